@@ -1,9 +1,22 @@
 from fastapi import APIRouter, HTTPException, status, BackgroundTasks
 from typing import Dict, Any
+import asyncio
 import logging
+from ...core.idempotency import idempotency
+from ...core.job_queue import job_queue
+from ...core.limits import limiter_snapshots
+from ...core.logging_config import logging_stats
 from ...services.email_monitor_service import email_monitor_service
 from ...services.customer_response_service import customer_response_service
 from ...services.scheduler_service import scheduler_service
+from ...services.baserow_service import baserow_service, garage_cache
+from ...services.baserow_replica import replica_enabled
+from ...services.service_request_outbox import service_request_outbox
+from ...services.direct_uploads import direct_uploads
+from ...services.image_intake import image_intake
+from ...services.image_processing import image_processor
+from ...services.image_upload_service import image_upload_service
+from ...services.media_store import media_store
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -95,7 +108,21 @@ async def get_fix_it_status() -> Dict[str, Any]:
             'success': True,
             'status': 'operational',
             'message': 'Fix it service is running',
-            'scheduler': scheduler_status
+            'scheduler': scheduler_status,
+            'garage_cache': garage_cache.snapshot(),
+            'replica': baserow_service.replica.status() if replica_enabled() else None,
+            'received_email_index': baserow_service.received_index.status(),
+            'limits': limiter_snapshots(),
+            'read_coalescing': baserow_service.reads.snapshot(),
+            'service_request_outbox': await asyncio.to_thread(service_request_outbox.status),
+            'jobs': await asyncio.to_thread(job_queue.status),
+            'image_uploads': image_upload_service.status(),
+            'media_store': media_store.status(),
+            'image_intake': image_intake.status(),
+            'direct_uploads': direct_uploads.status(),
+            'image_processing': image_processor.status(),
+            'idempotency': await asyncio.to_thread(idempotency.status),
+            'logging': logging_stats()
         }
     except Exception as e:
         logger.error(f"Error getting status: {str(e)}", exc_info=True)
@@ -104,21 +131,39 @@ async def get_fix_it_status() -> Dict[str, Any]:
             detail=str(e)
         )
 
+@router.post("/fix-it/garages/invalidate-cache", response_model=Dict[str, Any])
+async def invalidate_garage_cache() -> Dict[str, Any]:
+    """
+    Drop the cached garage directory
+    
+    Writes made through the API invalidate it automatically; call this after
+    editing the Fix it table directly in Baserow so the change is picked up
+    before GARAGE_CACHE_TTL expires.
+    """
+    from ...services.baserow_async_service import async_baserow_service as airtable_service
+    
+    airtable_service.invalidate_garage_cache()
+    return {
+        'success': True,
+        'message': 'Garage cache invalidated',
+        'garage_cache': garage_cache.snapshot()
+    }
+
 @router.get("/fix-it/test-garages", response_model=Dict[str, Any])
 async def test_garages() -> Dict[str, Any]:
     """Test endpoint to check if garages are accessible in Baserow"""
     try:
-        from ...services.baserow_service import baserow_service as airtable_service
+        from ...services.baserow_async_service import async_baserow_service as airtable_service
         
         logger.info("🧪 TEST: Fetching garages from Baserow...")
-        garages = airtable_service.get_fix_it_garages()
+        garages = await airtable_service.get_fix_it_garages()
         
         garage_list = []
         for garage in garages:
             garage_list.append({
-                'name': garage.get('name'),
-                'email': garage.get('email'),
-                'has_valid_email': bool(garage.get('email') and '@' in garage.get('email'))
+                'name': garage.name,
+                'email': garage.email,
+                'has_valid_email': bool(garage.email and '@' in garage.email)
             })
         
         return {
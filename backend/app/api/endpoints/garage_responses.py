@@ -3,7 +3,7 @@ from typing import Dict, Any
 from datetime import datetime
 import logging
 
-from ...services.baserow_service import baserow_service as airtable_service
+from ...services.baserow_async_service import async_baserow_service as airtable_service
 from ...models.garage_response import GarageResponse
 
 router = APIRouter(prefix="/api/garage-responses", tags=["garage-responses"])
@@ -34,7 +34,7 @@ async def record_garage_response(response: GarageResponse) -> Dict[str, Any]:
         }
         
         # Record the response in Baserow
-        result = airtable_service.record_garage_response(response_data)
+        result = await airtable_service.record_garage_response(response_data)
         
         if not result.get('success'):
             raise HTTPException(
@@ -64,7 +64,7 @@ async def get_garage_responses(request_id: str) -> Dict[str, Any]:
     """
     try:
         # Get responses from Baserow
-        responses = airtable_service.get_records('Recevied email')
+        responses = await airtable_service.get_records('Recevied email')
         
         return {
             'success': True,
@@ -0,0 +1,37 @@
+"""Serves files stored by the local media backend (``MEDIA_BACKEND=local``).
+
+Names are content hashes, so a file never changes under its URL: the hash
+is a strong ETag, ``If-None-Match`` gets a 304, and responses may be cached
+for a year. ``Range`` requests are answered by :class:`FileResponse`.
+"""
+import mimetypes
+import os
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from ...services.media_store import LocalMediaBackend, MEDIA_NAME, media_store
+
+router = APIRouter()
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+@router.get("/media/{name}")
+async def get_media(name: str, request: Request):
+    backend = media_store.backend
+    path = backend.path_for(name) if isinstance(backend, LocalMediaBackend) else None
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    etag = f'"{MEDIA_NAME.match(name).group(1)}"'
+    headers = {'etag': etag, 'cache-control': CACHE_CONTROL}
+    if _matches(request.headers.get('if-none-match', ''), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return FileResponse(path, media_type=mimetypes.guess_type(name)[0] or 'application/octet-stream', headers=headers)
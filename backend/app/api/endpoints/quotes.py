@@ -37,7 +37,7 @@ async def get_quote(quote_id: str):
     """
     Get a quote by ID
     """
-    quote = quote_service.get_quote(quote_id)
+    quote = await quote_service.get_quote(quote_id)
     if not quote:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -50,7 +50,7 @@ async def get_quotes_by_request(request_id: str):
     """
     Get all quotes for a service request
     """
-    return quote_service.get_quotes_by_request(request_id)
+    return await quote_service.get_quotes_by_request(request_id)
 
 @router.patch("/{quote_id}", response_model=Quote)
 async def update_quote(quote_id: str, update_data: QuoteUpdate):
@@ -62,7 +62,7 @@ async def update_quote(quote_id: str, update_data: QuoteUpdate):
     - **notes**: Updated notes (optional)
     - **valid_until**: New valid until date (YYYY-MM-DD, optional)
     """
-    updated_quote = quote_service.update_quote(quote_id, update_data)
+    updated_quote = await quote_service.update_quote(quote_id, update_data)
     if not updated_quote:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -75,7 +75,7 @@ async def get_quote_summary(request_id: str):
     """
     Get a summary of all quotes for a service request
     """
-    quotes = quote_service.get_quotes_by_request(request_id)
+    quotes = await quote_service.get_quotes_by_request(request_id)
     if not quotes:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, Body, BackgroundTasks, Request
 from fastapi.responses import JSONResponse
 from typing import Dict, Any, List
+import asyncio
+import json
 import logging
 import os
 import time
 from datetime import datetime
-from ...services.baserow_service import baserow_service as airtable_service
+from ...core.idempotency import idempotency
+from ...services.baserow_async_service import async_baserow_service as airtable_service
 from ...services.fix_it_service import fix_it_service
+from ...services.direct_uploads import DirectUploadRejected, direct_uploads, direct_uploads_enabled
+from ...services.image_intake import IntakeRejected, StagedImage, image_intake
+from ...services.image_processing import ImageRejected, image_processor
+from ...services.media_store import media_store
+from ...services.service_request_outbox import service_request_outbox, write_behind_enabled
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -19,47 +27,28 @@ async def _process_service_request(
     vin: str,
     license_plate: str,
     notes: str,
-    images: List[Dict[str, Any]]
+    images: List[StagedImage],
+    uploaded_image_urls: List[str] = ()
 ) -> Dict[str, Any]:
     """Process service request and return result"""
     try:
         logger.info(f"Starting to process service request for: {name} <{email}>")
         logger.info(f"Request includes {len(images)} images")
         
-        # Upload images to Cloudinary
-        image_urls = []
-        for img in images:
-            try:
-                if not isinstance(img, dict) or 'content' not in img:
-                    logger.warning(f"Skipping invalid image data: {img}")
-                    continue
-                
-                # Log image info (without content)
-                logger.info(f"Uploading image to Cloudinary: {img.get('filename', 'unnamed')}, "
-                           f"size: {len(img['content']) if img.get('content') else 0} bytes")
-                
-                # Upload to Cloudinary
-                url = airtable_service._upload_file_to_cloudinary(
-                    img['content'],
-                    img.get('filename', f"image_{int(time.time())}.jpg")
-                )
-                
-                if url:
-                    image_urls.append({'url': url})
-                    logger.info(f"Successfully uploaded image to Cloudinary: {url}")
-                else:
-                    logger.error(f"Failed to upload image to Cloudinary")
-                
-            except Exception as e:
-                logger.error(f"Error uploading image to Cloudinary: {str(e)}", exc_info=True)
-                continue
-        
-        logger.info(f"Uploaded {len(image_urls)} images to Cloudinary")
+        # Store the images all at once; photos stored before come back without an upload
+        uploads = [(img.filename, img) for img in images]
+        outcomes = await media_store.put_many(uploads)
+        image_urls = [{'url': url} for url in uploaded_image_urls]
+        image_urls += [{'url': outcome.url} for outcome in outcomes if outcome.ok]
+        failed_images = [{'filename': outcome.filename, 'error': outcome.error} for outcome in outcomes if not outcome.ok]
+        if failed_images:
+            logger.warning(f"{len(failed_images)} of {len(uploads)} image(s) could not be uploaded: "
+                           f"{', '.join(failure['filename'] for failure in failed_images)}")
         
         # Process the form data and create the service request
         try:
             # Use the correct method to create a customer record in Baserow
-            result = airtable_service.create_customer({
+            result = await airtable_service.create_customer({
                 'Name': name,
                 'Email': email,
                 'phone': phone,
@@ -93,6 +82,7 @@ async def _process_service_request(
                 'success': True,
                 'record_id': result.get('record_id'),
                 'image_urls': [img['url'] for img in image_urls],
+                'failed_images': failed_images,
                 'error': None
             }
             
@@ -116,89 +106,34 @@ async def _process_service_request(
             detail=error_msg
         )
 
-def _send_notifications(
-    request_id: str,
-    car_brand: str,
-    vin: str,
-    license_plate: str,
-    notes: str,
-    image_urls: List[str]
-):
-    """Send quote request notifications to all garages in Fix it table.
-    
-    This function sends emails to garages WITHOUT customer PII (name, email, phone).
-    Only includes request ID, car brand, VIN, damage notes, and image links.
-    
-    NOTE: This is a synchronous wrapper for the async email sending function
-    to work properly with FastAPI BackgroundTasks.
-    """
-    import asyncio
-    
-    logger.info(f"⚡ BACKGROUND TASK STARTED - Preparing to send quote requests for request ID: {request_id}")
-    logger.info(f"🔍 DEBUG: fix_it_service type: {type(fix_it_service)}")
-    logger.info(f"🔍 DEBUG: fix_it_service has send_quote_requests: {hasattr(fix_it_service, 'send_quote_requests')}")
-    
-    try:
-        logger.info(f"📧 Sending quote requests to garages for VIN: {vin}")
-        logger.info(f"🔍 DEBUG: Image URLs: {image_urls}")
-        
-        # Create a new event loop for this background task
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            logger.info(f"🔍 DEBUG: About to call fix_it_service.send_quote_requests()")
-            result = loop.run_until_complete(
-                fix_it_service.send_quote_requests(
-                    request_id=request_id,
-                    car_brand=car_brand,
-                    vin=vin,
-                    license_plate=license_plate,
-                    damage_notes=notes,
-                    image_urls=image_urls
-                )
-            )
-            logger.info(f"🔍 DEBUG: Result from send_quote_requests: {result}")
-            
-            if result.get('success'):
-                logger.info(f"✅ BACKGROUND TASK SUCCESS - Sent quote requests to {result.get('garages_contacted', 0)} garages")
-            else:
-                logger.error(f"❌ BACKGROUND TASK FAILED - Failed to send quote requests: {result.get('error', 'Unknown error')}")
-        finally:
-            loop.close()
-        
-    except Exception as e:
-        error_msg = f"❌ BACKGROUND TASK ERROR - Error sending quote requests to garages: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        # Don't re-raise as this is a background task
-
-# Dictionary to store in-flight requests with timestamps (in production, use Redis or similar)
-_in_flight_requests = {}
-
-# Store processed request IDs with timestamps to prevent duplicates
-_processed_request_ids = {}
-
-# Timeout for in-flight requests (in seconds)
-_IN_FLIGHT_TIMEOUT = 300  # 5 minutes
+async def _release_request_markers(request_key: str, request_id: str):
+    """Forget a rejected submission so the customer can send it again"""
+    await idempotency.release(f"request-key:{request_key}", request_id)
+    await idempotency.release(f"request-id:{request_id}", request_id)
 
-# Cleanup interval (in seconds)
-_CLEANUP_INTERVAL = 3600  # 1 hour
-_last_cleanup = 0
-
-def _cleanup_old_requests():
-    global _last_cleanup
-    current_time = time.time()
-    if current_time - _last_cleanup > _CLEANUP_INTERVAL:
-        _last_cleanup = current_time
-        logger.info("Cleaning up old requests")
-        for request_key, (timestamp, _) in list(_in_flight_requests.items()):
-            if current_time - timestamp > _IN_FLIGHT_TIMEOUT:
-                logger.info(f"Removing expired request: {request_key}")
-                _in_flight_requests.pop(request_key, None)
-        for request_id, timestamp in list(_processed_request_ids.items()):
-            if current_time - timestamp > _IN_FLIGHT_TIMEOUT:
-                logger.info(f"Removing expired request ID: {request_id}")
-                _processed_request_ids.pop(request_id, None)
+def _verify_uploaded_images(uploaded_images: str, has_files: bool) -> List[str]:
+    """Cloudinary URLs for the ``uploadedImages`` field, or a 400"""
+    if not uploaded_images:
+        return []
+    if has_files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Send photos either as files or as uploadedImages, not both"
+        )
+    try:
+        items = json.loads(uploaded_images)
+        if not isinstance(items, list):
+            raise ValueError("expected a list")
+        if len(items) > image_intake.max_images:
+            raise DirectUploadRejected(f"At most {image_intake.max_images} images can be attached")
+        return direct_uploads.verify(items)
+    except (ValueError, DirectUploadRejected) as e:
+        direct_uploads.metrics['rejected'] += 1
+        logger.warning(f"Rejected uploaded images: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid uploaded images: {str(e)}"
+        )
 
 def _generate_request_key(name: str, email: str, phone: str, vin: str, notes: str) -> str:
     """Generate a unique key for deduplication"""
@@ -206,6 +141,26 @@ def _generate_request_key(name: str, email: str, phone: str, vin: str, notes: st
     request_str = f"{name}:{email}:{phone}:{vin}:{notes}"
     return hashlib.md5(request_str.encode()).hexdigest()
 
+@router.post("/service-requests/upload-signature", response_model=Dict[str, Any])
+async def create_upload_signature(count: int = Body(1, embed=True)) -> Dict[str, Any]:
+    """Signed parameters for uploading ``count`` photos straight to Cloudinary"""
+    if not direct_uploads_enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Direct uploads are disabled")
+    if not 1 <= count <= image_intake.max_images:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"count must be between 1 and {image_intake.max_images}"
+        )
+    try:
+        return direct_uploads.issue(count, image_processor.settings.max_edge)
+    except Exception as e:
+        logger.error(f"Error issuing upload signature: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Direct uploads are not available"
+        )
+
+
 @router.post("/service-requests", response_model=Dict[str, Any])
 async def create_service_request(
     background_tasks: BackgroundTasks,
@@ -218,10 +173,11 @@ async def create_service_request(
     licensePlate: str = Form(""),
     notes: str = Form(""),
     requestId: str = Form(""),
+    uploadedImages: str = Form(""),
     images: List[UploadFile] = File([])
 ) -> Dict[str, Any]:
     logger.info(f"Received service request - Request ID: {requestId}")
-    logger.info(f"Request headers: {dict(request.headers)}")
+    logger.debug("Request headers: %s", dict(request.headers))
     
     try:
         current_time = time.time()
@@ -231,130 +187,62 @@ async def create_service_request(
         logger.info(f"Request details - Name: {name}, Email: {email}, Phone: {phone}")
         logger.info(f"Request includes {len(images)} images")
         
-        # Log form data (excluding sensitive info)
-        form_data = await request.form()
-        logger.info(f"Form data keys: {list(form_data.keys())}")
-        
         # Log files info
         for i, img in enumerate(images):
-            logger.info(f"Image {i+1}: {img.filename}, {img.content_type}, {img.size} bytes")
+            logger.debug("Image %s: %s, %s, %s bytes", i + 1, img.filename, img.content_type, img.size)
         
-        # Run cleanup of old requests if needed
-        _cleanup_old_requests()
+        # Too many or too large photos are turned away before anything else
+        try:
+            image_intake.check(images)
+        except IntakeRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        
+        # Photos the browser uploaded to Cloudinary itself (see upload-signature below)
+        uploaded_image_urls = _verify_uploaded_images(uploadedImages, has_files=bool(images))
         
         # Log CORS headers
-        logger.info(f"Origin header: {request.headers.get('origin')}")
-        logger.info(f"Access-Control-Request-Method: {request.headers.get('access-control-request-method')}")
-        logger.info(f"Access-Control-Request-Headers: {request.headers.get('access-control-request-headers')}")
+        logger.debug("Origin header: %s", request.headers.get('origin'))
+        logger.debug("Access-Control-Request-Method: %s", request.headers.get('access-control-request-method'))
+        logger.debug("Access-Control-Request-Headers: %s", request.headers.get('access-control-request-headers'))
         
         # Check for duplicate request ID or similar recent request
         request_key = _generate_request_key(name, email, phone, vin, notes)
         
-        # Check if we have a recent duplicate request
-        if request_key in _in_flight_requests:
-            timestamp, request_id = _in_flight_requests[request_key]
-            if current_time - timestamp < _IN_FLIGHT_TIMEOUT:
-                logger.warning(f"Duplicate request detected (key: {request_key[:8]}...), last processed {current_time - timestamp:.2f}s ago")
-                return JSONResponse(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    content={"detail": "A similar request was recently processed. Please wait before trying again."}
-                )
-            else:
-                # Remove expired request
-                _in_flight_requests.pop(request_key, None)
+        request_id = requestId or str(current_time)
         
-        # Also check the requestId if provided
-        if requestId and requestId in _processed_request_ids:
-            timestamp = _processed_request_ids[requestId]
-            if current_time - timestamp < _IN_FLIGHT_TIMEOUT:
-                logger.warning(f"Duplicate request ID detected: {requestId}")
-                return JSONResponse(
-                    status_code=status.HTTP_409_CONFLICT,
-                    content={"detail": "This request has already been processed"}
-                )
-            else:
-                # Remove expired request ID
-                _processed_request_ids.pop(requestId, None)
-                
-        # Mark this request as in-flight using both the key and requestId
-        _in_flight_requests[request_key] = (current_time, requestId or str(current_time))
+        # Claim the submission in the shared store; a held claim means a duplicate
+        holder = await idempotency.claim(f"request-key:{request_key}", request_id)
+        if holder is not None:
+            logger.warning(f"Duplicate request detected (key: {request_key[:8]}...), already claimed by {holder}")
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "A similar request was recently processed. Please wait before trying again."}
+            )
         
-        # Add request to in-flight requests
-        _processed_request_ids[requestId or str(current_time)] = current_time
+        # Also check the requestId if provided
+        if requestId and await idempotency.claim(f"request-id:{requestId}", request_id) is not None:
+            logger.warning(f"Duplicate request ID detected: {requestId}")
+            await idempotency.release(f"request-key:{request_key}", request_id)
+            return JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={"detail": "This request has already been processed"}
+            )
         
-        # Process images if any
-        image_data = []
-        for image in images:
-            try:
-                # Ensure we're at the start of the file
-                await image.seek(0)
-                # Read the file content
-                contents = await image.read()
-                
-                logger.info(f"Processing image: {image.filename}, size: {len(contents)} bytes, type: {image.content_type}")
-                
-                # Create a dictionary with file info and content
-                file_info = {
-                    "filename": image.filename or f"image_{int(time.time())}.jpg",
-                    "content": contents,  # Actual binary content
-                    "content_type": image.content_type or "application/octet-stream"
-                }
-                
-                # Log file info (without content)
-                logger.info(f"Added file to upload: {file_info['filename']} ({len(contents)} bytes, {file_info['content_type']})")
-                
-                image_data.append(file_info)
-                
-            except Exception as e:
-                logger.error(f"Error processing image {getattr(image, 'filename', 'unknown')}: {str(e)}", exc_info=True)
-                continue
+        # Copy the photos from the form's spool files to staging files, within the byte budget
+        try:
+            staged = await image_intake.stage(images)
+        except IntakeRejected as e:
+            await _release_request_markers(request_key, request_id)
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         
         try:
-            # Process the service request
-            logger.info(f"🔵 DEBUG: About to call _process_service_request with {len(image_data)} images")
-            result = await _process_service_request(
-                name=name,
-                email=email,
-                phone=phone,
-                car_brand=carBrand,
-                vin=vin,
-                license_plate=licensePlate,
-                notes=notes,
-                images=image_data
-            )
-            
-            logger.info(f"🔵 DEBUG: _process_service_request returned: {result}")
-            
-            # Get the image URLs from the result
-            image_urls = result.get('image_urls', [])
-            
-            logger.info(f"🔵 DEBUG: Extracted {len(image_urls)} image URLs")
-            
-            # Send quote requests to garages in BACKGROUND TASK
-            # This prevents timeout when sending to 50+ garages
-            logger.info(f"📧 Scheduling background task to send quote requests for VIN: {vin}")
-            background_tasks.add_task(
-                _send_notifications,
-                request_id=requestId,
-                car_brand=carBrand,
-                vin=vin,
-                license_plate=licensePlate,
-                notes=notes,
-                image_urls=image_urls
-            )
-            logger.info(f"✅ Background task scheduled - API will respond immediately")
-            
-            # Log success
-            logger.info(f"Successfully processed request from {email}")
-            logger.info(f"🔵 DEBUG: About to return result: {result}")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error in service request processing: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error processing service request: {str(e)}"
+            return await _handle_staged_request(
+                background_tasks, staged.images, uploaded_image_urls, request_key, requestId, current_time,
+                name=name, email=email, phone=phone, car_brand=carBrand, vin=vin,
+                license_plate=licensePlate, notes=notes,
             )
+        finally:
+            await image_intake.release(staged)
         
     except HTTPException:
         raise
@@ -364,3 +252,114 @@ async def create_service_request(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while processing your request: {str(e)}"
         )
+
+
+async def _handle_staged_request(
+    background_tasks: BackgroundTasks,
+    images: List[StagedImage],
+    uploaded_image_urls: List[str],
+    request_key: str,
+    request_id: str,
+    current_time: float,
+    name: str,
+    email: str,
+    phone: str,
+    car_brand: str,
+    vin: str,
+    license_plate: str,
+    notes: str,
+) -> Dict[str, Any]:
+    """Normalise the staged photos, then store the request (directly or through the outbox)"""
+    # The outbox gives a request without an ID its own ``req_...`` one;
+    # everything else keys on the same ID the idempotency claim used
+    resolved_id = request_id or str(current_time)
+    # Downscale, re-encode and strip EXIF before anything is stored or uploaded
+    try:
+        await image_processor.normalise_many(images)
+    except ImageRejected as e:
+        # Let the customer resubmit without the offending photo
+        await _release_request_markers(request_key, resolved_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"One of the images can't be accepted: {str(e)}"
+        )
+    
+    if write_behind_enabled():
+        # Commit locally and answer now; uploads, the Baserow row and the
+        # garage emails are done by the outbox flusher (with retries)
+        queued_id = await service_request_outbox.enqueue(request_id, {
+            'Name': name,
+            'Email': email,
+            'phone': phone,
+            'car_brand': car_brand,
+            'VIN': vin,
+            'Plate Number': license_plate,
+            'Note': notes,
+        }, images, image_urls=uploaded_image_urls)
+        background_tasks.add_task(service_request_outbox.flush)
+        logger.info(f"✅ Service request {queued_id} queued for {email}")
+        return {
+            'success': True,
+            'queued': True,
+            'request_id': queued_id,
+            'record_id': None,
+            'image_urls': [],
+            'error': None
+        }
+    
+    try:
+        # Process the service request
+        logger.debug("About to call _process_service_request with %s images", len(images))
+        result = await _process_service_request(
+            name=name,
+            email=email,
+            phone=phone,
+            car_brand=car_brand,
+            vin=vin,
+            license_plate=license_plate,
+            notes=notes,
+            images=images,
+            uploaded_image_urls=uploaded_image_urls
+        )
+        
+        logger.debug("_process_service_request returned: %s", result)
+        
+        # Get the image URLs from the result
+        image_urls = result.get('image_urls', [])
+        
+        logger.debug("Extracted %s image URLs", len(image_urls))
+        
+        # Queue the quote requests to the garages; they are sent after we
+        # respond, and the job queue picks them up again after a restart
+        await fix_it_service.queue_quote_requests(
+            request_id=resolved_id,
+            car_brand=car_brand,
+            vin=vin,
+            license_plate=license_plate,
+            damage_notes=notes,
+            image_urls=image_urls
+        )
+        
+        # Log success
+        logger.info(f"Successfully processed request from {email}")
+        logger.debug("About to return result: %s", result)
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error in service request processing: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing service request: {str(e)}"
+        )
+
+
+@router.get("/service-requests/{request_id}/status", response_model=Dict[str, Any])
+async def get_service_request_status(request_id: str) -> Dict[str, Any]:
+    """Progress of a service request accepted in write-behind mode"""
+    entry = await asyncio.to_thread(service_request_outbox.get, request_id)
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No queued service request {request_id}"
+        )
+    return {'success': True, **entry}
@@ -4,6 +4,8 @@ import cloudinary.api
 import os
 from dotenv import load_dotenv
 
+from ..core.limits import get_limiter
+
 # Load environment variables
 load_dotenv()
 
@@ -13,6 +15,7 @@ def configure_cloudinary():
         cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
         api_key=os.getenv('CLOUDINARY_API_KEY'),
         api_secret=os.getenv('CLOUDINARY_API_SECRET'),
+        upload_prefix=os.getenv('CLOUDINARY_UPLOAD_PREFIX') or None,
         secure=True
     )
     print("✅ Cloudinary configured successfully!")
@@ -36,14 +39,15 @@ def upload_file(file_content, public_id=None, folder="garagefy"):
         print(f"📤 Uploading file to Cloudinary folder: {folder}")
         
         # Upload the file
-        upload_result = cloudinary.uploader.upload(
-            file_content,
-            public_id=public_id,
-            folder=folder,
-            resource_type="auto",
-            chunk_size=6000000,  # 6MB chunks for large files
-            timeout=30  # 30 second timeout
-        )
+        with get_limiter('cloudinary').slot():
+            upload_result = cloudinary.uploader.upload(
+                file_content,
+                public_id=public_id,
+                folder=folder,
+                resource_type="auto",
+                chunk_size=6000000,  # 6MB chunks for large files
+                timeout=30  # 30 second timeout
+            )
         
         print(f"✅ File uploaded successfully: {upload_result.get('secure_url')}")
         
@@ -0,0 +1,101 @@
+"""In-process TTL cache with stale-while-revalidate semantics."""
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+FRESH = 'fresh'
+STALE = 'stale'
+MISS = 'miss'
+
+
+class TTLCache:
+    """Thread-safe keyed cache whose entries go fresh -> stale -> expired.
+
+    Entries younger than ``ttl`` are served as-is. Between ``ttl`` and
+    ``stale_ttl`` they are still served, but the caller is told to refresh
+    them in the background (at most one refresh per key at a time). Older
+    entries are treated as a miss. ``stats`` counts hits, stale hits, misses,
+    refreshes and invalidations for monitoring.
+
+    A load that was already running when :meth:`invalidate` was called
+    must not put its result back: loaders take :meth:`generation` before
+    reading and pass it to :meth:`store`, which drops values from before
+    the latest invalidation.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: Optional[float] = None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl if stale_ttl is not None else ttl, ttl)
+        self.stats: Counter = Counter()
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._refreshing: set = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Hashable) -> Tuple[str, Any]:
+        """Return ``(FRESH | STALE | MISS, value)`` for ``key``"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl > 0:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl:
+                    self.stats['hits'] += 1
+                    return FRESH, value
+                if age < self.stale_ttl:
+                    self.stats['stale_hits'] += 1
+                    return STALE, value
+            self.stats['misses'] += 1
+            return MISS, None
+
+    def generation(self) -> int:
+        """Bumped by every :meth:`invalidate`; take it before loading a value"""
+        with self._lock:
+            return self._generation
+
+    def store(self, key: Hashable, value: Any, generation: Optional[int] = None) -> bool:
+        """Keep ``value``, unless it was loaded before the latest invalidation"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.stats['discarded'] += 1
+                return False
+            self._entries[key] = (value, time.monotonic())
+            return True
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """Claim the background refresh for ``key``; False if one is running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.stats['refreshes'] += 1
+            return True
+
+    def end_refresh(self, key: Hashable):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def invalidate(self, key: Hashable = None):
+        """Drop one entry, or everything when ``key`` is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._generation += 1
+            self.stats['invalidations'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and current entry ages, for status endpoints"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'name': self.name,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'generation': self._generation,
+                'entries': {str(k): round(now - stored_at, 1) for k, (_, stored_at) in self._entries.items()},
+                **{k: self.stats.get(k, 0) for k in ('hits', 'stale_hits', 'misses', 'refreshes', 'invalidations', 'discarded')},
+            }
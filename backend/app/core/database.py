@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 Base = declarative_base()
 
 # Then import models to register them with Base
-from ..models import garage, booking, quote
+from ..models import garage, booking, quote, baserow_replica, received_email_index, service_request_outbox, storage, media_object, idempotency_key, job
 
 # Load environment variables
 load_dotenv()
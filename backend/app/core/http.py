@@ -0,0 +1,99 @@
+"""Shared HTTP transport helpers: pooled sessions and retry policy."""
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Methods that are safe to resend after a 5xx or a read timeout. A POST that
+# timed out may already have created a row, so it is only retried when the
+# server explicitly rejected it (429).
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PATCH', 'PUT', 'DELETE'})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header (seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff policy for transient HTTP failures"""
+
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    backoff_max: float = 30.0
+    retry_statuses: FrozenSet[int] = field(default_factory=lambda: frozenset({429, 502, 503, 504}))
+
+    @classmethod
+    def from_env(cls, prefix: str) -> 'RetryPolicy':
+        """Build a policy from ``<PREFIX>_MAX_RETRIES`` style variables."""
+        return cls(
+            max_retries=int(os.getenv(f'{prefix}_MAX_RETRIES', cls.max_retries)),
+            backoff_factor=float(os.getenv(f'{prefix}_BACKOFF_FACTOR', cls.backoff_factor)),
+            backoff_max=float(os.getenv(f'{prefix}_BACKOFF_MAX', cls.backoff_max)),
+        )
+
+    def should_retry_status(self, method: str, status_code: int, attempt: int) -> bool:
+        if attempt >= self.max_retries or status_code not in self.retry_statuses:
+            return False
+        return status_code == 429 or method.upper() in IDEMPOTENT_METHODS
+
+    def should_retry_timeout(self, method: str, attempt: int) -> bool:
+        return attempt < self.max_retries and method.upper() in IDEMPOTENT_METHODS
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before retry number ``attempt + 1``.
+
+        A server-provided ``Retry-After`` wins; otherwise exponential backoff
+        with a little jitter so concurrent callers don't retry in lockstep.
+        """
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(server_delay, self.backoff_max)
+        backoff = self.backoff_factor * (2 ** attempt)
+        return min(backoff + random.uniform(0, self.backoff_factor), self.backoff_max)
+
+
+def timeouts_from_env(prefix: str, connect: float = 5.0, read: float = 30.0) -> Tuple[float, float]:
+    """``(connect, read)`` timeouts from ``<PREFIX>_CONNECT_TIMEOUT`` / ``<PREFIX>_READ_TIMEOUT``."""
+    return (
+        float(os.getenv(f'{prefix}_CONNECT_TIMEOUT', connect)),
+        float(os.getenv(f'{prefix}_READ_TIMEOUT', read)),
+    )
+
+
+def build_session(pool_size: int = 10, connect_retries: int = 3) -> requests.Session:
+    """Create a keep-alive ``requests.Session`` with a sized connection pool.
+
+    urllib3 only retries failed *connects* here (nothing was sent, so that is
+    safe for every method); status and read-timeout retries are left to the
+    caller's :class:`RetryPolicy` so it can honour ``Retry-After``.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=None, connect=connect_retries, read=0, status=0, other=0, redirect=3, backoff_factor=0.2),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,254 @@
+"""Idempotency keys shared by every worker that serves the API.
+
+``POST /api/service-requests`` must not fan a submission out to the
+garages twice, whether it is a double click, a retried request or the same
+form sent again to another uvicorn worker. Before doing any work it
+*claims* the submission's keys; a key that is already held means the
+request is a duplicate. A claim is a single atomic step in every backend,
+so two workers racing for the same key can't both win, and it expires
+after its TTL, so a crashed worker's claims don't block resubmission for
+ever.
+
+``IDEMPOTENCY_BACKEND`` picks where claims live:
+
+* ``memory`` (default): an LRU in this process, capped at
+  ``IDEMPOTENCY_MAX_ENTRIES`` (10000). Only correct with a single worker.
+* ``sqlite``: the ``idempotency_keys`` table of ``garagefy.db``, which
+  every worker on the host opens.
+* ``redis``: any server speaking the Redis protocol at
+  ``IDEMPOTENCY_REDIS_URL`` (needs the ``redis`` package), for workers on
+  several hosts. ``python -m fakes`` includes one for local runs.
+
+If the backend can't be reached, a claim succeeds (and is counted under
+``errors``): a rare duplicate fan-out is better than losing a customer's
+request.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('memory', 'sqlite', 'redis')
+
+# Expired sqlite rows are deleted at most this often (seconds)
+PURGE_INTERVAL = 60
+
+
+class MemoryIdempotencyStore:
+    """Bounded LRU of claims in this process"""
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max(1, max_entries)
+        self.evicted = 0
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, holder: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+            self._entries[key] = (holder, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+        return None
+
+    def release(self, key: str, holder: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != holder:
+                return False
+            del self._entries[key]
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'evicted': self.evicted}
+
+
+class SqliteIdempotencyStore:
+    """Claims in the ``idempotency_keys`` table of ``garagefy.db``"""
+    name = 'sqlite'
+
+    def __init__(self):
+        self._purged_at = 0.0
+
+    def _purge(self, db, now: float):
+        if now - self._purged_at < PURGE_INTERVAL:
+            return
+        from ..models.idempotency_key import IdempotencyKey
+
+        self._purged_at = now
+        db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+
+    def claim(self, key: str, holder: str, ttl: float) -> Optional[str]:
+        from sqlalchemy.dialects.sqlite import insert
+
+        from ..models.idempotency_key import IdempotencyKey
+        from .database import SessionLocal
+
+        now = time.time()
+        # Insert, or take over a row whose claim has expired; both in one statement
+        statement = insert(IdempotencyKey).values(key=key, holder=holder, expires_at=now + ttl)
+        statement = statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={'holder': statement.excluded.holder, 'expires_at': statement.excluded.expires_at},
+            where=IdempotencyKey.expires_at <= now,
+        )
+        with SessionLocal() as db:
+            claimed = db.execute(statement).rowcount == 1
+            self._purge(db, now)
+            db.commit()
+            if claimed:
+                return None
+            current = db.get(IdempotencyKey, key)
+        # Released between the insert and the read: it was held when we tried
+        return current.holder if current is not None else holder
+
+    def release(self, key: str, holder: str) -> bool:
+        from ..models.idempotency_key import IdempotencyKey
+        from .database import SessionLocal
+
+        with SessionLocal() as db:
+            deleted = db.query(IdempotencyKey).filter(
+                IdempotencyKey.key == key, IdempotencyKey.holder == holder
+            ).delete(synchronize_session=False)
+            db.commit()
+        return deleted == 1
+
+    def status(self) -> Dict[str, Any]:
+        from ..models.idempotency_key import IdempotencyKey
+        from .database import SessionLocal
+
+        with SessionLocal() as db:
+            held = db.query(IdempotencyKey).filter(IdempotencyKey.expires_at > time.time()).count()
+        return {'entries': held}
+
+
+class RedisIdempotencyStore:
+    """Claims as ``SET NX PX`` keys on a Redis-protocol server"""
+    name = 'redis'
+
+    def __init__(self, url: str, prefix: str = 'garagefy:idempotency:', timeout: float = 2.0):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("IDEMPOTENCY_BACKEND=redis needs the redis package (pip install redis)")
+        self.url = url
+        self.prefix = prefix
+        self._watch_error = redis.WatchError
+        # RESP2 only needs what every Redis-protocol server speaks, the fake included
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout,
+                                            decode_responses=True, protocol=2)
+
+    def claim(self, key: str, holder: str, ttl: float) -> Optional[str]:
+        key = self.prefix + key
+        for _ in range(3):
+            if self._client.set(key, holder, nx=True, px=max(1, int(ttl * 1000))):
+                return None
+            current = self._client.get(key)
+            if current is not None:
+                return current
+            # Expired or released between SET and GET; try again
+        return holder
+
+    def release(self, key: str, holder: str) -> bool:
+        key = self.prefix + key
+        with self._client.pipeline() as pipe:
+            try:
+                # Delete only if it is still ours; EXEC fails if anyone touched it after WATCH
+                pipe.watch(key)
+                if pipe.get(key) != holder:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+                return True
+            except self._watch_error:
+                return False
+
+    def status(self) -> Dict[str, Any]:
+        return {'url': self.url.split('@')[-1], 'prefix': self.prefix}
+
+
+def create_store(backend: str):
+    """A new store for ``backend`` (one of :data:`BACKENDS`)"""
+    if backend == 'memory':
+        return MemoryIdempotencyStore(int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 10000)))
+    if backend == 'sqlite':
+        return SqliteIdempotencyStore()
+    if backend == 'redis':
+        return RedisIdempotencyStore(os.getenv('IDEMPOTENCY_REDIS_URL', 'redis://localhost:6379/0'),
+                                     prefix=os.getenv('IDEMPOTENCY_REDIS_PREFIX', 'garagefy:idempotency:'))
+    raise ValueError(f"Unknown IDEMPOTENCY_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+class Idempotency:
+    """Async front of the configured store, see module docstring.
+
+    The store is created on first use; the sqlite and redis stores block,
+    so their calls run on the default executor.
+    """
+
+    def __init__(self, store=None, ttl: Optional[float] = None):
+        self._store = store
+        self.ttl = ttl or float(os.getenv('IDEMPOTENCY_TTL', 300))
+        self.metrics: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = create_store(os.getenv('IDEMPOTENCY_BACKEND', 'memory').lower())
+        return self._store
+
+    async def _call(self, method, *args):
+        if isinstance(self.store, MemoryIdempotencyStore):
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def claim(self, key: str, holder: str, ttl: Optional[float] = None) -> Optional[str]:
+        """Hold ``key`` for ``ttl`` seconds; None if we got it, else the current holder"""
+        try:
+            current = await self._call(self.store.claim, key, holder, ttl or self.ttl)
+        except Exception as e:
+            self.metrics['errors'] += 1
+            logger.error(f"Idempotency store failed to claim {key}: {str(e)}")
+            return None
+        self.metrics['claimed' if current is None else 'duplicates'] += 1
+        return current
+
+    async def release(self, key: str, holder: str) -> bool:
+        """Give ``key`` up early, if ``holder`` still holds it"""
+        try:
+            released = await self._call(self.store.release, key, holder)
+        except Exception as e:
+            self.metrics['errors'] += 1
+            logger.error(f"Idempotency store failed to release {key}: {str(e)}")
+            return False
+        if released:
+            self.metrics['released'] += 1
+        return released
+
+    def status(self) -> Dict[str, Any]:
+        backend = os.getenv('IDEMPOTENCY_BACKEND', 'memory').lower()
+        try:
+            backend, store_status = self.store.name, self.store.status()
+        except Exception as e:
+            store_status = {'error': str(e)}
+        return {'backend': backend, 'ttl': self.ttl, **store_status, **self.metrics}
+
+
+idempotency = Idempotency()
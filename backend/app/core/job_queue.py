@@ -0,0 +1,377 @@
+"""Durable background jobs, persisted in the ``jobs`` table of ``garagefy.db``.
+
+FastAPI's ``BackgroundTasks`` only live as long as the process: a deploy
+or crash in the middle of sending quote requests used to leave the rest of
+the garages uncontacted, with nothing left to show for it. Work that has
+to happen goes through this queue instead:
+
+* :meth:`JobQueue.enqueue` commits the job before it returns. An optional
+  ``key`` makes enqueueing idempotent (the second insert is ignored).
+* A dispatcher on the app's event loop claims due jobs and runs each in its
+  own task, at most ``JOB_WORKERS`` (16) at a time and at most the
+  ``concurrency`` given to :meth:`JobQueue.register` per kind. Every
+  SQLite call (enqueue, claim, settle, purge) runs in a worker thread, so
+  the loop never waits on the database.
+* A handler is cancelled after its ``visibility_timeout`` seconds, and the
+  claim is a lease of a few seconds more. A ``running`` job whose lease
+  has expired (its process died) is claimed again, by this or any other
+  process sharing the database.
+* A handler that raises is retried after an exponential, jittered backoff
+  (``JOB_BACKOFF`` doubling up to ``JOB_BACKOFF_MAX``) until it has run
+  ``max_attempts`` times; :class:`JobFailed` gives up at once. Jobs
+  cancelled by a shutdown are handed back straight away, without using up
+  an attempt, so the next start resumes them.
+
+Finished jobs are deleted after ``JOB_RETENTION`` seconds (7 days); failed
+ones are kept. ``JOB_QUEUE_ENABLED=false`` opts out: the dispatcher isn't
+started and callers use their non-durable path (see
+``FixItService.queue_quote_requests``).
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_
+
+from .database import SessionLocal
+from .limits import BULK, lane
+from ..models.job import QueuedJob
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Finished jobs are purged at most this often (seconds)
+PURGE_INTERVAL = 600
+
+# A lease outlasts the handler's timeout by this much, to record the outcome
+LEASE_GRACE = 5
+
+
+def job_queue_enabled() -> bool:
+    return os.getenv('JOB_QUEUE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+
+class JobFailed(Exception):
+    """Raised by a handler for a failure that retrying won't fix"""
+
+
+@dataclass
+class Job:
+    """What a handler is given"""
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+@dataclass
+class JobKind:
+    name: str
+    handler: Callable[[Job], Awaitable[Any]]
+    concurrency: int
+    max_attempts: int
+    visibility_timeout: float
+    lane: int
+    running: int = 0
+
+
+@dataclass
+class _Claim:
+    job: Job
+    kind: JobKind
+
+
+class JobQueue:
+    """SQLite-backed job queue with workers on the event loop, see module docstring"""
+
+    def __init__(self):
+        self.workers = max(1, int(os.getenv('JOB_WORKERS', 16)))
+        self.poll_interval = float(os.getenv('JOB_POLL_INTERVAL', 1))
+        self.visibility_timeout = float(os.getenv('JOB_VISIBILITY_TIMEOUT', 300))
+        self.max_attempts = max(1, int(os.getenv('JOB_MAX_ATTEMPTS', 8)))
+        self.backoff_base = float(os.getenv('JOB_BACKOFF', 15))
+        self.backoff_max = float(os.getenv('JOB_BACKOFF_MAX', 1800))
+        self.retention = float(os.getenv('JOB_RETENTION', 7 * 24 * 3600))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.kinds: Dict[str, JobKind] = {}
+        self.metrics: Counter = Counter()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._purged_at = 0.0
+
+    def register(self, kind: str, handler: Callable[[Job], Awaitable[Any]], concurrency: Optional[int] = None,
+                 max_attempts: Optional[int] = None, visibility_timeout: Optional[float] = None, priority: int = BULK):
+        """Run jobs of ``kind`` with ``handler``; the other settings default to the queue's"""
+        self.kinds[kind] = JobKind(
+            name=kind,
+            handler=handler,
+            concurrency=max(1, concurrency or self.workers),
+            max_attempts=max(1, max_attempts or self.max_attempts),
+            visibility_timeout=visibility_timeout or self.visibility_timeout,
+            lane=priority,
+        )
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], key: Optional[str] = None, delay: float = 0) -> int:
+        """Durably add one job; returns its id (the existing job's, if ``key`` was taken)"""
+        if kind not in self.kinds:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        job_id, added = await asyncio.to_thread(self._insert, kind, payload, key, delay)
+        self._enqueued(added, 1)
+        return job_id
+
+    async def enqueue_many(self, kind: str, jobs: Iterable[Tuple[Optional[str], Dict[str, Any]]], delay: float = 0) -> int:
+        """Durably add ``(key, payload)`` jobs in one transaction; returns how many were new"""
+        if kind not in self.kinds:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        jobs = list(jobs)
+        if not jobs:
+            return 0
+        added = await asyncio.to_thread(self._insert_many, kind, jobs, delay)
+        self._enqueued(added, len(jobs))
+        return added
+
+    def _insert(self, kind: str, payload: Dict[str, Any], key: Optional[str], delay: float) -> Tuple[int, int]:
+        """``(job id, 1 if it was new else 0)``; blocking"""
+        if key is not None:
+            added = self._insert_many(kind, [(key, payload)], delay)
+            with SessionLocal() as db:
+                return db.query(QueuedJob.id).filter(QueuedJob.key == key).scalar(), added
+        now = time.time()
+        with SessionLocal() as db:
+            job = QueuedJob(kind=kind, payload=payload, status=QUEUED, attempts=0,
+                            run_at=now + delay, created_at=now, updated_at=now)
+            db.add(job)
+            db.commit()
+            return job.id, 1
+
+    def _insert_many(self, kind: str, jobs: List[Tuple[Optional[str], Dict[str, Any]]], delay: float) -> int:
+        """Insert jobs, skipping taken keys; returns how many were new. Blocking"""
+        from sqlalchemy.dialects.sqlite import insert
+
+        now = time.time()
+        rows = [
+            {'kind': kind, 'key': key, 'payload': payload, 'status': QUEUED, 'attempts': 0,
+             'run_at': now + delay, 'created_at': now, 'updated_at': now}
+            for key, payload in jobs
+        ]
+        with SessionLocal() as db:
+            statement = insert(QueuedJob.__table__).on_conflict_do_nothing(index_elements=[QueuedJob.key])
+            added = db.connection().execute(statement, rows).rowcount
+            db.commit()
+        return added
+
+    def _enqueued(self, added: int, submitted: int):
+        self.metrics['enqueued'] += added
+        if added < submitted:
+            self.metrics['duplicates'] += submitted - added
+        self._notify()
+
+    def _notify(self):
+        # Enqueueing may happen on a worker thread; the event belongs to the loop
+        if self._wakeup is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_base * (2 ** max(0, attempts - 1)), self.backoff_max)
+        # Jitter, so jobs that failed together don't all come back together
+        return delay * random.uniform(0.8, 1.2)
+
+    def _claim(self, kinds: List[str]) -> Optional[_Claim]:
+        """Lease the next due job of one of ``kinds``; None if there is none. Blocking"""
+        now = time.time()
+        due = or_(
+            and_(QueuedJob.status == QUEUED, QueuedJob.run_at <= now),
+            and_(QueuedJob.status == RUNNING, QueuedJob.locked_until <= now),
+        )
+        with SessionLocal() as db:
+            # Another process may take a candidate first; then try the next one
+            for _ in range(5):
+                candidate = db.query(QueuedJob.id, QueuedJob.kind, QueuedJob.status, QueuedJob.attempts).filter(
+                    QueuedJob.kind.in_(kinds), due
+                ).order_by(QueuedJob.run_at, QueuedJob.id).first()
+                if candidate is None:
+                    return None
+                kind = self.kinds[candidate.kind]
+                claimed = db.query(QueuedJob).filter(
+                    QueuedJob.id == candidate.id, QueuedJob.attempts == candidate.attempts, due
+                ).update({
+                    'status': RUNNING,
+                    'attempts': candidate.attempts + 1,
+                    'locked_by': self.owner,
+                    'locked_until': now + kind.visibility_timeout + LEASE_GRACE,
+                    'updated_at': now,
+                }, synchronize_session=False)
+                db.commit()
+                if not claimed:
+                    self.metrics['claim_conflicts'] += 1
+                    continue
+                if candidate.status == RUNNING:
+                    self.metrics['lease_expired'] += 1
+                    logger.warning(f"Job {candidate.id} ({candidate.kind}) outlived its lease, running it again")
+                payload = db.query(QueuedJob.payload).filter(QueuedJob.id == candidate.id).scalar()
+                return _Claim(Job(candidate.id, candidate.kind, payload, candidate.attempts + 1), kind)
+        return None
+
+    def _settle(self, job: Job, **values) -> bool:
+        """Record an outcome, if the job is still leased with our attempt. Blocking"""
+        values['updated_at'] = time.time()
+        with SessionLocal() as db:
+            updated = db.query(QueuedJob).filter(
+                QueuedJob.id == job.id, QueuedJob.status == RUNNING, QueuedJob.attempts == job.attempts
+            ).update(values, synchronize_session=False)
+            db.commit()
+        if not updated:
+            self.metrics['lost_leases'] += 1
+            logger.warning(f"Job {job.id} ({job.kind}) was taken over before it finished; its outcome is dropped")
+        return bool(updated)
+
+    async def _outcome(self, job: Job, **values) -> bool:
+        return await asyncio.to_thread(self._settle, job, **values)
+
+    async def _run(self, claim: _Claim):
+        job, kind = claim.job, claim.kind
+        started = time.monotonic()
+        try:
+            if job.attempts > kind.max_attempts:
+                # Its last attempt's lease ran out (the process died); don't start another
+                raise JobFailed(f"Lease expired on attempt {job.attempts - 1}")
+            with lane(kind.lane):
+                await asyncio.wait_for(kind.handler(job), timeout=kind.visibility_timeout)
+        except asyncio.CancelledError:
+            # Shutting down: hand it back for the next start, without using up an attempt
+            await self._outcome(job, status=QUEUED, attempts=job.attempts - 1, run_at=time.time(),
+                                locked_by=None, locked_until=None, last_error='Interrupted by shutdown')
+            self.metrics['interrupted'] += 1
+            raise
+        except Exception as e:
+            error = f"Timed out after {kind.visibility_timeout:g}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+            if isinstance(e, JobFailed) or job.attempts >= kind.max_attempts:
+                await self._outcome(job, status=FAILED, locked_by=None, locked_until=None, last_error=error)
+                self.metrics['failed'] += 1
+                logger.error(f"Job {job.id} ({job.kind}) failed for good after {job.attempts} attempt(s): {error}")
+            else:
+                delay = self._backoff(job.attempts)
+                await self._outcome(job, status=QUEUED, run_at=time.time() + delay,
+                                    locked_by=None, locked_until=None, last_error=error)
+                self.metrics['retried'] += 1
+                logger.warning(f"Job {job.id} ({job.kind}) failed, attempt {job.attempts} of "
+                               f"{kind.max_attempts}; retrying in {delay:.0f}s: {error}")
+        else:
+            await self._outcome(job, status=DONE, locked_by=None, locked_until=None, last_error=None)
+            self.metrics['done'] += 1
+            logger.debug("Job %s (%s) done in %.2fs", job.id, job.kind, time.monotonic() - started)
+        finally:
+            kind.running -= 1
+            self._slots.release()
+            # A slot (and maybe room for this kind) is free again
+            self._wakeup.set()
+
+    def _purge(self, now: float):
+        """Delete finished jobs past their retention; blocking"""
+        with SessionLocal() as db:
+            purged = db.query(QueuedJob).filter(
+                QueuedJob.status == DONE, QueuedJob.updated_at < now - self.retention
+            ).delete(synchronize_session=False)
+            db.commit()
+        if purged:
+            logger.info(f"Purged {purged} finished job(s)")
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            kinds = [kind.name for kind in self.kinds.values() if kind.running < kind.concurrency]
+            claim = None
+            if kinds:
+                try:
+                    claim = await asyncio.to_thread(self._claim, kinds)
+                except Exception as e:
+                    logger.error(f"Job queue could not claim a job: {str(e)}", exc_info=True)
+            if claim is None:
+                self._slots.release()
+                now = time.time()
+                if now - self._purged_at >= PURGE_INTERVAL:
+                    self._purged_at = now
+                    try:
+                        await asyncio.to_thread(self._purge, now)
+                    except Exception as e:
+                        logger.error(f"Job queue could not purge finished jobs: {str(e)}")
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            claim.kind.running += 1
+            task = asyncio.create_task(self._run(claim), name=f'job-{claim.job.id}')
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def start(self):
+        """Start the dispatcher on the running loop"""
+        if self._dispatcher is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch(), name='job-queue')
+        logger.info(f"Job queue started with {self.workers} worker(s) as {self.owner}")
+
+    async def stop(self, timeout: float = 10):
+        """Stop claiming; give running jobs ``timeout`` seconds, then hand the rest back"""
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        running = list(self._running)
+        if running:
+            done, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"Job queue stopped; {len(pending)} unfinished job(s) handed back")
+        self._loop = None
+
+    def status(self) -> Dict[str, Any]:
+        """Queue counts and metrics; blocking (it reads the jobs table)"""
+        with SessionLocal() as db:
+            counts: Dict[str, Dict[str, int]] = {}
+            for kind, status, count in db.query(QueuedJob.kind, QueuedJob.status, func.count()).group_by(
+                QueuedJob.kind, QueuedJob.status
+            ):
+                counts.setdefault(kind, {})[status] = count
+            oldest = db.query(func.min(QueuedJob.run_at)).filter(QueuedJob.status == QUEUED).scalar()
+        return {
+            'enabled': job_queue_enabled(),
+            'running': self._dispatcher is not None,
+            'workers': self.workers,
+            'in_flight': {kind.name: kind.running for kind in self.kinds.values()},
+            'counts': counts,
+            'oldest_queued_seconds': round(max(0.0, time.time() - oldest), 1) if oldest else None,
+            **self.metrics,
+        }
+
+
+job_queue = JobQueue()
@@ -0,0 +1,341 @@
+"""Per-dependency bulkheads and token-bucket rate limits.
+
+Every outbound call to Baserow, Microsoft Graph and Cloudinary goes through
+the :class:`DependencyLimiter` for that dependency (see :func:`get_limiter`).
+A limiter caps the calls in flight (the bulkhead) and the request rate (a
+token bucket with a burst allowance), and hands free slots out by priority
+lane, so a customer's form submission is served before a scheduler scan
+that happens to be queued first.
+
+The lane is taken from a context variable, so a job only has to say what it
+is once::
+
+    with lane(BACKGROUND):
+        await customer_response_service.check_and_send_customer_responses()
+
+and every Baserow/Graph call made underneath (including from tasks it
+gathers) queues in that lane. Code that sets nothing is ``INTERACTIVE``.
+
+Limits come from ``<NAME>_RATE_LIMIT`` (requests per second, 0 = no limit),
+``<NAME>_RATE_BURST`` and ``<NAME>_MAX_CONCURRENCY`` (0 = no limit).
+"""
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+INTERACTIVE = 0
+BULK = 1
+BACKGROUND = 2
+LANE_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk', BACKGROUND: 'background'}
+
+logger = logging.getLogger(__name__)
+
+# backend/, for short file names in log messages
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_lane: ContextVar[int] = ContextVar('dependency_lane', default=INTERACTIVE)
+
+
+@contextmanager
+def lane(priority: int):
+    """Run the enclosed calls in the given priority lane"""
+    token = _lane.set(priority)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> int:
+    return _lane.get()
+
+
+def _on_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _blocking_call_site() -> str:
+    """``file:line in function`` of the coroutine that made a blocking call"""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        code = frame.f_code
+        site = f"{os.path.relpath(code.co_filename, _ROOT)}:{frame.f_lineno} in {code.co_name}"
+        if code.co_flags & inspect.CO_COROUTINE:
+            return site
+        if fallback is None and not code.co_filename.endswith(('limits.py', 'contextlib.py')):
+            fallback = site
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a token and sleep the returned delay"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = max(0.0, rate)
+        self.burst = max(1.0, burst if burst else self.rate or 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self) -> float:
+        """Take one token; return how many seconds to wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            # _updated is in the future while the bucket is paused
+            wait = max(0.0, self._updated - now)
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            return wait
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for ``seconds`` (the server said to back off)"""
+        if self.rate <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, now + seconds)
+
+
+class _Waiter:
+    __slots__ = ('priority', 'event', 'loop', 'future', 'granted', 'cancelled')
+
+    def __init__(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self) -> bool:
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+            return True
+        except RuntimeError:
+            # The waiter's event loop has been closed
+            return False
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class DependencyLimiter:
+    """Bulkhead + token bucket for one outside dependency.
+
+    Use :meth:`slot` from threads and :meth:`async_slot` from coroutines;
+    both share the same limits. Free slots go to the highest-priority (lowest
+    number) waiter, first come first served within a lane.
+    """
+
+    def __init__(self, name: str, rate: float = 0.0, burst: Optional[float] = None, max_concurrency: int = 0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(0, max_concurrency)
+        self.metrics: Counter = Counter()
+        self._in_flight = 0
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._depth: Counter = Counter()
+        self._max_depth = 0
+        self._max_wait = 0.0
+        self._bypass_sites: Counter = Counter()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, rate: float, burst: float, max_concurrency: int) -> 'DependencyLimiter':
+        prefix = name.upper()
+        return cls(
+            name,
+            rate=float(os.getenv(f'{prefix}_RATE_LIMIT', rate)),
+            burst=float(os.getenv(f'{prefix}_RATE_BURST', burst)),
+            max_concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', max_concurrency)),
+        )
+
+    def _has_capacity(self) -> bool:
+        return not self.max_concurrency or self._in_flight < self.max_concurrency
+
+    def _claim(self, priority: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """Take a slot now, or queue a waiter for one (returned)"""
+        with self._lock:
+            self.metrics['acquired'] += 1
+            if not self._queue and self._has_capacity():
+                self._in_flight += 1
+                return None
+            waiter = _Waiter(priority, loop)
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            self._depth[priority] += 1
+            self._max_depth = max(self._max_depth, len(self._queue))
+            self.metrics['waits'] += 1
+            return waiter
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            while self._queue and self._has_capacity():
+                priority, _, waiter = heapq.heappop(self._queue)
+                if waiter.cancelled:
+                    continue
+                self._depth[priority] -= 1
+                waiter.granted = True
+                if waiter.wake():
+                    self._in_flight += 1
+                    break
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Withdraw a queued waiter; True if it had already been granted a slot"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.cancelled = True
+            self._depth[waiter.priority] -= 1
+            return False
+
+    def _record_wait(self, started: float):
+        waited = time.monotonic() - started
+        with self._lock:
+            self.metrics['wait_ms'] += int(waited * 1000)
+            self._max_wait = max(self._max_wait, waited)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for ``seconds``, e.g. after a 429"""
+        self.bucket.pause(seconds)
+        self.metrics['paused'] += 1
+
+    @contextmanager
+    def slot(self, priority: Optional[int] = None):
+        """Hold a slot (and a token) for one blocking call.
+
+        On an event loop thread we must not block waiting for a slot held by
+        a coroutine on that same loop, so such calls are let through at once:
+        they take a token and count as in flight, but don't wait for either.
+        That is a bug in the caller, which should run the call in a worker
+        thread; each place it happens is logged once with its stack and
+        counted under ``loop_bypass``.
+        """
+        priority = current_lane() if priority is None else priority
+        started = time.monotonic()
+        if _on_event_loop_thread():
+            site = _blocking_call_site()
+            with self._lock:
+                self._in_flight += 1
+                self.metrics['acquired'] += 1
+                self.metrics['loop_bypass'] += 1
+                self._bypass_sites[site] += 1
+                first = self._bypass_sites[site] == 1
+            if first:
+                logger.error(f"Blocking {self.name} call on the event loop thread from {site}: "
+                             f"it skips the bulkhead and rate limit; run it in a worker thread", stack_info=True)
+            self.bucket.reserve()
+        else:
+            waiter = self._claim(priority)
+            if waiter is not None:
+                waiter.event.wait()
+            delay = self.bucket.reserve()
+            if delay:
+                self.metrics['throttled'] += 1
+                time.sleep(delay)
+        self._record_wait(started)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self, priority: Optional[int] = None):
+        """Hold a slot (and a token) for one awaited call"""
+        priority = current_lane() if priority is None else priority
+        started = time.monotonic()
+        waiter = self._claim(priority, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        try:
+            delay = self.bucket.reserve()
+            if delay:
+                self.metrics['throttled'] += 1
+                await asyncio.sleep(delay)
+            self._record_wait(started)
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Limits, queue depth per lane and counters, for status endpoints"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'rate': self.bucket.rate,
+                'burst': self.bucket.burst,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'queued': {name: self._depth.get(priority, 0) for priority, name in LANE_NAMES.items()},
+                'max_queue_depth': self._max_depth,
+                'max_wait_ms': int(self._max_wait * 1000),
+                'loop_bypass_sites': dict(self._bypass_sites.most_common(10)),
+                **dict(self.metrics),
+            }
+
+
+# Defaults: (rate/s, burst, max concurrency). Baserow cloud allows a handful
+# of concurrent requests per token; Exchange Online accepts about 30
+# messages a minute per mailbox; Cloudinary's upload API is only limited by
+# how many uploads we want in flight.
+DEFAULT_LIMITS = {
+    'baserow': (20.0, 20.0, 8),
+    'graph': (0.5, 30.0, 4),
+    'cloudinary': (0.0, 0.0, 4),
+}
+
+_limiters: Dict[str, DependencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> DependencyLimiter:
+    """The shared limiter for ``name`` ('baserow', 'graph', 'cloudinary')"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = DependencyLimiter.from_env(name, *DEFAULT_LIMITS.get(name, (0.0, 0.0, 0)))
+                _limiters[name] = limiter
+    return limiter
+
+
+def limiter_snapshots() -> Dict[str, Dict[str, Any]]:
+    return {name: get_limiter(name).snapshot() for name in DEFAULT_LIMITS}
@@ -0,0 +1,253 @@
+"""Queue-based logging: callers enqueue, one thread formats and writes.
+
+Request handlers and the scheduler used to format every record and write it
+to the console and two rotating files on whatever thread logged it, usually
+the event loop. Now each logger call only builds the record and puts it on
+a bounded queue. A :class:`~logging.handlers.QueueListener` thread does the
+formatting (``%`` arguments, :func:`lazy_json` dumps, tracebacks) and the
+disk I/O. When the queue is full, records are dropped and counted in
+:data:`stats` rather than blocking the caller.
+
+Because formatting is deferred, pass payloads as arguments instead of
+formatting them into f-strings::
+
+    logger.debug("Payload being sent: %s", lazy_json(payload))
+
+The dump only happens if some handler actually takes the record. Payloads
+are formatted shortly after the call, on the listener thread, so don't log
+objects you are about to mutate.
+
+Settings:
+
+* ``LOG_LEVEL`` (INFO): level of the console.
+* ``LOG_FILE_LEVEL`` (DEBUG): level of ``logs/garagefy.log``.
+* ``LOG_FORMAT``: ``text`` (default) or ``json``, one object per line.
+* ``LOG_DIR`` (``backend/logs``).
+* ``LOG_QUEUE_SIZE`` (10000).
+* ``LOG_SAMPLE_RATES``: keep only a share of DEBUG records per logger,
+  e.g. ``app.services.baserow_service=0.05,app.services=0.2``. The longest
+  matching prefix wins, and records at INFO and above are always kept.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+REQUEST_LOGGER = 'request_logger'
+
+stats: Counter = Counter()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class LazyJson:
+    """``json.dumps(value, indent=2)``, done only when the record is formatted"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        try:
+            return json.dumps(self.value, indent=2, default=str, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return repr(self.value)
+
+
+def lazy_json(value: Any) -> LazyJson:
+    return LazyJson(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any ``extra=`` fields included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'where': f'{record.filename}:{record.lineno}',
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only a share of DEBUG records, per logger-name prefix"""
+
+    def __init__(self, rates: Dict[str, float], rng: Optional[random.Random] = None):
+        super().__init__()
+        # Longest prefix first, so the most specific rate wins
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+        self.random = rng or random.Random()
+
+    def rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not self.rates:
+            return True
+        if self.random.random() < self.rate_for(record.name):
+            return True
+        stats['sampled_out'] += 1
+        return False
+
+
+class _NameFilter(logging.Filter):
+    """Route records from ``name`` only (``keep=True``) or everything else"""
+
+    def __init__(self, name: str, keep: bool):
+        super().__init__()
+        self.logger_name, self.keep = name, keep
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return (record.name == self.logger_name) == self.keep
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records as they are; drop (and count) them when the queue is full.
+
+    The stock handler formats the message on the calling thread so the
+    record can be pickled; ours never leaves the process, so that work is
+    left to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            stats['queued'] += 1
+        except queue.Full:
+            stats['dropped'] += 1
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """``"a.b=0.1,c=0.5"`` -> ``{'a.b': 0.1, 'c': 0.5}``"""
+    rates = {}
+    for item in (value or '').split(','):
+        name, sep, rate = item.partition('=')
+        if sep and name.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def _level(name: str, default: str) -> int:
+    return logging.getLevelName(os.getenv(name, default).upper())
+
+
+def _build_handlers(log_dir: str, json_format: bool) -> List[logging.Handler]:
+    if json_format:
+        console_formatter = file_formatter = request_formatter = JsonFormatter()
+    else:
+        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
+        request_formatter = logging.Formatter('%(asctime)s - %(message)s')
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(_level('LOG_LEVEL', 'INFO'))
+    console_handler.setFormatter(console_formatter)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, 'garagefy.log'),
+        maxBytes=10 * 1024 * 1024,  # 10MB
+        backupCount=5,
+        encoding='utf-8'
+    )
+    file_handler.setLevel(_level('LOG_FILE_LEVEL', 'DEBUG'))
+    file_handler.setFormatter(file_formatter)
+
+    request_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, 'requests.log'),
+        maxBytes=10 * 1024 * 1024,  # 10MB
+        backupCount=5,
+        encoding='utf-8'
+    )
+    request_handler.setLevel(logging.INFO)
+    request_handler.setFormatter(request_formatter)
+
+    for handler in (console_handler, file_handler):
+        handler.addFilter(_NameFilter(REQUEST_LOGGER, keep=False))
+    request_handler.addFilter(_NameFilter(REQUEST_LOGGER, keep=True))
+    return [console_handler, file_handler, request_handler]
+
+
+def configure_logging() -> logging.Logger:
+    """Route the root logger and ``request_logger`` through the queue.
+
+    Safe to call more than once; only the first call does anything.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return logging.getLogger()
+
+        log_dir = os.getenv('LOG_DIR') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'logs'))
+        os.makedirs(log_dir, exist_ok=True)
+        handlers = _build_handlers(log_dir, os.getenv('LOG_FORMAT', 'text').lower() == 'json')
+
+        records: queue.Queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+        queue_handler = NonBlockingQueueHandler(records)
+        sample_rates = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+        if sample_rates:
+            queue_handler.addFilter(SamplingFilter(sample_rates))
+
+        # The root level gates record creation, so it follows the most verbose handler
+        root_logger = logging.getLogger()
+        for handler in root_logger.handlers[:]:
+            root_logger.removeHandler(handler)
+        root_logger.setLevel(min(handler.level for handler in handlers))
+        root_logger.addHandler(queue_handler)
+
+        request_logger = logging.getLogger(REQUEST_LOGGER)
+        request_logger.setLevel(logging.INFO)
+        request_logger.addHandler(queue_handler)
+        request_logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return root_logger
+
+
+def stop_logging():
+    """Write out whatever is still queued and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    """Queue counters for monitoring"""
+    return {
+        'queued': stats['queued'],
+        'dropped': stats['dropped'],
+        'sampled_out': stats['sampled_out'],
+        'pending': _listener.queue.qsize() if _listener is not None else 0,
+    }
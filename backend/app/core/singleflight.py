@@ -0,0 +1,129 @@
+"""Single-flight coalescing of identical concurrent calls.
+
+When several callers ask for the same thing at the same moment (say the
+email monitor and the customer-response job both listing 'Customer
+details' at the top of the minute), only the first one does the work and
+the rest wait for and share its result, or its exception.
+
+Blocking callers (:meth:`SingleFlight.do`) and coroutines
+(:meth:`SingleFlight.do_async`) share one table of flights, so a thread
+and a coroutine asking for the same key coalesce too, whichever started
+first. Every caller gets its own shallow copy of a list or dict result:
+reordering or filtering it is safe, but the rows inside are shared and
+must be treated as read-only.
+"""
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def _copy(result: Any) -> Any:
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
+class _Flight:
+    __slots__ = ('future', 'loop')
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.future: Future = Future()
+        self.future.set_running_or_notify_cancel()
+        # The loop running the work, for async flights
+        self.loop = loop
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SingleFlight:
+    """One in-flight call per key, see module docstring"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats: Counter = Counter()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable, loop: Optional[asyncio.AbstractEventLoop]):
+        """``(flight, leader)`` for ``key``; starts a flight if there is none"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight(loop)
+                self.stats['calls'] += 1
+                return flight, True
+            self.stats['shared'] += 1
+            return flight, False
+
+    def _land(self, key: Hashable, flight: _Flight, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return ``fn()``, sharing one call among concurrent callers of ``key``"""
+        loop = _running_loop()
+        with self._lock:
+            flight = self._flights.get(key)
+            # Blocking this loop's thread on its own task would never return
+            own_loop = flight is not None and loop is not None and flight.loop is loop
+        if own_loop:
+            self.stats['unshared'] += 1
+            return fn()
+
+        flight, leader = self._join(key, None)
+        if not leader:
+            return _copy(flight.future.result())
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return _copy(result)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``fn()``, sharing one call among concurrent callers of ``key``.
+
+        The work runs in its own task, so one waiter being cancelled doesn't
+        cancel it for the others; a call already running on a thread is
+        waited for without blocking the loop.
+        """
+        loop = asyncio.get_running_loop()
+        flight, leader = self._join(key, loop)
+        if leader:
+            task = loop.create_task(fn())
+            task.add_done_callback(lambda done: self._finished(key, flight, done))
+        # The shared future can't be cancelled (it is running), only our wait on it
+        return _copy(await asyncio.wrap_future(flight.future))
+
+    def _finished(self, key: Hashable, flight: _Flight, task: asyncio.Task):
+        if task.cancelled():
+            self._land(key, flight, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._land(key, flight, error=task.exception())
+        else:
+            self._land(key, flight, task.result())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            'name': self.name,
+            'in_flight': in_flight,
+            **{k: self.stats.get(k, 0) for k in ('calls', 'shared', 'unshared')},
+        }
@@ -1,5 +1,5 @@
 import logging
-import logging.handlers
+import asyncio
 import os
 import sys
 from datetime import datetime
@@ -9,67 +9,9 @@ from fastapi.responses import JSONResponse
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 
-# Ensure logs directory exists
-os.makedirs('logs', exist_ok=True)
-
-# Create logs directory if it doesn't exist
-log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
-os.makedirs(log_dir, exist_ok=True)
-
-# Configure root logger
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.DEBUG)
-
-# Clear existing handlers
-for handler in root_logger.handlers[:]:
-    root_logger.removeHandler(handler)
-
-# Create console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-
-# Create file handler for general logs
-log_file = os.path.join(log_dir, 'garagefy.log')
-file_handler = logging.handlers.RotatingFileHandler(
-    log_file,
-    maxBytes=10*1024*1024,  # 10MB
-    backupCount=5,
-    encoding='utf-8'
-)
-file_handler.setLevel(logging.DEBUG)
-
-# Create file handler for request logs
-request_log_file = os.path.join(log_dir, 'requests.log')
-request_handler = logging.handlers.RotatingFileHandler(
-    request_log_file,
-    maxBytes=10*1024*1024,  # 10MB
-    backupCount=5,
-    encoding='utf-8'
-)
-request_handler.setLevel(logging.INFO)
-
-# Create formatters
-log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-detailed_format = '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
-
-console_formatter = logging.Formatter(log_format)
-file_formatter = logging.Formatter(detailed_format)
-request_formatter = logging.Formatter('%(asctime)s - %(message)s')
-
-# Set formatters
-console_handler.setFormatter(console_formatter)
-file_handler.setFormatter(file_formatter)
-request_handler.setFormatter(request_formatter)
-
-# Add handlers to root logger
-root_logger.addHandler(console_handler)
-root_logger.addHandler(file_handler)
-
-# Create a separate logger for requests
-request_logger = logging.getLogger('request_logger')
-request_logger.setLevel(logging.INFO)
-request_logger.addHandler(request_handler)
-request_logger.propagate = False
+# Log records go through a queue to a background writer (see app.core.logging_config)
+from .core.logging_config import configure_logging
+configure_logging()
 
 # Create module logger
 logger = logging.getLogger(__name__)
@@ -106,11 +48,37 @@ from app.services.scheduler_service import scheduler_service
 async def startup_event():
     """Start background tasks on application startup"""
     try:
-        logger.info("Application startup - initializing scheduler")
-        scheduler_service.start()
-        logger.info("Scheduler started successfully")
+        # Off for load tests, where the harness drives the periodic jobs itself
+        if os.getenv('SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            logger.info("Application startup - initializing scheduler")
+            scheduler_service.start()
+            logger.info("Scheduler started successfully")
+        else:
+            logger.info("Scheduler disabled (SCHEDULER_ENABLED)")
     except Exception as e:
         logger.error(f"Error starting scheduler: {str(e)}", exc_info=True)
+    
+    # Run queued jobs, including any left unfinished by the previous process
+    # (JOB_QUEUE_ENABLED=false sends quote requests from a plain task instead)
+    from app.core.job_queue import job_queue, job_queue_enabled
+    if job_queue_enabled():
+        job_queue.start()
+    else:
+        logger.info("Job queue disabled (JOB_QUEUE_ENABLED)")
+    
+    try:
+        # Load Baserow field metadata now rather than on the first request
+        from app.services.baserow_service import baserow_service
+        await asyncio.get_running_loop().run_in_executor(None, baserow_service.schemas.warm)
+    except Exception as e:
+        logger.error(f"Error loading Baserow schemas: {str(e)}", exc_info=True)
+    
+    try:
+        # Index the garage replies already stored so duplicate checks need no Baserow scan
+        from app.services.baserow_service import baserow_service
+        await asyncio.get_running_loop().run_in_executor(None, baserow_service.received_index.warm)
+    except Exception as e:
+        logger.error(f"Error warming the received-email index: {str(e)}", exc_info=True)
 
 # Shutdown event - stop the scheduler
 @app.on_event("shutdown")
@@ -122,6 +90,24 @@ async def shutdown_event():
         logger.info("Scheduler stopped successfully")
     except Exception as e:
         logger.error(f"Error stopping scheduler: {str(e)}", exc_info=True)
+    
+    try:
+        # Running jobs get a moment to finish; the rest are handed back for the next start
+        from app.core.job_queue import job_queue
+        await job_queue.stop()
+    except Exception as e:
+        logger.error(f"Error stopping the job queue: {str(e)}", exc_info=True)
+    
+    try:
+        from app.services.baserow_async_service import async_baserow_service
+        await async_baserow_service.close()
+    except Exception as e:
+        logger.error(f"Error closing Baserow HTTP session: {str(e)}", exc_info=True)
+    
+    from app.services.image_processing import image_processor
+    from app.services.image_upload_service import image_upload_service
+    image_processor.shutdown()
+    image_upload_service.shutdown()
 
 # Configure CORS
 origins = [
@@ -151,8 +137,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized submissions before FastAPI reads and spools the form
+from app.core.body_limit import BodySizeLimitMiddleware
+from app.services.image_intake import image_intake
+app.add_middleware(BodySizeLimitMiddleware, limits={'/api/service-requests': image_intake.max_request_bytes})
+
 # Import the endpoint routers
-from app.api.endpoints import garage_responses, fix_it
+from app.api.endpoints import garage_responses, fix_it, media
 
 # Include the routers
 app.include_router(
@@ -183,6 +174,9 @@ app.include_router(
     responses={status.HTTP_404_NOT_FOUND: {"description": "Not found"}},
 )
 
+# Files of the local media backend, outside /api so their URLs stay short
+app.include_router(media.router, tags=["media"])
+
 
 @app.middleware("http")
 async def db_session_middleware(request: Request, call_next):
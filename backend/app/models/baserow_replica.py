@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, Index
+
+from ..core.database import Base
+
+
+class ReplicaRow(Base):
+    """Local copy of one Baserow row, keyed by (table id, row id).
+
+    ``data`` holds the raw (field-name keyed) row exactly as the list-rows
+    API returns it; ``vin``/``email``/``date_time`` are denormalised copies of
+    the columns we look rows up by, so those lookups hit an index instead of
+    scanning JSON.
+    """
+    __tablename__ = "baserow_replica_rows"
+
+    table_id = Column(Integer, primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    data = Column(JSON, nullable=False)
+    updated_on = Column(String)
+    vin = Column(String)
+    email = Column(String)
+    date_time = Column(String)
+    # time.time() of the last local write, used to keep write-through rows
+    # that are newer than a sync's snapshot
+    written_at = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index('ix_replica_rows_vin', 'table_id', 'vin'),
+        Index('ix_replica_rows_email', 'table_id', 'email'),
+        Index('ix_replica_rows_date_time', 'table_id', 'date_time'),
+    )
+
+
+class ReplicaSyncState(Base):
+    """Sync watermark and bookkeeping for one replicated table"""
+    __tablename__ = "baserow_replica_sync_state"
+
+    table_id = Column(Integer, primary_key=True)
+    table_name = Column(String)
+    watermark = Column(String)
+    last_synced_at = Column(DateTime(timezone=True))
+    last_full_sync_at = Column(DateTime(timezone=True))
+    row_count = Column(Integer, default=0)
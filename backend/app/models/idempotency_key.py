@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Float, Index
+
+from ..core.database import Base
+
+
+class IdempotencyKey(Base):
+    """A claimed idempotency key, shared by every worker using ``garagefy.db``.
+
+    ``holder`` is whatever the claimant stored (the request ID), so only
+    the claimant releases it; the row counts as free once ``expires_at``
+    has passed.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Float, JSON, Text, Index
+
+from ..core.database import Base
+
+
+class QueuedJob(Base):
+    """One job of the durable job queue (:mod:`app.core.job_queue`).
+
+    ``key`` is optional and unique, so enqueueing the same work twice adds
+    it once. While a job runs, ``locked_until`` is the end of its lease;
+    a ``running`` job past it is treated as abandoned and runs again.
+    ``attempts`` counts claims, and a worker only records the outcome if
+    the count is still the one it claimed with.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    key = Column(String, unique=True)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    run_at = Column(Float, nullable=False)
+    locked_by = Column(String)
+    locked_until = Column(Float)
+    last_error = Column(Text)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+        Index('ix_jobs_status_locked_until', 'status', 'locked_until'),
+    )
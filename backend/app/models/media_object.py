@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Float
+
+from ..core.database import Base
+
+
+class MediaObject(Base):
+    """One stored file, keyed by the media backend and the SHA-256 of its bytes.
+
+    ``url`` is where the backend put it; the same bytes stored again get
+    this URL back instead of a second upload.
+    """
+    __tablename__ = "media_objects"
+
+    backend = Column(String, primary_key=True)
+    digest = Column(String, primary_key=True)
+    url = Column(String, nullable=False)
+    size = Column(Integer, nullable=False, default=0)
+    content_type = Column(String, nullable=False, default='')
+    created_at = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Float, Index
+
+from ..core.database import Base
+
+
+class ReceivedEmailKey(Base):
+    """One stored garage reply, keyed by (VIN, normalised sender address).
+
+    ``message_hash`` is the SHA-256 of the reply's Message-ID, when we saw
+    one, so the same message is recognised even if it's matched to another
+    VIN. ``row_id`` points at the 'Recevied email' row in Baserow.
+    """
+    __tablename__ = "received_email_index"
+
+    vin = Column(String, primary_key=True)
+    sender = Column(String, primary_key=True)
+    message_hash = Column(String)
+    row_id = Column(Integer)
+    indexed_at = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index('ix_received_email_index_message_hash', 'message_hash'),
+        Index('ix_received_email_index_row_id', 'row_id'),
+    )
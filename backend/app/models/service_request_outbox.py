@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Float, JSON, Text, ForeignKey, Index
+
+from ..core.database import Base
+
+
+class OutboxServiceRequest(Base):
+    """A customer submission accepted locally and not yet fully processed.
+
+    ``status`` moves pending -> stored (row created in Baserow) -> notified
+    (garage emails queued); ``failed`` once ``attempts`` runs out. ``image_urls``
+    is filled in after the Cloudinary uploads so a retry doesn't re-upload.
+    """
+    __tablename__ = "service_request_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    request_id = Column(String, unique=True, nullable=False)
+    status = Column(String, nullable=False, default='pending')
+    fields = Column(JSON, nullable=False)
+    submitted_at = Column(String, nullable=False)
+    image_urls = Column(JSON)
+    record_id = Column(Integer)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(Float, nullable=False, default=0.0)
+    last_error = Column(Text)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_service_request_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+
+class OutboxImage(Base):
+    """A photo held until its submission's images are on Cloudinary.
+
+    The bytes stay on disk: ``path`` is the normalised file, moved into the
+    outbox directory when the submission was accepted.
+    """
+    __tablename__ = "service_request_outbox_files"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    outbox_id = Column(Integer, ForeignKey('service_request_outbox.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+    filename = Column(String)
+    content_type = Column(String)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String, nullable=False)
@@ -0,0 +1,94 @@
+from sqlalchemy import Column, Integer, String, Float, JSON, Text, Index, UniqueConstraint
+
+from ..core.database import Base
+
+
+class StoredCustomer(Base):
+    """'Customer details' row for the SQL storage backend"""
+    __tablename__ = "storage_customers"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, default='')
+    email = Column(String, nullable=False, default='')
+    phone = Column(String, nullable=False, default='')
+    vin = Column(String, nullable=False, default='')
+    brand = Column(String, nullable=False, default='')
+    notes = Column(Text, nullable=False, default='')
+    date_time = Column(String, nullable=False, default='')
+    sent_emails = Column(Text, nullable=False, default='')
+    plate_number = Column(String, nullable=False, default='')
+
+    __table_args__ = (
+        Index('ix_storage_customers_vin', 'vin'),
+    )
+
+
+class StoredGarage(Base):
+    """'Fix it' row for the SQL storage backend"""
+    __tablename__ = "storage_garages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, default='')
+    email = Column(String, nullable=False, default='')
+    address = Column(String, nullable=False, default='')
+    phone = Column(String, nullable=False, default='')
+    website = Column(String, nullable=False, default='')
+    reviews = Column(String, nullable=False, default='')
+    specialties = Column(String, nullable=False, default='')
+
+
+class StoredReceivedEmail(Base):
+    """'Recevied email' row for the SQL storage backend.
+
+    ``sender`` is the normalised address and ``message_hash`` the SHA-256 of
+    the Message-ID; the unique constraint on (vin, sender) is what makes a
+    garage's second reply for the same VIN a duplicate.
+    """
+    __tablename__ = "storage_received_emails"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    email = Column(String, nullable=False, default='')
+    subject = Column(Text, nullable=False, default='')
+    body = Column(Text, nullable=False, default='')
+    received_at = Column(String, nullable=False, default='')
+    vin = Column(String, nullable=False)
+    quote = Column(String, nullable=False, default='')
+    sender = Column(String, nullable=False)
+    message_hash = Column(String)
+
+    __table_args__ = (
+        UniqueConstraint('vin', 'sender', name='uq_storage_received_emails_vin_sender'),
+        Index('ix_storage_received_emails_message_hash', 'message_hash'),
+    )
+
+
+class StoredQuote(Base):
+    """'Quotes' row for the SQL storage backend"""
+    __tablename__ = "storage_quotes"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    request_id = Column(String, nullable=False)
+    customer_id = Column(String)
+    customer_name = Column(String)
+    customer_email = Column(String)
+    garage_id = Column(String)
+    garage_name = Column(String)
+    amount = Column(Float)
+    notes = Column(Text)
+    valid_until = Column(String)
+    status = Column(String)
+    created_at = Column(String)
+    updated_at = Column(String)
+
+    __table_args__ = (
+        Index('ix_storage_quotes_request_id', 'request_id'),
+    )
+
+
+class StoredServiceRequest(Base):
+    """'Service Requests' row for the SQL storage backend; ``fields`` holds the row by field name"""
+    __tablename__ = "storage_service_requests"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    request_id = Column(String, unique=True)
+    fields = Column(JSON, nullable=False)
@@ -0,0 +1,79 @@
+"""Storage repositories for customers, garages, received emails, quotes and service requests.
+
+``STORAGE_BACKEND`` picks the implementation the services use: ``baserow``
+(default), ``sql`` or ``memory``. See :mod:`app.repositories.base` for the
+interfaces and :mod:`app.repositories.conformance` for the checks every
+backend must pass.
+"""
+import os
+import threading
+from typing import Optional
+
+from .base import (
+    CustomerRepository,
+    GarageRepository,
+    QuoteRepository,
+    ReceivedEmailRepository,
+    Repositories,
+    ServiceRequestRepository,
+)
+
+BACKENDS = ('baserow', 'sql', 'memory')
+
+_repositories: Optional[Repositories] = None
+_lock = threading.Lock()
+
+
+def create_repositories(backend: str) -> Repositories:
+    """A new set of repositories for ``backend``"""
+    if backend == 'baserow':
+        from .baserow import baserow_repositories
+        return baserow_repositories()
+    if backend == 'sql':
+        from .sql import sql_repositories
+        return sql_repositories()
+    if backend == 'memory':
+        from .memory import memory_repositories
+        return memory_repositories()
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def get_repositories() -> Repositories:
+    """The process-wide repositories for ``STORAGE_BACKEND``"""
+    global _repositories
+    if _repositories is None:
+        with _lock:
+            if _repositories is None:
+                _repositories = create_repositories(os.getenv('STORAGE_BACKEND', 'baserow').lower())
+    return _repositories
+
+
+def set_repositories(repositories: Optional[Repositories]):
+    """Swap the process-wide repositories (benchmarks, load tests); None resets to ``STORAGE_BACKEND``"""
+    global _repositories
+    with _lock:
+        _repositories = repositories
+
+
+class RepositoriesProxy:
+    """Proxy that resolves the repositories on first use"""
+    def __getattr__(self, name):
+        return getattr(get_repositories(), name)
+
+
+repositories = RepositoriesProxy()
+
+__all__ = [
+    'BACKENDS',
+    'CustomerRepository',
+    'GarageRepository',
+    'QuoteRepository',
+    'ReceivedEmailRepository',
+    'Repositories',
+    'RepositoriesProxy',
+    'ServiceRequestRepository',
+    'create_repositories',
+    'get_repositories',
+    'repositories',
+    'set_repositories',
+]
@@ -0,0 +1,169 @@
+"""Storage-agnostic repository interfaces.
+
+The business services (quotes, Fix it fan-out, customer responses, the
+email monitor) only need a handful of operations per table. They are
+written against these interfaces instead of the Baserow client, so the same
+logic runs on Baserow, on SQLAlchemy (SQLite or Postgres) or fully in memory.
+
+Conventions shared by every implementation:
+
+* customers, garages and received emails are returned as the row
+  dataclasses from :mod:`app.services.baserow_schema`, with integer ids;
+* ``values`` passed to ``create`` use the dataclass attribute names
+  (``name``, ``email``, ``vin`` ...);
+* quotes are plain dicts keyed like :class:`app.models.quote.Quote`, with a
+  string ``id``;
+* service requests are plain dicts keyed by the 'Service Requests' field
+  names (``Status``, ``Quote Count`` ...) plus a string ``id``, and can be
+  looked up either by that id or by their ``Request ID``.
+
+Every method is a coroutine; implementations backed by blocking drivers run
+them in a worker thread.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from ..services.baserow_schema import CustomerRequest, Garage, ReceivedEmail
+
+
+class CustomerRepository(ABC):
+    """'Customer details': one row per service request"""
+
+    @abstractmethod
+    async def create(self, values: Dict[str, Any]) -> CustomerRequest:
+        """Store a new request; ``values`` keyed by attribute name"""
+
+    @abstractmethod
+    async def get(self, customer_id: int) -> Optional[CustomerRequest]:
+        ...
+
+    @abstractmethod
+    def iter_all(self) -> AsyncIterator[CustomerRequest]:
+        """Every request, streamed; stopping early stops the read"""
+
+    @abstractmethod
+    async def find_by_vin(self, vin: str) -> List[CustomerRequest]:
+        ...
+
+    @abstractmethod
+    async def mark_sent(self, notes: Dict[int, str]) -> Set[int]:
+        """Set 'Sent Emails' per customer id; returns the ids that were updated"""
+
+
+class GarageRepository(ABC):
+    """'Fix it': the garage directory"""
+
+    @abstractmethod
+    async def list(self) -> List[Garage]:
+        """Garages that can be contacted (the email contains an ``@``)"""
+
+    @abstractmethod
+    async def add(self, values: Dict[str, Any]) -> Garage:
+        ...
+
+
+class ReceivedEmailRepository(ABC):
+    """'Recevied email': garage replies, one per garage and VIN"""
+
+    @abstractmethod
+    async def store(self, email_data: Dict[str, Any], vin: str) -> Tuple[ReceivedEmail, bool]:
+        """Store a reply unless this garage already replied for ``vin``.
+
+        ``email_data`` has the email monitor's keys (``from_email``,
+        ``subject``, ``body``, ``received_at``, optionally ``message_id``).
+        Returns ``(reply, created)``; for a duplicate, ``reply`` is the one
+        already stored (only its ``id`` is guaranteed to be set). Raises
+        ``ValueError`` without a VIN.
+        """
+
+    @abstractmethod
+    async def list_by_vin(self, vin: str) -> List[ReceivedEmail]:
+        ...
+
+
+class QuoteRepository(ABC):
+    """'Quotes': structured quotes submitted by garages"""
+
+    @abstractmethod
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def get(self, quote_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def list_by_request(self, request_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def update(self, quote_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        ...
+
+
+class ServiceRequestRepository(ABC):
+    """'Service Requests': quote bookkeeping per request"""
+
+    @abstractmethod
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Look up by row id or by 'Request ID'"""
+
+    @abstractmethod
+    async def update(self, request_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        ...
+
+
+@dataclass
+class Repositories:
+    """One repository per table, all from the same backend"""
+    backend: str
+    customers: CustomerRepository
+    garages: GarageRepository
+    received_emails: ReceivedEmailRepository
+    quotes: QuoteRepository
+    service_requests: ServiceRequestRepository
+
+
+# Quote fields, as on app.models.quote.Quote
+QUOTE_FIELDS = (
+    'request_id', 'customer_id', 'customer_name', 'customer_email', 'garage_id', 'garage_name',
+    'amount', 'notes', 'valid_until', 'status', 'created_at', 'updated_at',
+)
+
+
+def quote_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the known quote fields, with enums stored by value"""
+    return {
+        key: getattr(value, 'value', value)
+        for key, value in values.items()
+        if key in QUOTE_FIELDS
+    }
+
+
+def matches_request(record: Dict[str, Any], request_id: str) -> bool:
+    return str(record.get('id')) == str(request_id) or record.get('Request ID') == request_id
+
+
+def has_valid_email(garage: Garage) -> bool:
+    return bool(garage.email) and '@' in garage.email
+
+
+def sender_of(email_data: Dict[str, Any]) -> str:
+    return (email_data.get('from_email') or '').strip().lower()
+
+
+def reply_values(email_data: Dict[str, Any], vin: str, received_at: str) -> Dict[str, Any]:
+    """``email_data`` -> :class:`ReceivedEmail` attributes, as stored by Baserow"""
+    return {
+        'email': sender_of(email_data),
+        'subject': email_data.get('subject', 'No Subject'),
+        'body': email_data.get('body', ''),
+        'received_at': email_data.get('received_at') or received_at,
+        'vin': vin,
+        'quote': email_data.get('quote', ''),
+    }
@@ -0,0 +1,161 @@
+"""Baserow repositories, on top of :data:`async_baserow_service`.
+
+These are thin adapters: caching, the replica, the duplicate-reply index,
+rate limits and request coalescing all stay in the Baserow service, so the
+services see exactly the behaviour they had when they called it directly.
+"""
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from ..services.baserow_async_service import async_baserow_service
+from ..services.baserow_schema import CustomerRequest, Garage, ReceivedEmail
+from .base import (
+    CustomerRepository,
+    GarageRepository,
+    QuoteRepository,
+    ReceivedEmailRepository,
+    Repositories,
+    ServiceRequestRepository,
+    quote_values,
+)
+
+CUSTOMERS_TABLE = 'Customer details'
+GARAGES_TABLE = 'Fix it'
+RECEIVED_TABLE = 'Recevied email'
+QUOTES_TABLE = 'Quotes'
+SERVICE_REQUESTS_TABLE = 'Service Requests'
+
+
+def _plain(record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """``{'id', 'fields'}`` record -> flat dict with a string id"""
+    if not record or not record.get('fields'):
+        return None
+    return {**record['fields'], 'id': str(record.get('id'))}
+
+
+class _BaserowRepository:
+
+    def __init__(self, service=None):
+        self.service = service or async_baserow_service
+
+
+class BaserowCustomerRepository(_BaserowRepository, CustomerRepository):
+
+    async def create(self, values: Dict[str, Any]) -> CustomerRequest:
+        values = {'date_time': datetime.now(timezone.utc).isoformat(), **values}
+        schema = await self.service.schema(CUSTOMERS_TABLE)
+        record = await self.service.create_record(CUSTOMERS_TABLE, schema.encode(values))
+        return schema.decode(record.get('fields', {}))
+
+    async def get(self, customer_id: int) -> Optional[CustomerRequest]:
+        record = await self.service.get_record(CUSTOMERS_TABLE, int(customer_id))
+        return (await self.service.schema(CUSTOMERS_TABLE)).decode(record.get('fields', {})) if record else None
+
+    async def iter_all(self) -> AsyncIterator[CustomerRequest]:
+        decode = (await self.service.schema(CUSTOMERS_TABLE)).decode
+        async for record in self.service.iter_records(CUSTOMERS_TABLE):
+            yield decode(record.get('fields', {}))
+
+    async def find_by_vin(self, vin: str) -> List[CustomerRequest]:
+        records = await self.service.get_records(CUSTOMERS_TABLE, filter_dict={'field': 'VIN', 'value': vin})
+        decode = (await self.service.schema(CUSTOMERS_TABLE)).decode
+        return [decode(record.get('fields', {})) for record in records]
+
+    async def mark_sent(self, notes: Dict[int, str]) -> Set[int]:
+        if not notes:
+            return set()
+        result = await self.service.bulk_update_records(
+            CUSTOMERS_TABLE,
+            [{'id': customer_id, 'Sent Emails': note} for customer_id, note in notes.items()],
+        )
+        return {int(row['id']) for row in result['results'] if row['success']}
+
+
+class BaserowGarageRepository(_BaserowRepository, GarageRepository):
+
+    async def list(self) -> List[Garage]:
+        return await self.service.get_fix_it_garages()
+
+    async def add(self, values: Dict[str, Any]) -> Garage:
+        schema = await self.service.schema(GARAGES_TABLE)
+        record = await self.service.create_record(GARAGES_TABLE, schema.encode(values))
+        self.service.invalidate_garage_cache()
+        return schema.decode(record.get('fields', {}))
+
+
+class BaserowReceivedEmailRepository(_BaserowRepository, ReceivedEmailRepository):
+
+    async def store(self, email_data: Dict[str, Any], vin: str) -> Tuple[ReceivedEmail, bool]:
+        if not vin or not str(vin).strip():
+            raise ValueError(f"Cannot store email without VIN. Email from: {email_data.get('from_email', 'unknown')}")
+        result = await self.service.store_received_email(email_data, vin)
+        schema = await self.service.schema(RECEIVED_TABLE)
+        if 'success' not in result:
+            # A duplicate: the stored row, or just its id when the index answered
+            return schema.decode(result.get('fields') or {'id': result.get('id')}), False
+        if not result['success']:
+            raise RuntimeError(result.get('error') or 'Could not store received email')
+        return schema.decode(result.get('data') or {}), True
+
+    async def list_by_vin(self, vin: str) -> List[ReceivedEmail]:
+        records = await self.service.get_records(RECEIVED_TABLE, formula=f'{{VIN}} = "{vin}"')
+        decode = (await self.service.schema(RECEIVED_TABLE)).decode
+        return [decode(record.get('fields', {})) for record in records]
+
+
+class BaserowQuoteRepository(_BaserowRepository, QuoteRepository):
+    """Quotes are stored under their model field names (``request_id`` ...)"""
+
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        return _plain(await self.service.create_record(QUOTES_TABLE, quote_values(values)))
+
+    async def get(self, quote_id: str) -> Optional[Dict[str, Any]]:
+        if not str(quote_id).isdigit():
+            return None
+        return _plain(await self.service.get_record(QUOTES_TABLE, int(quote_id)))
+
+    async def list_by_request(self, request_id: str) -> List[Dict[str, Any]]:
+        records = await self.service.get_records(QUOTES_TABLE, filter_dict={'field': 'request_id', 'value': request_id})
+        return [_plain(record) for record in records if record.get('fields')]
+
+    async def update(self, quote_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not str(quote_id).isdigit():
+            return None
+        return _plain(await self.service.update_record(QUOTES_TABLE, int(quote_id), quote_values(values)))
+
+
+class BaserowServiceRequestRepository(_BaserowRepository, ServiceRequestRepository):
+
+    async def _row_id(self, request_id: str) -> Optional[int]:
+        if str(request_id).isdigit():
+            return int(request_id)
+        records = await self.service.get_records(SERVICE_REQUESTS_TABLE, filter_dict={'field': 'Request ID', 'value': request_id})
+        return records[0]['id'] if records else None
+
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {k: v for k, v in values.items() if k != 'id'}
+        return _plain(await self.service.create_record(SERVICE_REQUESTS_TABLE, fields))
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        row_id = await self._row_id(request_id)
+        if row_id is None:
+            return None
+        return _plain(await self.service.get_record(SERVICE_REQUESTS_TABLE, row_id))
+
+    async def update(self, request_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        row_id = await self._row_id(request_id)
+        if row_id is None:
+            return None
+        fields = {k: v for k, v in values.items() if k != 'id'}
+        return _plain(await self.service.update_record(SERVICE_REQUESTS_TABLE, row_id, fields))
+
+
+def baserow_repositories(service=None) -> Repositories:
+    return Repositories(
+        backend='baserow',
+        customers=BaserowCustomerRepository(service),
+        garages=BaserowGarageRepository(service),
+        received_emails=BaserowReceivedEmailRepository(service),
+        quotes=BaserowQuoteRepository(service),
+        service_requests=BaserowServiceRequestRepository(service),
+    )
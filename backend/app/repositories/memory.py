@@ -0,0 +1,174 @@
+"""In-memory repositories: no I/O at all.
+
+Used to run and benchmark the business logic without Baserow or a database,
+and as the reference implementation for the conformance suite. Rows are
+kept as dataclasses/dicts and copied on the way in and out, so callers can't
+mutate stored state by accident.
+"""
+import copy
+import itertools
+from dataclasses import fields, replace
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from ..services.baserow_schema import CustomerRequest, Garage, ReceivedEmail
+from ..services.received_email_index import message_hash, normalise_sender, normalise_vin
+from .base import (
+    CustomerRepository,
+    GarageRepository,
+    QuoteRepository,
+    ReceivedEmailRepository,
+    Repositories,
+    ServiceRequestRepository,
+    has_valid_email,
+    matches_request,
+    quote_values,
+    reply_values,
+)
+
+
+def _row(row_type: type, row_id: int, values: Dict[str, Any]):
+    """Build a row dataclass, with '' for anything not given (as Baserow decodes it)"""
+    return row_type(row_id, *[values.get(field.name) or '' for field in fields(row_type)[1:]])
+
+
+class MemoryCustomerRepository(CustomerRepository):
+
+    def __init__(self):
+        self._rows: Dict[int, CustomerRequest] = {}
+        self._ids = itertools.count(1)
+
+    async def create(self, values: Dict[str, Any]) -> CustomerRequest:
+        values = {'date_time': datetime.now(timezone.utc).isoformat(), **values}
+        customer = _row(CustomerRequest, next(self._ids), values)
+        self._rows[customer.id] = customer
+        return replace(customer)
+
+    async def get(self, customer_id: int) -> Optional[CustomerRequest]:
+        customer = self._rows.get(int(customer_id))
+        return replace(customer) if customer else None
+
+    async def iter_all(self) -> AsyncIterator[CustomerRequest]:
+        for customer in list(self._rows.values()):
+            yield replace(customer)
+
+    async def find_by_vin(self, vin: str) -> List[CustomerRequest]:
+        return [replace(customer) for customer in self._rows.values() if customer.vin == vin]
+
+    async def mark_sent(self, notes: Dict[int, str]) -> Set[int]:
+        updated = set()
+        for customer_id, note in notes.items():
+            customer = self._rows.get(int(customer_id))
+            if customer is not None:
+                customer.sent_emails = note
+                updated.add(customer.id)
+        return updated
+
+
+class MemoryGarageRepository(GarageRepository):
+
+    def __init__(self):
+        self._rows: Dict[int, Garage] = {}
+        self._ids = itertools.count(1)
+
+    async def list(self) -> List[Garage]:
+        return [replace(garage) for garage in self._rows.values() if has_valid_email(garage)]
+
+    async def add(self, values: Dict[str, Any]) -> Garage:
+        garage = _row(Garage, next(self._ids), values)
+        self._rows[garage.id] = garage
+        return replace(garage)
+
+
+class MemoryReceivedEmailRepository(ReceivedEmailRepository):
+
+    def __init__(self):
+        self._rows: Dict[int, ReceivedEmail] = {}
+        self._keys: Dict[Tuple[str, str], int] = {}
+        self._messages: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    async def store(self, email_data: Dict[str, Any], vin: str) -> Tuple[ReceivedEmail, bool]:
+        if not vin or not str(vin).strip():
+            raise ValueError(f"Cannot store email without VIN. Email from: {email_data.get('from_email', 'unknown')}")
+        key = (normalise_vin(vin), normalise_sender(email_data.get('from_email')))
+        digest = message_hash(email_data.get('message_id'))
+        existing = self._messages.get(digest) if digest else None
+        if existing is None:
+            existing = self._keys.get(key)
+        if existing is not None:
+            return replace(self._rows[existing]), False
+
+        reply = _row(ReceivedEmail, next(self._ids), reply_values(email_data, vin, datetime.now(timezone.utc).isoformat()))
+        self._rows[reply.id] = reply
+        self._keys[key] = reply.id
+        if digest:
+            self._messages[digest] = reply.id
+        return replace(reply), True
+
+    async def list_by_vin(self, vin: str) -> List[ReceivedEmail]:
+        return [replace(reply) for reply in self._rows.values() if reply.vin == vin]
+
+
+class MemoryQuoteRepository(QuoteRepository):
+
+    def __init__(self):
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        quote = {**quote_values(values), 'id': str(next(self._ids))}
+        self._rows[quote['id']] = quote
+        return dict(quote)
+
+    async def get(self, quote_id: str) -> Optional[Dict[str, Any]]:
+        quote = self._rows.get(str(quote_id))
+        return dict(quote) if quote else None
+
+    async def list_by_request(self, request_id: str) -> List[Dict[str, Any]]:
+        return [dict(quote) for quote in self._rows.values() if quote.get('request_id') == request_id]
+
+    async def update(self, quote_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        quote = self._rows.get(str(quote_id))
+        if quote is None:
+            return None
+        quote.update(quote_values(values))
+        return dict(quote)
+
+
+class MemoryServiceRequestRepository(ServiceRequestRepository):
+
+    def __init__(self):
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    def _find(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return next((record for record in self._rows.values() if matches_request(record, request_id)), None)
+
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        record = {**copy.deepcopy(values), 'id': str(next(self._ids))}
+        self._rows[record['id']] = record
+        return copy.deepcopy(record)
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        record = self._find(request_id)
+        return copy.deepcopy(record) if record else None
+
+    async def update(self, request_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        record = self._find(request_id)
+        if record is None:
+            return None
+        record.update(copy.deepcopy({k: v for k, v in values.items() if k != 'id'}))
+        return copy.deepcopy(record)
+
+
+def memory_repositories() -> Repositories:
+    """A fresh, empty set of in-memory repositories"""
+    return Repositories(
+        backend='memory',
+        customers=MemoryCustomerRepository(),
+        garages=MemoryGarageRepository(),
+        received_emails=MemoryReceivedEmailRepository(),
+        quotes=MemoryQuoteRepository(),
+        service_requests=MemoryServiceRequestRepository(),
+    )
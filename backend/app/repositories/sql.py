@@ -0,0 +1,340 @@
+"""SQLAlchemy repositories (SQLite or Postgres).
+
+Tables are the ``storage_*`` models in :mod:`app.models.storage`. The
+database is ``STORAGE_DATABASE_URL``, else ``DATABASE_URL`` (what
+docker-compose sets for its Postgres service), else the app's own
+``garagefy.db``. The tables are created on first use.
+
+Sessions are blocking, so every call runs in the default executor; the
+event loop never waits on the database.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import create_engine, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ..core.database import Base, SessionLocal
+from ..models.storage import StoredCustomer, StoredGarage, StoredQuote, StoredReceivedEmail, StoredServiceRequest
+from ..services.baserow_schema import CustomerRequest, Garage, ReceivedEmail
+from ..services.received_email_index import message_hash, normalise_sender, normalise_vin
+from .base import (
+    QUOTE_FIELDS,
+    CustomerRepository,
+    GarageRepository,
+    QuoteRepository,
+    ReceivedEmailRepository,
+    Repositories,
+    ServiceRequestRepository,
+    quote_values,
+    reply_values,
+)
+
+logger = logging.getLogger(__name__)
+
+STORAGE_TABLES = [
+    model.__table__
+    for model in (StoredCustomer, StoredGarage, StoredReceivedEmail, StoredQuote, StoredServiceRequest)
+]
+
+# Rows per query when streaming customers
+PAGE_SIZE = 500
+
+
+def _customer(row: StoredCustomer) -> CustomerRequest:
+    return CustomerRequest(
+        row.id, row.name, row.email, row.phone, row.vin, row.brand,
+        row.notes, row.date_time, row.sent_emails, row.plate_number,
+    )
+
+
+def _garage(row: StoredGarage) -> Garage:
+    return Garage(row.id, row.name, row.email, row.address, row.phone, row.website, row.reviews, row.specialties)
+
+
+def _reply(row: StoredReceivedEmail) -> ReceivedEmail:
+    return ReceivedEmail(row.id, row.email, row.subject, row.body, row.received_at, row.vin, row.quote)
+
+
+def _quote(row: StoredQuote) -> Dict[str, Any]:
+    quote = {name: getattr(row, name) for name in QUOTE_FIELDS if getattr(row, name) is not None}
+    quote['id'] = str(row.id)
+    return quote
+
+
+def _service_request(row: StoredServiceRequest) -> Dict[str, Any]:
+    return {**row.fields, 'id': str(row.id)}
+
+
+def _columns(model: type, values: Dict[str, Any]) -> Dict[str, Any]:
+    """Known columns only, with None as '' like the Baserow decoder"""
+    return {
+        key: '' if value is None else value
+        for key, value in values.items()
+        if key != 'id' and key in model.__table__.columns
+    }
+
+
+class _SqlRepository:
+
+    def __init__(self, session_factory: Callable):
+        self.session_factory = session_factory
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, partial(fn, *args))
+
+
+class SqlCustomerRepository(_SqlRepository, CustomerRepository):
+
+    def _create(self, values: Dict[str, Any]) -> CustomerRequest:
+        values = {'date_time': datetime.now(timezone.utc).isoformat(), **values}
+        with self.session_factory() as db:
+            row = StoredCustomer(**_columns(StoredCustomer, values))
+            db.add(row)
+            db.commit()
+            return _customer(row)
+
+    async def create(self, values: Dict[str, Any]) -> CustomerRequest:
+        return await self._run(self._create, values)
+
+    def _get(self, customer_id: int) -> Optional[CustomerRequest]:
+        with self.session_factory() as db:
+            row = db.get(StoredCustomer, int(customer_id))
+            return _customer(row) if row else None
+
+    async def get(self, customer_id: int) -> Optional[CustomerRequest]:
+        return await self._run(self._get, customer_id)
+
+    def _page(self, after_id: int) -> List[CustomerRequest]:
+        with self.session_factory() as db:
+            rows = db.query(StoredCustomer).filter(StoredCustomer.id > after_id).order_by(StoredCustomer.id).limit(PAGE_SIZE)
+            return [_customer(row) for row in rows]
+
+    async def iter_all(self) -> AsyncIterator[CustomerRequest]:
+        after_id = 0
+        while True:
+            page = await self._run(self._page, after_id)
+            for customer in page:
+                yield customer
+            if len(page) < PAGE_SIZE:
+                return
+            after_id = page[-1].id
+
+    def _find_by_vin(self, vin: str) -> List[CustomerRequest]:
+        with self.session_factory() as db:
+            return [_customer(row) for row in db.query(StoredCustomer).filter(StoredCustomer.vin == vin).order_by(StoredCustomer.id)]
+
+    async def find_by_vin(self, vin: str) -> List[CustomerRequest]:
+        return await self._run(self._find_by_vin, vin)
+
+    def _mark_sent(self, notes: Dict[int, str]) -> Set[int]:
+        notes = {int(customer_id): note for customer_id, note in notes.items()}
+        with self.session_factory() as db:
+            rows = db.query(StoredCustomer).filter(StoredCustomer.id.in_(notes)).all()
+            for row in rows:
+                row.sent_emails = notes[row.id]
+            db.commit()
+            return {row.id for row in rows}
+
+    async def mark_sent(self, notes: Dict[int, str]) -> Set[int]:
+        if not notes:
+            return set()
+        return await self._run(self._mark_sent, notes)
+
+
+class SqlGarageRepository(_SqlRepository, GarageRepository):
+
+    def _list(self) -> List[Garage]:
+        with self.session_factory() as db:
+            rows = db.query(StoredGarage).filter(StoredGarage.email.contains('@')).order_by(StoredGarage.id)
+            return [_garage(row) for row in rows]
+
+    async def list(self) -> List[Garage]:
+        return await self._run(self._list)
+
+    def _add(self, values: Dict[str, Any]) -> Garage:
+        with self.session_factory() as db:
+            row = StoredGarage(**_columns(StoredGarage, values))
+            db.add(row)
+            db.commit()
+            return _garage(row)
+
+    async def add(self, values: Dict[str, Any]) -> Garage:
+        return await self._run(self._add, values)
+
+
+class SqlReceivedEmailRepository(_SqlRepository, ReceivedEmailRepository):
+
+    @staticmethod
+    def _existing(db, vin: str, sender: str, digest: Optional[str]) -> Optional[StoredReceivedEmail]:
+        match = (StoredReceivedEmail.vin == vin) & (StoredReceivedEmail.sender == sender)
+        if digest:
+            match = or_(match, StoredReceivedEmail.message_hash == digest)
+        return db.query(StoredReceivedEmail).filter(match).order_by(StoredReceivedEmail.id).first()
+
+    def _store(self, email_data: Dict[str, Any], vin: str) -> Tuple[ReceivedEmail, bool]:
+        key_vin, sender = normalise_vin(vin), normalise_sender(email_data.get('from_email'))
+        digest = message_hash(email_data.get('message_id'))
+        values = reply_values(email_data, vin, datetime.now(timezone.utc).isoformat())
+        with self.session_factory() as db:
+            existing = self._existing(db, key_vin, sender, digest)
+            if existing is not None:
+                return _reply(existing), False
+            row = StoredReceivedEmail(**_columns(StoredReceivedEmail, values), sender=sender, message_hash=digest)
+            row.vin = key_vin
+            db.add(row)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker stored the same garage's reply just now
+                db.rollback()
+                return _reply(self._existing(db, key_vin, sender, digest)), False
+            return _reply(row), True
+
+    async def store(self, email_data: Dict[str, Any], vin: str) -> Tuple[ReceivedEmail, bool]:
+        if not vin or not str(vin).strip():
+            raise ValueError(f"Cannot store email without VIN. Email from: {email_data.get('from_email', 'unknown')}")
+        return await self._run(self._store, email_data, vin)
+
+    def _list_by_vin(self, vin: str) -> List[ReceivedEmail]:
+        with self.session_factory() as db:
+            rows = db.query(StoredReceivedEmail).filter(StoredReceivedEmail.vin == normalise_vin(vin)).order_by(StoredReceivedEmail.id)
+            return [_reply(row) for row in rows]
+
+    async def list_by_vin(self, vin: str) -> List[ReceivedEmail]:
+        return await self._run(self._list_by_vin, vin)
+
+
+class SqlQuoteRepository(_SqlRepository, QuoteRepository):
+
+    def _create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        with self.session_factory() as db:
+            row = StoredQuote(**quote_values(values))
+            db.add(row)
+            db.commit()
+            return _quote(row)
+
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._run(self._create, values)
+
+    def _get(self, quote_id: str) -> Optional[Dict[str, Any]]:
+        if not str(quote_id).isdigit():
+            return None
+        with self.session_factory() as db:
+            row = db.get(StoredQuote, int(quote_id))
+            return _quote(row) if row else None
+
+    async def get(self, quote_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, quote_id)
+
+    def _list_by_request(self, request_id: str) -> List[Dict[str, Any]]:
+        with self.session_factory() as db:
+            rows = db.query(StoredQuote).filter(StoredQuote.request_id == request_id).order_by(StoredQuote.id)
+            return [_quote(row) for row in rows]
+
+    async def list_by_request(self, request_id: str) -> List[Dict[str, Any]]:
+        return await self._run(self._list_by_request, request_id)
+
+    def _update(self, quote_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not str(quote_id).isdigit():
+            return None
+        with self.session_factory() as db:
+            row = db.get(StoredQuote, int(quote_id))
+            if row is None:
+                return None
+            for key, value in quote_values(values).items():
+                setattr(row, key, value)
+            db.commit()
+            return _quote(row)
+
+    async def update(self, quote_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._run(self._update, quote_id, values)
+
+
+class SqlServiceRequestRepository(_SqlRepository, ServiceRequestRepository):
+
+    @staticmethod
+    def _find(db, request_id: str) -> Optional[StoredServiceRequest]:
+        match = StoredServiceRequest.request_id == str(request_id)
+        if str(request_id).isdigit():
+            match = or_(match, StoredServiceRequest.id == int(request_id))
+        return db.query(StoredServiceRequest).filter(match).order_by(StoredServiceRequest.id).first()
+
+    def _create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {k: v for k, v in values.items() if k != 'id'}
+        with self.session_factory() as db:
+            row = StoredServiceRequest(request_id=fields.get('Request ID'), fields=fields)
+            db.add(row)
+            db.commit()
+            return _service_request(row)
+
+    async def create(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._run(self._create, values)
+
+    def _get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self.session_factory() as db:
+            row = self._find(db, request_id)
+            return _service_request(row) if row else None
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, request_id)
+
+    def _update(self, request_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.session_factory() as db:
+            row = self._find(db, request_id)
+            if row is None:
+                return None
+            # Assign a new dict so the JSON column is seen as changed
+            row.fields = {**row.fields, **{k: v for k, v in values.items() if k != 'id'}}
+            if 'Request ID' in values:
+                row.request_id = values['Request ID']
+            db.commit()
+            return _service_request(row)
+
+    async def update(self, request_id: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._run(self._update, request_id, values)
+
+
+def storage_database_url() -> Optional[str]:
+    return os.getenv('STORAGE_DATABASE_URL') or os.getenv('DATABASE_URL') or None
+
+
+def session_factory_for(url: Optional[str]) -> Callable:
+    """Session factory for ``url`` (None = the app's database), with the storage tables created"""
+    if not url:
+        factory = SessionLocal
+        engine = SessionLocal.kw['bind']
+    else:
+        kwargs: Dict[str, Any] = {}
+        if url.startswith('sqlite'):
+            kwargs['connect_args'] = {'check_same_thread': False}
+            if url in ('sqlite://', 'sqlite:///:memory:'):
+                # One shared connection, or every session would see its own empty database
+                kwargs['poolclass'] = StaticPool
+        else:
+            kwargs['pool_pre_ping'] = True
+        engine = create_engine(url, **kwargs)
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+    Base.metadata.create_all(bind=engine, tables=STORAGE_TABLES)
+    return factory
+
+
+def sql_repositories(url: Optional[str] = None) -> Repositories:
+    """Repositories on ``url``, defaulting to :func:`storage_database_url`"""
+    factory = session_factory_for(url or storage_database_url())
+    return Repositories(
+        backend='sql',
+        customers=SqlCustomerRepository(factory),
+        garages=SqlGarageRepository(factory),
+        received_emails=SqlReceivedEmailRepository(factory),
+        quotes=SqlQuoteRepository(factory),
+        service_requests=SqlServiceRequestRepository(factory),
+    )
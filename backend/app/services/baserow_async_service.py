@@ -0,0 +1,628 @@
+import asyncio
+import contextvars
+import json
+import logging
+import weakref
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from .baserow_service import GARAGE_CACHE_KEY, BaserowAPIError, BaserowService, garage_cache, get_baserow_service
+from .baserow_schema import Garage, TableSchema
+from ..core.cache import FRESH, STALE
+
+
+class AsyncBaserowService:
+    """Asyncio counterpart of :class:`BaserowService`.
+
+    Configuration (table IDs, field mappings, retry policy), payload building,
+    the bulk-write plan and response shaping are shared with the synchronous
+    service; only the I/O differs. Return values keep the same Airtable-style
+    ``{'id': ..., 'fields': {...}}`` shape so callers can switch by adding
+    ``await``.
+
+    The shared parts that block (cold schema loads, the replica, the
+    received-email index and the other write hooks, all SQLite or
+    ``requests``) run on the default executor through :meth:`_run`, so the
+    event loop only ever waits on aiohttp.
+    """
+
+    def __init__(self, sync_service: Optional[BaserowService] = None):
+        self.sync = sync_service or get_baserow_service()
+        self.logger = logging.getLogger(__name__)
+        # aiohttp sessions are bound to the loop they were created on. The API
+        # runs on one loop, but background helpers may run their own, so keep
+        # one shared session per loop.
+        self._sessions: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]' = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @property
+    def table_ids(self) -> Dict[str, int]:
+        return self.sync.table_ids
+
+    @property
+    def metrics(self):
+        return self.sync.metrics
+
+    async def _run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking part of the sync service in the default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, partial(fn, *args, **kwargs))
+
+    async def schema(self, table_name: str) -> TableSchema:
+        """Field metadata for ``table_name``, see :meth:`BaserowService.schema`.
+
+        Schemas are warmed at startup; a cold or expired one is loaded on a
+        worker thread. Once this has returned, the sync service's payload
+        builders and filters for the table need no I/O.
+        """
+        schema = self.sync.schemas.cached(table_name)
+        if schema is None:
+            schema = await self._run(self.sync.schema, table_name)
+        return schema
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connect_timeout, read_timeout = self.sync.timeout
+            session = aiohttp.ClientSession(
+                headers=self.sync.headers,
+                connector=aiohttp.TCPConnector(limit=self.sync.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Close the HTTP session bound to the running event loop"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def _make_request(self, method: str, endpoint: str, data: Dict = None, params: Dict = None) -> Dict:
+        """Make HTTP request to Baserow API"""
+        url = f'{self.sync.base_url}{endpoint}'
+        policy = self.sync.retry_policy
+
+        try:
+            if method not in ('GET', 'POST', 'PATCH', 'DELETE'):
+                raise ValueError(f"Unsupported method: {method}")
+
+            session = self._get_session()
+            # Rows are always read and written by field name
+            request_params = {'user_field_names': 'true', **(params or {})}
+            attempt = 0
+            while True:
+                try:
+                    async with self.sync.limiter.async_slot():
+                        async with session.request(method, url, json=data, params=request_params) as response:
+                            text = await response.text()
+                            status = response.status
+                            retry_after = response.headers.get('Retry-After')
+                except aiohttp.ClientConnectorError:
+                    # Nothing was sent, so reconnecting is safe for any method
+                    if attempt >= policy.max_retries:
+                        raise
+                    delay = policy.delay(attempt)
+                    self.logger.warning(f"Could not connect for {method} {url}, retrying in {delay:.1f}s")
+                    self.metrics['http_retries'] += 1
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                except asyncio.TimeoutError:
+                    if not policy.should_retry_timeout(method, attempt):
+                        raise
+                    delay = policy.delay(attempt)
+                    self.logger.warning(f"Read timeout on {method} {url}, retrying in {delay:.1f}s")
+                    self.metrics['http_retries'] += 1
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+                if policy.should_retry_status(method, status, attempt):
+                    delay = policy.delay(attempt, retry_after)
+                    self.logger.warning(
+                        f"Baserow returned {status} for {method} {url}, "
+                        f"retry {attempt + 1}/{policy.max_retries} in {delay:.1f}s"
+                    )
+                    self.metrics['http_retries'] += 1
+                    if status == 429:
+                        self.sync.limiter.pause(delay)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                break
+
+            if status >= 400:
+                self.sync._raise_api_error(status, text)
+
+            return json.loads(text) if text else {}
+
+        except asyncio.TimeoutError:
+            self.logger.error(f"Request timeout: {url}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Request failed: {str(e)}")
+            raise
+
+    async def _fetch_page(self, endpoint: str, params: Optional[Dict[str, Any]], page: int) -> Dict[str, Any]:
+        """See :meth:`BaserowService._fetch_page`"""
+        try:
+            return await self._make_request('GET', endpoint, params=self.sync._page_params(params, page))
+        except BaserowAPIError as e:
+            if page == 1 or not self.sync._past_last_page(e):
+                raise
+            self.metrics['pages_past_end'] += 1
+            return {'results': [], 'next': None}
+
+    async def _fetch_rows_in_order(self, endpoint: str, params: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """See :meth:`BaserowService._fetch_rows_in_order`"""
+        rows, page = [], 1
+        while True:
+            response = await self._fetch_page(endpoint, params, page)
+            rows.extend(response.get('results', []))
+            if not response.get('next'):
+                return self.sync._unique_rows(rows)
+            page += 1
+
+    async def _fetch_all_rows(self, table_id: int, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fetch every row of a list-rows query, remaining pages concurrently.
+
+        Same strategy as :meth:`BaserowService._fetch_all_rows`: page 1
+        gives ``count``, the other pages are gathered with at most
+        ``page_fanout`` requests in flight and kept in page order, and a
+        short read is done again sequentially.
+        """
+        endpoint = self.sync._rows_endpoint(table_id)
+        first = await self._fetch_page(endpoint, params, 1)
+        rows = list(first.get('results', []))
+
+        pages = self.sync._remaining_pages(first)
+        semaphore = asyncio.Semaphore(self.sync.page_fanout)
+
+        async def fetch(page: int) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._fetch_page(endpoint, params, page)
+
+        responses = await asyncio.gather(*(fetch(page) for page in pages))
+        for response in responses:
+            rows.extend(response.get('results', []))
+
+        # Rows added while we were reading can spill past the planned pages
+        last = responses[-1] if responses else first
+        page = pages[-1] if pages else 1
+        while last.get('next'):
+            page += 1
+            last = await self._fetch_page(endpoint, params, page)
+            rows.extend(last.get('results', []))
+
+        rows = self.sync._unique_rows(rows)
+        if self.sync._short_read(first, rows, table_id):
+            rows = await self._fetch_rows_in_order(endpoint, params)
+        return rows
+
+    async def _read_rows(self, table_id: int, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """:meth:`_fetch_all_rows`, coalesced with identical reads in flight on this loop"""
+        return await self.sync.reads.do_async(
+            self.sync._read_key(table_id, params), lambda: self._fetch_all_rows(table_id, params)
+        )
+
+    async def _load_fix_it_garages(self) -> List[Garage]:
+        """Read and parse the 'Fix it' table from Baserow, bypassing the cache"""
+        table_id = self.table_ids['Fix it']
+        self.logger.info(f"🔍 Fetching garages from Fix it table (ID: {table_id})")
+
+        rows = await self._run(self.sync._from_replica, 'Fix it', 'rows')
+        if rows is None:
+            rows = await self._read_rows(table_id)
+
+        schema = await self.schema('Fix it')
+        garages = []
+        for record in rows:
+            garage = self.sync._parse_garage(record, schema)
+            if garage:
+                garages.append(garage)
+
+        self.logger.info(f"📧 Total valid garages: {len(garages)}")
+        return garages
+
+    async def get_fix_it_garages(self) -> List[Garage]:
+        """
+        Fetch all garages from 'Fix it' table (cached, see ``garage_cache``)
+
+        Returns:
+            List of :class:`Garage` rows with name, email, address, etc.
+        """
+        state, garages = garage_cache.lookup(GARAGE_CACHE_KEY)
+        if state == STALE:
+            self.sync._revalidate_garages_in_background()
+        if state in (FRESH, STALE):
+            return list(garages)
+
+        try:
+            generation = garage_cache.generation()
+            garages = await self.sync.reads.do_async((GARAGE_CACHE_KEY, generation), self._load_fix_it_garages)
+            garage_cache.store(GARAGE_CACHE_KEY, garages, generation)
+            return list(garages)
+
+        except Exception as e:
+            self.logger.error(f"❌ Error fetching garages: {str(e)}", exc_info=True)
+            return []
+
+    def invalidate_garage_cache(self):
+        """Drop the cached garage directory so the next read hits Baserow"""
+        self.sync.invalidate_garage_cache()
+
+    async def get_all_garages(self) -> List[Garage]:
+        """Alias for get_fix_it_garages for compatibility"""
+        return await self.get_fix_it_garages()
+
+    async def create_customer(self, data: dict) -> Dict[str, Any]:
+        """
+        Create a new customer record in 'Customer details' table
+
+        Args:
+            data: Dictionary with keys like Name, Email, VIN, Phone, etc.
+
+        Returns:
+            Dict with success status and record_id
+        """
+        try:
+            table_id = self.table_ids['Customer details']
+
+            # Validate table ID
+            if not table_id or table_id == 0:
+                error_msg = f"Invalid Customer details table ID: {table_id}. Check BASEROW_TABLE_CUSTOMER_DETAILS env var"
+                self.logger.error(error_msg)
+                return {'success': False, 'error': error_msg, 'record_id': None}
+
+            await self.schema('Customer details')
+            payload, error_msg = self.sync._build_customer_payload(data)
+            if error_msg:
+                return {'success': False, 'error': error_msg, 'record_id': None}
+
+            response = await self._make_request('POST', self.sync._rows_endpoint(table_id), data=payload)
+            await self._run(self.sync._after_write, 'Customer details', response)
+
+            record_id = response.get('id')
+            self.logger.info(f"✅ Created customer record: {record_id}")
+
+            return {
+                'success': True,
+                'record_id': record_id,
+                'error': None
+            }
+
+        except Exception as e:
+            error_msg = f"Error creating customer: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return {
+                'success': False,
+                'record_id': None,
+                'error': error_msg
+            }
+
+    async def _resolve_filter(self, table_name: str, formula: str, filter_dict: Optional[Dict]) -> Tuple[Dict[str, str], bool]:
+        """:meth:`BaserowService._resolve_filter`, with the table's schema loaded off the loop"""
+        await self.schema(table_name)
+        return self.sync._resolve_filter(table_name, formula, filter_dict)
+
+    async def get_records(self, table_name: str, formula: str = "", filter_dict: Dict = None) -> List[Dict[str, Any]]:
+        """Get records from a table with optional filtering.
+
+        Same filtering rules and return shape as
+        :meth:`BaserowService.get_records`.
+        """
+        try:
+            table_id = self.table_ids.get(table_name)
+            if not table_id:
+                raise ValueError(f"Unknown table: {table_name}")
+
+            records = await self._run(self.sync._from_replica, table_name, 'get_records', formula, filter_dict)
+            if records is not None:
+                return records
+
+            filter_params, client_side = await self._resolve_filter(table_name, formula, filter_dict)
+
+            rows = await self._read_rows(table_id, filter_params)
+            return self.sync._wrap_rows(rows, formula, filter_dict, client_side)
+
+        except Exception as e:
+            self.logger.error(f"Error getting records from {table_name}: {str(e)}")
+            return []
+
+    async def iter_records(self, table_name: str, formula: str = "", filter_dict: Dict = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async generator yielding records page by page.
+
+        See :meth:`BaserowService.iter_records`; leaving the ``async for``
+        early stops further page requests.
+        """
+        table_id = self.table_ids.get(table_name)
+        if not table_id:
+            self.logger.error(f"Error iterating records from {table_name}: Unknown table: {table_name}")
+            return
+
+        records = await self._run(self.sync._from_replica, table_name, 'get_records', formula, filter_dict)
+        if records is not None:
+            for record in records:
+                yield record
+            return
+
+        filter_params, client_side = await self._resolve_filter(table_name, formula, filter_dict)
+        endpoint = self.sync._rows_endpoint(table_id)
+        page = 1
+
+        while True:
+            try:
+                response = await self._make_request('GET', endpoint, params=self.sync._page_params(filter_params, page))
+            except Exception as e:
+                self.logger.error(f"Error iterating records from {table_name} (page {page}): {str(e)}")
+                return
+
+            for record in self.sync._wrap_rows(response.get('results', []), formula, filter_dict, client_side):
+                yield record
+
+            if not response.get('next'):
+                return
+            page += 1
+
+    async def get_record(self, table_name: str, record_id: int) -> Optional[Dict[str, Any]]:
+        """Get a single record by ID in the Airtable ``{'id', 'fields'}`` shape"""
+        try:
+            table_id = self.table_ids.get(table_name)
+            if not table_id:
+                raise ValueError(f"Unknown table: {table_name}")
+
+            record = await self._run(self.sync._from_replica, table_name, 'get_record', record_id)
+            if record is not None:
+                return record
+
+            response = await self._make_request('GET', self.sync._rows_endpoint(table_id, record_id))
+
+            if not response:
+                return None
+
+            return {
+                'id': response.get('id'),
+                'fields': response,
+            }
+
+        except Exception as e:
+            self.logger.error(f"Error getting record: {str(e)}")
+            return None
+
+    async def create_record(self, table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new record in a table, returned in the ``{'id', 'fields'}`` shape"""
+        try:
+            table_id = self.table_ids.get(table_name)
+            if not table_id:
+                raise ValueError(f"Unknown table: {table_name}")
+
+            response = await self._make_request('POST', self.sync._rows_endpoint(table_id), data=data)
+            await self._run(self.sync._after_write, table_name, response)
+
+            return {
+                'id': response.get('id') if response else None,
+                'fields': response,
+            }
+
+        except Exception as e:
+            self.logger.error(f"Error creating record: {str(e)}")
+            raise
+
+    async def update_record(self, table_name: str, record_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Update a record in a table
+
+        Returns:
+            Updated record or None if failed
+        """
+        try:
+            table_id = self.table_ids.get(table_name)
+            if not table_id:
+                raise ValueError(f"Unknown table: {table_name}")
+
+            response = await self._make_request('PATCH', self.sync._rows_endpoint(table_id, record_id), data=data)
+            await self._run(self.sync._after_write, table_name, response)
+
+            self.logger.info(f"✅ Updated record {record_id} in {table_name}")
+
+            # Preserve Airtable-style shape for callers expecting 'fields'
+            if response:
+                return {
+                    'id': response.get('id'),
+                    'fields': response,
+                }
+            return None
+
+        except Exception as e:
+            self.logger.error(f"Error updating record: {str(e)}")
+            return None
+
+    async def delete_record(self, table_name: str, record_id: int) -> bool:
+        """
+        Delete a record from a table
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            table_id = self.table_ids.get(table_name)
+            if not table_id:
+                raise ValueError(f"Unknown table: {table_name}")
+
+            await self._make_request('DELETE', self.sync._rows_endpoint(table_id, record_id))
+            await self._run(self.sync._after_write, table_name, deleted_id=record_id)
+
+            self.logger.info(f"✅ Deleted record {record_id} from {table_name}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error deleting record: {str(e)}")
+            return False
+
+    async def _bulk_write(self, table_name: str, operation: str, items: List[Any]) -> Dict[str, Any]:
+        """Drive :meth:`BaserowService._bulk_plan` with aiohttp requests"""
+        plan = self.sync._bulk_plan(table_name, operation, items)
+        response, error = None, None
+        try:
+            while True:
+                method, endpoint, body = plan.throw(error) if error else plan.send(response)
+                try:
+                    response, error = await self._make_request(method, endpoint, data=body), None
+                except Exception as e:
+                    response, error = None, e
+        except StopIteration as done:
+            return await self._run(self.sync._after_bulk_write, table_name, operation, done.value)
+
+    async def bulk_create_records(self, table_name: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create many rows via the batch endpoint, see :meth:`BaserowService.bulk_create_records`"""
+        return await self._bulk_write(table_name, 'create', list(rows))
+
+    async def bulk_update_records(self, table_name: str, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Update many rows (``{'id': ..., **fields}``) via the batch endpoint"""
+        return await self._bulk_write(table_name, 'update', list(updates))
+
+    async def bulk_delete_records(self, table_name: str, record_ids: List[int]) -> Dict[str, Any]:
+        """Delete many rows via the batch-delete endpoint"""
+        return await self._bulk_write(table_name, 'delete', list(record_ids))
+
+    async def _indexed_reply(self, email_data: Dict[str, Any], vin: str) -> Optional[Dict[str, Any]]:
+        """Async :meth:`BaserowService._indexed_reply`"""
+        index = self.sync.received_index
+        match = await self._run(index.find, vin, email_data.get('from_email'), email_data.get('message_id'))
+        if match is None:
+            return None
+        reason, row_id = match
+        record = await self._indexed_row(row_id)
+        if record is None:
+            existing_records = await self.get_records('Recevied email', formula=f'{{VIN}} = "{vin}"')
+            return self.sync._scanned_reply(existing_records, email_data, vin)
+        return self.sync._duplicate_reply(reason, record, email_data, vin)
+
+    async def _indexed_row(self, row_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Async :meth:`BaserowService._indexed_row`"""
+        if row_id is None:
+            return None
+        record = await self._run(self.sync._from_replica, 'Recevied email', 'get_record', row_id)
+        if record is not None:
+            return record
+        try:
+            response = await self._make_request('GET', self.sync._rows_endpoint(self.table_ids['Recevied email'], row_id))
+        except Exception as e:
+            if not (isinstance(e, BaserowAPIError) and e.status_code == 404):
+                return self.sync._unconfirmed_row(row_id, e)
+            response = None
+        if not response:
+            await self._run(self.sync.received_index.discard_row, row_id)
+            return None
+        return {'id': response.get('id'), 'fields': response}
+
+    async def _find_stored_reply(self, email_data: Dict[str, Any], vin: str) -> Optional[Dict[str, Any]]:
+        """Async :meth:`BaserowService._find_stored_reply`"""
+        if not email_data.get('from_email'):
+            self.logger.warning(f"No email provided, cannot check for duplicates")
+            return None
+        try:
+            if self.sync.received_index.is_ready():
+                return await self._indexed_reply(email_data, vin)
+            existing_records = await self.get_records('Recevied email', formula=f'{{VIN}} = "{vin}"')
+            return self.sync._scanned_reply(existing_records, email_data, vin)
+        except Exception as e:
+            self.logger.warning(f"Could not check for duplicates: {str(e)}, will proceed with save")
+            return None
+
+    async def store_received_email(self, email_data: Dict[str, Any], vin: str = None) -> Dict[str, Any]:
+        """
+        Store a received email in the 'Recevied email' table
+
+        Args:
+            email_data: Dictionary with from_email, subject, body, received_at, attachments
+            vin: Vehicle Identification Number
+
+        Returns:
+            Dict with success status and record data
+        """
+        try:
+            rejection = self.sync._reply_rejection(email_data, vin)
+            if rejection:
+                return rejection
+
+            duplicate = await self._find_stored_reply(email_data, vin)
+            if duplicate:
+                return duplicate
+
+            await self.schema('Recevied email')
+            payload = self.sync._build_received_email_payload(email_data, vin)
+
+            endpoint = self.sync._rows_endpoint(self.table_ids['Recevied email'])
+            response = await self._make_request('POST', endpoint, data=payload)
+            return await self._run(self.sync._reply_stored, email_data, vin, response)
+
+        except Exception as e:
+            self.logger.error(f"Error storing email: {str(e)}", exc_info=True)
+            return {'success': False, 'error': str(e)}
+
+    async def record_garage_response(self, response_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a garage response in the 'Recevied email' table
+
+        Returns:
+            Dict with success status
+        """
+        try:
+            table_id = self.table_ids['Recevied email']
+
+            # Validate table ID
+            if not table_id or table_id == 0:
+                error_msg = f"Invalid Recevied email table ID: {table_id}. Check BASEROW_TABLE_RECEIVED_EMAIL env var"
+                self.logger.error(error_msg)
+                return {
+                    'success': False,
+                    'record': None,
+                    'error': error_msg
+                }
+
+            await self.schema('Recevied email')
+            payload = self.sync._build_garage_response_payload(response_data)
+
+            response = await self._make_request('POST', self.sync._rows_endpoint(table_id), data=payload)
+            await self._run(self.sync._after_write, 'Recevied email', response)
+
+            self.logger.info(f"✅ Recorded response from {response_data.get('garage_email')} for VIN {response_data.get('vin')}")
+
+            return {
+                'success': True,
+                'record': response,
+                'error': None
+            }
+
+        except Exception as e:
+            error_msg = f"Error recording garage response: {str(e)}"
+            self.logger.error(error_msg, exc_info=True)
+            return {
+                'success': False,
+                'record': None,
+                'error': error_msg
+            }
+
+
+# Singleton instance - lazy initialization
+_async_baserow_service_instance = None
+
+def get_async_baserow_service():
+    """Get or create the async Baserow service instance (lazy initialization)"""
+    global _async_baserow_service_instance
+    if _async_baserow_service_instance is None:
+        _async_baserow_service_instance = AsyncBaserowService()
+    return _async_baserow_service_instance
+
+class AsyncBaserowServiceProxy:
+    """Proxy that lazily initializes the actual service"""
+    def __getattr__(self, name):
+        return getattr(get_async_baserow_service(), name)
+
+async_baserow_service = AsyncBaserowServiceProxy()
@@ -0,0 +1,308 @@
+"""Local SQLite read-replica of the Baserow tables the scheduler scans.
+
+The scheduled jobs re-read Customer details, Recevied email and Fix it every
+minute, and almost none of those rows change between runs. The replica keeps
+a copy of those tables in ``garagefy.db`` and :class:`BaserowService` serves
+``get_records``/``get_record`` from it once a table has been synced:
+
+* A sync worker (scheduled by ``SchedulerService``) pulls only rows changed
+  since the last watermark. Baserow has no built-in modification timestamp
+  on rows, so incremental sync needs a "Last modified" field per table,
+  configured by field id in ``BASEROW_UPDATED_ON_FIELD_<TABLE>``. Rows are
+  read newest-first (``order_by=-<field>``) until one is older than the
+  watermark. Tables without that field, and every
+  ``BASEROW_REPLICA_FULL_SYNC_EVERY``-th run (to pick up rows deleted in
+  the Baserow UI), are re-read in full.
+* Writes made through the services go to Baserow first and are then applied
+  here, so reads after our own writes are consistent.
+* If the worker stops syncing a table for longer than
+  ``BASEROW_REPLICA_MAX_LAG`` seconds, reads fall back to Baserow.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..core.database import SessionLocal
+from ..core.limits import BACKGROUND, lane
+from ..models.baserow_replica import ReplicaRow, ReplicaSyncState
+from .baserow_service import resolve_conditions
+
+logger = logging.getLogger(__name__)
+
+REPLICATED_TABLES = ('Customer details', 'Recevied email', 'Fix it')
+
+# Replica column -> Baserow field name(s) it is copied from, first match wins
+INDEXED_FIELDS = {
+    'vin': ('VIN',),
+    'email': ('Email',),
+    'date_time': ('Date and Time', 'Received At'),
+}
+
+_UPDATED_ON_ENV = {
+    'Customer details': 'BASEROW_UPDATED_ON_FIELD_CUSTOMER_DETAILS',
+    'Recevied email': 'BASEROW_UPDATED_ON_FIELD_RECEIVED_EMAIL',
+    'Fix it': 'BASEROW_UPDATED_ON_FIELD_FIX_IT',
+}
+
+
+def replica_enabled() -> bool:
+    return os.getenv('BASEROW_REPLICA_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _as_key(value: Any) -> Optional[str]:
+    """String form of a scalar cell for the index columns"""
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    return str(value)
+
+
+class BaserowReplica:
+    """SQLite mirror of selected Baserow tables, see module docstring"""
+
+    def __init__(self, service):
+        self.service = service
+        self.max_lag = float(os.getenv('BASEROW_REPLICA_MAX_LAG', 600))
+        self.full_sync_every = max(1, int(os.getenv('BASEROW_REPLICA_FULL_SYNC_EVERY', 60)))
+        self.metrics: Counter = Counter()
+
+        # table id -> canonical table name; aliases ('Received') share an id
+        self._tables: Dict[int, str] = {}
+        for name in REPLICATED_TABLES:
+            table_id = service.table_ids.get(name)
+            if table_id:
+                self._tables[table_id] = name
+        self._updated_on_fields: Dict[str, int] = {
+            name: int(os.environ[env]) for name, env in _UPDATED_ON_ENV.items() if os.getenv(env)
+        }
+
+        self._synced_at: Dict[int, float] = {}
+        self._sync_runs: Counter = Counter()
+        self._sync_lock = threading.Lock()
+
+    def _table(self, table_name: str) -> Optional[int]:
+        table_id = self.service.table_ids.get(table_name)
+        return table_id if table_id in self._tables else None
+
+    def is_ready(self, table_name: str) -> bool:
+        """True once the table has been synced recently enough to serve reads"""
+        table_id = self._table(table_name)
+        if table_id is None:
+            return False
+        synced_at = self._synced_at.get(table_id)
+        return synced_at is not None and time.time() - synced_at <= self.max_lag
+
+    def rows(self, table_name: str) -> List[Dict[str, Any]]:
+        """Every raw row of a replicated table, in row id order"""
+        table_id = self._table(table_name)
+        with SessionLocal() as db:
+            query = db.query(ReplicaRow.data).filter(ReplicaRow.table_id == table_id).order_by(ReplicaRow.row_id)
+            return [data for (data,) in query]
+
+    def get_records(self, table_name: str, formula: str = "", filter_dict: Dict = None) -> List[Dict[str, Any]]:
+        """Replica equivalent of :meth:`BaserowService.get_records`.
+
+        Equality conditions on indexed fields narrow the candidate rows in
+        SQL; every condition is then checked on the row itself with the
+        same semantics as Baserow's ``equal`` filter.
+        """
+        table_id = self._table(table_name)
+        canonical = self._tables[table_id]
+        self.metrics['reads'] += 1
+
+        conditions = resolve_conditions(canonical, formula, filter_dict, self.service.schema(canonical).ids)
+        with SessionLocal() as db:
+            query = db.query(ReplicaRow.data).filter(ReplicaRow.table_id == table_id)
+            for name, value in conditions or ():
+                for column, names in INDEXED_FIELDS.items():
+                    if name in names:
+                        query = query.filter(getattr(ReplicaRow, column) == value)
+                        self.metrics['indexed_reads'] += 1
+            rows = [data for (data,) in query.order_by(ReplicaRow.row_id)]
+
+        if conditions is None:
+            # Same client-side fallback get_records uses against Baserow
+            return self.service._wrap_rows(rows, formula, filter_dict, True)
+        matched = [row for row in rows if all(str(row.get(name)) == value for name, value in conditions)]
+        return self.service._wrap_rows(matched, formula, filter_dict, False)
+
+    def get_record(self, table_name: str, record_id: int) -> Optional[Dict[str, Any]]:
+        table_id = self._table(table_name)
+        self.metrics['reads'] += 1
+        with SessionLocal() as db:
+            row = db.get(ReplicaRow, (table_id, int(record_id)))
+            if row is None:
+                return None
+            return {'id': row.row_id, 'fields': row.data}
+
+    def _updated_on_field(self, canonical: str) -> Optional[str]:
+        """Name of the table's "Last modified" field, if one is configured"""
+        field_id = self._updated_on_fields.get(canonical)
+        return self.service.schema(canonical).names.get(field_id) if field_id else None
+
+    def _mapping(self, table_id: int, row: Dict[str, Any], written_at: float) -> Dict[str, Any]:
+        canonical = self._tables[table_id]
+        field_names = self.service.schema(canonical).ids
+        mapping = {
+            'table_id': table_id,
+            'row_id': int(row['id']),
+            'data': row,
+            'written_at': written_at,
+            'updated_on': None,
+        }
+        updated_field = self._updated_on_field(canonical)
+        if updated_field:
+            mapping['updated_on'] = _as_key(row.get(updated_field))
+        for column, names in INDEXED_FIELDS.items():
+            mapping[column] = None
+            for name in names:
+                if name in field_names:
+                    mapping[column] = _as_key(row.get(name))
+                    break
+        return mapping
+
+    def _upsert(self, db, table_id: int, rows: Iterable[Dict[str, Any]], snapshot_at: float) -> int:
+        """Store rows read at ``snapshot_at``, keeping any newer local write"""
+        rows = [row for row in rows if row and row.get('id') is not None]
+        if not rows:
+            return 0
+        newer = {
+            row_id for (row_id,) in db.query(ReplicaRow.row_id).filter(
+                ReplicaRow.table_id == table_id,
+                ReplicaRow.row_id.in_([int(row['id']) for row in rows]),
+                ReplicaRow.written_at > snapshot_at,
+            )
+        }
+        stored = 0
+        for row in rows:
+            if int(row['id']) in newer:
+                continue
+            db.merge(ReplicaRow(**self._mapping(table_id, row, snapshot_at)))
+            stored += 1
+        return stored
+
+    def apply_write(self, table_name: str, row: Optional[Dict[str, Any]]):
+        """Mirror a row Baserow just returned from a create/update"""
+        table_id = self._table(table_name)
+        if table_id is None or not row or row.get('id') is None:
+            return
+        try:
+            with SessionLocal() as db:
+                db.merge(ReplicaRow(**self._mapping(table_id, row, time.time())))
+                db.commit()
+            self.metrics['write_through'] += 1
+        except Exception as e:
+            # Baserow has the write; the next sync will bring it in
+            logger.warning(f"Replica write-through failed for {table_name} row {row.get('id')}: {str(e)}")
+
+    def apply_delete(self, table_name: str, record_id: int):
+        table_id = self._table(table_name)
+        if table_id is None:
+            return
+        try:
+            with SessionLocal() as db:
+                db.query(ReplicaRow).filter(
+                    ReplicaRow.table_id == table_id, ReplicaRow.row_id == int(record_id)
+                ).delete()
+                db.commit()
+            self.metrics['write_through'] += 1
+        except Exception as e:
+            logger.warning(f"Replica delete failed for {table_name} row {record_id}: {str(e)}")
+
+    def _fetch_changed_rows(self, table_id: int, field: str, watermark: str) -> List[Dict[str, Any]]:
+        """Rows modified at or after ``watermark``, read newest-first"""
+        endpoint = f'/api/database/rows/table/{table_id}/'
+        params = {'order_by': f'-{field}'}
+        changed: List[Dict[str, Any]] = []
+        page = 1
+        while True:
+            response = self.service._make_request('GET', endpoint, params=self.service._page_params(params, page))
+            for row in response.get('results', []):
+                updated_on = _as_key(row.get(field))
+                if updated_on is not None and updated_on < watermark:
+                    return changed
+                changed.append(row)
+            if not response.get('next'):
+                return changed
+            page += 1
+
+    def sync_table(self, table_name: str) -> Dict[str, Any]:
+        """Bring one table up to date; returns what was done"""
+        table_id = self._table(table_name)
+        if table_id is None:
+            raise ValueError(f"Table not replicated: {table_name}")
+        canonical = self._tables[table_id]
+        updated_field = self._updated_on_field(canonical)
+
+        with SessionLocal() as db:
+            state = db.get(ReplicaSyncState, table_id) or ReplicaSyncState(table_id=table_id, table_name=canonical)
+            self._sync_runs[table_id] += 1
+            full = (
+                not updated_field
+                or not state.watermark
+                or table_id not in self._synced_at
+                or self._sync_runs[table_id] % self.full_sync_every == 0
+            )
+
+            snapshot_at = time.time()
+            if full:
+                rows = self.service._fetch_all_rows(table_id)
+                # Drop everything not written locally since the snapshot;
+                # that removes rows deleted in Baserow
+                db.query(ReplicaRow).filter(
+                    ReplicaRow.table_id == table_id, ReplicaRow.written_at <= snapshot_at
+                ).delete(synchronize_session=False)
+                stored = self._upsert(db, table_id, rows, snapshot_at)
+                state.last_full_sync_at = datetime.now(timezone.utc)
+            else:
+                rows = self._fetch_changed_rows(table_id, updated_field, state.watermark)
+                stored = self._upsert(db, table_id, rows, snapshot_at)
+
+            if updated_field:
+                stamps = [s for s in (_as_key(r.get(updated_field)) for r in rows) if s]
+                if stamps:
+                    state.watermark = max([state.watermark or '', *stamps])
+            state.last_synced_at = datetime.now(timezone.utc)
+            db.flush()
+            state.row_count = db.query(ReplicaRow).filter(ReplicaRow.table_id == table_id).count()
+            db.add(state)
+            db.commit()
+            row_count = state.row_count
+
+        self._synced_at[table_id] = snapshot_at
+        self.metrics['rows_synced'] += stored
+        if stored and canonical == 'Fix it':
+            self.service.invalidate_garage_cache()
+        return {'table': canonical, 'full': full, 'rows_fetched': len(rows), 'rows_stored': stored, 'row_count': row_count}
+
+    def sync_all(self) -> List[Dict[str, Any]]:
+        """Sync every replicated table; one table failing doesn't stop the rest"""
+        results = []
+        with self._sync_lock, lane(BACKGROUND):
+            for table_id, table_name in self._tables.items():
+                try:
+                    result = self.sync_table(table_name)
+                    logger.debug(f"Replica sync: {result}")
+                    results.append(result)
+                except Exception as e:
+                    self.metrics['sync_errors'] += 1
+                    logger.error(f"Replica sync of {table_name} failed: {str(e)}", exc_info=True)
+                    results.append({'table': table_name, 'error': str(e)})
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'tables': {
+                name: {
+                    'ready': self.is_ready(name),
+                    'lag_seconds': round(now - self._synced_at[table_id], 1) if table_id in self._synced_at else None,
+                    'incremental': name in self._updated_on_fields,
+                }
+                for table_id, name in self._tables.items()
+            },
+            **dict(self.metrics),
+        }
@@ -0,0 +1,254 @@
+"""Baserow table schemas: field metadata, row decoders and payload encoders.
+
+Every request to Baserow is made with ``user_field_names=true``, so rows come
+back keyed by field name. The registry loads each table's field list once
+(``/api/database/fields/table/<id>/``), caches it on disk so restarts don't
+refetch it, and compiles a decoder that turns a raw row into a small slotted
+dataclass with one attribute lookup per field.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tables are sometimes referred to by an alias
+TABLE_ALIASES = {'Received': 'Recevied email'}
+
+
+@dataclass(slots=True)
+class Garage:
+    """A row of the 'Fix it' garage directory"""
+    id: Optional[int]
+    name: str
+    email: str
+    address: str
+    phone: str
+    website: str
+    reviews: str
+    specialties: str
+
+    @property
+    def phone_number(self) -> str:
+        return self.phone
+
+
+@dataclass(slots=True)
+class CustomerRequest:
+    """A row of 'Customer details' (one service request)"""
+    id: Optional[int]
+    name: str
+    email: str
+    phone: str
+    vin: str
+    brand: str
+    notes: str
+    date_time: str
+    sent_emails: str
+    plate_number: str
+
+
+@dataclass(slots=True)
+class ReceivedEmail:
+    """A row of 'Recevied email' (one garage reply)"""
+    id: Optional[int]
+    email: str
+    subject: str
+    body: str
+    received_at: str
+    vin: str
+    quote: str
+
+
+# Row type and attribute -> Baserow field name for each decoded table
+ROW_TYPES: Dict[str, Tuple[type, Dict[str, str]]] = {
+    'Fix it': (Garage, {
+        'name': 'Name',
+        'email': 'Email',
+        'address': 'Address',
+        'phone': 'Phone',
+        'website': 'Website',
+        'reviews': 'Reviews',
+        'specialties': 'Specialties',
+    }),
+    'Customer details': (CustomerRequest, {
+        'name': 'Name',
+        'email': 'Email',
+        'phone': 'Phone',
+        'vin': 'VIN',
+        'brand': 'Brand',
+        'notes': 'Notes',
+        'date_time': 'Date and Time',
+        'sent_emails': 'Sent Emails',
+        'plate_number': 'Plate Number',
+    }),
+    'Recevied email': (ReceivedEmail, {
+        'email': 'Email',
+        'subject': 'Subject',
+        'body': 'Body',
+        'received_at': 'Received At',
+        'vin': 'VIN',
+        'quote': 'Quote',
+    }),
+}
+
+
+def _compile_decoder(row_type: type, field_names: Tuple[str, ...]) -> Callable[[Dict[str, Any]], Any]:
+    def decode(row: Dict[str, Any]):
+        get = row.get
+        return row_type(get('id'), *[get(name) or '' for name in field_names])
+    return decode
+
+
+class TableSchema:
+    """Field metadata for one table plus its compiled decoder/encoder"""
+
+    def __init__(self, table_name: str, fields: List[Dict[str, Any]]):
+        self.table_name = TABLE_ALIASES.get(table_name, table_name)
+        self.fields = fields
+        self.ids: Dict[str, int] = {f['name']: int(f['id']) for f in fields}
+        self.names: Dict[int, str] = {field_id: name for name, field_id in self.ids.items()}
+
+        row_type, attributes = ROW_TYPES.get(self.table_name, (None, {}))
+        self.row_type = row_type
+        self._attributes = attributes
+        self._decode = _compile_decoder(row_type, tuple(attributes.values())) if row_type else None
+
+    def field_name(self, key: str) -> Optional[str]:
+        """Resolve a field name, ``field_<id>`` key or decoded attribute name"""
+        if key in self.ids:
+            return key
+        if key in self._attributes:
+            return self._attributes[key]
+        if key.startswith('field_') and key[6:].isdigit():
+            return self.names.get(int(key[6:]))
+        return None
+
+    def decode(self, row: Dict[str, Any]):
+        """Raw (name-keyed) row -> row dataclass"""
+        if self._decode is None:
+            raise KeyError(f"No row type for table {self.table_name}")
+        return self._decode(row)
+
+    def encode(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a write payload keyed by field name.
+
+        Keys may be field names or decoded attribute names; empty values are
+        dropped. Keys the table doesn't have are dropped with a warning,
+        since Baserow rejects the whole write otherwise. With no metadata at
+        all (unknown table) the values are passed through unchanged.
+        """
+        if not self.ids:
+            return {k: v for k, v in values.items() if v not in (None, '')}
+        payload = {}
+        for key, value in values.items():
+            if value in (None, ''):
+                continue
+            name = self.field_name(key)
+            if name is None:
+                logger.warning(f"Dropping unknown field {key!r} for table {self.table_name}")
+                continue
+            payload[name] = value
+        return payload
+
+
+class SchemaRegistry:
+    """Loads and caches :class:`TableSchema` objects for a Baserow service.
+
+    Field lists are fetched once per table and written to a JSON file
+    (``BASEROW_SCHEMA_CACHE``, ``backend/baserow_schema.json``), valid for ``BASEROW_SCHEMA_TTL`` seconds.
+    If Baserow can't be reached, the built-in ``seed`` field IDs are used
+    and the fetch is retried a few minutes later.
+    """
+
+    RETRY_AFTER = 300
+
+    def __init__(self, service, seed: Dict[str, Dict[str, int]]):
+        self.service = service
+        self.seed = seed
+        self.cache_path = os.getenv('BASEROW_SCHEMA_CACHE') or os.path.abspath(
+            os.path.join(os.path.dirname(__file__), '..', '..', 'baserow_schema.json'))
+        self.ttl = float(os.getenv('BASEROW_SCHEMA_TTL', 86400))
+        self._schemas: Dict[int, Tuple[TableSchema, float]] = {}
+        self._lock = threading.Lock()
+
+    def _read_disk(self) -> Dict[str, Any]:
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_disk(self, table_id: int, fields: List[Dict[str, Any]]):
+        cache = self._read_disk()
+        cache[str(table_id)] = {'loaded_at': time.time(), 'fields': fields}
+        tmp_path = f'{self.cache_path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write Baserow schema cache {self.cache_path}: {str(e)}")
+
+    def _load(self, table_name: str, table_id: int) -> Tuple[TableSchema, float]:
+        cached = self._read_disk().get(str(table_id))
+        if cached and time.time() - cached.get('loaded_at', 0) < self.ttl:
+            return TableSchema(table_name, cached['fields']), cached['loaded_at'] + self.ttl
+
+        try:
+            response = self.service._make_request('GET', f'/api/database/fields/table/{table_id}/')
+            fields = [
+                {'id': f['id'], 'name': f['name'], 'type': f.get('type'), 'primary': f.get('primary', False)}
+                for f in response
+            ]
+            self._write_disk(table_id, fields)
+            logger.info(f"Loaded {len(fields)} field(s) for Baserow table {table_name} ({table_id})")
+            return TableSchema(table_name, fields), time.time() + self.ttl
+        except Exception as e:
+            seed = self.seed.get(TABLE_ALIASES.get(table_name, table_name), {})
+            logger.warning(f"Could not load fields for {table_name}, using built-in field IDs: {str(e)}")
+            fields = [{'id': field_id, 'name': name} for name, field_id in seed.items()]
+            return TableSchema(table_name, fields), time.time() + self.RETRY_AFTER
+
+    def cached(self, table_name: str) -> Optional[TableSchema]:
+        """The loaded schema for ``table_name`` if it is still fresh; never does I/O"""
+        table_id = self.service.table_ids.get(table_name)
+        if not table_id:
+            return TableSchema(table_name, [])
+        entry = self._schemas.get(table_id)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def get(self, table_name: str) -> TableSchema:
+        table_id = self.service.table_ids.get(table_name)
+        if not table_id:
+            return TableSchema(table_name, [])
+        entry = self._schemas.get(table_id)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        with self._lock:
+            entry = self._schemas.get(table_id)
+            if entry is None or entry[1] <= time.time():
+                entry = self._load(table_name, table_id)
+                self._schemas[table_id] = entry
+            return entry[0]
+
+    def warm(self):
+        """Load every configured table's schema up front"""
+        for table_name, table_id in self.service.table_ids.items():
+            if table_id and table_name not in TABLE_ALIASES:
+                self.get(table_name)
+
+    def invalidate(self):
+        """Forget every loaded schema, in memory and on disk"""
+        with self._lock:
+            self._schemas.clear()
+            try:
+                os.remove(self.cache_path)
+            except OSError:
+                pass
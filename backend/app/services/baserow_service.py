@@ -1,13 +1,210 @@
 import os
+import re
+import math
+import time
+import threading
 import requests
 import logging
-from typing import Dict, List, Optional, Any
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Generator, Iterator, List, Optional, Any, Tuple
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import json
 
+from ..core.cache import FRESH, STALE, TTLCache
+from ..core.http import RetryPolicy, build_session, timeouts_from_env
+from ..core.limits import BACKGROUND, current_lane, get_limiter, lane
+from ..core.logging_config import lazy_json
+from ..core.singleflight import SingleFlight
+from .baserow_schema import TABLE_ALIASES, Garage, SchemaRegistry, TableSchema
+
 load_dotenv()
 
+# Process-wide cache of the parsed 'Fix it' garage directory, shared by the
+# sync and async clients. Fresh for GARAGE_CACHE_TTL seconds, then served
+# stale (while one background refresh runs) up to GARAGE_CACHE_STALE_TTL.
+# Writes to the 'Fix it' table through either client invalidate it.
+GARAGE_CACHE_KEY = 'Fix it'
+garage_cache = TTLCache(
+    'fix_it_garages',
+    ttl=float(os.getenv('GARAGE_CACHE_TTL', 300)),
+    stale_ttl=float(os.getenv('GARAGE_CACHE_STALE_TTL', 3600)),
+)
+
+# Built-in field IDs for the tables we query by field name. The live field
+# list comes from the schema registry (see baserow_schema.py); these are only
+# used when Baserow's field metadata can't be loaded.
+FIELD_IDS: Dict[str, Dict[str, int]] = {
+    'Customer details': {
+        'Name': 6389828,
+        'Phone': 6389829,
+        'Email': 6389830,
+        'VIN': 6389831,
+        'Notes': 6389832,
+        'Brand': 6389833,
+        'Date and Time': 6389834,
+        'Image': 6389835,
+        'Sent Emails': 6389836,
+        'Plate Number': 6389837,
+    },
+    'Fix it': {
+        'Name': 6389820,
+        'Address': 6389821,
+        'Phone': 6389822,
+        'Email': 6389823,
+        'Website': 6389824,
+        'Reviews': 6389825,
+        'Specialties': 6389826,
+    },
+    'Recevied email': {
+        'Email': 6389838,
+        'Subject': 6389839,
+        'Body': 6389840,
+        'Received At': 6389841,
+        'VIN': 6389842,
+    },
+}
+FIELD_IDS['Received'] = FIELD_IDS['Recevied email']
+
+# ``{Field} = "value"`` / ``{Field} = 'value'`` / ``{Field} = value``
+_CONDITION_RE = re.compile(
+    r"""\s*\{\s*([^}]+?)\s*\}\s*=\s*("[^"]*"|'[^']*'|[^,()"']*?)\s*(?:,|$)"""
+)
+_FIELD_KEY_RE = re.compile(r'^field_(\d+)$')
+
+# Baserow accepts at most this many rows per /batch/ request
+BATCH_SIZE = 200
+
+
+class BaserowAPIError(Exception):
+    """Baserow answered a request with an error status"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _strip_quotes(value: str) -> str:
+    value = value.strip()
+    if (value.startswith('"') and value.endswith('"')) or (
+        value.startswith("'") and value.endswith("'")
+    ):
+        return value[1:-1]
+    return value
+
+
+def parse_formula(formula: str) -> Optional[List[Tuple[str, str]]]:
+    """Parse a simple Airtable-style formula into ``(field, value)`` pairs.
+
+    Understands a single equality (``{VIN} = "ABC123"``) or an ``AND(...)``
+    of equalities. Returns ``None`` for anything else so callers can fall
+    back to client-side matching.
+    """
+    expr = (formula or '').strip()
+    if not expr:
+        return []
+    if expr.upper().startswith('AND(') and expr.endswith(')'):
+        expr = expr[4:-1]
+
+    conditions: List[Tuple[str, str]] = []
+    pos = 0
+    while pos < len(expr):
+        m = _CONDITION_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            return None
+        conditions.append((m.group(1).strip(), _strip_quotes(m.group(2))))
+        pos = m.end()
+    return conditions or None
+
+
+def _match_simple(expr: str, row: Dict[str, Any]) -> bool:
+    """Match a simple equality expression against a row.
+
+    Supports patterns like ``{VIN} = "ABC123"``.
+    If parsing fails, returns True (non-filtering) to avoid
+    accidentally dropping data.
+    """
+    expr = expr.strip()
+    m = re.match(r"^\{\s*([^}]+)\s*\}\s*=\s*(.+)$", expr)
+    if not m:
+        return True
+    field_name = m.group(1).strip()
+    raw_val = _strip_quotes(m.group(2).strip())
+    actual = row.get(field_name)
+    return str(actual).strip() == raw_val
+
+
+def formula_matches(formula: str, row: Dict[str, Any]) -> bool:
+    """Client-side evaluation of a simple Airtable-style formula."""
+    if not formula:
+        return True
+    expr = formula.strip()
+    # Handle AND(condition1, condition2, ...)
+    if expr.upper().startswith("AND(") and expr.endswith(")"):
+        inner = expr[4:-1]
+        parts = [p for p in inner.split(',') if p.strip()]
+        for part in parts:
+            if not _match_simple(part, row):
+                return False
+        return True
+    # Fallback: single simple condition
+    return _match_simple(expr, row)
+
+
+def resolve_conditions(
+    table_name: str, formula: str = "", filter_dict: Dict = None, field_ids: Optional[Dict[str, int]] = None
+) -> Optional[List[Tuple[str, str]]]:
+    """Translate ``formula``/``filter_dict`` into ``(field name, value)`` pairs.
+
+    Fields may be given by name or as ``field_<id>``. Returns ``None`` when
+    some condition references a field the table doesn't have, has an empty
+    value, or the formula is too complex to translate.
+    """
+    conditions = parse_formula(formula)
+    if conditions is None:
+        return None
+    if filter_dict and filter_dict.get('field'):
+        conditions.append((filter_dict['field'], filter_dict.get('value')))
+
+    if field_ids is None:
+        field_ids = FIELD_IDS.get(table_name, {})
+    names_by_id = {field_id: name for name, field_id in field_ids.items()}
+    resolved: Dict[str, str] = {}
+    for field, value in conditions:
+        key_match = _FIELD_KEY_RE.match(field)
+        name = names_by_id.get(int(key_match.group(1))) if key_match else (field if field in field_ids else None)
+        if not name or value is None or str(value) == '':
+            # Baserow ignores empty-valued filters, which would widen the
+            # result instead of narrowing it.
+            return None
+        if name in resolved and resolved[name] != str(value):
+            # Two different values for one field can never match; let the
+            # client-side path deal with that oddity.
+            return None
+        resolved[name] = str(value)
+    return list(resolved.items())
+
+
+def build_filter_params(
+    table_name: str, formula: str = "", filter_dict: Dict = None, field_ids: Optional[Dict[str, int]] = None
+) -> Optional[Dict[str, str]]:
+    """Translate ``formula``/``filter_dict`` into Baserow query parameters.
+
+    Returns a (possibly empty) dict of ``filter__<field name>__equal``
+    params (requests are made with ``user_field_names``), or ``None`` when
+    the filter can't be expressed server-side, see :func:`resolve_conditions`.
+    """
+    conditions = resolve_conditions(table_name, formula, filter_dict, field_ids)
+    if conditions is None:
+        return None
+    if not conditions:
+        return {}
+    params = {f'filter__{name}__equal': value for name, value in conditions}
+    params['filter_type'] = 'AND'
+    return params
+
+
 class BaserowService:
     """Service for interacting with Baserow database"""
     
@@ -37,43 +234,107 @@ class BaserowService:
             'Service Requests': int(os.getenv('BASEROW_TABLE_SERVICE_REQUESTS', 0)),
         }
         
+        # Shared keep-alive transport: one pooled session for every call to
+        # the Baserow host, with retry/backoff on 429/502/503/504.
+        self.pool_size = int(os.getenv('BASEROW_POOL_SIZE', 10))
+        self.retry_policy = RetryPolicy.from_env('BASEROW')
+        self.timeout = timeouts_from_env('BASEROW')
+        self.session = build_session(pool_size=self.pool_size, connect_retries=self.retry_policy.max_retries)
+        # Shared with the async client: caps Baserow calls in flight and per
+        # second, user-facing calls first (see app.core.limits)
+        self.limiter = get_limiter('baserow')
+        # Identical reads issued at the same moment share one request
+        self.reads = SingleFlight('baserow_reads')
+        
+        # Large reads: Baserow's maximum page size, and how many pages may be
+        # fetched concurrently once the first page has told us the row count
+        # (1 = strictly sequential).
+        self.page_size = min(int(os.getenv('BASEROW_PAGE_SIZE', 200)), 200)
+        self.page_fanout = max(1, int(os.getenv('BASEROW_PAGE_FANOUT', 4)))
+        self._page_executor = ThreadPoolExecutor(max_workers=self.page_fanout, thread_name_prefix='baserow-page')
+        
+        # Operational counters (e.g. how often filters fall back to a
+        # client-side scan) for monitoring.
+        self.metrics: Counter = Counter()
+        
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"Initializing Baserow service for database {self.database_id}")
+        
+        # Field metadata per table, loaded on first use
+        self.schemas = SchemaRegistry(self, FIELD_IDS)
+        
+        # Optional local read-replica of the tables the scheduler scans
+        from .baserow_replica import BaserowReplica, replica_enabled
+        self.replica: Optional[BaserowReplica] = BaserowReplica(self) if replica_enabled() else None
+        
+        # Which garage replies are already stored, so storing one needs no scan
+        from .received_email_index import ReceivedEmailIndex
+        self.received_index = ReceivedEmailIndex(self)
+    
+    def _raise_api_error(self, status_code: int, text: str):
+        """Log a Baserow error response in detail and raise"""
+        error_msg = text
+        try:
+            error_json = json.loads(text)
+            error_msg = error_json.get('error', error_msg)
+            # Log detailed error for debugging
+            self.logger.error(f"API Error ({status_code}): {error_msg}")
+            self.logger.error("Full error response: %s", lazy_json(error_json))
+            if 'detail' in error_json:
+                self.logger.error(f"Error details: {error_json['detail']}")
+            # Log field-specific errors for validation issues
+            if isinstance(error_json, dict):
+                for key, value in error_json.items():
+                    if key not in ['error', 'detail']:
+                        self.logger.error(f"Field error [{key}]: {value}")
+        except:
+            self.logger.error(f"Raw error response: {text}")
+        raise BaserowAPIError(f"Baserow API error: {error_msg}", status_code)
     
     def _make_request(self, method: str, endpoint: str, data: Dict = None, params: Dict = None) -> Dict:
         """Make HTTP request to Baserow API"""
         url = f'{self.base_url}{endpoint}'
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=self.headers, params=params, timeout=30)
-            elif method == 'POST':
-                response = requests.post(url, headers=self.headers, json=data, params=params, timeout=30)
-            elif method == 'PATCH':
-                response = requests.patch(url, headers=self.headers, json=data, timeout=30)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=self.headers, timeout=30)
-            else:
+            if method not in ('GET', 'POST', 'PATCH', 'DELETE'):
                 raise ValueError(f"Unsupported method: {method}")
             
-            if response.status_code >= 400:
-                error_msg = response.text
+            # Rows are always read and written by field name
+            request_params = {'user_field_names': 'true', **(params or {})}
+            attempt = 0
+            while True:
                 try:
-                    error_json = response.json()
-                    error_msg = error_json.get('error', error_msg)
-                    # Log detailed error for debugging
-                    self.logger.error(f"API Error ({response.status_code}): {error_msg}")
-                    self.logger.error(f"Full error response: {json.dumps(error_json, indent=2)}")
-                    if 'detail' in error_json:
-                        self.logger.error(f"Error details: {error_json['detail']}")
-                    # Log field-specific errors for validation issues
-                    if isinstance(error_json, dict):
-                        for key, value in error_json.items():
-                            if key not in ['error', 'detail']:
-                                self.logger.error(f"Field error [{key}]: {value}")
-                except:
-                    self.logger.error(f"Raw error response: {response.text}")
-                raise Exception(f"Baserow API error: {error_msg}")
+                    with self.limiter.slot():
+                        response = self.session.request(
+                            method, url, headers=self.headers, json=data, params=request_params, timeout=self.timeout
+                        )
+                except requests.exceptions.ReadTimeout:
+                    if not self.retry_policy.should_retry_timeout(method, attempt):
+                        raise
+                    delay = self.retry_policy.delay(attempt)
+                    self.logger.warning(f"Read timeout on {method} {url}, retrying in {delay:.1f}s")
+                    self.metrics['http_retries'] += 1
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                
+                if self.retry_policy.should_retry_status(method, response.status_code, attempt):
+                    delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+                    self.logger.warning(
+                        f"Baserow returned {response.status_code} for {method} {url}, "
+                        f"retry {attempt + 1}/{self.retry_policy.max_retries} in {delay:.1f}s"
+                    )
+                    self.metrics['http_retries'] += 1
+                    if response.status_code == 429:
+                        self.limiter.pause(delay)
+                    response.close()
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                break
+            
+            if response.status_code >= 400:
+                self._raise_api_error(response.status_code, response.text)
             
             return response.json() if response.text else {}
             
@@ -84,77 +345,320 @@ class BaserowService:
             self.logger.error(f"Request failed: {str(e)}")
             raise
     
-    def get_fix_it_garages(self) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _rows_endpoint(table_id: int, record_id: Optional[int] = None) -> str:
+        endpoint = f'/api/database/rows/table/{table_id}/'
+        return f'{endpoint}{record_id}/' if record_id is not None else endpoint
+    
+    def _page_params(self, params: Optional[Dict[str, Any]], page: int) -> Dict[str, Any]:
+        return {'size': self.page_size, **(params or {}), 'page': page}
+    
+    def _remaining_pages(self, first_page: Dict[str, Any]) -> range:
+        """Pages still to fetch after page 1, judged from its ``count``"""
+        if not first_page.get('next'):
+            return range(0)
+        total_pages = math.ceil((first_page.get('count') or 0) / self.page_size)
+        return range(2, max(total_pages, 2) + 1)
+    
+    @staticmethod
+    def _past_last_page(error: Exception) -> bool:
+        """Whether ``error`` is Baserow saying a page no longer exists (rows were deleted)"""
+        return isinstance(error, BaserowAPIError) and error.status_code == 404
+    
+    @staticmethod
+    def _unique_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """``rows`` without the repeats a shift between pages causes, first one kept"""
+        seen = set()
+        unique = []
+        for row in rows:
+            row_id = row.get('id')
+            if row_id is not None:
+                if row_id in seen:
+                    continue
+                seen.add(row_id)
+            unique.append(row)
+        return unique
+    
+    def _short_read(self, first_page: Dict[str, Any], rows: List[Dict[str, Any]], table_id: int) -> bool:
+        """Whether a fanned-out read came back with fewer rows than page 1 counted.
+        
+        Rows deleted while the pages were being read shift later rows onto
+        pages already fetched, so some were never seen: the caller should
+        read the table again, page after page.
         """
-        Fetch all garages from 'Fix it' table
+        count = first_page.get('count') or 0
+        if len(rows) >= count:
+            return False
+        self.metrics['page_rereads'] += 1
+        self.logger.warning(f"Read {len(rows)} of {count} row(s) from table {table_id}, rows moved between pages; reading again in order")
+        return True
+    
+    def _fetch_page(self, endpoint: str, params: Optional[Dict[str, Any]], page: int) -> Dict[str, Any]:
+        """One list-rows page; a page past the end (after page 1) reads as empty"""
+        try:
+            return self._make_request('GET', endpoint, params=self._page_params(params, page))
+        except BaserowAPIError as e:
+            if page == 1 or not self._past_last_page(e):
+                raise
+            self.metrics['pages_past_end'] += 1
+            return {'results': [], 'next': None}
+    
+    def _fetch_rows_in_order(self, endpoint: str, params: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Every row, one page at a time, following ``next`` until it runs out"""
+        rows, page = [], 1
+        while True:
+            response = self._fetch_page(endpoint, params, page)
+            rows.extend(response.get('results', []))
+            if not response.get('next'):
+                return self._unique_rows(rows)
+            page += 1
+    
+    def _fetch_all_rows(self, table_id: int, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Fetch every row of a (possibly filtered) list-rows query.
+        
+        The first page reports ``count``; the remaining pages are then
+        requested concurrently (at most ``page_fanout`` at a time) and
+        stitched back together in page order. A page that has stopped
+        existing counts as the end, and if rows were lost to deletions
+        shifting the pages, the query is read again sequentially.
+        """
+        endpoint = self._rows_endpoint(table_id)
+        first = self._fetch_page(endpoint, params, 1)
+        rows = list(first.get('results', []))
+        
+        pages = self._remaining_pages(first)
+        if self.page_fanout > 1 and len(pages) > 1:
+            # Pool threads don't inherit the caller's priority lane
+            priority = current_lane()
+            
+            def fetch_page(page: int) -> Dict[str, Any]:
+                with lane(priority):
+                    return self._fetch_page(endpoint, params, page)
+            
+            responses = list(self._page_executor.map(fetch_page, pages))
+        else:
+            responses = [self._fetch_page(endpoint, params, page) for page in pages]
+        for response in responses:
+            rows.extend(response.get('results', []))
+        
+        # Rows added while we were reading can spill onto pages past the
+        # count we planned for; pick those up sequentially.
+        last = responses[-1] if responses else first
+        page = pages[-1] if pages else 1
+        while last.get('next'):
+            page += 1
+            last = self._fetch_page(endpoint, params, page)
+            rows.extend(last.get('results', []))
+        
+        rows = self._unique_rows(rows)
+        if self._short_read(first, rows, table_id):
+            rows = self._fetch_rows_in_order(endpoint, params)
+        return rows
+    
+    @staticmethod
+    def _read_key(table_id: int, params: Optional[Dict[str, Any]]) -> Tuple:
+        return ('rows', table_id, tuple(sorted((params or {}).items())))
+    
+    def _read_rows(self, table_id: int, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """:meth:`_fetch_all_rows`, coalesced with identical reads already in flight"""
+        return self.reads.do(self._read_key(table_id, params), lambda: self._fetch_all_rows(table_id, params))
+    
+    def schema(self, table_name: str) -> TableSchema:
+        """Field metadata and row decoder/encoder for ``table_name``"""
+        return self.schemas.get(table_name)
+    
+    def _parse_garage(self, record: Dict[str, Any], schema: Optional[TableSchema] = None) -> Optional[Garage]:
+        """Decode a raw 'Fix it' row into a :class:`Garage`, or None if it has no valid email"""
+        garage = (schema or self.schema('Fix it')).decode(record)
+        
+        # Only add garages with valid email
+        if garage.email and '@' in garage.email:
+            self.logger.debug("✅ Loaded garage: %s (%s)", garage.name, garage.email)
+            return garage
+        self.logger.warning(f"⚠️ Skipping garage '{garage.name}' - invalid email")
+        return None
+    
+    def _load_fix_it_garages(self) -> List[Garage]:
+        """Read and parse the 'Fix it' table from Baserow, bypassing the cache"""
+        table_id = self.table_ids['Fix it']
+        self.logger.info(f"🔍 Fetching garages from Fix it table (ID: {table_id})")
+        
+        rows = self._from_replica('Fix it', 'rows')
+        if rows is None:
+            rows = self._read_rows(table_id)
+        
+        schema = self.schema('Fix it')
+        garages = []
+        for record in rows:
+            garage = self._parse_garage(record, schema)
+            if garage:
+                garages.append(garage)
+        
+        self.logger.info(f"📧 Total valid garages: {len(garages)}")
+        return garages
+    
+    def _refresh_fix_it_garages(self):
+        """Background revalidation of a stale garage cache entry"""
+        try:
+            generation = garage_cache.generation()
+            garages = self.reads.do((GARAGE_CACHE_KEY, generation), self._load_fix_it_garages)
+            garage_cache.store(GARAGE_CACHE_KEY, garages, generation)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Garage cache refresh failed, keeping stale entry: {str(e)}")
+        finally:
+            garage_cache.end_refresh(GARAGE_CACHE_KEY)
+    
+    def _revalidate_garages_in_background(self):
+        """Start a refresh thread unless one is already running.
+
+        A plain thread rather than an asyncio task so the refresh survives
+        short-lived event loops used by background helpers.
+        """
+        if garage_cache.begin_refresh(GARAGE_CACHE_KEY):
+            threading.Thread(target=self._refresh_garages_in_background, name='garage-cache-refresh', daemon=True).start()
+    
+    def _refresh_garages_in_background(self):
+        with lane(BACKGROUND):
+            self._refresh_fix_it_garages()
+    
+    def get_fix_it_garages(self) -> List[Garage]:
+        """
+        Fetch all garages from 'Fix it' table (cached, see ``garage_cache``)
         
         Returns:
-            List of garage dictionaries with name, email, address, etc.
+            List of :class:`Garage` rows with name, email, address, etc.
         """
+        state, garages = garage_cache.lookup(GARAGE_CACHE_KEY)
+        if state == STALE:
+            self._revalidate_garages_in_background()
+        if state in (FRESH, STALE):
+            return list(garages)
+        
         try:
-            table_id = self.table_ids['Fix it']
-            self.logger.info(f"🔍 Fetching garages from Fix it table (ID: {table_id})")
-            
-            garages = []
-            page = 1
-            
-            while True:
-                endpoint = f'/api/database/rows/table/{table_id}/'
-                params = {'page': page, 'size': 100}
-                
-                response = self._make_request('GET', endpoint, params=params)
-                
-                for record in response.get('results', []):
-                    # Baserow returns fields by ID, try both field names and field IDs
-                    # Field mapping for Fix it table:
-                    # field_6389820 = Name
-                    # field_6389821 = Address
-                    # field_6389822 = Phone
-                    # field_6389823 = Email
-                    # field_6389824 = Website
-                    # field_6389825 = Reviews
-                    # field_6389826 = Specialties
-                    
-                    name = record.get('Name') or record.get('field_6389820', '')
-                    email = record.get('Email') or record.get('field_6389823', '')
-                    address = record.get('Address') or record.get('field_6389821', '')
-                    phone_value = record.get('Phone') or record.get('field_6389822', '')
-                    website = record.get('Website') or record.get('field_6389824', '')
-                    reviews = record.get('Reviews') or record.get('field_6389825', '')
-                    specialties = record.get('Specialties') or record.get('field_6389826', '')
-                    
-                    garage = {
-                        'id': record.get('id'),
-                        'name': name,
-                        'email': email,
-                        'address': address,
-                        # Expose both 'phone' and 'phone_number' for compatibility
-                        'phone': phone_value,
-                        'phone_number': phone_value,
-                        'website': website,
-                        'specialties': specialties,
-                        'reviews': reviews
-                    }
-                    
-                    # Only add garages with valid email
-                    if garage['email'] and '@' in garage['email']:
-                        garages.append(garage)
-                        self.logger.info(f"✅ Loaded garage: {garage['name']} ({garage['email']})")
-                    else:
-                        self.logger.warning(f"⚠️ Skipping garage '{garage['name']}' - invalid email")
-                
-                # Check if there are more pages
-                if not response.get('next'):
-                    break
-                page += 1
-            
-            self.logger.info(f"📧 Total valid garages: {len(garages)}")
-            return garages
+            # Loads started before an invalidation are neither joined nor cached
+            generation = garage_cache.generation()
+            garages = self.reads.do((GARAGE_CACHE_KEY, generation), self._load_fix_it_garages)
+            garage_cache.store(GARAGE_CACHE_KEY, garages, generation)
+            return list(garages)
             
         except Exception as e:
             self.logger.error(f"❌ Error fetching garages: {str(e)}", exc_info=True)
             return []
     
+    def invalidate_garage_cache(self):
+        """Drop the cached garage directory so the next read hits Baserow"""
+        garage_cache.invalidate(GARAGE_CACHE_KEY)
+        self.logger.info("🧹 Garage directory cache invalidated")
+    
+    def _after_write(self, table_name: str, row: Optional[Dict[str, Any]] = None, deleted_id: Optional[int] = None,
+                     message_id: Optional[str] = None):
+        """Hook run after every row write: cache invalidation, reply index and replica write-through"""
+        if deleted_id is not None:
+            self._after_writes(table_name, deleted_ids=[deleted_id])
+        else:
+            self._after_writes(table_name, [row] if row else [], message_ids=[message_id])
+    
+    def _after_writes(self, table_name: str, rows: List[Dict[str, Any]] = (), deleted_ids: List[int] = (),
+                      message_ids: List[Optional[str]] = ()):
+        """:meth:`_after_write` for a batch of rows; the reply index is updated in one transaction"""
+        if table_name == GARAGE_CACHE_KEY:
+            self.invalidate_garage_cache()
+        if TABLE_ALIASES.get(table_name, table_name) == 'Recevied email':
+            try:
+                if deleted_ids:
+                    self.received_index.discard_rows(deleted_ids)
+                written = [(row, message_id) for row, message_id in zip(rows, list(message_ids) + [None] * len(rows))
+                           if row and row.get('id') is not None]
+                if written:
+                    self.received_index.add_rows(*zip(*written))
+            except Exception as e:
+                self.logger.warning(f"Could not update the received-email index: {str(e)}")
+        if self.replica is not None:
+            for deleted_id in deleted_ids:
+                self.replica.apply_delete(table_name, deleted_id)
+            for row in rows:
+                self.replica.apply_write(table_name, row)
+    
+    def _from_replica(self, table_name: str, method: str, *args):
+        """Serve a read from the local replica when it holds ``table_name``.
+        
+        Returns None when the caller should go to Baserow instead.
+        """
+        if self.replica is None or not self.replica.is_ready(table_name):
+            return None
+        try:
+            return getattr(self.replica, method)(table_name, *args)
+        except Exception as e:
+            self.logger.warning(f"Replica read from {table_name} failed, using Baserow: {str(e)}")
+            return None
+    
+    def _build_customer_payload(self, data: dict) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Validate customer form data and map it to 'Customer details' fields
+        
+        Returns:
+            Tuple of (payload, error message); payload is None when invalid
+        """
+        # Validate required fields
+        if not data.get('Name') or not data.get('Email'):
+            error_msg = "Name and Email are required"
+            self.logger.error(error_msg)
+            return None, error_msg
+
+        values = {
+            'name': (data.get('Name') or '').strip(),
+            'email': (data.get('Email') or '').strip(),
+            'vin': str(data.get('VIN') or '').strip(),
+            'phone': str(data.get('Phone') or data.get('phone') or data.get('phone_number') or '').strip(),
+            'brand': str(data.get('Brand') or data.get('car_brand') or data.get('carBrand') or '').strip(),
+            'plate_number': str(data.get('Plate Number') or data.get('License Plate') or data.get('license_plate') or '').strip(),
+            'notes': str(data.get('Notes') or data.get('Note') or data.get('notes') or '').strip(),
+            # Baserow datetime fields take ISO format with timezone; queued
+            # submissions keep the time they were made
+            'date_time': data.get('Date and Time') or datetime.now(timezone.utc).isoformat(),
+        }
+
+        # Handle images
+        # NOTE: Baserow file/image fields require file uploads, not URLs
+        # Solution: Store Cloudinary URLs in the Sent Emails text field
+        if data.get('Image'):
+            images = data['Image']
+            if not isinstance(images, list):
+                images = [images]
+
+            # Extract URLs from image data
+            image_urls = []
+            for img in images:
+                if isinstance(img, dict) and 'url' in img:
+                    image_urls.append(img['url'])
+                elif isinstance(img, str):
+                    image_urls.append(img)
+
+            # This allows us to preserve the image URLs while avoiding file field validation errors
+            if image_urls:
+                # Store as newline-separated URLs for better readability
+                values['sent_emails'] = '\n'.join(image_urls)
+                self.logger.debug("Stored %s image URLs in Sent Emails", len(image_urls))
+                self.logger.debug("Image URLs: %s", values['sent_emails'])
+
+        schema = self.schema('Customer details')
+        payload = schema.encode(values)
+
+        self.logger.info(f"Creating customer record for {data.get('Email')}")
+        self.logger.debug("Payload being sent: %s", lazy_json(payload))
+        self.logger.debug("Payload keys: %s", list(payload.keys()))
+
+        # Validate payload has required fields
+        required_fields = [schema.field_name('name'), schema.field_name('email')]
+        missing_fields = [f for f in required_fields if f not in payload]
+        if missing_fields:
+            error_msg = f"Missing required fields in payload: {missing_fields}"
+            self.logger.error(error_msg)
+            return None, error_msg
+
+        self.logger.debug("Payload validation passed for %s fields", len(payload))
+        return payload, None
+    
     def create_customer(self, data: dict) -> Dict[str, Any]:
         """
         Create a new customer record in 'Customer details' table
@@ -167,8 +671,8 @@ class BaserowService:
         """
         try:
             table_id = self.table_ids['Customer details']
-            self.logger.info(f"🔍 DEBUG: Customer details table ID: {table_id}")
-            self.logger.info(f"🔍 DEBUG: All table IDs: {self.table_ids}")
+            self.logger.debug("Customer details table ID: %s", table_id)
+            self.logger.debug("All table IDs: %s", self.table_ids)
             
             # Validate table ID
             if not table_id or table_id == 0:
@@ -176,136 +680,17 @@ class BaserowService:
                 self.logger.error(error_msg)
                 return {'success': False, 'error': error_msg, 'record_id': None}
             
-            # Validate required fields
-            if not data.get('Name') or not data.get('Email'):
-                error_msg = "Name and Email are required"
-                self.logger.error(error_msg)
-                return {'success': False, 'error': error_msg, 'record_id': None}
-            
-            # Prepare payload with field IDs for Customer details table
-            # Customer details table field mappings:
-            # field_6389828 = Name
-            # field_6389829 = Phone
-            # field_6389830 = Email
-            # field_6389831 = VIN
-            # field_6389832 = Notes
-            # field_6389833 = Brand
-            # field_6389834 = Date and Time
-            # field_6389835 = Image
-            # field_6389836 = Sent Emails
-            # field_6389837 = Plate Number
-            
-            payload = {}
-            
-            # Name (required) - field_6389828
-            name_value = (data.get('Name') or '').strip()
-            if name_value:
-                payload['field_6389828'] = name_value
-            
-            # Email (required) - field_6389830
-            email_value = (data.get('Email') or '').strip()
-            if email_value:
-                payload['field_6389830'] = email_value
-
-            # VIN - field_6389831
-            vin_value = data.get('VIN')
-            if vin_value:
-                payload['field_6389831'] = str(vin_value).strip()
-
-            # Phone - field_6389829
-            phone_value = data.get('Phone') or data.get('phone') or data.get('phone_number')
-            if phone_value:
-                payload['field_6389829'] = str(phone_value).strip()
-
-            # Brand - field_6389833
-            brand_value = data.get('Brand') or data.get('car_brand') or data.get('carBrand')
-            if brand_value:
-                payload['field_6389833'] = str(brand_value).strip()
-
-            # Plate Number - field_6389837
-            plate_value = data.get('Plate Number') or data.get('License Plate') or data.get('license_plate')
-            if plate_value:
-                payload['field_6389837'] = str(plate_value).strip()
-
-            # Notes - field_6389832
-            notes_value = data.get('Notes') or data.get('Note') or data.get('notes')
-            if notes_value:
-                payload['field_6389832'] = str(notes_value).strip()
-            
-            # Date and Time - field_6389834
-            # Baserow expects date-time in ISO format without timezone info for date fields
-            # or with timezone for datetime fields
-            try:
-                # Try ISO format with timezone first (for datetime fields)
-                payload['field_6389834'] = datetime.now(timezone.utc).isoformat()
-            except Exception as e:
-                self.logger.warning(f"Could not set date field with timezone: {e}, trying without timezone")
-                # Fallback to just the date part if datetime field doesn't work
-                payload['field_6389834'] = datetime.now().isoformat()
-            
-            # Handle images - field_6389835 (Image file field) and field_6389836 (Sent Emails text field)
-            # NOTE: Baserow file/image fields require file uploads, not URLs
-            # Solution: Store Cloudinary URLs in the Sent Emails text field (field_6389836)
-            if data.get('Image'):
-                images = data['Image']
-                if not isinstance(images, list):
-                    images = [images]
-                
-                # Extract URLs from image data
-                image_urls = []
-                for img in images:
-                    if isinstance(img, dict) and 'url' in img:
-                        image_urls.append(img['url'])
-                    elif isinstance(img, str):
-                        image_urls.append(img)
-                
-                # Store image URLs in the Sent Emails text field (field_6389836)
-                # This allows us to preserve the image URLs while avoiding file field validation errors
-                if image_urls:
-                    # Store as newline-separated URLs for better readability
-                    image_urls_str = '\n'.join(image_urls)
-                    payload['field_6389836'] = image_urls_str
-                    self.logger.info(f"🔍 DEBUG: Stored {len(image_urls)} image URLs in field_6389836")
-                    self.logger.info(f"🔍 DEBUG: Image URLs: {image_urls_str}")
-            
-            self.logger.info(f"Creating customer record for {data.get('Email')}")
-            self.logger.info(f"🔍 DEBUG: Payload being sent: {json.dumps(payload, indent=2)}")
-            self.logger.info(f"🔍 DEBUG: Payload keys: {list(payload.keys())}")
-            
-            # Validate payload has required fields
-            required_fields = ['field_6389828', 'field_6389830']  # Name and Email
-            missing_fields = [f for f in required_fields if f not in payload]
-            if missing_fields:
-                error_msg = f"Missing required fields in payload: {missing_fields}"
-                self.logger.error(error_msg)
+            payload, error_msg = self._build_customer_payload(data)
+            if error_msg:
                 return {'success': False, 'error': error_msg, 'record_id': None}
             
-            # Validate field values
-            for field_id, value in payload.items():
-                if field_id in ['field_6389828', 'field_6389830']:  # Name and Email
-                    if not value or (isinstance(value, str) and not value.strip()):
-                        error_msg = f"Empty value for required field {field_id}"
-                        self.logger.error(error_msg)
-                        return {'success': False, 'error': error_msg, 'record_id': None}
-                
-                # Check for field type issues
-                if field_id == 'field_6389835' and isinstance(value, list):  # Image field
-                    # Ensure all items are valid dicts with 'url' key
-                    for item in value:
-                        if isinstance(item, dict):
-                            if 'url' not in item or not item['url']:
-                                self.logger.warning(f"Invalid image object - missing or empty 'url': {item}")
-                        else:
-                            self.logger.warning(f"Image field expects dict with 'url' key, got: {type(item)}")
-            
-            self.logger.info(f"🔍 DEBUG: Payload validation passed for {len(payload)} fields")
-            
             endpoint = f'/api/database/rows/table/{table_id}/'
-            self.logger.info(f"🔍 DEBUG: Endpoint: {endpoint}")
-            self.logger.info(f"🔍 DEBUG: API Token present: {bool(self.api_token)}")
+            self.logger.debug("Endpoint: %s", endpoint)
+            self.logger.debug("API Token present: %s", bool(self.api_token))
             response = self._make_request('POST', endpoint, data=payload)
-            self.logger.info(f"🔍 DEBUG: Response: {json.dumps(response, indent=2)}")
-            self.logger.info(f"🔍 DEBUG: Response keys: {list(response.keys()) if response else 'None'}")
+            self._after_write('Customer details', response)
+            self.logger.debug("Response: %s", lazy_json(response))
+            self.logger.debug("Response keys: %s", list(response.keys()) if response else 'None')
             
             record_id = response.get('id')
             self.logger.info(f"✅ Created customer record: {record_id}")
@@ -325,6 +710,49 @@ class BaserowService:
                 'error': error_msg
             }
     
+    def _resolve_filter(self, table_name: str, formula: str, filter_dict: Optional[Dict]) -> Tuple[Dict[str, str], bool]:
+        """Return ``(query params, client_side)`` for a list-rows call.
+
+        ``client_side`` is True when the filter couldn't be translated into
+        Baserow parameters and has to be applied to every fetched row.
+        """
+        filter_params = build_filter_params(table_name, formula, filter_dict, self.schema(table_name).ids)
+        if filter_params is None:
+            self.metrics['filter_client_fallback'] += 1
+            self.logger.debug(
+                f"Filter on {table_name} not expressible server-side, scanning client-side: "
+                f"formula={formula!r} filter_dict={filter_dict!r}"
+            )
+            return {}, True
+        if filter_params:
+            self.metrics['filter_server_side'] += 1
+        return filter_params, False
+
+    @staticmethod
+    def _wrap_rows(
+        rows: List[Dict[str, Any]], formula: str, filter_dict: Optional[Dict], client_side: bool
+    ) -> List[Dict[str, Any]]:
+        """Apply any client-side filter and wrap rows in the Airtable shape"""
+        wrapped = []
+        for raw in rows:
+            if client_side:
+                # Apply formula-based filtering first
+                if not formula_matches(formula, raw):
+                    continue
+
+                # Optional simple client-side filter on a single field
+                if filter_dict:
+                    field = filter_dict.get('field')
+                    value = filter_dict.get('value')
+                    if field and raw.get(field) != value:
+                        continue
+
+            wrapped.append({
+                'id': raw.get('id'),
+                'fields': raw,
+            })
+        return wrapped
+
     def get_records(self, table_name: str, formula: str = "", filter_dict: Dict = None) -> List[Dict[str, Any]]:
         """Get records from a table with optional filtering.
 
@@ -337,6 +765,12 @@ class BaserowService:
         - Simple equality: ``{VIN} = "ABC123"`` or ``{VIN} = 'ABC123'``
         - AND of equalities: ``AND({Email}="x", {Subject}="y")``
 
+        Filters on fields the table has are sent to Baserow as
+        ``filter__<field>__equal`` parameters so only matching rows are
+        transferred. Anything that can't be translated is evaluated
+        client-side over the full table (counted in
+        ``metrics['filter_client_fallback']``).
+
         Args:
             table_name: Logical table name (e.g. ``'Customer details'``).
             formula: Simple Airtable-style formula used in existing code.
@@ -352,77 +786,14 @@ class BaserowService:
             if not table_id:
                 raise ValueError(f"Unknown table: {table_name}")
 
-            import re
-
-            def _strip_quotes(value: str) -> str:
-                value = value.strip()
-                if (value.startswith('"') and value.endswith('"')) or (
-                    value.startswith("'") and value.endswith("'")
-                ):
-                    return value[1:-1]
-                return value
-
-            def _match_simple(expr: str, row: Dict[str, Any]) -> bool:
-                """Match a simple equality expression against a row.
-
-                Supports patterns like ``{VIN} = "ABC123"``.
-                If parsing fails, returns True (non-filtering) to avoid
-                accidentally dropping data.
-                """
-                expr = expr.strip()
-                m = re.match(r"^\{\s*([^}]+)\s*\}\s*=\s*(.+)$", expr)
-                if not m:
-                    return True
-                field_name = m.group(1).strip()
-                raw_val = _strip_quotes(m.group(2).strip())
-                actual = row.get(field_name)
-                return str(actual).strip() == raw_val
-
-            def _formula_matches(row: Dict[str, Any]) -> bool:
-                if not formula:
-                    return True
-                expr = formula.strip()
-                # Handle AND(condition1, condition2, ...)
-                if expr.upper().startswith("AND(") and expr.endswith(")"):
-                    inner = expr[4:-1]
-                    parts = [p for p in inner.split(',') if p.strip()]
-                    for part in parts:
-                        if not _match_simple(part, row):
-                            return False
-                    return True
-                # Fallback: single simple condition
-                return _match_simple(expr, row)
-
-            records: List[Dict[str, Any]] = []
-            page = 1
+            records = self._from_replica(table_name, 'get_records', formula, filter_dict)
+            if records is not None:
+                return records
 
-            while True:
-                endpoint = f'/api/database/rows/table/{table_id}/'
-                params = {'page': page, 'size': 100}
-
-                response = self._make_request('GET', endpoint, params=params)
-
-                for raw in response.get('results', []):
-                    # Apply formula-based filtering first
-                    if not _formula_matches(raw):
-                        continue
-
-                    # Optional simple client-side filter on a single field
-                    if filter_dict:
-                        field = filter_dict.get('field')
-                        value = filter_dict.get('value')
-                        if field and raw.get(field) != value:
-                            continue
+            filter_params, client_side = self._resolve_filter(table_name, formula, filter_dict)
 
-                    wrapped = {
-                        'id': raw.get('id'),
-                        'fields': raw,
-                    }
-                    records.append(wrapped)
-
-                if not response.get('next'):
-                    break
-                page += 1
+            rows = self._read_rows(table_id, filter_params)
+            records = self._wrap_rows(rows, formula, filter_dict, client_side)
 
             return records
 
@@ -430,6 +801,41 @@ class BaserowService:
             self.logger.error(f"Error getting records from {table_name}: {str(e)}")
             return []
     
+    def iter_records(self, table_name: str, formula: str = "", filter_dict: Dict = None) -> Iterator[Dict[str, Any]]:
+        """Yield records one page at a time instead of building the whole list.
+        
+        Takes the same filters as :meth:`get_records` and yields the same
+        Airtable-style ``{'id', 'fields'}`` records. The next page is only
+        requested once the caller has consumed the current one, so breaking
+        out of the loop early stops the download.
+        """
+        table_id = self.table_ids.get(table_name)
+        if not table_id:
+            self.logger.error(f"Error iterating records from {table_name}: Unknown table: {table_name}")
+            return
+        
+        records = self._from_replica(table_name, 'get_records', formula, filter_dict)
+        if records is not None:
+            yield from records
+            return
+        
+        filter_params, client_side = self._resolve_filter(table_name, formula, filter_dict)
+        endpoint = f'/api/database/rows/table/{table_id}/'
+        page = 1
+        
+        while True:
+            try:
+                response = self._make_request('GET', endpoint, params=self._page_params(filter_params, page))
+            except Exception as e:
+                self.logger.error(f"Error iterating records from {table_name} (page {page}): {str(e)}")
+                return
+            
+            yield from self._wrap_rows(response.get('results', []), formula, filter_dict, client_side)
+            
+            if not response.get('next'):
+                return
+            page += 1
+    
     def update_record(self, table_name: str, record_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Update a record in a table
@@ -449,6 +855,7 @@ class BaserowService:
             
             endpoint = f'/api/database/rows/table/{table_id}/{record_id}/'
             response = self._make_request('PATCH', endpoint, data=data)
+            self._after_write(table_name, response)
 
             self.logger.info(f"✅ Updated record {record_id} in {table_name}")
 
@@ -482,6 +889,7 @@ class BaserowService:
             
             endpoint = f'/api/database/rows/table/{table_id}/{record_id}/'
             self._make_request('DELETE', endpoint)
+            self._after_write(table_name, deleted_id=record_id)
             
             self.logger.info(f"✅ Deleted record {record_id} from {table_name}")
             return True
@@ -490,6 +898,288 @@ class BaserowService:
             self.logger.error(f"Error deleting record: {str(e)}")
             return False
     
+    # Bulk writes go through Baserow's batch endpoints. A batch is applied
+    # atomically, so when Baserow rejects one (e.g. a bad value or a deleted
+    # row) the chunk is replayed row by row to find out which rows fail.
+    # Network errors and timeouts fail the whole chunk without a replay,
+    # since a timed-out create may already have been applied.
+    
+    @staticmethod
+    def _batch_call(table_id: int, operation: str, chunk: List[Any]) -> Tuple[str, str, Dict[str, Any]]:
+        """``(method, endpoint, body)`` for one batch request"""
+        endpoint = f'/api/database/rows/table/{table_id}/'
+        if operation == 'delete':
+            return 'POST', endpoint + 'batch-delete/', {'items': [int(row_id) for row_id in chunk]}
+        return ('POST' if operation == 'create' else 'PATCH'), endpoint + 'batch/', {'items': chunk}
+    
+    @staticmethod
+    def _single_call(table_id: int, operation: str, item: Any) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """``(method, endpoint, body)`` for the one-row equivalent of a batch item"""
+        endpoint = f'/api/database/rows/table/{table_id}/'
+        if operation == 'create':
+            return 'POST', endpoint, item
+        if operation == 'update':
+            return 'PATCH', f"{endpoint}{item['id']}/", {k: v for k, v in item.items() if k != 'id'}
+        return 'DELETE', f'{endpoint}{item}/', None
+    
+    @staticmethod
+    def _bulk_row_result(operation: str, index: int, item: Any, row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Per-row success entry"""
+        if operation == 'delete':
+            return {'index': index, 'id': item, 'success': True, 'record': None, 'error': None}
+        return {
+            'index': index,
+            'id': (row or {}).get('id'),
+            'success': True,
+            'record': {'id': row.get('id'), 'fields': row} if row else None,
+            'error': None,
+        }
+    
+    @staticmethod
+    def _bulk_row_failure(operation: str, index: int, item: Any, error: Exception) -> Dict[str, Any]:
+        row_id = item if operation == 'delete' else (item.get('id') if operation == 'update' else None)
+        return {'index': index, 'id': row_id, 'success': False, 'record': None, 'error': str(error)}
+    
+    @staticmethod
+    def _bulk_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        failed = sum(1 for result in results if not result['success'])
+        return {
+            'success': failed == 0,
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': results,
+        }
+    
+    def _bulk_plan(self, table_name: str, operation: str, items: List[Any]) -> Generator[Tuple[str, str, Any], Any, List[Dict[str, Any]]]:
+        """The requests of a bulk write, without making them.
+        
+        Yields ``(method, endpoint, body)``, is sent back each response (or
+        thrown its error) and returns the per-row results, so the sync and
+        async clients share this logic and differ only in how they send.
+        """
+        table_id = self.table_ids.get(table_name)
+        if not table_id:
+            error = ValueError(f"Unknown table: {table_name}")
+            return [self._bulk_row_failure(operation, i, item, error) for i, item in enumerate(items)]
+        
+        results: List[Dict[str, Any]] = []
+        for offset in range(0, len(items), BATCH_SIZE):
+            chunk = items[offset:offset + BATCH_SIZE]
+            try:
+                response = yield self._batch_call(table_id, operation, chunk)
+            except BaserowAPIError as e:
+                if len(chunk) == 1:
+                    results.append(self._bulk_row_failure(operation, offset, chunk[0], e))
+                    continue
+                self.logger.warning(f"Batch {operation} on {table_name} rejected ({str(e)}), retrying {len(chunk)} rows one by one")
+                for index, item in enumerate(chunk, offset):
+                    try:
+                        row = yield self._single_call(table_id, operation, item)
+                        results.append(self._bulk_row_result(operation, index, item, row))
+                    except Exception as row_error:
+                        results.append(self._bulk_row_failure(operation, index, item, row_error))
+                continue
+            except Exception as e:
+                self.logger.error(f"Batch {operation} on {table_name} failed: {str(e)}")
+                results.extend(self._bulk_row_failure(operation, i, item, e) for i, item in enumerate(chunk, offset))
+                continue
+            
+            rows = response.get('items', []) if operation != 'delete' else [None] * len(chunk)
+            for index, (item, row) in enumerate(zip(chunk, rows), offset):
+                results.append(self._bulk_row_result(operation, index, item, row))
+        return results
+    
+    def _after_bulk_write(self, table_name: str, operation: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run the write hooks for every row that was written; returns the summary"""
+        written = [result for result in results if result['success']]
+        if operation == 'delete':
+            self._after_writes(table_name, deleted_ids=[result['id'] for result in written])
+        elif written:
+            self._after_writes(table_name, [(result['record'] or {}).get('fields') for result in written])
+        summary = self._bulk_summary(results)
+        self.logger.info(f"✅ Bulk {operation} on {table_name}: {summary['succeeded']} ok, {summary['failed']} failed")
+        return summary
+    
+    def _bulk_write(self, table_name: str, operation: str, items: List[Any]) -> Dict[str, Any]:
+        plan = self._bulk_plan(table_name, operation, items)
+        response, error = None, None
+        try:
+            while True:
+                method, endpoint, body = plan.throw(error) if error else plan.send(response)
+                try:
+                    response, error = self._make_request(method, endpoint, data=body), None
+                except Exception as e:
+                    response, error = None, e
+        except StopIteration as done:
+            return self._after_bulk_write(table_name, operation, done.value)
+    
+    def bulk_create_records(self, table_name: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Create many rows using Baserow's batch endpoint (200 rows per request)
+        
+        Args:
+            table_name: Name of the table
+            rows: Field payloads, one per row to create
+            
+        Returns:
+            Dict with ``success`` (all rows created), ``succeeded``/``failed``
+            counts and ``results``: one entry per input row, in order, with
+            ``index``, ``id``, ``success``, ``record`` and ``error``
+        """
+        return self._bulk_write(table_name, 'create', list(rows))
+    
+    def bulk_update_records(self, table_name: str, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Update many rows using Baserow's batch endpoint (200 rows per request)
+        
+        Args:
+            table_name: Name of the table
+            updates: One dict per row: its ``id`` plus the fields to change
+            
+        Returns:
+            Same shape as :meth:`bulk_create_records`
+        """
+        return self._bulk_write(table_name, 'update', list(updates))
+    
+    def bulk_delete_records(self, table_name: str, record_ids: List[int]) -> Dict[str, Any]:
+        """
+        Delete many rows using Baserow's batch-delete endpoint (200 rows per request)
+        
+        Returns:
+            Same shape as :meth:`bulk_create_records`
+        """
+        return self._bulk_write(table_name, 'delete', list(record_ids))
+    
+    @staticmethod
+    def _find_duplicate_response(existing_records: List[Dict[str, Any]], garage_email: str) -> Optional[Dict[str, Any]]:
+        """Return the existing 'Recevied email' record from ``garage_email``, if any"""
+        from .received_email_index import normalise_sender
+        garage_email = normalise_sender(garage_email)
+        for record in existing_records:
+            if normalise_sender(record.get('fields', {}).get('Email')) == garage_email:
+                return record
+        return None
+    
+    def _indexed_reply(self, email_data: Dict[str, Any], vin: str) -> Optional[Dict[str, Any]]:
+        """The stored reply :attr:`received_index` says ``email_data`` duplicates, if any.
+        
+        A hit is only trusted once its row is confirmed to still exist; if it
+        has been deleted, the VIN's rows are scanned instead.
+        """
+        from_email = email_data.get('from_email')
+        match = self.received_index.find(vin, from_email, email_data.get('message_id'))
+        if match is None:
+            return None
+        reason, row_id = match
+        record = self._indexed_row(row_id)
+        if record is None:
+            existing_records = self.get_records('Recevied email', formula=f'{{VIN}} = "{vin}"')
+            return self._scanned_reply(existing_records, email_data, vin)
+        return self._duplicate_reply(reason, record, email_data, vin)
+    
+    def _indexed_row(self, row_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Re-read the 'Recevied email' row an index hit points at; None if it is gone"""
+        if row_id is None:
+            return None
+        record = self._from_replica('Recevied email', 'get_record', row_id)
+        if record is not None:
+            return record
+        try:
+            response = self._make_request('GET', self._rows_endpoint(self.table_ids['Recevied email'], row_id))
+        except Exception as e:
+            if not (isinstance(e, BaserowAPIError) and e.status_code == 404):
+                return self._unconfirmed_row(row_id, e)
+            response = None
+        if not response:
+            self.received_index.discard_row(row_id)
+            return None
+        return {'id': response.get('id'), 'fields': response}
+    
+    def _unconfirmed_row(self, row_id: int, error: Exception) -> Dict[str, Any]:
+        """Stand-in for an indexed row Baserow couldn't be asked about: the index is trusted"""
+        self.metrics['unconfirmed_duplicates'] += 1
+        self.logger.warning(f"Could not confirm stored reply {row_id}, trusting the index: {str(error)}")
+        return {'id': row_id}
+    
+    def _duplicate_reply(self, reason: str, record: Dict[str, Any], email_data: Dict[str, Any], vin: str) -> Dict[str, Any]:
+        self.logger.info(f"Duplicate response detected ({reason}): {email_data.get('from_email')} for VIN {vin} already stored, skipping save")
+        return {**record, 'duplicate': True}
+    
+    def _scanned_reply(self, existing_records: List[Dict[str, Any]], email_data: Dict[str, Any], vin: str) -> Optional[Dict[str, Any]]:
+        """The record among the VIN's ``existing_records`` that ``email_data`` duplicates, if any"""
+        from_email = email_data.get('from_email')
+        duplicate = self._find_duplicate_response(existing_records, from_email.strip().lower())
+        if duplicate:
+            self.logger.info(f"Duplicate response detected: Garage {from_email} already responded for VIN {vin}, skipping save")
+        return duplicate
+    
+    def _find_stored_reply(self, email_data: Dict[str, Any], vin: str) -> Optional[Dict[str, Any]]:
+        """Return the already-stored reply ``email_data`` duplicates, if any.
+        
+        Answered from :attr:`received_index` once it has been warmed; until
+        then the VIN's rows are read from Baserow as before.
+        """
+        if not email_data.get('from_email'):
+            self.logger.warning(f"No email provided, cannot check for duplicates")
+            return None
+        try:
+            if self.received_index.is_ready():
+                return self._indexed_reply(email_data, vin)
+            existing_records = self.get_records('Recevied email', formula=f'{{VIN}} = "{vin}"')
+            return self._scanned_reply(existing_records, email_data, vin)
+        except Exception as e:
+            self.logger.warning(f"Could not check for duplicates: {str(e)}, will proceed with save")
+            return None
+    
+    def _build_received_email_payload(self, email_data: Dict[str, Any], vin: str) -> Dict[str, Any]:
+        """Map a received email to 'Recevied email' fields"""
+        return self.schema('Recevied email').encode({
+            'vin': vin,
+            'email': email_data.get('from_email', '').strip().lower(),
+            'subject': email_data.get('subject', 'No Subject'),
+            'body': email_data.get('body', ''),
+            'received_at': email_data.get('received_at', datetime.now(timezone.utc).isoformat()),
+        })
+    
+    def _build_garage_response_payload(self, response_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a garage response to 'Recevied email' fields"""
+        return self.schema('Recevied email').encode({
+            'email': response_data.get('garage_email', ''),
+            'subject': response_data.get('subject', f"Response from {response_data.get('garage_name', '')}"),
+            'body': response_data.get('body', ''),
+            'received_at': response_data.get('response_date', datetime.now(timezone.utc).isoformat()),
+            'vin': response_data.get('vin', ''),  # CRITICAL for matching responses to customers
+        })
+    
+    def _reply_rejection(self, email_data: Dict[str, Any], vin: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The error result when ``email_data`` can't be stored, else None"""
+        # IMPORTANT: Validate VIN before saving
+        # Do not save emails without VIN to avoid creating empty records
+        if not vin or not str(vin).strip():
+            error_msg = f"Cannot store email without VIN. Email from: {email_data.get('from_email', 'unknown')}"
+            self.logger.error(error_msg)
+            return {'success': False, 'error': error_msg}
+        
+        table_id = self.table_ids['Recevied email']
+        
+        # Validate table ID
+        if not table_id or table_id == 0:
+            error_msg = f"Invalid Recevied email table ID: {table_id}. Check BASEROW_TABLE_RECEIVED_EMAIL env var"
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+        return None
+    
+    def _reply_stored(self, email_data: Dict[str, Any], vin: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Write hooks for a newly stored reply; returns the success result"""
+        self._after_write('Recevied email', response, message_id=email_data.get('message_id'))
+        
+        self.logger.info(f"✅ Stored email from {email_data.get('from_email', '')} for VIN {vin}")
+        # Return with success flag for proper status checking
+        return {
+            'success': True,
+            'data': response
+        }
+    
     def store_received_email(self, email_data: Dict[str, Any], vin: str = None) -> Dict[str, Any]:
         """
         Store a received email in the 'Recevied email' table
@@ -502,76 +1192,19 @@ class BaserowService:
             Dict with success status and record data
         """
         try:
-            # IMPORTANT: Validate VIN before saving
-            # Do not save emails without VIN to avoid creating empty records
-            if not vin or not str(vin).strip():
-                error_msg = f"Cannot store email without VIN. Email from: {email_data.get('from_email', 'unknown')}"
-                self.logger.error(error_msg)
-                return {'success': False, 'error': error_msg}
-            
-            table_id = self.table_ids['Recevied email']
-            
-            # Validate table ID
-            if not table_id or table_id == 0:
-                error_msg = f"Invalid Recevied email table ID: {table_id}. Check BASEROW_TABLE_RECEIVED_EMAIL env var"
-                self.logger.error(error_msg)
-                raise ValueError(error_msg)
+            rejection = self._reply_rejection(email_data, vin)
+            if rejection:
+                return rejection
             
-            self.logger.info(f"🔍 DEBUG: Using table ID {table_id} for Recevied email table")
-            
-            # Check for duplicates by VIN AND Email (same garage shouldn't respond twice for same VIN)
-            try:
-                if vin and email_data.get('from_email'):
-                    garage_email = email_data.get('from_email', '').strip().lower()
-                    # Get all records for this VIN
-                    existing_records = self.get_records(
-                        'Recevied email',
-                        formula=f'{{VIN}} = "{vin}"'
-                    )
-                    
-                    # Check if this specific garage already responded for this VIN
-                    for record in existing_records:
-                        existing_email = record.get('fields', {}).get('field_6389838', '').strip().lower()
-                        if existing_email == garage_email:
-                            self.logger.info(f"Duplicate response detected: Garage {garage_email} already responded for VIN {vin}, skipping save")
-                            return record
-                else:
-                    if not vin:
-                        self.logger.warning(f"No VIN provided, cannot check for duplicates")
-                    if not email_data.get('from_email'):
-                        self.logger.warning(f"No email provided, cannot check for duplicates")
-            except Exception as e:
-                self.logger.warning(f"Could not check for duplicates: {str(e)}, will proceed with save")
-            
-            # Prepare payload using field IDs
-            # Recevied email table field mappings:
-            # field_6389838 = Email
-            # field_6389839 = Subject
-            # field_6389840 = Body
-            # field_6389841 = Received At
-            # field_6389842 = VIN
-            payload = {
-                'field_6389842': vin or '',  # VIN
-                'field_6389838': email_data.get('from_email', '').strip().lower(),  # Email
-                'field_6389839': email_data.get('subject', 'No Subject'),  # Subject
-                'field_6389840': email_data.get('body', ''),  # Body
-                'field_6389841': email_data.get('received_at', datetime.now(timezone.utc).isoformat())  # Received At
-            }
+            duplicate = self._find_stored_reply(email_data, vin)
+            if duplicate:
+                return duplicate
             
-            # Remove empty values
-            payload = {k: v for k, v in payload.items() if v}
+            payload = self._build_received_email_payload(email_data, vin)
+            self.logger.debug("Storing email with payload: %s", lazy_json(payload))
             
-            self.logger.info(f"🔍 DEBUG: Storing email with payload: {json.dumps(payload, indent=2)}")
-            
-            endpoint = f'/api/database/rows/table/{table_id}/'
-            response = self._make_request('POST', endpoint, data=payload)
-            
-            self.logger.info(f"✅ Stored email from {email_data.get('from_email', '')} for VIN {vin}")
-            # Return with success flag for proper status checking
-            return {
-                'success': True,
-                'data': response
-            }
+            response = self._make_request('POST', self._rows_endpoint(self.table_ids['Recevied email']), data=payload)
+            return self._reply_stored(email_data, vin, response)
             
         except Exception as e:
             self.logger.error(f"Error storing email: {str(e)}", exc_info=True)
@@ -600,31 +1233,15 @@ class BaserowService:
                     'error': error_msg
                 }
             
-            self.logger.info(f"🔍 DEBUG: Using table ID {table_id} for Recevied email table")
-            
-            # Map response data to Baserow field IDs
-            # Recevied email table field mappings:
-            # field_6389838 = Email
-            # field_6389839 = Subject
-            # field_6389840 = Body
-            # field_6389841 = Received At
-            # field_6389842 = VIN (IMPORTANT for matching responses to customers)
-            
-            payload = {
-                'field_6389838': response_data.get('garage_email', ''),  # Email
-                'field_6389839': response_data.get('subject', f"Response from {response_data.get('garage_name', '')}"),  # Subject
-                'field_6389840': response_data.get('body', ''),  # Body
-                'field_6389841': response_data.get('response_date', datetime.now(timezone.utc).isoformat()),  # Received At
-                'field_6389842': response_data.get('vin', ''),  # VIN - CRITICAL for matching
-            }
+            self.logger.debug("Using table ID %s for Recevied email table", table_id)
             
-            # Remove empty values to avoid validation errors
-            payload = {k: v for k, v in payload.items() if v}
+            payload = self._build_garage_response_payload(response_data)
             
-            self.logger.info(f"🔍 DEBUG: Storing garage response with payload: {json.dumps(payload, indent=2)}")
+            self.logger.debug("Storing garage response with payload: %s", lazy_json(payload))
             
             endpoint = f'/api/database/rows/table/{table_id}/'
             response = self._make_request('POST', endpoint, data=payload)
+            self._after_write('Recevied email', response)
             
             self.logger.info(f"✅ Recorded response from {response_data.get('garage_email')} for VIN {response_data.get('vin')}")
             
@@ -654,6 +1271,10 @@ class BaserowService:
             if not table_id:
                 raise ValueError(f"Unknown table: {table_name}")
 
+            record = self._from_replica(table_name, 'get_record', record_id)
+            if record is not None:
+                return record
+
             endpoint = f'/api/database/rows/table/{table_id}/{record_id}/'
             response = self._make_request('GET', endpoint)
 
@@ -682,6 +1303,7 @@ class BaserowService:
 
             endpoint = f'/api/database/rows/table/{table_id}/'
             response = self._make_request('POST', endpoint, data=data)
+            self._after_write(table_name, response)
 
             return {
                 'id': response.get('id') if response else None,
@@ -692,7 +1314,7 @@ class BaserowService:
             self.logger.error(f"Error creating record: {str(e)}")
             raise
     
-    def get_all_garages(self) -> List[Dict[str, Any]]:
+    def get_all_garages(self) -> List[Garage]:
         """Alias for get_fix_it_garages for compatibility"""
         return self.get_fix_it_garages()
     
@@ -707,101 +1329,8 @@ class BaserowService:
         Returns:
             str: URL of the uploaded file, or None if upload failed
         """
-        try:
-            import cloudinary
-            import cloudinary.uploader
-            import cloudinary.api
-            import hashlib
-            import time
-            import re
-            
-            self.logger.info(f"Starting Cloudinary upload for file: {filename}")
-            
-            # Verify Cloudinary credentials
-            cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME')
-            api_key = os.getenv('CLOUDINARY_API_KEY')
-            api_secret = os.getenv('CLOUDINARY_API_SECRET')
-            
-            if not all([cloud_name, api_key, api_secret]):
-                error_msg = "Missing Cloudinary configuration. Please check environment variables."
-                self.logger.error(error_msg)
-                return None
-                
-            self.logger.info("Cloudinary credentials verified")
-                
-            # Configure Cloudinary
-            cloudinary.config(
-                cloud_name=cloud_name,
-                api_key=api_key,
-                api_secret=api_secret,
-                secure=True
-            )
-            
-            # Ensure file_content is in the correct format
-            if hasattr(file_content, 'read'):
-                # If it's a file-like object, read its content
-                file_content = file_content.read()
-            
-            if not file_content:
-                self.logger.error("No file content provided")
-                return None
-            
-            timestamp = str(int(time.time()))
-            file_hash = hashlib.md5(file_content if isinstance(file_content, bytes) else file_content.encode()).hexdigest()
-            
-            # Clean the filename to remove any special characters
-            clean_filename = re.sub(r'[^\w\d-]', '_', os.path.splitext(filename)[0])
-            clean_extension = os.path.splitext(filename)[1].lower()
-            public_id = f"garagefy/{clean_filename}_{timestamp}_{file_hash[:8]}{clean_extension}"
-            
-            self.logger.info(f"Preparing to upload file to Cloudinary. Size: {len(file_content)} bytes, Public ID: {public_id}")
-            
-            # Upload to Cloudinary with explicit resource type
-            resource_type = "auto"
-            if isinstance(filename, str):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                    resource_type = "image"
-                elif filename.lower().endswith(('.mp4', '.webm', '.mov')):
-                    resource_type = "video"
-                elif filename.lower().endswith(('.pdf', '.doc', '.docx', '.txt')):
-                    resource_type = "raw"
-            
-            try:
-                result = cloudinary.uploader.upload(
-                    file_content,
-                    public_id=public_id,
-                    folder="garagefy",
-                    resource_type=resource_type,
-                    overwrite=True,
-                    unique_filename=True,
-                    use_filename=True,
-                    filename_override=os.path.basename(filename),
-                    timeout=30  # 30 second timeout
-                )
-                
-                self.logger.debug(f"Cloudinary upload response: {json.dumps(result, default=str)}")
-                
-                if not result:
-                    self.logger.error("Cloudinary upload returned no result")
-                    return None
-                    
-                if 'secure_url' not in result:
-                    self.logger.error(f"Cloudinary upload failed. Response: {result}")
-                    return None
-                    
-                self.logger.info(f"Successfully uploaded to Cloudinary: {result['secure_url']}")
-                return result['secure_url']
-                
-            except cloudinary.api.Error as e:
-                self.logger.error(f"Cloudinary API error: {str(e)}", exc_info=True)
-                return None
-            except Exception as e:
-                self.logger.exception(f"Unexpected error during Cloudinary upload: {str(e)}")
-                return None
-            
-        except Exception as e:
-            self.logger.exception(f"Unexpected error in _upload_file_to_cloudinary: {str(e)}")
-            return None
+        from .image_upload_service import image_upload_service
+        return image_upload_service.upload(file_content, filename)
 
 
 # Singleton instance - lazy initialization
@@ -1,7 +1,8 @@
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta, timezone
-from .baserow_service import baserow_service as airtable_service
+from ..repositories import repositories
+from .baserow_schema import CustomerRequest
 from .email_service import email_service
 
 logger = logging.getLogger(__name__)
@@ -10,7 +11,7 @@ class CustomerResponseService:
     """Service for sending compiled quotes to customers"""
     
     def __init__(self):
-        self.airtable = airtable_service
+        self.storage = repositories
         self.email_service = email_service
     
     def _calculate_business_days_ago(self, days: int) -> datetime:
@@ -41,25 +42,21 @@ class CustomerResponseService:
             Dict with processing results
         """
         try:
-            # Get all customer records from Customer details table
-            customer_records = self.airtable.get_records('Customer details')
-            
-            logger.info(f"Checking {len(customer_records)} customer records")
-            
+            # Stream customer records from Customer details table page by page;
+            # only the ones still awaiting a response are kept in memory.
             # Group records by VIN to ensure ONE email per VIN
             vin_groups = {}
-            for record in customer_records:
-                fields = record.get('fields', {})
-                # Try both field name and field ID for VIN
-                vin = fields.get('VIN', '') or fields.get('field_6389831', '')
-                vin = str(vin).strip()
+            records_checked = 0
+            async for customer in self.storage.customers.iter_all():
+                records_checked += 1
+                vin = str(customer.vin).strip()
                 
                 if not vin:
-                    logger.warning(f"Record {record.get('id')} has no VIN, skipping")
+                    logger.warning(f"Record {customer.id} has no VIN, skipping")
                     continue
                 
                 # Check if response already sent using Sent Emails field
-                sent_emails = fields.get('Sent Emails', '')
+                sent_emails = customer.sent_emails
                 if sent_emails and 'quote sent' in sent_emails.lower():
                     logger.debug(f"Response already sent for VIN {vin} (Sent Emails: {sent_emails}), skipping")
                     continue
@@ -67,34 +64,31 @@ class CustomerResponseService:
                 # Group by VIN - use the most recent record for each VIN
                 if vin not in vin_groups:
                     vin_groups[vin] = {
-                        'record': record,
-                        'fields': fields,
-                        'all_records': [record]  # Keep track of all records for this VIN
+                        'customer': customer,
+                        'all_records': [customer]  # Keep track of all records for this VIN
                     }
                 else:
                     # Keep track of all records with this VIN
-                    vin_groups[vin]['all_records'].append(record)
+                    vin_groups[vin]['all_records'].append(customer)
                     # Use the most recent record
-                    existing_date = vin_groups[vin]['fields'].get('Date and Time', '')
-                    new_date = fields.get('Date and Time', '')
-                    if new_date > existing_date:
-                        vin_groups[vin]['record'] = record
-                        vin_groups[vin]['fields'] = fields
+                    if customer.date_time > vin_groups[vin]['customer'].date_time:
+                        vin_groups[vin]['customer'] = customer
             
-            logger.info(f"Found {len(vin_groups)} unique VINs to process")
+            logger.info(f"Checked {records_checked} customer records, found {len(vin_groups)} unique VINs to process")
             
             responses_sent = 0
             errors = []
+            # >7-day-old records are marked in one batch after the loop
+            stale_updates = {}
             
             # Process each VIN (ONE email per VIN)
             for vin, vin_data in vin_groups.items():
                 try:
-                    fields = vin_data['fields']
-                    record_id = vin_data['record'].get('id')
+                    customer = vin_data['customer']
                     all_records = vin_data['all_records']
                     
-                    # Get submission date (using Airtable's Date and Time field)
-                    submission_date_str = fields.get('Date and Time') or fields.get('Created time') or fields.get('DateTime')
+                    # Get submission date (Date and Time field)
+                    submission_date_str = customer.date_time
                     if not submission_date_str:
                         logger.warning(f"No submission date found for VIN {vin}")
                         continue
@@ -106,23 +100,18 @@ class CustomerResponseService:
                     days_since_submission = (current_time - submission_date).days
                     if days_since_submission > 7:
                         # Mark all records with this VIN as sent
-                        for rec in all_records:
-                            try:
-                                self.airtable.update_record(
-                                    'Customer details',
-                                    rec.get('id'),
-                                    {'Sent Emails': f'Quote sent on {current_time.strftime("%Y-%m-%d")}'}
-                                )
-                            except Exception as e:
-                                logger.warning(f"Could not auto-mark old request: {str(e)}")
-                        logger.info(f"Auto-marked {len(all_records)} old record(s) for VIN {vin} ({days_since_submission} days old) as sent")
+                        stale_updates.update(
+                            (rec.id, f'Quote sent on {current_time.strftime("%Y-%m-%d")}')
+                            for rec in all_records
+                        )
+                        logger.info(f"Auto-marking {len(all_records)} old record(s) for VIN {vin} ({days_since_submission} days old) as sent")
                         continue
                     
                     # Calculate business days
                     business_days_passed = self._count_business_days(submission_date, current_time)
                     
                     # Check if ALL garages have responded
-                    all_garages_responded = self._check_all_garages_responded(vin)
+                    all_garages_responded = await self._check_all_garages_responded(vin)
                     
                     # Send response if:
                     # 1. All garages have responded, OR
@@ -131,31 +120,35 @@ class CustomerResponseService:
                     
                     if should_send:
                         reason = "all garages responded" if all_garages_responded else "2 business days passed"
-                        logger.info(f"Sending consolidated response for VIN {vin} to {fields.get('Email')} ({reason})")
+                        logger.info(f"Sending consolidated response for VIN {vin} to {customer.email} ({reason})")
                         
-                        success = await self._send_customer_response(record_id, fields, vin)
+                        success = await self._send_customer_response(customer, vin)
                         
                         if success:
                             responses_sent += 1
                             # Mark ALL records with this VIN as sent to prevent duplicate emails
+                            sent_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                            updated = await self.storage.customers.mark_sent(
+                                {rec.id: f'Quote sent on {sent_time}' for rec in all_records}
+                            )
                             for rec in all_records:
-                                try:
-                                    sent_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-                                    self.airtable.update_record(
-                                        'Customer details',
-                                        rec.get('id'),
-                                        {'Sent Emails': f'Quote sent on {sent_time}'}
-                                    )
-                                    logger.info(f"Marked record {rec.get('id')} for VIN {vin} as sent")
-                                except Exception as update_error:
-                                    logger.warning(f"Could not update Sent Emails for {rec.get('id')}: {str(update_error)}")
+                                if rec.id in updated:
+                                    logger.info(f"Marked record {rec.id} for VIN {vin} as sent")
+                                else:
+                                    logger.warning(f"Could not update Sent Emails for {rec.id}")
                         else:
-                            errors.append(f"Failed to send response for VIN {vin} to {fields.get('Email')}")
+                            errors.append(f"Failed to send response for VIN {vin} to {customer.email}")
                     
                 except Exception as e:
                     logger.error(f"Error processing VIN {vin}: {str(e)}", exc_info=True)
                     errors.append(str(e))
             
+            if stale_updates:
+                updated = await self.storage.customers.mark_sent(stale_updates)
+                for record_id in stale_updates.keys() - updated:
+                    logger.warning(f"Could not auto-mark old request {record_id}")
+                logger.info(f"Auto-marked {len(updated)} old record(s) as sent")
+            
             return {
                 'success': True,
                 'responses_sent': responses_sent,
@@ -231,7 +224,7 @@ class CustomerResponseService:
         
         return None
     
-    def _check_all_garages_responded(self, vin: str) -> bool:
+    async def _check_all_garages_responded(self, vin: str) -> bool:
         """
         Check if all garages in the 'Fix it' table have responded for this VIN
         
@@ -243,7 +236,7 @@ class CustomerResponseService:
         """
         try:
             # Get all garages from Fix it table
-            garages = self.airtable.get_fix_it_garages()
+            garages = await self.storage.garages.list()
             total_garages = len(garages)
             
             if total_garages == 0:
@@ -251,16 +244,12 @@ class CustomerResponseService:
                 return False
             
             # Get all responses from Received email table for this VIN
-            received_emails = self.airtable.get_records(
-                'Recevied email',
-                formula=f'{{VIN}} = "{vin}"'
-            )
+            received_emails = await self.storage.received_emails.list_by_vin(vin)
             
             # Get unique garage emails that have responded
             responded_emails = set()
-            for email_record in received_emails:
-                email_fields = email_record.get('fields', {})
-                garage_email = email_fields.get('Email', '').strip().lower()
+            for reply in received_emails:
+                garage_email = reply.email.strip().lower()
                 if garage_email:
                     # Extract just the email address from "Name <email@domain.com>" format
                     import re
@@ -272,8 +261,8 @@ class CustomerResponseService:
             # Get all garage emails (just the address part)
             all_garage_emails = set()
             for g in garages:
-                if g.get('email'):
-                    email = g['email'].strip().lower()
+                if g.email:
+                    email = g.email.strip().lower()
                     # Extract just the email address from "Name <email@domain.com>" format if present
                     import re
                     email_match = re.search(r'<(.+?)>', email)
@@ -292,22 +281,21 @@ class CustomerResponseService:
             logger.error(f"Error checking if all garages responded: {str(e)}", exc_info=True)
             return False
     
-    async def _send_customer_response(self, record_id: str, customer_fields: Dict[str, Any], vin: str) -> bool:
+    async def _send_customer_response(self, customer: CustomerRequest, vin: str) -> bool:
         """
         Send compiled quotes to customer for a specific VIN
         
         Args:
-            record_id: Airtable record ID
-            customer_fields: Customer record fields
+            customer: Most recent 'Customer details' row for the VIN
             vin: Vehicle Identification Number (unique identifier for the request)
             
         Returns:
             bool: True if email sent successfully
         """
         try:
-            customer_email = customer_fields.get('Email')
-            customer_name = customer_fields.get('Name', 'Cher client')
-            car_brand = customer_fields.get('Brand') or customer_fields.get('car brand', 'N/A')
+            customer_email = customer.email
+            customer_name = customer.name or 'Cher client'
+            car_brand = customer.brand or 'N/A'
             
             if not customer_email:
                 logger.error("No customer email found")
@@ -316,22 +304,18 @@ class CustomerResponseService:
             logger.info(f"Compiling quotes for VIN {vin}, customer: {customer_email}")
             
             # Get all quotes from Received email table matching this VIN
-            received_emails = self.airtable.get_records(
-                'Recevied email',
-                formula=f'{{VIN}} = "{vin}"'
-            )
+            received_emails = await self.storage.received_emails.list_by_vin(vin)
             
             logger.info(f"Found {len(received_emails)} response(s) from garages for VIN {vin}")
             
             # Get all garages from Fix it table (includes phone, address, etc.)
-            garages = self.airtable.get_fix_it_garages()
-            garage_dict = {g['email'].strip().lower(): g for g in garages}
+            garages = await self.storage.garages.list()
+            garage_dict = {g.email.strip().lower(): g for g in garages}
             
             # Compile quotes with garage contact information
             quotes = []
-            for email_record in received_emails:
-                email_fields = email_record.get('fields', {})
-                garage_email_raw = email_fields.get('Email', '').strip().lower()
+            for reply in received_emails:
+                garage_email_raw = reply.email.strip().lower()
                 
                 # Extract just the email address from "Name <email@domain.com>" format
                 import re
@@ -339,55 +323,28 @@ class CustomerResponseService:
                 garage_email_clean = email_match.group(1).strip().lower() if email_match else garage_email_raw
                 
                 # Get garage details from Fix it table using clean email
-                garage = garage_dict.get(garage_email_clean, {})
+                garage = garage_dict.get(garage_email_clean)
                 
                 # Extract only the garage's direct response (before email thread)
-                body_full = email_fields.get('Body', '')
-                
-                # Remove email thread - split by common email reply markers
-                import re
+                body_full = reply.body
                 
                 # Try to extract price from body if not already set
-                quote_amount = email_fields.get('Quote', '')
+                quote_amount = reply.quote
                 if not quote_amount or quote_amount == 'Non spécifié':
                     quote_amount = self._extract_price_from_text(body_full) or 'Non spécifié'
                 
-                # Try multiple splitting patterns (in order of most specific to least)
-                body_clean = body_full
-                
-                # Pattern to match email thread markers
-                # The pattern "On [date]... wrote:" can span multiple lines
-                patterns_to_try = [
-                    # Match "On [date]... wrote:" even if it spans lines (use .+? to allow > in email addresses)
-                    (r'\n\nOn\s+.+?wrote\s*:', re.DOTALL | re.IGNORECASE),
-                    (r'\nOn\s+.+?wrote\s*:', re.DOTALL | re.IGNORECASE),
-                    # Match quoted reply lines (lines starting with >)
-                    (r'\n>', 0),
-                    # Match email separator
-                    (r'\n-{3,}', 0),
-                    # Match "From:" header
-                    (r'\nFrom\s*:', 0),
-                ]
-                
-                for pattern, flags in patterns_to_try:
-                    match = re.search(pattern, body_clean, flags=flags)
-                    if match:
-                        # Take everything before the match
-                        body_clean = body_clean[:match.start()].strip()
-                        break
-                
-                # Final cleanup: remove any trailing whitespace
-                body_clean = body_clean.strip()
+                # Remove email thread - keep only the garage's own text
+                body_clean = self._strip_quoted_reply(body_full)
                 
                 quotes.append({
-                    'garage_name': garage.get('name', 'Garage inconnu'),
+                    'garage_name': garage.name if garage else 'Garage inconnu',
                     'garage_email': garage_email_clean,
-                    'garage_phone': garage.get('phone_number', 'Non disponible'),  # From Fix it table Phone field (phone_number)
-                    'garage_address': garage.get('address', 'Non disponible'),  # From Fix it table Address field
+                    'garage_phone': garage.phone_number if garage else 'Non disponible',  # From Fix it table Phone field
+                    'garage_address': garage.address if garage else 'Non disponible',  # From Fix it table Address field
                     'quote_amount': quote_amount,  # Extracted from email body if not set
-                    'subject': email_fields.get('Subject', ''),
+                    'subject': reply.subject,
                     'body': body_clean,  # Only garage's response, not email thread
-                    'received_at': email_fields.get('Received At', '')
+                    'received_at': reply.received_at
                 })
             
             # Build email content
@@ -464,6 +421,37 @@ class CustomerResponseService:
             logger.error(f"Error sending customer response: {str(e)}", exc_info=True)
             return False
     
+    def _strip_quoted_reply(self, body: str) -> str:
+        """Cut a reply at the first email thread marker, keeping the text above it"""
+        import re
+        
+        # Try multiple splitting patterns (in order of most specific to least)
+        body_clean = body
+        
+        # Pattern to match email thread markers
+        # The pattern "On [date]... wrote:" can span multiple lines
+        patterns_to_try = [
+            # Match "On [date]... wrote:" even if it spans lines (use .+? to allow > in email addresses)
+            (r'\n\nOn\s+.+?wrote\s*:', re.DOTALL | re.IGNORECASE),
+            (r'\nOn\s+.+?wrote\s*:', re.DOTALL | re.IGNORECASE),
+            # Match quoted reply lines (lines starting with >)
+            (r'\n>', 0),
+            # Match email separator
+            (r'\n-{3,}', 0),
+            # Match "From:" header
+            (r'\nFrom\s*:', 0),
+        ]
+        
+        for pattern, flags in patterns_to_try:
+            match = re.search(pattern, body_clean, flags=flags)
+            if match:
+                # Take everything before the match
+                body_clean = body_clean[:match.start()].strip()
+                break
+        
+        # Final cleanup: remove any trailing whitespace
+        return body_clean.strip()
+    
     def _build_quotes_cards(self, quotes: List[Dict[str, Any]]) -> str:
         """Build mobile-friendly quote cards with garage contact information"""
         if not quotes:
@@ -0,0 +1,141 @@
+"""Signed browser-to-Cloudinary uploads, so photo bytes skip the API.
+
+The form asks ``POST /api/service-requests/upload-signature`` for one set
+of upload parameters per photo, posts each photo straight to Cloudinary,
+and then submits only what Cloudinary answered (``public_id``, ``version``,
+``signature``, ``format``) with the service request. Multipart photos keep
+working as a fallback.
+
+Every parameter set is signed with the API secret, so Cloudinary takes
+only what we issued:
+
+* ``public_id`` is ``garagefy/d_<issued>_<nonce>_<n>_<mac>``. The MAC
+  ties the issue time and slot to our secret, so a submitted asset is
+  known to come from one of our signatures.
+* ``allowed_formats`` limits uploads to JPEG, PNG and WebP.
+* ``transformation`` is an incoming ``c_limit`` to ``IMAGE_MAX_EDGE``,
+  so Cloudinary stores a downscaled copy, like the server-side pipeline.
+  Cloudinary has no per-upload byte limit; the form checks sizes against
+  ``max_bytes`` before uploading.
+
+On submission, :meth:`DirectUploads.verify` checks Cloudinary's response
+signature (``sha1(public_id, version, secret)``), the MAC, and that the
+upload happened within ``CLOUDINARY_DIRECT_UPLOAD_TTL`` seconds (900) of
+issuing. The URL is then built on the server; URLs sent by the browser are
+never used as given.
+
+Set ``CLOUDINARY_DIRECT_UPLOADS=false`` to switch this off (the endpoint
+then answers 404 and the form falls back). ``CLOUDINARY_DELIVERY_URL``
+overrides ``https://res.cloudinary.com`` for the local fake.
+"""
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+ALLOWED_FORMATS = ('jpg', 'png', 'webp')
+FOLDER = 'garagefy'
+CLOCK_SKEW = 60  # seconds Cloudinary's clock may be behind ours
+
+_PUBLIC_ID = re.compile(rf'^{FOLDER}/d_(\d+)_([0-9a-f]{{12}})_(\d+)_([0-9a-f]{{16}})$')
+
+
+def direct_uploads_enabled() -> bool:
+    return os.getenv('CLOUDINARY_DIRECT_UPLOADS', 'true').lower() in ('1', 'true', 'yes')
+
+
+class DirectUploadRejected(Exception):
+    """A submitted upload that we didn't sign or that Cloudinary didn't store"""
+
+
+class DirectUploads:
+    """Issues and checks signed upload parameters, see module docstring"""
+
+    def __init__(self):
+        self.ttl = int(os.getenv('CLOUDINARY_DIRECT_UPLOAD_TTL', 900))
+        self.max_bytes = int(os.getenv('CLOUDINARY_DIRECT_MAX_BYTES', 10 * 1024 * 1024))
+        self.metrics: Counter = Counter()
+
+    @staticmethod
+    def _credentials():
+        import cloudinary
+        from .image_upload_service import image_upload_service
+
+        image_upload_service.configure()
+        return cloudinary.config()
+
+    def _mac(self, secret: str, issued: int, nonce: str, slot: int) -> str:
+        return hmac.new(secret.encode(), f'{issued}:{nonce}:{slot}'.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def issue(self, count: int, max_edge: int) -> Dict[str, Any]:
+        """Upload URL and ``count`` signed parameter sets"""
+        import cloudinary.utils
+
+        config = self._credentials()
+        issued = int(time.time())
+        nonce = secrets.token_hex(6)
+        uploads = []
+        for slot in range(count):
+            params = {
+                'public_id': f'{FOLDER}/d_{issued}_{nonce}_{slot}_{self._mac(config.api_secret, issued, nonce, slot)}',
+                'timestamp': issued,
+                'allowed_formats': ','.join(ALLOWED_FORMATS),
+                'transformation': f'c_limit,w_{max_edge},h_{max_edge}',
+            }
+            params['signature'] = cloudinary.utils.api_sign_request(params, config.api_secret)
+            uploads.append(params)
+
+        prefix = (os.getenv('CLOUDINARY_UPLOAD_PREFIX') or 'https://api.cloudinary.com').rstrip('/')
+        self.metrics['issued'] += count
+        return {
+            'upload_url': f'{prefix}/v1_1/{config.cloud_name}/image/upload',
+            'api_key': config.api_key,
+            'expires_at': issued + self.ttl,
+            'max_bytes': self.max_bytes,
+            'allowed_formats': list(ALLOWED_FORMATS),
+            'uploads': uploads,
+        }
+
+    def verify(self, uploaded: List[Dict[str, Any]]) -> List[str]:
+        """Delivery URLs for uploads made with our parameters; raises :class:`DirectUploadRejected`"""
+        import cloudinary.utils
+
+        config = self._credentials()
+        delivery = (os.getenv('CLOUDINARY_DELIVERY_URL') or 'https://res.cloudinary.com').rstrip('/')
+        urls = []
+        for item in uploaded:
+            if not isinstance(item, dict):
+                raise DirectUploadRejected("Malformed upload entry")
+            public_id, image_format = str(item.get('public_id', '')), str(item.get('format', '')).lower()
+            try:
+                version = int(item.get('version'))
+            except (TypeError, ValueError):
+                raise DirectUploadRejected(f"Missing version for {public_id}")
+
+            match = _PUBLIC_ID.match(public_id)
+            if not match:
+                raise DirectUploadRejected(f"{public_id} was not issued by this server")
+            issued, nonce, slot, mac = int(match.group(1)), match.group(2), int(match.group(3)), match.group(4)
+            if not hmac.compare_digest(mac, self._mac(config.api_secret, issued, nonce, slot)):
+                raise DirectUploadRejected(f"{public_id} was not issued by this server")
+            if not cloudinary.utils.verify_api_response_signature(public_id, version, str(item.get('signature', ''))):
+                raise DirectUploadRejected(f"Cloudinary signature for {public_id} doesn't match")
+            # The version is Cloudinary's upload time, and it is covered by the signature
+            if not issued - CLOCK_SKEW <= version <= issued + self.ttl:
+                raise DirectUploadRejected(f"{public_id} was uploaded after its signature expired")
+            if image_format not in ALLOWED_FORMATS and image_format != 'jpeg':
+                raise DirectUploadRejected(f"{public_id} has unsupported format {image_format!r}")
+
+            urls.append(f'{delivery}/{config.cloud_name}/image/upload/v{version}/{public_id}.{image_format}')
+        self.metrics['verified'] += len(urls)
+        return urls
+
+    def status(self) -> Dict[str, Any]:
+        return {'enabled': direct_uploads_enabled(), 'ttl': self.ttl, **self.metrics}
+
+
+direct_uploads = DirectUploads()
@@ -7,7 +7,7 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
 import base64
 import msal
-from .baserow_service import baserow_service as airtable_service
+from ..repositories import repositories
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +22,7 @@ class EmailMonitorService:
         self.client_id = os.getenv('MS_CLIENT_ID')
         self.client_secret = os.getenv('MS_CLIENT_SECRET')
         self.tenant_id = os.getenv('MS_TENANT_ID')
-        self.airtable = airtable_service
+        self.storage = repositories
     
     def _get_oauth2_token(self) -> Optional[str]:
         """Get OAuth2 access token for IMAP"""
@@ -339,17 +339,17 @@ Résumer en français de manière structurée."""
                     
                     # Try to extract Request ID from subject or body (format: Ref: req_XXXXX)
                     request_id = self._extract_request_id_from_subject(subject)
-                    logger.info(f"🔍 DEBUG: Extracted request ID from subject: {request_id}")
+                    logger.debug("Extracted request ID from subject: %s", request_id)
                     
                     # If not found in subject, try to extract from body
                     if not request_id:
                         request_id = self._extract_request_id_from_subject(body)
-                        logger.info(f"🔍 DEBUG: Extracted request ID from body: {request_id}")
+                        logger.debug("Extracted request ID from body: %s", request_id)
                     
                     # If we have a request ID, find the VIN from Customer details table
                     vin = None
                     if request_id:
-                        vin = self._get_vin_from_request_id(request_id)
+                        vin = await self._get_vin_from_request_id(request_id)
                         logger.info(f"Found request ID {request_id}, matched to VIN: {vin}")
                     
                     # Fallback: Try to extract VIN directly from subject or body
@@ -374,7 +374,8 @@ Résumer en français de manière structurée."""
                         'subject': subject,
                         'body': body,
                         'received_at': received_at,
-                        'attachments': attachment_names
+                        'attachments': attachment_names,
+                        'message_id': msg.get('Message-ID', '')
                     }
                     
                     # Add attachment analysis to body if available
@@ -383,16 +384,16 @@ Résumer en français de manière structurée."""
                         for analysis in attachment_analysis:
                             email_data['body'] += f"\n{analysis['filename']}:\n{analysis['analysis']}\n"
                     
-                    result = self.airtable.store_received_email(email_data, vin)
-                    
-                    # Check if save was successful
-                    if result and result.get('success', False):
-                        processed_count += 1
-                        logger.info(f"Successfully saved NEW email to Airtable from {from_email}")
-                    else:
-                        error_msg = result.get('error', 'Unknown error') if result else 'No response'
-                        logger.warning(f"Failed to save email from {from_email}: {error_msg}")
-                        errors.append(f"Failed to save email from {from_email}: {error_msg}")
+                    try:
+                        _, created = await self.storage.received_emails.store(email_data, vin)
+                        if created:
+                            processed_count += 1
+                            logger.info(f"Successfully saved NEW email to Airtable from {from_email}")
+                        else:
+                            logger.info(f"Reply from {from_email} for VIN {vin} was already stored")
+                    except Exception as e:
+                        logger.warning(f"Failed to save email from {from_email}: {str(e)}")
+                        errors.append(f"Failed to save email from {from_email}: {str(e)}")
                     
                     # ALWAYS mark as read to prevent reprocessing on next check
                     # This is critical - even if save failed, mark as read so we don't process it again
@@ -468,13 +469,9 @@ Résumer en français de manière structurée."""
         
         return None
     
-    def _get_vin_from_request_id(self, request_id: str) -> Optional[str]:
+    async def _get_vin_from_request_id(self, request_id: str) -> Optional[str]:
         """Look up VIN from Customer details table using Request ID"""
         try:
-            # Search Customer details table for this request ID
-            # The request ID should be stored in a field or we can search by DateTime
-            customer_records = self.airtable.get_records('Customer details')
-            
             # Since request_id contains timestamp, we can try to match it
             # Format: req_TIMESTAMP_RANDOM
             # Extract timestamp
@@ -484,10 +481,10 @@ Résumer en français de manière structurée."""
             if timestamp_match:
                 timestamp_ms = int(timestamp_match.group(1))
                 
-                # Search for customer record with matching timestamp (within 1 second tolerance)
-                for record in customer_records:
-                    fields = record.get('fields', {})
-                    date_str = fields.get('Date and Time') or fields.get('DateTime') or fields.get('Created time')
+                # Search Customer details for a record with a matching timestamp.
+                # Rows are streamed page by page and we stop at the first match.
+                async for customer in self.storage.customers.iter_all():
+                    date_str = customer.date_time
                     
                     if date_str:
                         try:
@@ -497,7 +494,7 @@ Résumer en français de manière structurée."""
                             
                             # Check if timestamps are close (within 2 seconds)
                             if abs(record_timestamp_ms - timestamp_ms) < 2000:
-                                vin = fields.get('VIN')
+                                vin = customer.vin
                                 if vin:
                                     logger.info(f"Matched request {request_id} to VIN {vin}")
                                     return vin
@@ -11,6 +11,9 @@ import msal
 import requests
 from dotenv import load_dotenv
 
+from ..core.http import parse_retry_after
+from ..core.limits import get_limiter
+
 # Load environment variables
 load_dotenv()
 
@@ -23,9 +26,11 @@ class EmailService:
         self.client_secret = os.getenv('MS_CLIENT_SECRET')
         self.tenant_id = os.getenv('MS_TENANT_ID')
         self.user_email = os.getenv('EMAIL_ADDRESS', 'info@garagefy.app')
+        # A fixed bearer token skips MSAL entirely; only for the local fakes (python -m fakes)
+        self.static_token = os.getenv('GRAPH_STATIC_TOKEN')
         
         # Validate required environment variables
-        if not self.client_id or not self.client_secret or not self.tenant_id:
+        if not self.static_token and (not self.client_id or not self.client_secret or not self.tenant_id):
             raise ValueError("Missing required Microsoft credentials. Please set MS_CLIENT_ID, MS_CLIENT_SECRET, and MS_TENANT_ID in .env file")
         
         # Microsoft Graph API configuration
@@ -35,7 +40,7 @@ class EmailService:
         self.token_cache = {}
         
         # Microsoft Graph API endpoint
-        self.graph_endpoint = 'https://graph.microsoft.com/v1.0'
+        self.graph_endpoint = os.getenv('GRAPH_BASE_URL', 'https://graph.microsoft.com/v1.0').rstrip('/')
         
         # Log the configuration (without sensitive data)
         self.logger.info(f"Initializing EmailService for {self.user_email}")
@@ -49,6 +54,8 @@ class EmailService:
     
     def _get_token(self):
         """Get access token using MSAL with client credentials flow"""
+        if self.static_token:
+            return self.static_token
         try:
             app = msal.ConfidentialClientApplication(
                 client_id=self.client_id,
@@ -192,6 +199,9 @@ class EmailService:
             # Send the email using Microsoft Graph API with aiohttp
             import aiohttp
             
+            limiter = get_limiter('graph')
+            send_url = f"{self.graph_endpoint}/users/{self.user_email}/sendMail"
+            
             try:
                 async with aiohttp.ClientSession() as session:
                     headers = {
@@ -199,41 +209,39 @@ class EmailService:
                         'Content-Type': 'application/json'
                     }
                     
-                    async with session.post(
-                        f"{self.graph_endpoint}/users/{self.user_email}/sendMail",
-                        headers=headers,
-                        json=message,
-                        timeout=30
-                    ) as response:
-                        response_text = await response.text()
+                    async with limiter.async_slot():
+                        async with session.post(send_url, headers=headers, json=message, timeout=30) as response:
+                            response_text = await response.text()
+                            status = response.status
+                            retry_after = response.headers.get('Retry-After')
+                    
+                    if status == 202:
+                        self.logger.info(f"Email sent successfully to {', '.join(to_emails)}")
+                        return True
+                    elif status == 401:
+                        # Token expired, retry once with fresh token
+                        self.logger.warning("Token expired (401), retrying with fresh token...")
+                        fresh_token = self._get_token()
+                        headers['Authorization'] = f'Bearer {fresh_token}'
                         
-                        if response.status == 202:
-                            self.logger.info(f"Email sent successfully to {', '.join(to_emails)}")
-                            return True
-                        elif response.status == 401:
-                            # Token expired, retry once with fresh token
-                            self.logger.warning("Token expired (401), retrying with fresh token...")
-                            fresh_token = self._get_token()
-                            headers['Authorization'] = f'Bearer {fresh_token}'
-                            
-                            async with session.post(
-                                f"{self.graph_endpoint}/users/{self.user_email}/sendMail",
-                                headers=headers,
-                                json=message,
-                                timeout=30
-                            ) as retry_response:
+                        async with limiter.async_slot():
+                            async with session.post(send_url, headers=headers, json=message, timeout=30) as retry_response:
                                 retry_text = await retry_response.text()
-                                if retry_response.status == 202:
-                                    self.logger.info(f"Email sent successfully after token refresh to {', '.join(to_emails)}")
-                                    return True
-                                else:
-                                    error_msg = f"Failed to send email after retry: {retry_response.status} - {retry_text}"
-                                    self.logger.error(error_msg)
-                                    raise Exception(error_msg)
+                                retry_status = retry_response.status
+                        if retry_status == 202:
+                            self.logger.info(f"Email sent successfully after token refresh to {', '.join(to_emails)}")
+                            return True
                         else:
-                            error_msg = f"Failed to send email: {response.status} - {response_text}"
+                            error_msg = f"Failed to send email after retry: {retry_status} - {retry_text}"
                             self.logger.error(error_msg)
                             raise Exception(error_msg)
+                    else:
+                        if status == 429:
+                            # Mailbox is throttled; hold back every other send too
+                            limiter.pause(parse_retry_after(retry_after) or 60)
+                        error_msg = f"Failed to send email: {status} - {response_text}"
+                        self.logger.error(error_msg)
+                        raise Exception(error_msg)
             
             except aiohttp.ClientError as e:
                 self.logger.error(f"Network error sending email: {str(e)}")
@@ -1,19 +1,30 @@
+import asyncio
 import logging
-from typing import Dict, Any, List
+import os
+from dataclasses import asdict
+from typing import List, Optional, Set
 from datetime import datetime, timedelta, timezone
-from .baserow_service import baserow_service as airtable_service
+from ..core.job_queue import Job, job_queue, job_queue_enabled
+from ..core.limits import BULK, lane
+from ..repositories import repositories
+from .baserow_schema import Garage
 from .email_service import email_service
 
 logger = logging.getLogger(__name__)
 
+FAN_OUT_JOB = 'quote_requests.fan_out'
+SEND_JOB = 'quote_requests.send'
+
 class FixItService:
     """Service for handling Fix it quote requests"""
     
     def __init__(self):
-        self.airtable = airtable_service
+        self.storage = repositories
         self.email_service = email_service
+        # Fan-outs sent without the job queue, kept so they aren't garbage collected
+        self._sending: Set[asyncio.Task] = set()
     
-    async def send_quote_requests(
+    async def queue_quote_requests(
         self,
         request_id: str,
         car_brand: str,
@@ -21,9 +32,16 @@ class FixItService:
         license_plate: str,
         damage_notes: str,
         image_urls: List[str]
-    ) -> Dict[str, Any]:
+    ) -> Optional[int]:
         """
-        Send quote requests to all garages in the Fix it table
+        Queue quote requests to all garages in the Fix it table
+        
+        Garages get no customer details (name, email, phone), only the
+        request ID, car, damage notes and image links. The job is committed
+        before this returns, so the emails still go out if the process
+        restarts; see :meth:`_fan_out_job`. With ``JOB_QUEUE_ENABLED=false``
+        they are sent from a task on this loop instead
+        (:meth:`send_quote_requests`) and a restart loses the rest.
         
         Args:
             request_id: Unique identifier for this request
@@ -34,103 +52,102 @@ class FixItService:
             image_urls: List of Cloudinary URLs for damage photos
             
         Returns:
-            Dict with success status and details
+            int: The fan-out job's id, or None when the job queue is off
         """
+        payload = {
+            'request_id': request_id,
+            'car_brand': car_brand,
+            'vin': vin,
+            'license_plate': license_plate,
+            'damage_notes': damage_notes,
+            'image_urls': list(image_urls),
+        }
+        if not job_queue_enabled():
+            task = asyncio.create_task(self.send_quote_requests(**payload))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+            logger.info(f"📧 Sending quote requests for VIN {vin} in the background")
+            return None
+        # Keyed by request, so queueing the same request twice sends it once
+        job_id = await job_queue.enqueue(FAN_OUT_JOB, payload, key=f"quote-requests:{request_id}")
+        logger.info(f"📧 Queued quote requests for VIN {vin} (job {job_id})")
+        return job_id
+    
+    async def send_quote_requests(self, request_id: str, **details) -> int:
+        """Send every garage its quote request now, without the job queue; returns how many were sent"""
         try:
-            import asyncio
-            
-            # Get all garages from Fix it table
-            logger.info("⚡ Fetching garages from Baserow 'Fix it' table...")
-            logger.info(f"🔍 DEBUG: self.airtable type: {type(self.airtable)}")
-            logger.info(f"🔍 DEBUG: self.airtable has get_fix_it_garages: {hasattr(self.airtable, 'get_fix_it_garages')}")
-            garages = self.airtable.get_fix_it_garages()
-            logger.info(f"🔍 DEBUG: Garages returned: {garages}")
-            
-            if not garages:
-                logger.error("❌ NO GARAGES FOUND IN FIX IT TABLE!")
-                logger.error("❌ Please check:")
-                logger.error("   1. Airtable base has a table named 'Fix it' (exact spelling)")
-                logger.error("   2. Table contains garage records")
-                logger.error("   3. Each garage has a valid Email field")
-                return {
-                    'success': False,
-                    'error': 'No garages available in Fix it table',
-                    'garages_contacted': 0
-                }
-            
-            logger.info(f"✅ Found {len(garages)} garages in Fix it table")
-            logger.info(f"📧 Sending quote requests to {len(garages)} garages in parallel batches...")
-            
-            # Send emails in parallel batches to avoid timeout
-            # Process in batches of 10 to avoid overwhelming the email service
-            BATCH_SIZE = 10
-            successful_sends = 0
-            failed_sends = 0
-            
-            # Split garages into batches
-            for i in range(0, len(garages), BATCH_SIZE):
-                batch = garages[i:i + BATCH_SIZE]
-                logger.info(f"Processing batch {i//BATCH_SIZE + 1} of {(len(garages) + BATCH_SIZE - 1)//BATCH_SIZE} ({len(batch)} garages)")
-                
-                # Create tasks for parallel sending
-                tasks = []
-                for garage in batch:
-                    task = self._send_garage_quote_request(
-                        garage=garage,
-                        request_id=request_id,
-                        car_brand=car_brand,
-                        vin=vin,
-                        license_plate=license_plate,
-                        damage_notes=damage_notes,
-                        image_urls=image_urls
-                    )
-                    tasks.append(task)
-                
-                # Send all emails in this batch in parallel
-                try:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Count successes and failures
-                    for idx, result in enumerate(results):
-                        garage = batch[idx]
-                        if isinstance(result, Exception):
-                            failed_sends += 1
-                            logger.error(f"Error sending to {garage['name']}: {str(result)}")
-                        elif result:
-                            successful_sends += 1
-                            logger.info(f"✅ Sent to {garage['name']} ({garage['email']})")
-                        else:
-                            failed_sends += 1
-                            logger.error(f"❌ Failed to send to {garage['name']} ({garage['email']})")
-                    
-                    # Small delay between batches to avoid rate limiting
-                    if i + BATCH_SIZE < len(garages):
-                        await asyncio.sleep(1)
-                        
-                except Exception as e:
-                    logger.error(f"Error processing batch: {str(e)}", exc_info=True)
-                    failed_sends += len(batch)
-            
-            logger.info(f"✅ Quote requests sent: {successful_sends} successful, {failed_sends} failed out of {len(garages)} total")
-            
-            return {
-                'success': True,
-                'garages_contacted': successful_sends,
-                'garages_failed': failed_sends,
-                'total_garages': len(garages)
-            }
-            
+            garages = await self._quote_garages()
         except Exception as e:
-            logger.error(f"Error sending quote requests: {str(e)}", exc_info=True)
-            return {
-                'success': False,
-                'error': str(e),
-                'garages_contacted': 0
-            }
+            logger.error(f"❌ Could not send quote requests for request {request_id}: {str(e)}")
+            return 0
+        
+        # The shared Graph limiter paces the sends; the bulk lane lets interactive calls go first
+        with lane(BULK):
+            results = await asyncio.gather(*(
+                self._send_garage_quote_request(garage=garage, request_id=request_id, **details)
+                for garage in garages
+            ), return_exceptions=True)
+        
+        sent = 0
+        for garage, result in zip(garages, results):
+            if result is True:
+                sent += 1
+            else:
+                error = f": {str(result)}" if isinstance(result, Exception) else ""
+                logger.error(f"❌ Failed to send to {garage.name} ({garage.email}){error}")
+        logger.info(f"✅ Quote requests sent: {sent} of {len(garages)} garages for request {request_id}")
+        return sent
+    
+    async def _quote_garages(self) -> List[Garage]:
+        """The Fix it garages with an email address; raises if there are none"""
+        logger.info("⚡ Fetching garages from the 'Fix it' table...")
+        garages = await self.storage.garages.list()
+        logger.debug("Garages returned: %s", garages)
+        
+        if not garages:
+            logger.error("❌ NO GARAGES FOUND IN FIX IT TABLE!")
+            logger.error("❌ Please check:")
+            logger.error("   1. Airtable base has a table named 'Fix it' (exact spelling)")
+            logger.error("   2. Table contains garage records")
+            logger.error("   3. Each garage has a valid Email field")
+            raise RuntimeError('No garages available in Fix it table')
+        
+        reachable = []
+        for garage in garages:
+            if not (garage.email or '').strip():
+                logger.warning(f"Skipping {garage.name}: no email address")
+                continue
+            reachable.append(garage)
+        return reachable
+    
+    async def _fan_out_job(self, job: Job):
+        """Queue one send job per garage in the Fix it table.
+        
+        Each garage's email is its own job, retried on its own, so a
+        restart half-way through only sends the ones still outstanding.
+        The send jobs are keyed by this job's id and the garage's address,
+        so running this job again doesn't queue any garage twice.
+        """
+        garages = await self._quote_garages()
+        sends = {}
+        for garage in garages:
+            address = garage.email.strip().lower()
+            sends.setdefault(f"quote-request:{job.id}:{address}", {**job.payload, 'garage': asdict(garage)})
+        
+        added = await job_queue.enqueue_many(SEND_JOB, sends.items())
+        logger.info(f"✅ Queued quote requests to {added} of {len(garages)} garages for request {job.payload['request_id']}")
+    
+    async def _send_job(self, job: Job):
+        """Send one garage its quote request; raising makes the queue retry it"""
+        payload = dict(job.payload)
+        garage = Garage(**payload.pop('garage'))
+        if not await self._send_garage_quote_request(garage=garage, **payload):
+            raise RuntimeError(f"Could not send the quote request to {garage.name} ({garage.email})")
+        logger.info(f"✅ Sent to {garage.name} ({garage.email})")
     
     async def _send_garage_quote_request(
         self,
-        garage: Dict[str, Any],
+        garage: Garage,
         request_id: str,
         car_brand: str,
         vin: str,
@@ -142,7 +159,7 @@ class FixItService:
         Send a quote request email to a single garage in English
         
         Args:
-            garage: Garage information dict
+            garage: Garage from the Fix it table
             request_id: Unique request identifier
             car_brand: Car brand
             vin: Vehicle Identification Number
@@ -259,7 +276,7 @@ Reference: {request_id}
             
             # Send the email with both HTML and plain text versions
             success = await self.email_service.send_email(
-                to_emails=[garage['email']],
+                to_emails=[garage.email],
                 subject=subject,
                 html_content=html_content,
                 text_content=plain_text
@@ -268,7 +285,7 @@ Reference: {request_id}
             return success
             
         except Exception as e:
-            logger.error(f"Error sending quote request to {garage.get('name', 'unknown')}: {str(e)}", exc_info=True)
+            logger.error(f"Error sending quote request to {garage.name}: {str(e)}", exc_info=True)
             return False
     
     def _calculate_business_days_deadline(self, business_days: int) -> datetime:
@@ -294,3 +311,8 @@ Reference: {request_id}
 
 # Singleton instance
 fix_it_service = FixItService()
+
+job_queue.register(FAN_OUT_JOB, fix_it_service._fan_out_job, concurrency=2)
+# Leaves workers free for fan-outs; the Graph limiter paces the sends themselves
+job_queue.register(SEND_JOB, fix_it_service._send_job,
+                   concurrency=int(os.getenv('QUOTE_REQUEST_SEND_CONCURRENCY', 12)))
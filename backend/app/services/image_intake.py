@@ -0,0 +1,214 @@
+"""Bounded-memory intake for the photos attached to a service request.
+
+Starlette spools each uploaded file (in memory up to 1 MB, then on disk).
+Reading every spool into ``bytes`` would keep all of a request's photos in
+memory, several times over, until the upload finished. Instead, each spool
+is copied in ``CHUNK_SIZE`` chunks into a staging file, SHA-256 hashed on the way,
+and the later stages (:mod:`.image_processing`, :mod:`.image_upload_service`)
+work from the staged file's path.
+
+Limits, all in bytes:
+
+* ``SERVICE_REQUEST_MAX_IMAGE_BYTES`` (15 MB) per photo and
+  ``SERVICE_REQUEST_MAX_IMAGES`` (10) per request, checked from the
+  spooled sizes before anything is copied (413).
+* ``SERVICE_REQUEST_MAX_BYTES`` (60 MB) for the whole request body,
+  enforced while it streams in by :mod:`app.core.body_limit`.
+* ``INTAKE_BYTE_BUDGET`` (256 MB) of staged photos across all requests.
+  A request that doesn't fit waits up to ``INTAKE_BUDGET_WAIT`` seconds
+  (10) for others to finish, then gets a 503.
+
+Staging files live in ``INTAKE_DIR`` (the system temp directory) and are
+deleted by :meth:`ImageIntake.release`.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi import UploadFile, status
+
+from ..core.body_limit import CONTENT_TOO_LARGE, stats as body_limit_stats
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+MB = 1024 * 1024
+
+
+class IntakeRejected(Exception):
+    """A submission whose photos can't be accepted; carries the HTTP answer"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StagedImage:
+    """One photo on disk; usable wherever a path is accepted"""
+    filename: str
+    content_type: str
+    path: str
+    size: int
+    sha256: str
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+@dataclass
+class StagedRequest:
+    """A request's staged photos and the budget they hold"""
+    images: List[StagedImage]
+    reserved: int
+
+
+class ByteBudget:
+    """Bytes reserved by requests in flight, with waiting when full"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, amount: int, timeout: float) -> bool:
+        """Reserve ``amount`` bytes; False if they didn't free up within ``timeout``"""
+        if self.limit <= 0:
+            self.in_use += amount
+            return True
+        # A request bigger than the whole budget may still run, alone
+        amount = min(amount, self.limit)
+        condition = self._get_condition()
+        async with condition:
+            try:
+                await asyncio.wait_for(condition.wait_for(lambda: self.in_use + amount <= self.limit), timeout)
+            except asyncio.TimeoutError:
+                return False
+            self.in_use += amount
+            return True
+
+    async def release(self, amount: int):
+        if self.limit > 0:
+            amount = min(amount, self.limit)
+        condition = self._get_condition()
+        async with condition:
+            self.in_use = max(0, self.in_use - amount)
+            condition.notify_all()
+
+
+class ImageIntake:
+    """Validates, budgets and stages uploaded photos, see module docstring"""
+
+    def __init__(self):
+        self.max_image_bytes = int(os.getenv('SERVICE_REQUEST_MAX_IMAGE_BYTES', 15 * MB))
+        self.max_images = int(os.getenv('SERVICE_REQUEST_MAX_IMAGES', 10))
+        self.max_request_bytes = int(os.getenv('SERVICE_REQUEST_MAX_BYTES', 60 * MB))
+        self.budget = ByteBudget(int(os.getenv('INTAKE_BYTE_BUDGET', 256 * MB)))
+        self.budget_wait = float(os.getenv('INTAKE_BUDGET_WAIT', 10))
+        self.directory = os.getenv('INTAKE_DIR') or None
+        self.metrics: Counter = Counter()
+
+    def check(self, uploads: List[UploadFile]):
+        """Reject too many or too large photos from their spooled sizes alone"""
+        if len(uploads) > self.max_images:
+            self.metrics['rejected'] += 1
+            raise IntakeRejected(CONTENT_TOO_LARGE,
+                                 f"At most {self.max_images} images can be attached")
+        for upload in uploads:
+            if upload.size is not None and upload.size > self.max_image_bytes:
+                self.metrics['rejected'] += 1
+                raise IntakeRejected(CONTENT_TOO_LARGE,
+                                     f"Image {upload.filename} is larger than {self.max_image_bytes // MB} MB")
+
+    def _copy(self, upload: UploadFile) -> StagedImage:
+        """Spool -> staging file, chunk by chunk (blocking; runs on a worker thread)"""
+        filename = upload.filename or f"image_{int(time.time())}.jpg"
+        digest = hashlib.sha256()
+        size = 0
+        upload.file.seek(0)
+        fd, path = tempfile.mkstemp(prefix='intake-', suffix=os.path.splitext(filename)[1].lower(), dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = upload.file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        raise IntakeRejected(CONTENT_TOO_LARGE,
+                                             f"Image {filename} is larger than {self.max_image_bytes // MB} MB")
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return StagedImage(filename, upload.content_type or "application/octet-stream", path, size, digest.hexdigest())
+
+    async def stage(self, uploads: List[UploadFile]) -> StagedRequest:
+        """Copy the uploads to staging files within the global byte budget.
+
+        Every successful call must be paired with :meth:`release`.
+        """
+        self.check(uploads)
+        reserve = sum(upload.size or self.max_image_bytes for upload in uploads)
+        if not await self.budget.acquire(reserve, self.budget_wait):
+            self.metrics['over_budget'] += 1
+            raise IntakeRejected(status.HTTP_503_SERVICE_UNAVAILABLE,
+                                 "Too many uploads in progress, please try again in a moment")
+
+        loop = asyncio.get_running_loop()
+        staged: List[StagedImage] = []
+        try:
+            for upload in uploads:
+                image = await loop.run_in_executor(None, self._copy, upload)
+                staged.append(image)
+                logger.info(f"Staged image: {image.filename}, size: {image.size} bytes, type: {image.content_type}")
+        except BaseException as e:
+            for image in staged:
+                image.discard()
+            await self.budget.release(reserve)
+            if isinstance(e, IntakeRejected):
+                self.metrics['rejected'] += 1
+            raise
+
+        self.metrics['staged'] += len(staged)
+        self.metrics['bytes'] += sum(image.size for image in staged)
+        return StagedRequest(staged, reserve)
+
+    async def release(self, request: StagedRequest):
+        """Delete the staging files and give their bytes back to the budget"""
+        for image in request.images:
+            image.discard()
+        await self.budget.release(request.reserved)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'budget_bytes': self.budget.limit,
+            'in_use_bytes': self.budget.in_use,
+            'max_image_bytes': self.max_image_bytes,
+            'max_request_bytes': self.max_request_bytes,
+            'body_rejected_declared': body_limit_stats['rejected_declared'],
+            'body_rejected_streamed': body_limit_stats['rejected_streamed'],
+            **self.metrics,
+        }
+
+
+image_intake = ImageIntake()
@@ -0,0 +1,349 @@
+"""Shrink customer photos before they are uploaded and mailed to garages.
+
+Phones send 4-12 MB JPEGs, and every garage that gets the quote request
+downloads them. Between reading the upload and storing it, each photo is:
+
+1. checked before it is decoded, so a small file that inflates to
+   gigabytes (a decompression bomb) is rejected: over ``IMAGE_MAX_PIXELS``
+   (200 MP, above any phone camera), or more than
+   ``IMAGE_MAX_PIXELS_PER_BYTE`` pixels per byte of file once the JPEG
+   decoder's downscaling is accounted for (a 200 MP photo only decodes at
+   1/8 scale, so only the other formats need to be small),
+2. rotated upright according to its EXIF orientation,
+3. scaled down so neither side exceeds ``IMAGE_MAX_EDGE`` pixels,
+4. re-encoded as ``IMAGE_FORMAT`` (``jpeg`` or ``webp``) at
+   ``IMAGE_QUALITY``, without EXIF (which also drops GPS positions).
+
+Photos arrive as :class:`~.image_intake.StagedImage` files and are
+replaced on disk. Decoding and encoding are CPU-bound, so they run in a
+process pool (``IMAGE_PROCESS_WORKERS``) instead of holding the GIL on the
+request loop. Anything Pillow can't read (HEIC without a plugin, PDFs, videos) and
+animated images are passed through unchanged, as are all photos when
+Pillow isn't installed or ``IMAGE_NORMALIZE=false``.
+
+A photo that can't be normalised (corrupt past its header, too slow, or
+its worker crashed) is never uploaded as it came: a JPEG has its metadata
+segments removed losslessly (:func:`strip_jpeg_metadata`, without
+decoding it), anything else is rejected.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Workers import this module too; keep them clear of FastAPI
+    from .image_intake import StagedImage
+
+logger = logging.getLogger(__name__)
+
+_FORMATS = {
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+}
+
+
+def _discard(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class ImageRejected(Exception):
+    """A photo that must not be processed (or stored) at all"""
+
+
+class ImageCorrupt(Exception):
+    """A photo whose header read fine but whose pixels couldn't be decoded"""
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# JFIF, ICC profile and Adobe (colour transform): needed to show the photo right
+_KEPT_SEGMENTS = {0xE0, 0xE2, 0xEE}
+
+
+def strip_jpeg_metadata(source: str, dest: str) -> Optional[Tuple[int, str]]:
+    """Copy the JPEG at ``source`` to ``dest`` without EXIF, XMP, IPTC or comments.
+
+    Only the segments before the image data are rewritten; the compressed
+    pixels are copied as they are. Returns ``(size, sha256)`` of ``dest``,
+    or None if ``source`` isn't a well-formed JPEG (``dest`` may then be
+    left half written). The EXIF orientation goes too, so a photo the
+    camera stored sideways stays sideways.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(source, 'rb') as src, open(dest, 'wb') as out:
+        def write(data: bytes):
+            nonlocal size
+            out.write(data)
+            digest.update(data)
+            size += len(data)
+
+        if src.read(2) != b'\xff\xd8':
+            return None
+        write(b'\xff\xd8')
+        while True:
+            marker = src.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            while marker[1] == 0xFF:
+                # Fill bytes before a marker
+                marker = b'\xff' + src.read(1)
+                if len(marker) < 2:
+                    return None
+            code = marker[1]
+            if code == 0x01 or 0xD0 <= code <= 0xD7:
+                write(marker)
+                continue
+            if code == 0xD9:
+                write(marker)
+                break
+            header = src.read(2)
+            length = int.from_bytes(header, 'big') if len(header) == 2 else 0
+            payload = src.read(length - 2) if length >= 2 else b''
+            if length < 2 or len(payload) != length - 2:
+                return None
+            if code == 0xFE or (0xE0 <= code <= 0xEF and code not in _KEPT_SEGMENTS):
+                continue
+            write(marker + header + payload)
+            if code == 0xDA:
+                # Start of scan: the rest is image data (and later scans), copied as is
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    write(chunk)
+                break
+    return size, digest.hexdigest()
+
+
+@dataclass
+class ImageSettings:
+    max_edge: int = 2048
+    quality: int = 82
+    format: str = 'jpeg'
+    max_pixels: int = 200_000_000
+    max_pixels_per_byte: float = 100
+
+    @classmethod
+    def from_env(cls) -> 'ImageSettings':
+        image_format = os.getenv('IMAGE_FORMAT', 'jpeg').lower()
+        if image_format not in _FORMATS:
+            logger.warning(f"Unknown IMAGE_FORMAT {image_format!r}, using jpeg")
+            image_format = 'jpeg'
+        return cls(
+            max_edge=int(os.getenv('IMAGE_MAX_EDGE', 2048)),
+            quality=min(100, max(1, int(os.getenv('IMAGE_QUALITY', 82)))),
+            format=image_format,
+            max_pixels=int(os.getenv('IMAGE_MAX_PIXELS', 200_000_000)),
+            max_pixels_per_byte=float(os.getenv('IMAGE_MAX_PIXELS_PER_BYTE', 100)),
+        )
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL.Image  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def normalise_image(source: str, dest: str, filename: str, settings: ImageSettings) -> Optional[Dict[str, Any]]:
+    """Re-encode the photo at ``source`` into ``dest``; ``None`` if it should be kept as it is.
+
+    Runs in the worker processes, so it only takes and returns plain data.
+    Raises :class:`ImageRejected` for decompression bombs and
+    :class:`ImageCorrupt` when the pixels can't be decoded.
+    """
+    import io
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    # Pillow itself only raises at twice MAX_IMAGE_PIXELS; the size check below catches the rest
+    Image.MAX_IMAGE_PIXELS = settings.max_pixels
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(str(e))
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    # open() only read the header, so these are checked before any pixels are decoded
+    width, height = image.size
+    if width * height > settings.max_pixels:
+        raise ImageRejected(f"{width}x{height} pixels is over the {settings.max_pixels} pixel limit")
+    if getattr(image, 'is_animated', False):
+        return None
+
+    pil_format, extension, content_type = _FORMATS[settings.format]
+    try:
+        # Let the JPEG decoder scale down by 1/2..1/8 while decoding; a square box doesn't care about rotation
+        image.draft('RGB', (settings.max_edge, settings.max_edge))
+        decoded = image.size[0] * image.size[1]
+        # Up to four times the output size decodes cheaply whatever the file size
+        if decoded > 4 * settings.max_edge ** 2 and decoded > settings.max_pixels_per_byte * os.path.getsize(source):
+            raise ImageRejected(f"{width}x{height} pixels from {os.path.getsize(source)} bytes looks like a decompression bomb")
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((settings.max_edge, settings.max_edge), Image.LANCZOS)
+        if image.mode not in (('RGB', 'RGBA') if pil_format == 'WEBP' else ('RGB', 'L')):
+            transparent = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if pil_format == 'WEBP' and transparent else 'RGB')
+
+        buffer = io.BytesIO()
+        # No exif= argument, so nothing from the original's metadata is written; the
+        # JPEG encoder would still copy a comment from image.info, so drop it first
+        image.info.pop('comment', None)
+        image.save(buffer, pil_format, quality=settings.quality, optimize=pil_format == 'JPEG')
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(str(e))
+    except (OSError, ValueError, SyntaxError) as e:
+        # Truncated or corrupt past the header
+        raise ImageCorrupt(str(e))
+
+    content = buffer.getvalue()
+    with open(dest, 'wb') as f:
+        f.write(content)
+    stem = os.path.splitext(os.path.basename(filename))[0] or 'image'
+    return {
+        'filename': f"{stem}{extension}",
+        'content_type': content_type,
+        'size': len(content),
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'width': image.width,
+        'height': image.height,
+    }
+
+
+class ImageProcessor:
+    """Process-pool front end for :func:`normalise_image`, see module docstring"""
+
+    def __init__(self, settings: Optional[ImageSettings] = None, max_workers: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.settings = settings or ImageSettings.from_env()
+        self.max_workers = max(1, max_workers or int(os.getenv('IMAGE_PROCESS_WORKERS', 2)))
+        self.timeout = timeout or float(os.getenv('IMAGE_PROCESS_TIMEOUT', 20))
+        self.enabled = os.getenv('IMAGE_NORMALIZE', 'true').lower() in ('1', 'true', 'yes')
+        if self.enabled and not pillow_available():
+            logger.warning("Pillow is not installed; photos will be uploaded without resizing")
+            self.enabled = False
+        self.metrics: Counter = Counter()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Spawned, not forked: the app has threads (logging, scheduler)
+                    # whose locks a forked child could inherit held
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+        return self._executor
+
+    async def _normalise_one(self, image: 'StagedImage'):
+        """Replace the staged file with its normalised version, or at least strip its metadata"""
+        dest = image.path + '.out'
+        future = self._get_executor().submit(normalise_image, image.path, dest, image.filename, self.settings)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except ImageRejected as e:
+            self.metrics['rejected'] += 1
+            logger.warning(f"Rejected image {image.filename}: {str(e)}")
+            raise
+        except asyncio.TimeoutError:
+            # The worker may still write dest; remove it whenever it's done
+            future.add_done_callback(lambda _: _discard(dest))
+            self.metrics['timed_out'] += 1
+            reason = f"processing took over {self.timeout:g}s"
+        except BrokenProcessPool:
+            # A worker died (out of memory on a huge image, usually); start a fresh pool next time
+            with self._lock:
+                self._executor = None
+            self.metrics['failed'] += 1
+            reason = "its worker crashed"
+        except ImageCorrupt as e:
+            self.metrics['corrupt'] += 1
+            reason = f"it is corrupt ({str(e)})"
+        except Exception as e:
+            self.metrics['failed'] += 1
+            logger.error(f"Error processing {image.filename}: {str(e)}", exc_info=True)
+            reason = "processing failed"
+        else:
+            self._normalised(image, dest, result)
+            return
+        await self._strip_metadata(image, reason)
+
+    def _normalised(self, image: 'StagedImage', dest: str, result: Optional[Dict[str, Any]]):
+        if result is None:
+            self.metrics['passed_through'] += 1
+            return
+        os.replace(dest, image.path)
+        self.metrics['processed'] += 1
+        self.metrics['bytes_in'] += image.size
+        self.metrics['bytes_out'] += result['size']
+        logger.info(f"Normalised {image.filename}: {image.size} -> {result['size']} bytes "
+                    f"({result['width']}x{result['height']})")
+        image.filename = result['filename']
+        image.content_type = result['content_type']
+        image.size = result['size']
+        image.sha256 = result['sha256']
+
+    async def _strip_metadata(self, image: 'StagedImage', reason: str):
+        """Fallback for a photo that couldn't be normalised: drop its metadata, or reject it"""
+        dest = image.path + '.stripped'
+        try:
+            stripped = await asyncio.to_thread(strip_jpeg_metadata, image.path, dest)
+        except OSError as e:
+            logger.error(f"Could not strip the metadata of {image.filename}: {str(e)}")
+            stripped = None
+        if stripped is None:
+            _discard(dest)
+            self.metrics['rejected'] += 1
+            logger.error(f"Rejected image {image.filename}: {reason}, and it isn't a JPEG "
+                         f"whose metadata can be removed")
+            raise ImageRejected(f"{image.filename} could not be processed")
+        os.replace(dest, image.path)
+        image.size, image.sha256 = stripped
+        self.metrics['stripped'] += 1
+        logger.warning(f"Could not normalise {image.filename}: {reason}; uploading it with its metadata removed")
+
+    async def normalise_many(self, images: List['StagedImage']):
+        """Normalise staged photos in place, in parallel.
+
+        Raises :class:`ImageRejected` if any of them is a decompression bomb.
+        """
+        if not self.enabled or not images:
+            return
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._normalise_one(image) for image in images), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        logger.info(f"Processed {len(images)} image(s) in {time.monotonic() - started:.2f}s")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'workers': self.max_workers,
+            'max_edge': self.settings.max_edge,
+            'format': self.settings.format,
+            **self.metrics,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+image_processor = ImageProcessor()
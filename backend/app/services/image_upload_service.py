@@ -0,0 +1,223 @@
+"""Cloudinary uploads for customer photos, off the event loop and in parallel.
+
+The Cloudinary SDK is blocking, so :meth:`ImageUploadService.upload_many`
+runs each upload on a small thread pool and awaits them together: a
+request with five photos waits about as long as its slowest photo instead
+of the sum of all five. The shared ``cloudinary`` limiter still caps the
+uploads in flight across the whole process.
+
+Each upload has its own deadline (``CLOUDINARY_UPLOAD_TIMEOUT`` seconds,
+counted from when it is submitted). A photo that fails or runs out of time
+doesn't fail the others; callers get an :class:`UploadOutcome` per photo and
+decide what partial success means for them.
+
+Settings: ``CLOUDINARY_UPLOAD_WORKERS`` (4) and ``CLOUDINARY_UPLOAD_TIMEOUT``
+(30). The SDK is configured from the ``CLOUDINARY_*`` credentials once, on
+first use.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..core.limits import get_limiter
+from ..core.logging_config import lazy_json
+
+logger = logging.getLogger(__name__)
+
+
+class CloudinaryUploadError(Exception):
+    """An upload that Cloudinary rejected or never answered"""
+
+
+@dataclass
+class UploadOutcome:
+    filename: str
+    url: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.url is not None
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _resource_type(filename: str) -> str:
+    name = filename.lower()
+    if name.endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
+        return "image"
+    if name.endswith(('.mp4', '.webm', '.mov')):
+        return "video"
+    if name.endswith(('.pdf', '.doc', '.docx', '.txt')):
+        return "raw"
+    return "auto"
+
+
+class ImageUploadService:
+    """Thread-pooled Cloudinary uploader, see module docstring"""
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_workers = max(1, max_workers or int(os.getenv('CLOUDINARY_UPLOAD_WORKERS', 4)))
+        self.timeout = timeout or float(os.getenv('CLOUDINARY_UPLOAD_TIMEOUT', 30))
+        self.metrics: Counter = Counter()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def configure(self):
+        """Apply the credentials to the SDK's global config, the first time only"""
+        if self._configured:
+            return
+        with self._lock:
+            if self._configured:
+                return
+            import cloudinary
+
+            cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME')
+            api_key = os.getenv('CLOUDINARY_API_KEY')
+            api_secret = os.getenv('CLOUDINARY_API_SECRET')
+            if not all([cloud_name, api_key, api_secret]):
+                raise CloudinaryUploadError("Missing Cloudinary configuration. Please check environment variables.")
+
+            cloudinary.config(
+                cloud_name=cloud_name,
+                api_key=api_key,
+                api_secret=api_secret,
+                upload_prefix=os.getenv('CLOUDINARY_UPLOAD_PREFIX') or None,
+                secure=True
+            )
+            self._configured = True
+            logger.info("Cloudinary configured")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cloudinary-upload')
+        return self._executor
+
+    def upload_or_raise(self, file_content, filename: str, public_id: Optional[str] = None) -> str:
+        """Upload one file (blocking) and return its URL.
+
+        Without a ``public_id`` one is made up from the filename, the time
+        and the content hash.
+        """
+        import cloudinary.uploader
+
+        self.configure()
+
+        if isinstance(file_content, os.PathLike):
+            # A staged file: the SDK reads it from disk, so it never sits in memory here
+            file_hash = getattr(file_content, 'sha256', None) or file_sha256(os.fspath(file_content))
+            size = os.path.getsize(file_content)
+            file_content = os.fspath(file_content)
+        else:
+            if hasattr(file_content, 'read'):
+                file_content = file_content.read()
+            if file_content:
+                file_hash = hashlib.sha256(file_content if isinstance(file_content, bytes) else file_content.encode()).hexdigest()
+            size = len(file_content or b'')
+        if not size:
+            raise CloudinaryUploadError("No file content provided")
+
+        if public_id is None:
+            timestamp = str(int(time.time()))
+
+            # Clean the filename to remove any special characters
+            clean_filename = re.sub(r'[^\w\d-]', '_', os.path.splitext(filename)[0])
+            clean_extension = os.path.splitext(filename)[1].lower()
+            public_id = f"garagefy/{clean_filename}_{timestamp}_{file_hash[:8]}{clean_extension}"
+
+        logger.info(f"Uploading {filename} to Cloudinary. Size: {size} bytes, Public ID: {public_id}")
+
+        with get_limiter('cloudinary').slot():
+            result = cloudinary.uploader.upload(
+                file_content,
+                public_id=public_id,
+                folder="garagefy",
+                resource_type=_resource_type(filename),
+                overwrite=True,
+                unique_filename=True,
+                use_filename=True,
+                filename_override=os.path.basename(filename),
+                timeout=self.timeout
+            )
+
+        logger.debug("Cloudinary upload response: %s", lazy_json(result))
+        if not result or 'secure_url' not in result:
+            raise CloudinaryUploadError(f"Cloudinary upload failed. Response: {result}")
+
+        self.metrics['uploaded'] += 1
+        self.metrics['bytes'] += size
+        logger.info(f"Successfully uploaded to Cloudinary: {result['secure_url']}")
+        return result['secure_url']
+
+    def upload(self, file_content, filename: str) -> Optional[str]:
+        """Upload one file (blocking); the URL, or None if it failed"""
+        try:
+            return self.upload_or_raise(file_content, filename)
+        except Exception as e:
+            self.metrics['failed'] += 1
+            logger.error(f"Cloudinary upload of {filename} failed: {str(e)}", exc_info=True)
+            return None
+
+    async def upload_async(self, filename: str, content, public_id: Optional[str] = None) -> UploadOutcome:
+        """Upload one file on the pool, within the timeout; never raises"""
+        # Run in a copy of the caller's context so the limiter sees its lane
+        future = self._get_executor().submit(contextvars.copy_context().run, self.upload_or_raise, content, filename, public_id)
+        try:
+            url = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            return UploadOutcome(filename, url=url)
+        except asyncio.TimeoutError:
+            # A queued upload is cancelled; one already running finishes on its own and is ignored
+            self.metrics['timed_out'] += 1
+            logger.error(f"Cloudinary upload of {filename} timed out after {self.timeout:g}s")
+            return UploadOutcome(filename, error=f"Timed out after {self.timeout:g}s")
+        except Exception as e:
+            self.metrics['failed'] += 1
+            logger.error(f"Cloudinary upload of {filename} failed: {str(e)}", exc_info=not isinstance(e, CloudinaryUploadError))
+            return UploadOutcome(filename, error=str(e))
+
+    async def upload_many(self, images: Sequence[Tuple[str, Any]]) -> List[UploadOutcome]:
+        """Upload ``(filename, content)`` pairs concurrently; one outcome per pair, in order.
+
+        ``content`` is bytes or a path (such as a staged file).
+        """
+        if not images:
+            return []
+        started = time.monotonic()
+        outcomes = await asyncio.gather(*(self.upload_async(filename, content) for filename, content in images))
+        uploaded = sum(1 for outcome in outcomes if outcome.ok)
+        logger.info(f"Uploaded {uploaded} of {len(images)} image(s) to Cloudinary in {time.monotonic() - started:.2f}s")
+        return list(outcomes)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'workers': self.max_workers,
+            'timeout': self.timeout,
+            **self.metrics,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+image_upload_service = ImageUploadService()
@@ -0,0 +1,224 @@
+"""Content-addressed storage for customer photos, with upload dedup.
+
+Every stored file is keyed by the SHA-256 of its bytes. The ``media_objects``
+table of ``garagefy.db`` maps ``(backend, digest)`` to the URL the backend
+gave it, so storing the same bytes again (a resubmitted form, a write-behind
+retry, the same photo attached twice) returns that URL without uploading
+anything. Photos are normalised deterministically before they get here
+(:mod:`.image_processing`), so a re-sent photo hashes the same. Concurrent
+stores of the same bytes share one upload through a :class:`SingleFlight`.
+
+``MEDIA_BACKEND`` picks where the bytes go:
+
+* ``cloudinary`` (default) uploads through :mod:`.image_upload_service`
+  with ``garagefy/<digest>`` as the public id.
+* ``local`` writes ``MEDIA_DIR/<digest[:2]>/<digest><ext>`` and hands out
+  ``MEDIA_BASE_URL/media/<digest><ext>``, served by the ``/media`` route
+  with a strong ETag, ``Range`` support and an immutable ``Cache-Control``.
+  It is meant for development and benchmarks, where no Cloudinary account
+  (or fake) is wanted.
+
+The index is trusted as it is for Cloudinary: an asset deleted there by
+hand keeps its row until the row is deleted too. Local entries whose file
+has gone are stored again.
+"""
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..core.database import SessionLocal
+from ..core.singleflight import SingleFlight
+from ..models.media_object import MediaObject
+from .image_upload_service import UploadOutcome, file_sha256, image_upload_service
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# <digest><ext>, the only names the local backend hands out
+MEDIA_NAME = re.compile(r'^([0-9a-f]{64})(\.[a-z0-9]{1,5})?$')
+
+
+def _extension(filename: str) -> str:
+    extension = os.path.splitext(filename or '')[1].lower()
+    return extension if re.fullmatch(r'\.[a-z0-9]{1,5}', extension) else ''
+
+
+def _content_type(filename: str, content) -> str:
+    return (getattr(content, 'content_type', None)
+            or mimetypes.guess_type(filename or '')[0]
+            or 'application/octet-stream')
+
+
+def _size(content) -> int:
+    if isinstance(content, os.PathLike):
+        return os.path.getsize(content)
+    return len(content or b'')
+
+
+class CloudinaryMediaBackend:
+    name = 'cloudinary'
+
+    async def put(self, digest: str, filename: str, content) -> UploadOutcome:
+        return await image_upload_service.upload_async(filename, content, public_id=f"garagefy/{digest}")
+
+    def has(self, url: str) -> bool:
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {}
+
+
+class LocalMediaBackend:
+    name = 'local'
+
+    def __init__(self, root: str, base_url: str):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+
+    def path_for(self, name: str) -> Optional[str]:
+        """Path of a stored ``<digest><ext>``, or None for any other name"""
+        match = MEDIA_NAME.match(name)
+        if not match:
+            return None
+        return os.path.join(self.root, match.group(1)[:2], name)
+
+    def _write(self, name: str, content) -> str:
+        path = self.path_for(name)
+        if os.path.exists(path):
+            return path
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Written beside its final name and renamed, so a reader never sees half a file
+        fd, tmp = tempfile.mkstemp(prefix='.media-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                if isinstance(content, os.PathLike):
+                    with open(content, 'rb') as source:
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                            out.write(chunk)
+                else:
+                    out.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return path
+
+    async def put(self, digest: str, filename: str, content) -> UploadOutcome:
+        name = f"{digest}{_extension(filename)}"
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, name, content)
+        except OSError as e:
+            logger.error(f"Could not store {filename} under {self.root}: {str(e)}")
+            return UploadOutcome(filename, error=str(e))
+        return UploadOutcome(filename, url=f"{self.base_url}/media/{name}")
+
+    def has(self, url: str) -> bool:
+        path = self.path_for(url.rsplit('/', 1)[-1])
+        return path is not None and os.path.exists(path)
+
+    def status(self) -> Dict[str, Any]:
+        return {'root': self.root, 'base_url': self.base_url}
+
+
+def _backend_from_env():
+    name = os.getenv('MEDIA_BACKEND', 'cloudinary').lower()
+    if name == 'local':
+        base_url = os.getenv('MEDIA_BASE_URL') or f"http://localhost:{os.getenv('PORT', 8099)}"
+        return LocalMediaBackend(os.getenv('MEDIA_DIR') or 'media', base_url)
+    if name != 'cloudinary':
+        logger.warning(f"Unknown MEDIA_BACKEND {name!r}, using cloudinary")
+    return CloudinaryMediaBackend()
+
+
+class MediaStore:
+    """Deduplicating front of the configured media backend, see module docstring"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or _backend_from_env()
+        self.metrics: Counter = Counter()
+        self.flights = SingleFlight('media_store')
+
+    async def _digest(self, content) -> str:
+        if isinstance(content, os.PathLike):
+            # Staged files were hashed while they were copied in
+            known = getattr(content, 'sha256', None)
+            if known:
+                return known
+            return await asyncio.get_running_loop().run_in_executor(None, file_sha256, os.fspath(content))
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    async def _run(fn, *args):
+        """Run blocking index work (SQLite, file checks) off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _lookup(self, digest: str) -> Optional[str]:
+        with SessionLocal() as db:
+            entry = db.get(MediaObject, (self.backend.name, digest))
+            if entry is None:
+                return None
+            if self.backend.has(entry.url):
+                return entry.url
+            db.delete(entry)
+            db.commit()
+        return None
+
+    def _record(self, digest: str, url: str, size: int, content_type: str):
+        with SessionLocal() as db:
+            db.merge(MediaObject(backend=self.backend.name, digest=digest, url=url,
+                                 size=size, content_type=content_type, created_at=time.time()))
+            db.commit()
+
+    async def _store(self, digest: str, filename: str, content) -> UploadOutcome:
+        outcome = await self.backend.put(digest, filename, content)
+        if outcome.ok:
+            await self._run(self._record, digest, outcome.url, _size(content), _content_type(filename, content))
+            self.metrics['stored'] += 1
+        else:
+            self.metrics['failed'] += 1
+        return outcome
+
+    async def put(self, filename: str, content) -> UploadOutcome:
+        """Store one file (bytes or a path) unless the same bytes are already stored; never raises"""
+        if not _size(content):
+            return UploadOutcome(filename, error="No file content provided")
+        digest = await self._digest(content)
+        url = await self._run(self._lookup, digest)
+        if url is not None:
+            self.metrics['deduplicated'] += 1
+            logger.info(f"{filename} is already stored as {url}, not uploading it again")
+            return UploadOutcome(filename, url=url)
+
+        outcome = await self.flights.do_async(digest, lambda: self._store(digest, filename, content))
+        return UploadOutcome(filename, url=outcome.url, error=outcome.error)
+
+    async def put_many(self, items: Sequence[Tuple[str, Any]]) -> List[UploadOutcome]:
+        """Store ``(filename, content)`` pairs concurrently; one outcome per pair, in order"""
+        if not items:
+            return []
+        started = time.monotonic()
+        outcomes = await asyncio.gather(*(self.put(filename, content) for filename, content in items))
+        stored = sum(1 for outcome in outcomes if outcome.ok)
+        logger.info(f"Stored {stored} of {len(items)} file(s) with the {self.backend.name} media backend "
+                    f"in {time.monotonic() - started:.2f}s")
+        return list(outcomes)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'backend': self.backend.name,
+            **self.backend.status(),
+            'coalescing': self.flights.snapshot(),
+            **self.metrics,
+        }
+
+
+media_store = MediaStore()
@@ -4,18 +4,15 @@ from typing import List, Optional, Dict, Any
 from fastapi import HTTPException, status
 
 from ..models.quote import Quote, QuoteCreate, QuoteUpdate, QuoteSummary, QuoteStatus
-from .baserow_service import baserow_service as airtable_service
+from ..repositories import repositories
 
 logger = logging.getLogger(__name__)
 
 class QuoteService:
     """Service for handling quote-related operations"""
     
-    QUOTE_TABLE = "Quotes"
-    SERVICE_REQUESTS_TABLE = "Service Requests"
-    
     def __init__(self):
-        self.airtable = airtable_service
+        self.storage = repositories
     
     async def create_quote(self, quote: QuoteCreate) -> Quote:
         """Create a new quote"""
@@ -25,14 +22,10 @@ class QuoteService:
             quote_data['created_at'] = datetime.utcnow().isoformat()
             quote_data['updated_at'] = datetime.utcnow().isoformat()
             
-            # Save to Baserow via the Airtable-compatible wrapper
-            record = self.airtable.create_record(self.QUOTE_TABLE, quote_data)
-            fields = record.get('fields', {}) or {}
-            # Expose the Baserow row ID as the quote ID in API responses
-            fields['id'] = str(record.get('id')) if record.get('id') is not None else fields.get('id')
+            fields = await self.storage.quotes.create(quote_data)
             
             # Update service request with new quote count
-            self._update_service_request_quote_count(quote.request_id)
+            await self._update_service_request_quote_count(quote.request_id)
             
             # Check if we should send quote summary
             await self._check_and_send_quote_summary(quote.request_id)
@@ -46,39 +39,28 @@ class QuoteService:
                 detail=f"Failed to create quote: {str(e)}"
             )
     
-    def get_quote(self, quote_id: str) -> Optional[Quote]:
+    async def get_quote(self, quote_id: str) -> Optional[Quote]:
         """Get a quote by ID"""
         try:
-            record = self.airtable.get_record(self.QUOTE_TABLE, int(quote_id))
-            if not record:
-                return None
-            fields = record.get('fields', {}) or {}
-            fields['id'] = str(record.get('id')) if record.get('id') is not None else fields.get('id')
-            return Quote(**fields)
+            fields = await self.storage.quotes.get(quote_id)
+            return Quote(**fields) if fields else None
         except Exception as e:
             logger.error(f"Error getting quote {quote_id}: {str(e)}")
             return None
     
-    def get_quotes_by_request(self, request_id: str) -> List[Quote]:
+    async def get_quotes_by_request(self, request_id: str) -> List[Quote]:
         """Get all quotes for a service request"""
         try:
-            formula = f"{{Request ID}} = '{request_id}'"
-            records = self.airtable.get_records(self.QUOTE_TABLE, formula=formula)
-            quotes: List[Quote] = []
-            for record in records:
-                fields = record.get('fields', {}) or {}
-                fields['id'] = str(record.get('id')) if record.get('id') is not None else fields.get('id')
-                quotes.append(Quote(**fields))
-            return quotes
+            return [Quote(**fields) for fields in await self.storage.quotes.list_by_request(request_id)]
         except Exception as e:
             logger.error(f"Error getting quotes for request {request_id}: {str(e)}")
             return []
     
-    def update_quote(self, quote_id: str, update_data: QuoteUpdate) -> Optional[Quote]:
+    async def update_quote(self, quote_id: str, update_data: QuoteUpdate) -> Optional[Quote]:
         """Update an existing quote"""
         try:
             # Get existing quote
-            existing = self.get_quote(quote_id)
+            existing = await self.get_quote(quote_id)
             if not existing:
                 return None
                 
@@ -86,41 +68,29 @@ class QuoteService:
             update_dict = update_data.dict(exclude_unset=True)
             update_dict['updated_at'] = datetime.utcnow().isoformat()
             
-            # Update in Baserow via the Airtable-compatible wrapper
-            updated = self.airtable.update_record(
-                self.QUOTE_TABLE,
-                int(quote_id),
-                update_dict
-            )
-
-            if not updated or not updated.get('fields'):
+            updated = await self.storage.quotes.update(quote_id, update_dict)
+            if not updated:
                 return None
                 
             # If status changed to accepted/rejected, check for summary
             if 'status' in update_dict and update_dict['status'] in [QuoteStatus.ACCEPTED, QuoteStatus.REJECTED]:
-                self._check_and_send_quote_summary(existing.request_id)
+                await self._check_and_send_quote_summary(existing.request_id)
 
-            fields = updated.get('fields', {}) or {}
-            fields['id'] = str(updated.get('id')) if updated.get('id') is not None else fields.get('id')
-            return Quote(**fields)
+            return Quote(**updated)
             
         except Exception as e:
             logger.error(f"Error updating quote {quote_id}: {str(e)}")
             return None
     
-    def _update_service_request_quote_count(self, request_id: str) -> None:
+    async def _update_service_request_quote_count(self, request_id: str) -> None:
         """Update the quote count for a service request"""
         try:
             # Get current count of quotes for this request
-            quotes = self.get_quotes_by_request(request_id)
+            quotes = await self.get_quotes_by_request(request_id)
             quote_count = len(quotes)
             
             # Update the service request
-            self.airtable.update_record(
-                self.SERVICE_REQUESTS_TABLE,
-                request_id,
-                {"Quote Count": quote_count}
-            )
+            await self.storage.service_requests.update(request_id, {"Quote Count": quote_count})
             
         except Exception as e:
             logger.error(f"Error updating quote count for request {request_id}: {str(e)}")
@@ -129,15 +99,13 @@ class QuoteService:
         """Check if we should send a quote summary and send it if needed"""
         try:
             # Get the service request
-            request_record = self.airtable.get_record(self.SERVICE_REQUESTS_TABLE, request_id)
-            if not request_record:
+            request_data = await self.storage.service_requests.get(request_id)
+            if not request_data:
                 logger.warning(f"Service request {request_id} not found")
                 return False
-                
-            request_data = request_record['fields']
             
             # Get all quotes for this request
-            quotes = self.get_quotes_by_request(request_id)
+            quotes = await self.get_quotes_by_request(request_id)
             
             # Check if we should send the summary
             should_send = False
@@ -170,8 +138,7 @@ class QuoteService:
                 logger.info(f"Sending quote summary for request {request_id} to {summary.customer_email}")
                 
                 # Mark the request as having received quotes
-                self.airtable.update_record(
-                    self.SERVICE_REQUESTS_TABLE,
+                await self.storage.service_requests.update(
                     request_id,
                     {
                         "Status": "Quotes Received",
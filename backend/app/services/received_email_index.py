@@ -0,0 +1,240 @@
+"""Duplicate-reply index for the 'Recevied email' table.
+
+``store_received_email`` must not store the same garage's reply to the same
+request twice. Asking Baserow for every row with the VIN and comparing
+senders costs a table scan per incoming email, so instead we keep an index
+of what has been stored:
+
+* keys are ``(VIN, normalised sender address)``, plus the SHA-256 of the
+  email's Message-ID when there is one (a re-delivered message is caught
+  even if it is matched to a different VIN);
+* the index lives in memory for O(1) lookups and is persisted in the
+  ``received_email_index`` table of ``garagefy.db``, which every worker on
+  the host shares: a key missing from memory is looked up there before the
+  reply is treated as new;
+* :meth:`ReceivedEmailIndex.warm` (run at startup) rebuilds the index from
+  the rows currently in Baserow: rows written by something else (the ingest
+  script, the Baserow UI) are added and keys whose row has been deleted are
+  dropped.
+
+A hit only says which row to check: callers confirm the row still exists
+before treating a reply as a duplicate (see
+``BaserowService._indexed_reply``). Until the first warm-up has finished,
+:meth:`is_ready` is False and callers should fall back to asking Baserow.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from email.utils import parseaddr
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..core.database import SessionLocal
+from ..models.received_email_index import ReceivedEmailKey
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'Recevied email'
+
+
+def normalise_sender(value: Optional[str]) -> str:
+    """``'Garage X <Info@Garage.lu>'`` -> ``'info@garage.lu'``"""
+    value = (value or '').strip()
+    address = parseaddr(value)[1]
+    return (address or value).strip().lower()
+
+
+def normalise_vin(value: Optional[str]) -> str:
+    return str(value or '').strip().upper()
+
+
+def message_hash(message_id: Optional[str]) -> Optional[str]:
+    """SHA-256 of a Message-ID header, ignoring surrounding ``<>`` and whitespace"""
+    message_id = (message_id or '').strip().strip('<>').strip()
+    if not message_id:
+        return None
+    return hashlib.sha256(message_id.encode('utf-8')).hexdigest()
+
+
+class ReceivedEmailIndex:
+    """In-memory, SQLite-backed index of stored garage replies"""
+
+    def __init__(self, service):
+        self.service = service
+        self.metrics: Counter = Counter()
+        self._keys: Dict[Tuple[str, str], Optional[int]] = {}
+        self._messages: Dict[str, Optional[int]] = {}
+        self._lock = threading.Lock()
+        self._warmed_at: Optional[float] = None
+
+    def is_ready(self) -> bool:
+        return self._warmed_at is not None
+
+    def _remember(self, vin: str, sender: str, digest: Optional[str], row_id: Optional[int]):
+        self._keys[(vin, sender)] = row_id
+        if digest:
+            self._messages[digest] = row_id
+
+    def _persist(self, entries: Iterable[Tuple[str, str, Optional[str], Optional[int]]]):
+        now = time.time()
+        with SessionLocal() as db:
+            for vin, sender, digest, row_id in entries:
+                existing = db.get(ReceivedEmailKey, (vin, sender))
+                if existing is None:
+                    db.add(ReceivedEmailKey(vin=vin, sender=sender, message_hash=digest, row_id=row_id, indexed_at=now))
+                else:
+                    existing.message_hash = digest or existing.message_hash
+                    existing.row_id = row_id if row_id is not None else existing.row_id
+                    existing.indexed_at = now
+            db.commit()
+
+    def warm(self) -> int:
+        """Rebuild the index from every row currently in Baserow.
+
+        Persisted keys whose row is gone are dropped, unless they were
+        written after the rows were read (another worker's new reply).
+        Returns the number of keys that were new to the index.
+        """
+        started = time.time()
+        if self.service.replica is not None and self.service.replica.is_ready(TABLE_NAME):
+            rows = self.service.replica.rows(TABLE_NAME)
+        else:
+            rows = self.service._fetch_all_rows(self.service.table_ids[TABLE_NAME])
+
+        schema = self.service.schema(TABLE_NAME)
+        current: Dict[Tuple[str, str], int] = {}
+        for row in rows:
+            received = schema.decode(row)
+            vin, sender = normalise_vin(received.vin), normalise_sender(received.email)
+            if vin and sender and received.id is not None:
+                # Rows come in id order: the first reply is the one kept
+                current.setdefault((vin, sender), received.id)
+
+        keys, messages = dict(current), {}
+        with SessionLocal() as db:
+            for entry in db.query(ReceivedEmailKey).all():
+                key = (entry.vin, entry.sender)
+                if entry.indexed_at >= started:
+                    keys[key] = entry.row_id
+                elif key not in current:
+                    db.delete(entry)
+                    self.metrics['dropped'] += 1
+                    continue
+                elif entry.row_id != current[key]:
+                    entry.row_id = current[key]
+                if entry.message_hash:
+                    messages[entry.message_hash] = keys[key]
+                current.pop(key, None)
+            for (vin, sender), row_id in current.items():
+                db.add(ReceivedEmailKey(vin=vin, sender=sender, row_id=row_id, indexed_at=started))
+            db.commit()
+
+        with self._lock:
+            self._keys, self._messages = keys, messages
+        self._warmed_at = time.time()
+        self.metrics['warmups'] += 1
+        logger.info(f"Received-email index warmed: {len(keys)} key(s), {len(current)} new from Baserow")
+        return len(current)
+
+    def _shared_entry(self, vin: str, sender: str, digest: Optional[str]) -> Optional[Tuple[str, Optional[int]]]:
+        """Look a key up in the persisted index, which other workers write too"""
+        with SessionLocal() as db:
+            entry = None
+            if digest:
+                entry = db.query(ReceivedEmailKey).filter(ReceivedEmailKey.message_hash == digest).first()
+            reason = 'message' if entry is not None else 'sender'
+            entry = entry or db.get(ReceivedEmailKey, (vin, sender))
+            if entry is None:
+                return None
+            found = (entry.vin, entry.sender, entry.message_hash, entry.row_id)
+        with self._lock:
+            self._remember(*found)
+        return reason, found[3]
+
+    def find(self, vin: str, sender: str, message_id: Optional[str] = None) -> Optional[Tuple[str, Optional[int]]]:
+        """Return ``(match, row id)`` if this reply looks already stored, else None.
+
+        ``match`` is ``'message'`` when the Message-ID was seen before and
+        ``'sender'`` when this garage already replied for the VIN. A key
+        missing from memory is looked up in SQLite, so this may block.
+        """
+        digest = message_hash(message_id)
+        key = (normalise_vin(vin), normalise_sender(sender))
+        with self._lock:
+            if digest and digest in self._messages:
+                self.metrics['hits'] += 1
+                return 'message', self._messages[digest]
+            if key in self._keys:
+                self.metrics['hits'] += 1
+                return 'sender', self._keys[key]
+        match = self._shared_entry(*key, digest)
+        self.metrics['shared_hits' if match else 'misses'] += 1
+        return match
+
+    def add_many(self, entries: Iterable[Tuple[str, str, Optional[str], Optional[int]]]):
+        """Record ``(VIN, sender, Message-ID, row id)`` replies just stored in Baserow, in one transaction"""
+        keys = []
+        for vin, sender, message_id, row_id in entries:
+            vin, sender = normalise_vin(vin), normalise_sender(sender)
+            if vin and sender:
+                keys.append((vin, sender, message_hash(message_id), row_id))
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._remember(*key)
+        try:
+            self._persist(keys)
+        except Exception as e:
+            # Still indexed in memory; the next warm-up re-adds them from Baserow
+            logger.warning(f"Could not persist {len(keys)} received-email key(s): {str(e)}")
+
+    def add(self, vin: str, sender: str, message_id: Optional[str] = None, row_id: Optional[int] = None):
+        """Record a reply that has just been stored in Baserow"""
+        self.add_many([(vin, sender, message_id, row_id)])
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]], message_ids: Iterable[Optional[str]] = ()):
+        """Index raw 'Recevied email' rows Baserow just returned from a write.
+
+        ``message_ids`` lines up with ``rows``; missing entries mean none.
+        """
+        decode = self.service.schema(TABLE_NAME).decode
+        message_ids = list(message_ids)
+        received = [decode(row) for row in rows]
+        self.add_many(
+            (r.vin, r.email, message_ids[i] if i < len(message_ids) else None, r.id)
+            for i, r in enumerate(received)
+        )
+
+    def add_row(self, row: Dict[str, Any], message_id: Optional[str] = None):
+        """Index one raw 'Recevied email' row Baserow just returned from a write"""
+        self.add_rows([row], [message_id])
+
+    def discard_rows(self, row_ids: Iterable[int]):
+        """Forget every key pointing at deleted 'Recevied email' rows"""
+        row_ids = {int(row_id) for row_id in row_ids}
+        if not row_ids:
+            return
+        with self._lock:
+            self._keys = {key: rid for key, rid in self._keys.items() if rid not in row_ids}
+            self._messages = {digest: rid for digest, rid in self._messages.items() if rid not in row_ids}
+        try:
+            with SessionLocal() as db:
+                db.query(ReceivedEmailKey).filter(ReceivedEmailKey.row_id.in_(row_ids)).delete(synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            logger.warning(f"Could not remove received-email keys for rows {sorted(row_ids)}: {str(e)}")
+
+    def discard_row(self, row_id: int):
+        """Forget every key pointing at a deleted 'Recevied email' row"""
+        self.discard_rows([row_id])
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'ready': self.is_ready(),
+            'keys': len(self._keys),
+            'message_ids': len(self._messages),
+            'warmed_at': self._warmed_at,
+            **dict(self.metrics),
+        }
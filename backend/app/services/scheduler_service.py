@@ -1,11 +1,16 @@
 import logging
 import asyncio
+import os
 from typing import Optional
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from ..core.limits import BACKGROUND, lane
 from .email_monitor_service import email_monitor_service
 from .customer_response_service import customer_response_service
+from .baserow_service import baserow_service
+from .baserow_replica import replica_enabled
+from .service_request_outbox import service_request_outbox, write_behind_enabled
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +66,35 @@ class SchedulerService:
             )
             logger.info(f"Scheduled customer response task (every 1 minute, starting in {delay_seconds}s to avoid conflicts)")
             
+            # Keep the local Baserow read-replica in sync (first run immediately)
+            if replica_enabled():
+                interval = int(os.getenv('BASEROW_REPLICA_SYNC_INTERVAL', 60))
+                self.scheduler.add_job(
+                    func=self._sync_replica_task,
+                    trigger=IntervalTrigger(seconds=interval),
+                    id='sync_baserow_replica',
+                    name='Sync Baserow read-replica',
+                    replace_existing=True,
+                    max_instances=1,
+                    next_run_time=datetime.now()
+                )
+                logger.info(f"Scheduled Baserow replica sync (every {interval}s)")
+            
+            # Retry queued service requests; the first run resumes anything
+            # left in the outbox before a restart
+            if write_behind_enabled():
+                interval = int(os.getenv('SERVICE_REQUEST_OUTBOX_INTERVAL', 15))
+                self.scheduler.add_job(
+                    func=self._flush_service_requests_task,
+                    trigger=IntervalTrigger(seconds=interval),
+                    id='flush_service_request_outbox',
+                    name='Flush queued service requests to Baserow',
+                    replace_existing=True,
+                    max_instances=1,
+                    next_run_time=datetime.now()
+                )
+                logger.info(f"Scheduled service request outbox flush (every {interval}s)")
+            
             # Start the scheduler
             self.scheduler.start()
             self.is_running = True
@@ -89,7 +123,8 @@ class SchedulerService:
         """Scheduled task to check emails"""
         try:
             logger.info(f"[SCHEDULED] Starting email check at {datetime.now()}")
-            result = await email_monitor_service.check_and_process_new_emails(mark_as_read=True)
+            with lane(BACKGROUND):
+                result = await email_monitor_service.check_and_process_new_emails(mark_as_read=True)
             
             if result.get('success'):
                 logger.info(f"[SCHEDULED] Email check completed: {result.get('emails_processed', 0)} emails processed")
@@ -103,7 +138,8 @@ class SchedulerService:
         """Scheduled task to send customer responses"""
         try:
             logger.info(f"[SCHEDULED] Starting customer response check at {datetime.now()}")
-            result = await customer_response_service.check_and_send_customer_responses()
+            with lane(BACKGROUND):
+                result = await customer_response_service.check_and_send_customer_responses()
             
             if result.get('success'):
                 logger.info(f"[SCHEDULED] Customer response check completed: {result.get('responses_sent', 0)} responses sent")
@@ -113,6 +149,27 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"[SCHEDULED] Error in customer response task: {str(e)}", exc_info=True)
     
+    async def _sync_replica_task(self):
+        """Scheduled task to pull Baserow changes into the local replica"""
+        try:
+            replica = baserow_service.replica
+            if replica is None:
+                return
+            # The sync uses the blocking client; keep it off the event loop
+            results = await asyncio.get_running_loop().run_in_executor(None, replica.sync_all)
+            logger.debug(f"[SCHEDULED] Replica sync completed: {results}")
+        except Exception as e:
+            logger.error(f"[SCHEDULED] Error in replica sync task: {str(e)}", exc_info=True)
+    
+    async def _flush_service_requests_task(self):
+        """Scheduled task to write queued service requests to Baserow"""
+        try:
+            attempted = await service_request_outbox.flush()
+            if attempted:
+                logger.info(f"[SCHEDULED] Service request outbox flush attempted {attempted} request(s)")
+        except Exception as e:
+            logger.error(f"[SCHEDULED] Error in service request outbox task: {str(e)}", exc_info=True)
+    
     def get_status(self) -> dict:
         """Get scheduler status"""
         if not self.is_running:
@@ -0,0 +1,316 @@
+"""Write-behind queue for customer service requests.
+
+With ``SERVICE_REQUEST_WRITE_BEHIND=true`` the /service-requests endpoint
+doesn't wait for Cloudinary and Baserow: it commits the submission to the
+``service_request_outbox`` table in ``garagefy.db`` and answers with the
+request ID straight away. The photos aren't copied into the database: their
+normalised files are moved into ``SERVICE_REQUEST_OUTBOX_DIR`` and only the
+paths are stored. The flusher then, for each due entry:
+
+1. stores the photos with the media store (once; the URLs are kept),
+2. creates the 'Customer details' row, stamped with the submission time so
+   garage replies quoting the request ID still match it,
+3. queues the quote requests to the garages
+   (``FixItService.queue_quote_requests``), which the job queue sends and
+   retries per garage.
+
+A failed step is retried with exponential backoff, up to
+``SERVICE_REQUEST_OUTBOX_MAX_ATTEMPTS`` times. The flusher runs right after
+each submission and on a schedule, which also picks up entries left over
+from before a restart. Every database call runs in a worker thread.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from ..core.database import SessionLocal
+from ..core.limits import BULK, lane
+from ..models.service_request_outbox import OutboxImage, OutboxServiceRequest
+from .baserow_async_service import async_baserow_service
+from .fix_it_service import fix_it_service
+from .image_intake import StagedImage
+from .media_store import media_store
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+STORED = 'stored'
+NOTIFIED = 'notified'
+FAILED = 'failed'
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv('SERVICE_REQUEST_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _discard(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def new_request_id() -> str:
+    """Same ``req_<ms timestamp>_<random>`` shape the frontend generates"""
+    return f"req_{int(time.time() * 1000)}_{uuid.uuid4().hex[:9]}"
+
+
+class ServiceRequestOutbox:
+    """SQLite-backed queue of submissions waiting for Baserow, see module docstring"""
+
+    def __init__(self):
+        self.max_attempts = max(1, int(os.getenv('SERVICE_REQUEST_OUTBOX_MAX_ATTEMPTS', 10)))
+        self.backoff_base = float(os.getenv('SERVICE_REQUEST_OUTBOX_BACKOFF', 30))
+        self.backoff_max = float(os.getenv('SERVICE_REQUEST_OUTBOX_BACKOFF_MAX', 1800))
+        self.directory = os.path.abspath(os.getenv('SERVICE_REQUEST_OUTBOX_DIR') or 'outbox')
+        self.metrics: Counter = Counter()
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    async def enqueue(self, request_id: str, fields: Dict[str, Any], images: List[StagedImage],
+                      image_urls: Optional[List[str]] = None) -> str:
+        """Durably accept a submission; returns its request ID.
+
+        The ``images`` files are moved into the outbox directory, so the
+        caller's staging cleanup finds nothing left to delete. ``image_urls``
+        are photos already on Cloudinary (uploaded by the browser); the
+        upload step is skipped for those submissions.
+        """
+        request_id = request_id or new_request_id()
+        await asyncio.to_thread(self._accept, request_id, fields, images, image_urls)
+        self.metrics['enqueued'] += 1
+        logger.info(f"Queued service request {request_id} with {len(images)} image(s)")
+        return request_id
+
+    def _accept(self, request_id: str, fields: Dict[str, Any], images: List[StagedImage],
+                image_urls: Optional[List[str]]):
+        """Move the photos in and commit the entry; blocking"""
+        os.makedirs(self.directory, exist_ok=True)
+        moved: List[Tuple[StagedImage, str]] = []
+        now = time.time()
+        try:
+            for image in images:
+                extension = os.path.splitext(image.path)[1]
+                path = os.path.join(self.directory, f"{uuid.uuid4().hex}{extension}")
+                # A rename when the staging directory is on the same filesystem
+                shutil.move(image.path, path)
+                moved.append((image, path))
+            with SessionLocal() as db:
+                entry = OutboxServiceRequest(
+                    request_id=request_id,
+                    status=PENDING,
+                    fields=fields,
+                    submitted_at=datetime.now(timezone.utc).isoformat(),
+                    attempts=0,
+                    next_attempt_at=now,
+                    image_urls=image_urls or None,
+                    created_at=now,
+                    updated_at=now,
+                )
+                db.add(entry)
+                db.flush()
+                for position, (image, path) in enumerate(moved):
+                    db.add(OutboxImage(
+                        outbox_id=entry.id,
+                        position=position,
+                        filename=image.filename,
+                        content_type=image.content_type,
+                        path=path,
+                        size=image.size,
+                        sha256=image.sha256,
+                    ))
+                db.commit()
+        except BaseException:
+            for _, path in moved:
+                _discard(path)
+            raise
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.backoff_base * (2 ** max(0, attempts - 1)), self.backoff_max)
+
+    async def _update(self, entry_id: int, **values):
+        await asyncio.to_thread(self._write, entry_id, **values)
+
+    def _write(self, entry_id: int, **values):
+        with SessionLocal() as db:
+            entry = db.get(OutboxServiceRequest, entry_id)
+            for key, value in values.items():
+                setattr(entry, key, value)
+            entry.updated_at = time.time()
+            db.commit()
+
+    async def _upload_images(self, entry_id: int, final_attempt: bool) -> List[str]:
+        """Upload the entry's photos; raise (to retry) unless all made it or this is the last try"""
+        images = await asyncio.to_thread(self._images, entry_id)
+        outcomes = await media_store.put_many([(image.filename, image) for image in images])
+        urls = [outcome.url for outcome in outcomes if outcome.ok]
+        if len(urls) < len(images) and not final_attempt:
+            raise RuntimeError(f"Stored {len(urls)} of {len(images)} image(s)")
+        await asyncio.to_thread(self._uploaded, entry_id, urls)
+        return urls
+
+    def _images(self, entry_id: int) -> List[StagedImage]:
+        """The entry's photo files, in order; blocking"""
+        with SessionLocal() as db:
+            return [
+                StagedImage(image.filename or f"image_{int(time.time())}.jpg",
+                            image.content_type or 'application/octet-stream', image.path, image.size, image.sha256)
+                for image in db.query(OutboxImage).filter(OutboxImage.outbox_id == entry_id).order_by(OutboxImage.position)
+            ]
+
+    def _uploaded(self, entry_id: int, urls: List[str]):
+        """Keep the URLs and drop the photo files; blocking"""
+        with SessionLocal() as db:
+            paths = [path for (path,) in db.query(OutboxImage.path).filter(OutboxImage.outbox_id == entry_id)]
+            db.query(OutboxImage).filter(OutboxImage.outbox_id == entry_id).delete()
+            entry = db.get(OutboxServiceRequest, entry_id)
+            entry.image_urls = urls
+            entry.updated_at = time.time()
+            db.commit()
+        for path in paths:
+            _discard(path)
+
+    async def _find_created_row(self, fields: Dict[str, Any], submitted_at: str) -> Optional[int]:
+        """Row id of an earlier attempt's create that did reach Baserow, if any"""
+        submitted = datetime.fromisoformat(submitted_at)
+        records = await async_baserow_service.get_records('Customer details', filter_dict={'field': 'Email', 'value': fields['Email']})
+        schema = await async_baserow_service.schema('Customer details')
+        for record in records:
+            customer = schema.decode(record['fields'])
+            if customer.vin != fields.get('VIN') or not customer.date_time:
+                continue
+            try:
+                created = datetime.fromisoformat(customer.date_time.replace('Z', '+00:00'))
+            except ValueError:
+                continue
+            if abs((created - submitted).total_seconds()) < 2:
+                return record['id']
+        return None
+
+    async def _store(self, fields: Dict[str, Any], submitted_at: str, image_urls: List[str], retry: bool) -> int:
+        if retry:
+            existing = await self._find_created_row(fields, submitted_at)
+            if existing:
+                logger.info(f"Service request row {existing} was already created by an earlier attempt")
+                return existing
+        result = await async_baserow_service.create_customer({
+            **fields,
+            'Image': [{'url': url} for url in image_urls] or None,
+            'Date and Time': submitted_at,
+        })
+        if not result or not result.get('success'):
+            raise RuntimeError((result or {}).get('error') or 'Invalid response from Baserow service')
+        return result.get('record_id')
+
+    async def _notify(self, request_id: str, fields: Dict[str, Any], image_urls: List[str]):
+        # Keyed by request ID, so a retry after a crash here doesn't queue them twice
+        await fix_it_service.queue_quote_requests(
+            request_id=request_id,
+            car_brand=fields.get('car_brand', ''),
+            vin=fields.get('VIN', ''),
+            license_plate=fields.get('Plate Number', ''),
+            damage_notes=fields.get('Note', ''),
+            image_urls=image_urls,
+        )
+
+    def _entry(self, entry_id: int) -> Optional[Tuple[str, str, Dict[str, Any], str, Optional[List[str]], int]]:
+        """What :meth:`_process` needs of a due entry, or None; blocking"""
+        with SessionLocal() as db:
+            entry = db.get(OutboxServiceRequest, entry_id)
+            if entry is None or entry.status not in (PENDING, STORED):
+                return None
+            return (entry.request_id, entry.status, dict(entry.fields),
+                    entry.submitted_at, entry.image_urls, entry.attempts)
+
+    async def _process(self, entry_id: int):
+        entry = await asyncio.to_thread(self._entry, entry_id)
+        if entry is None:
+            return
+        request_id, status, fields, submitted_at, image_urls, attempts = entry
+
+        final_attempt = attempts + 1 >= self.max_attempts
+        try:
+            if status == PENDING:
+                if image_urls is None:
+                    image_urls = await self._upload_images(entry_id, final_attempt)
+                record_id = await self._store(fields, submitted_at, image_urls, retry=attempts > 0)
+                await self._update(entry_id, status=STORED, record_id=record_id, attempts=0, last_error=None)
+                self.metrics['stored'] += 1
+                logger.info(f"Stored queued service request {request_id} as row {record_id}")
+                status, attempts = STORED, 0
+
+            await self._notify(request_id, fields, image_urls or [])
+            await self._update(entry_id, status=NOTIFIED, last_error=None)
+            self.metrics['notified'] += 1
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                await self._update(entry_id, attempts=attempts, status=FAILED, last_error=str(e))
+                self.metrics['failed'] += 1
+                logger.error(f"Giving up on service request {request_id} ({status}) after {attempts} attempt(s): {str(e)}")
+            else:
+                delay = self._backoff(attempts)
+                await self._update(entry_id, attempts=attempts, next_attempt_at=time.time() + delay, last_error=str(e))
+                self.metrics['retries'] += 1
+                logger.warning(f"Service request {request_id} ({status}) failed, retry {attempts} in {delay:.0f}s: {str(e)}")
+
+    async def flush(self) -> int:
+        """Process every due entry; returns how many were attempted"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        if self._flush_lock.locked():
+            return 0
+        async with self._flush_lock:
+            due = await asyncio.to_thread(self._due)
+            with lane(BULK):
+                for entry_id in due:
+                    await self._process(entry_id)
+            return len(due)
+
+    def _due(self) -> List[int]:
+        with SessionLocal() as db:
+            return [
+                entry_id for (entry_id,) in db.query(OutboxServiceRequest.id).filter(
+                    OutboxServiceRequest.status.in_((PENDING, STORED)),
+                    OutboxServiceRequest.next_attempt_at <= time.time(),
+                ).order_by(OutboxServiceRequest.id)
+            ]
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Progress of one queued submission; blocking"""
+        with SessionLocal() as db:
+            entry = db.query(OutboxServiceRequest).filter(OutboxServiceRequest.request_id == request_id).first()
+            if entry is None:
+                return None
+            return {
+                'request_id': entry.request_id,
+                'status': entry.status,
+                'record_id': entry.record_id,
+                'attempts': entry.attempts,
+                'last_error': entry.last_error,
+                'submitted_at': entry.submitted_at,
+            }
+
+    def status(self) -> Dict[str, Any]:
+        """Counts and metrics; blocking (it reads the outbox table)"""
+        with SessionLocal() as db:
+            counts = dict(db.query(OutboxServiceRequest.status, func.count()).group_by(OutboxServiceRequest.status))
+            oldest = db.query(func.min(OutboxServiceRequest.created_at)).filter(
+                OutboxServiceRequest.status.in_((PENDING, STORED))
+            ).scalar()
+        return {
+            'enabled': write_behind_enabled(),
+            'counts': counts,
+            'oldest_pending_seconds': round(time.time() - oldest, 1) if oldest else None,
+            **dict(self.metrics),
+        }
+
+
+service_request_outbox = ServiceRequestOutbox()
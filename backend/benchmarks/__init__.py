@@ -0,0 +1,20 @@
+"""Microbenchmarks for the pure-Python hot paths.
+
+asv-style: each ``bench_*.py`` module defines ``time_*`` functions, with an
+optional ``params`` tuple to run them once per value (the corpus language,
+mostly) and an optional ``threshold`` of their own. Run from ``backend/``::
+
+    python -m benchmarks                 # compare against baseline.json
+    python -m benchmarks -k vin          # only benchmarks matching "vin"
+    python -m benchmarks --strict        # exit with status 1 on a regression
+    python -m benchmarks --save          # record new baselines
+
+Timings are the median of ``--repeat`` rounds, each taken relative to a
+fixed pure-Python calibration loop run alongside it. That evens out a
+machine's drift, but not every difference between machines: benchmarks
+of a few microseconds can still move by half on different hardware or
+under load. A benchmark more than its threshold (``--threshold``, 1.5x,
+unless it sets one) slower than its baseline is reported as a
+regression, and fails the run only with ``--strict``. Re-save the
+baselines in the same commit as any intended speed change.
+"""
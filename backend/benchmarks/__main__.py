@@ -0,0 +1,120 @@
+"""``python -m benchmarks``: run and compare, see package docstring"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import platform
+import statistics
+import sys
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def _calibration():
+    total = 0
+    for i in range(20_000):
+        total += i * i % 7
+    return total
+
+
+def measure(func: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    """Median seconds per call, and the median ratio to the calibration loop.
+
+    Every round times the benchmark and the calibration loop back to back
+    and keeps their ratio, so a machine that slows down halfway through
+    (shared CI runners do) moves both alike. Medians rather than minimums,
+    so one lucky or unlucky round doesn't set the result.
+    """
+    timer, calibration = timeit.Timer(func), timeit.Timer(_calibration)
+    number, _ = timer.autorange()
+    calibration_number, _ = calibration.autorange()
+    seconds, ratios = [], []
+    for _ in range(repeat):
+        calibration_seconds = calibration.timeit(calibration_number) / calibration_number
+        seconds.append(timer.timeit(number) / number)
+        ratios.append(seconds[-1] / calibration_seconds)
+    return statistics.median(seconds), statistics.median(ratios)
+
+
+def discover(pattern: str = '') -> List[Tuple[str, Callable[[], object], Optional[float]]]:
+    """``(name, zero-argument callable, threshold)`` for every benchmark matching ``pattern``"""
+    found = []
+    for module_info in sorted(pkgutil.iter_modules([BENCH_DIR]), key=lambda m: m.name):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module(f'benchmarks.{module_info.name}')
+        suite = module_info.name[len('bench_'):]
+        for attr in sorted(dir(module)):
+            func = getattr(module, attr)
+            if not attr.startswith('time_') or not callable(func):
+                continue
+            params = getattr(func, 'params', None)
+            threshold = getattr(func, 'threshold', None)
+            cases = [(f'{suite}.{attr[5:]}[{p}]', (lambda f=func, p=p: f(p))) for p in params] if params \
+                else [(f'{suite}.{attr[5:]}', func)]
+            found.extend((name, call, threshold) for name, call in cases if pattern in name)
+    return found
+
+
+def _format(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f}{unit}'
+    return f'{seconds / 1e-9:.0f}ns'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('-k', dest='pattern', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help="slowdown factor that counts as a regression, unless the benchmark sets its own")
+    parser.add_argument('--strict', action='store_true', help='exit with status 1 if anything regressed')
+    parser.add_argument('--save', action='store_true', help='write the results to baseline.json')
+    args = parser.parse_args(argv)
+
+    # The services log at debug level inside these loops; keep it cheap and quiet
+    logging.disable(logging.CRITICAL)
+
+    baseline: Dict = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    results, regressions = {}, []
+    for name, call, threshold in discover(args.pattern):
+        call()  # warm caches and lazy imports outside the timing
+        seconds, relative = measure(call, args.repeat)
+        results[name] = {'seconds': seconds, 'relative': relative}
+        line = f'{name:<52} {_format(seconds):>10}'
+        before = baseline.get('results', {}).get(name)
+        if before:
+            ratio = relative / before['relative']
+            line += f'   {ratio:5.2f}x baseline'
+            if ratio > (threshold or args.threshold):
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line, flush=True)
+
+    if args.save:
+        saved = baseline.get('results', {}) if args.pattern else {}
+        saved.update(results)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'results': dict(sorted(saved.items())),
+            }, f, indent=2)
+            f.write('\n')
+        print(f'Saved {len(results)} result(s) to {os.path.relpath(BASELINE_PATH)}')
+    elif regressions:
+        print(f'\n{len(regressions)} benchmark(s) slower than their threshold: {", ".join(regressions)}')
+        if args.strict:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Client-side formula matching in get_records, over a 10k-row 'Recevied email' table"""
+import random
+
+from app.services.baserow_service import BaserowService
+
+from .corpora import replies
+
+ROWS = 10_000
+
+_rng = random.Random(10_000)
+_vins = [f'WVWZZZ1JZ{n:08d}' for n in range(ROWS // 4)]
+_rows = [
+    {
+        'id': i + 1,
+        'Email': f'garage{_rng.randint(1, 60)}@garages.fake.test',
+        'Subject': subject,
+        'Body': body,
+        'Received At': '2026-01-15T10:30:00Z',
+        'VIN': _rng.choice(_vins),
+        'Quote': '',
+    }
+    for i, (subject, body) in enumerate(replies('fr') * (ROWS // len(replies('fr')) + 1))
+    if i < ROWS
+]
+_FORMULAS = {
+    'equals': f'{{VIN}} = "{_vins[7]}"',
+    'and': f'AND({{VIN}} = "{_vins[7]}", {{Email}} = "garage3@garages.fake.test")',
+}
+
+
+def time_formula_matching(formula):
+    BaserowService._wrap_rows(_rows, _FORMULAS[formula], None, True)
+
+
+time_formula_matching.params = tuple(_FORMULAS)
@@ -0,0 +1,20 @@
+"""Inbox-check parsing: runs on every unread message of every tick"""
+from app.services.email_monitor_service import EmailMonitorService
+
+from .corpora import LANGUAGES, replies
+
+service = EmailMonitorService()
+
+
+def time_extract_vin_from_text(language):
+    for subject, body in replies(language):
+        service._extract_vin_from_text(f'{subject}\n{body}')
+
+
+def time_extract_request_id_from_subject(language):
+    for subject, _ in replies(language):
+        service._extract_request_id_from_subject(subject)
+
+
+time_extract_vin_from_text.params = LANGUAGES
+time_extract_request_id_from_subject.params = LANGUAGES
@@ -0,0 +1,19 @@
+"""Reply ingestion (scripts/ingest_garage_replies.py): runs on every new message"""
+import contextlib
+import os
+
+from scripts.ingest_garage_replies import extract_vin
+
+from .corpora import LANGUAGES, replies
+
+# extract_vin reports each match with print(); keep the cost, drop the output
+_devnull = open(os.devnull, 'w')
+
+
+def time_extract_vin(language):
+    with contextlib.redirect_stdout(_devnull):
+        for subject, body in replies(language):
+            extract_vin(subject, body)
+
+
+time_extract_vin.params = LANGUAGES
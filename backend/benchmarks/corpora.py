@@ -0,0 +1,82 @@
+"""Deterministic garage-reply corpora in French, English and German.
+
+Built from :mod:`loadtest.payloads` with a fixed seed, so every run (and
+the committed baselines) sees the same text. Each reply is
+``(subject, body)``. Bodies quote the original request below the garage's
+answer, a fifth of them are Outlook-style HTML, and a tenth carry neither a
+VIN nor a request reference, so the fallback paths get exercised too.
+"""
+import random
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from loadtest.payloads import CAR_BRANDS, DAMAGE_NOTES, LANGUAGES, garage_reply, garage_request_text, vin
+
+REPLIES_PER_LANGUAGE = 200
+SEED = 20260101
+
+_SUBJECT_PREFIXES = {'fr': ['RE:', 'Re :', 'TR:'], 'en': ['RE:', 'Re:', 'FW:'], 'de': ['AW:', 'Aw:', 'WG:']}
+_NO_REFERENCE_SUBJECTS = {
+    'fr': ['Votre demande de devis', 'Devis carrosserie', 'Question sur le véhicule'],
+    'en': ['Your quote request', 'Bodywork estimate', 'Question about the car'],
+    'de': ['Ihre Anfrage', 'Kostenvoranschlag Karosserie', 'Rückfrage zum Fahrzeug'],
+}
+
+
+def _request_id(rng: random.Random) -> str:
+    suffix = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(9))
+    return f'req_{rng.randint(1750000000000, 1790000000000)}_{suffix}'
+
+
+def _as_html(body: str) -> str:
+    paragraphs = ''.join(f'<p class="MsoNormal">{line or "&nbsp;"}</p>\r\n' for line in body.splitlines())
+    return f'<html><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8"></head><body><div>{paragraphs}</div></body></html>'
+
+
+@lru_cache(maxsize=None)
+def replies(language: str) -> List[Tuple[str, str]]:
+    """``REPLIES_PER_LANGUAGE`` ``(subject, body)`` garage replies in ``language``"""
+    rng = random.Random(f'{SEED}-{language}')
+    corpus = []
+    for i in range(REPLIES_PER_LANGUAGE):
+        vin_, brand, notes = vin(rng), rng.choice(CAR_BRANDS), rng.choice(DAMAGE_NOTES)
+        prefix = rng.choice(_SUBJECT_PREFIXES[language])
+        roll = rng.random()
+        if roll < 0.1:
+            # Answer to a forwarded or retyped request: no VIN anywhere
+            _, body = garage_reply(brand, notes, rng, language=language, garage=f'Garage {i}')
+            corpus.append((f'{prefix} {rng.choice(_NO_REFERENCE_SUBJECTS[language])}', body))
+            continue
+        _, body = garage_reply(vin_, garage_request_text(vin_, brand, notes), rng, language=language, garage=f'Garage {i}')
+        if roll < 0.55:
+            subject = f'{prefix} Repair Quote Request - VIN: {vin_}'
+        else:
+            subject = f'{prefix} Demande de devis - Ref: {_request_id(rng)}'
+        if rng.random() < 0.2:
+            body = _as_html(body)
+        corpus.append((subject, body))
+    return corpus
+
+
+@lru_cache(maxsize=None)
+def quotes(language: str, count: int = 20) -> List[Dict[str, Any]]:
+    """Quote dicts as the customer digest builds them, from the first ``count`` replies"""
+    from app.services.customer_response_service import CustomerResponseService
+
+    service = CustomerResponseService()
+    return [
+        {
+            'garage_name': f'Garage {i}',
+            'garage_email': f'garage{i}@garages.fake.test',
+            'garage_phone': f'+352 26 {100000 + i}',
+            'garage_address': f'{i} Rue de la Gare, Luxembourg',
+            'quote_amount': service._extract_price_from_text(body) or 'Non spécifié',
+            'subject': subject,
+            'body': service._strip_quoted_reply(body),
+            'received_at': '2026-01-15T10:30:00+00:00',
+        }
+        for i, (subject, body) in enumerate(replies(language)[:count])
+    ]
+
+
+__all__ = ['LANGUAGES', 'REPLIES_PER_LANGUAGE', 'replies', 'quotes']
@@ -0,0 +1,137 @@
+"""Local stand-ins for Baserow, Microsoft Graph, Cloudinary and Redis.
+
+Load tests shouldn't hit (or be billed by) the real services, and the
+interesting behaviour under load - throttling, slow responses, 5xx bursts -
+is exactly what the real services won't produce on demand. Each fake is a
+small aiohttp app speaking just enough of the real API for the backend,
+with latency, error and 429 injection from :mod:`fakes.faults`; Redis is
+a plain TCP server speaking its wire protocol (:mod:`fakes.redis`).
+
+Run them from ``backend/`` with ``python -m fakes`` (see ``--help``), which
+prints the environment variables that point the backend at them. For
+in-process use, e.g. from the load harness::
+
+    with FakeServices(garages=40) as fakes:
+        os.environ.update(fakes.env())
+        ...
+        print(fakes.stats())
+"""
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+from .baserow import FakeBaserow
+from .cloudinary import FakeCloudinary
+from .faults import Faults
+from .graph import FakeGraph
+from .redis import FakeRedis
+
+__all__ = ['FakeBaserow', 'FakeCloudinary', 'FakeGraph', 'FakeRedis', 'FakeServices', 'Faults']
+
+
+class FakeServices:
+    """All the fakes on their own event loop in a background thread.
+
+    Ports default to 0 (any free port); the chosen URLs are in :attr:`urls`
+    once :meth:`start` returns.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        ports: Optional[Dict[str, int]] = None,
+        faults: Optional[Dict[str, Faults]] = None,
+        garages: int = 20,
+        reply_rate: float = 0.0,
+        reply_delay_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        faults = faults or {}
+        self.host = host
+        self.ports = {'baserow': 0, 'graph': 0, 'cloudinary': 0, 'redis': 0, **(ports or {})}
+        self.baserow = FakeBaserow(faults.get('baserow'), seed=seed)
+        self.graph = FakeGraph(faults.get('graph'), reply_rate=reply_rate, reply_delay_ms=reply_delay_ms, seed=seed)
+        self.cloudinary = FakeCloudinary(faults.get('cloudinary'), seed=seed)
+        self.redis = FakeRedis(faults.get('redis'), seed=seed)
+        if garages:
+            self.baserow.seed_garages(garages)
+        self.urls: Dict[str, str] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runners = []
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def fakes(self) -> Dict[str, Any]:
+        return {'baserow': self.baserow, 'graph': self.graph, 'cloudinary': self.cloudinary, 'redis': self.redis}
+
+    async def _start_sites(self):
+        for name, fake in self.fakes.items():
+            if isinstance(fake, FakeRedis):
+                self.urls[name] = await fake.serve(self.host, self.ports[name])
+                continue
+            runner = web.AppRunner(fake.app(), access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, self.ports[name])
+            await site.start()
+            port = runner.addresses[0][1]
+            self.urls[name] = f'http://{self.host}:{port}'
+            self._runners.append(runner)
+
+    async def _stop_sites(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
+        await self.redis.stop()
+
+    def start(self) -> 'FakeServices':
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self._start_sites())
+            except Exception as e:
+                failure.append(e)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self._stop_sites())
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, name='fake-services', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        return self
+
+    def stop(self):
+        if self.loop and self._thread and self._thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=10)
+
+    def __enter__(self) -> 'FakeServices':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables pointing the backend at the running fakes"""
+        env: Dict[str, str] = {}
+        for name, fake in self.fakes.items():
+            env.update(fake.env(self.urls[name]))
+        return env
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-route call counts from each fake, keyed by service"""
+        return {name: fake.state.stats() for name, fake in self.fakes.items()}
+
+    def reset_stats(self):
+        for fake in self.fakes.values():
+            fake.state.calls.clear()
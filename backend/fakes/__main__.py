@@ -0,0 +1,90 @@
+"""``python -m fakes``: serve the fake Baserow, Graph, Cloudinary and Redis.
+
+Prints ``export`` lines for the backend, then serves until interrupted::
+
+    eval "$(python -m fakes --latency-ms 40 --throttle-rate 0.05 --garages 60 | grep ^export)"
+
+Faults given with ``--latency-ms`` etc. apply to every service; override one
+with ``--set graph.throttle_rate=0.2`` (repeatable). They can also be changed
+while running through each fake's ``POST /_fake/faults``.
+"""
+import argparse
+import signal
+import sys
+import threading
+from dataclasses import fields
+
+from . import FakeServices
+from .faults import Faults
+
+SERVICES = ('baserow', 'graph', 'cloudinary', 'redis')
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fakes', description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--baserow-port', type=int, default=8101)
+    parser.add_argument('--graph-port', type=int, default=8102)
+    parser.add_argument('--cloudinary-port', type=int, default=8103)
+    parser.add_argument('--redis-port', type=int, default=8104)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added to every request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='latency varies by up to this much either way')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with 429s, in seconds')
+    parser.add_argument('--set', action='append', default=[], metavar='SERVICE.FAULT=VALUE',
+                        help='per-service override, e.g. baserow.latency_ms=80')
+    parser.add_argument('--garages', type=int, default=20, help="contactable garages seeded into 'Fix it'")
+    parser.add_argument('--reply-rate', type=float, default=0.0, help='chance each garage replies to a request')
+    parser.add_argument('--reply-delay-ms', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None, help='make fault injection and replies repeatable')
+    return parser.parse_args(argv)
+
+
+def _faults(args) -> dict:
+    defaults = {f.name: getattr(args, f.name) for f in fields(Faults)}
+    faults = {service: Faults(**defaults) for service in SERVICES}
+    for override in args.set:
+        try:
+            target, value = override.split('=', 1)
+            service, key = target.split('.', 1)
+            faults[service].update({key: value})
+        except (KeyError, ValueError) as e:
+            sys.exit(f"Bad --set {override!r}: expected one of {', '.join(SERVICES)}.<fault>=<value> ({e})")
+    return faults
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    fakes = FakeServices(
+        host=args.host,
+        ports={service: getattr(args, f'{service}_port') for service in SERVICES},
+        faults=_faults(args),
+        garages=args.garages,
+        reply_rate=args.reply_rate,
+        reply_delay_ms=args.reply_delay_ms,
+        seed=args.seed,
+    ).start()
+
+    for key, value in sorted(fakes.env().items()):
+        print(f'export {key}={value}')
+    for service, url in fakes.urls.items():
+        if url.startswith('http'):
+            print(f'# {service}: {url} (stats at {url}/_fake/stats)', file=sys.stderr)
+        else:
+            print(f'# {service}: {url}', file=sys.stderr)
+    sys.stdout.flush()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fakes.stop()
+
+
+if __name__ == '__main__':
+    main()
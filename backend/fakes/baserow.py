@@ -0,0 +1,319 @@
+"""Fake Baserow REST API.
+
+Implements what :mod:`app.services.baserow_service` calls:
+
+* ``GET  /api/database/fields/table/<id>/``
+* ``GET  /api/database/rows/table/<id>/`` with ``page``/``size``,
+  ``filter__<field>__equal`` (``filter_type`` AND/OR) and ``order_by``
+* ``GET/PATCH/DELETE /api/database/rows/table/<id>/<row>/``,
+  ``POST /api/database/rows/table/<id>/``
+* ``POST/PATCH /api/database/rows/table/<id>/batch/`` and
+  ``POST .../batch-delete/`` (at most 200 items, like Baserow)
+
+Rows are kept in memory. Fields can be addressed by name or as
+``field_<id>``, and rows come back name-keyed when ``user_field_names`` is
+set. Every table has a read-only ``Last modified`` field the fake keeps up
+to date, so incremental replica sync can be exercised too.
+"""
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from .faults import FakeState, Faults, make_app
+
+BATCH_SIZE = 200
+MAX_PAGE_SIZE = 200
+
+# Table name -> (default table id, fields); ids match the BASEROW_TABLE_* defaults printed by the runner
+TABLES: Dict[str, Tuple[int, List[str]]] = {
+    'Customer details': (1, ['Name', 'Phone', 'Email', 'VIN', 'Notes', 'Brand', 'Date and Time', 'Image', 'Sent Emails', 'Plate Number']),
+    'Fix it': (2, ['Name', 'Address', 'Phone', 'Email', 'Website', 'Reviews', 'Specialties']),
+    'Recevied email': (3, ['Email', 'Subject', 'Body', 'Received At', 'VIN', 'Quote']),
+    'Quotes': (4, [
+        'request_id', 'customer_id', 'customer_name', 'customer_email', 'garage_id', 'garage_name',
+        'amount', 'notes', 'valid_until', 'status', 'created_at', 'updated_at',
+    ]),
+    'Service Requests': (5, [
+        'Request ID', 'Customer Name', 'Customer Email', 'Status', 'Quote Count',
+        'Notified Garages Count', 'Quote Summary Sent', 'Quote Summary Sent At',
+    ]),
+}
+UPDATED_ON_FIELD = 'Last modified'
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _error(status: int, code: str, detail: str = '') -> web.Response:
+    return web.json_response({'error': code, 'detail': detail or code}, status=status)
+
+
+class FakeTable:
+
+    def __init__(self, table_id: int, name: str, field_names: List[str], field_ids: itertools.count):
+        self.id = table_id
+        self.name = name
+        self.fields = [
+            {'id': next(field_ids), 'name': field_name, 'type': 'text', 'primary': i == 0, 'read_only': False}
+            for i, field_name in enumerate(field_names)
+        ]
+        self.fields.append({'id': next(field_ids), 'name': UPDATED_ON_FIELD, 'type': 'last_modified', 'primary': False, 'read_only': True})
+        self.by_name = {f['name']: f for f in self.fields}
+        self.by_key = {f'field_{f["id"]}': f['name'] for f in self.fields}
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._row_ids = itertools.count(1)
+
+    def resolve(self, key: str) -> Optional[str]:
+        if key in self.by_name:
+            return key
+        return self.by_key.get(key)
+
+    def _values(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        values = {}
+        for key, value in data.items():
+            if key == 'id':
+                continue
+            name = self.resolve(key)
+            if name is None:
+                raise KeyError(key)
+            if not self.by_name[name]['read_only']:
+                values[name] = value
+        return values
+
+    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        row = {name: None for name in self.by_name}
+        row.update(self._values(data))
+        row['id'] = next(self._row_ids)
+        row[UPDATED_ON_FIELD] = _now()
+        self.rows[row['id']] = row
+        return row
+
+    def update(self, row_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        row = self.rows[row_id]
+        row.update(self._values(data))
+        row[UPDATED_ON_FIELD] = _now()
+        return row
+
+    def render(self, row: Dict[str, Any], user_field_names: bool) -> Dict[str, Any]:
+        if user_field_names:
+            return dict(row)
+        return {'id': row['id'], **{f'field_{self.by_name[name]["id"]}': value for name, value in row.items() if name != 'id'}}
+
+
+class FakeBaserow:
+    """In-memory Baserow database with the REST endpoints we use"""
+
+    def __init__(self, faults: Optional[Faults] = None, table_ids: Optional[Dict[str, int]] = None, seed: Optional[int] = None):
+        self.state = FakeState('baserow', faults, seed)
+        field_ids = itertools.count(1001)
+        self.tables: Dict[int, FakeTable] = {}
+        for name, (default_id, field_names) in TABLES.items():
+            table_id = (table_ids or {}).get(name, default_id)
+            self.tables[table_id] = FakeTable(table_id, name, field_names, field_ids)
+
+    def table(self, name: str) -> FakeTable:
+        return next(table for table in self.tables.values() if table.name == name)
+
+    def seed_garages(self, count: int, domain: str = 'garages.fake.test') -> List[Dict[str, Any]]:
+        """Add ``count`` contactable garages to 'Fix it'"""
+        table = self.table('Fix it')
+        return [
+            table.create({
+                'Name': f'Fake Garage {i}',
+                'Email': f'garage{i}@{domain}',
+                'Address': f'{i} Rue de la Gare, Luxembourg',
+                'Phone': f'+352 600 {i:03d}',
+                'Specialties': 'Carrosserie',
+            })
+            for i in range(1, count + 1)
+        ]
+
+    # --- request handling -------------------------------------------------
+
+    def _table_or_404(self, request: web.Request) -> FakeTable:
+        table = self.tables.get(int(request.match_info['table_id']))
+        if table is None:
+            raise web.HTTPNotFound(text='{"error": "ERROR_TABLE_DOES_NOT_EXIST"}', content_type='application/json')
+        return table
+
+    @staticmethod
+    def _user_field_names(request: web.Request) -> bool:
+        return request.query.get('user_field_names', '').lower() in ('1', 'true', 'yes', 'y')
+
+    @staticmethod
+    def _authorised(request: web.Request) -> bool:
+        return request.headers.get('Authorization', '').startswith(('Token ', 'JWT '))
+
+    @web.middleware
+    async def auth_middleware(self, request: web.Request, handler):
+        if request.path.startswith('/api/') and not self._authorised(request):
+            return _error(401, 'ERROR_INVALID_TOKEN')
+        return await handler(request)
+
+    async def list_fields(self, request: web.Request) -> web.Response:
+        return web.json_response(self._table_or_404(request).fields)
+
+    def _filtered(self, table: FakeTable, query) -> List[Dict[str, Any]]:
+        conditions = []
+        for key, value in query.items():
+            if key.startswith('filter__') and key.endswith('__equal'):
+                name = table.resolve(key[len('filter__'):-len('__equal')])
+                if name is None:
+                    raise KeyError(key)
+                conditions.append((name, value))
+        rows = list(table.rows.values())
+        if conditions:
+            combine = any if query.get('filter_type', 'AND').upper() == 'OR' else all
+            rows = [
+                row for row in rows
+                if combine(str(row.get(name) if row.get(name) is not None else '') == value for name, value in conditions)
+            ]
+        for key in reversed([k for k in query.get('order_by', '').split(',') if k]):
+            name = table.resolve(key.lstrip('-+'))
+            if name is None:
+                raise KeyError(key)
+            rows.sort(key=lambda row: (row.get(name) is None, str(row.get(name) or '')), reverse=key.startswith('-'))
+        return rows
+
+    async def list_rows(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        try:
+            page = max(1, int(request.query.get('page', 1)))
+            size = int(request.query.get('size', 100))
+        except ValueError:
+            return _error(400, 'ERROR_QUERY_PARAMETER_VALIDATION')
+        if not 1 <= size <= MAX_PAGE_SIZE:
+            return _error(400, 'ERROR_QUERY_PARAMETER_VALIDATION', f'size must be 1-{MAX_PAGE_SIZE}')
+        try:
+            rows = self._filtered(table, request.query)
+        except KeyError as e:
+            return _error(400, 'ERROR_FILTER_FIELD_NOT_FOUND', str(e))
+
+        start = (page - 1) * size
+        if start and start >= len(rows):
+            return _error(404, 'ERROR_INVALID_PAGE')
+        user_field_names = self._user_field_names(request)
+
+        def page_url(number: int) -> str:
+            return str(request.url.update_query(page=number))
+
+        return web.json_response({
+            'count': len(rows),
+            'next': page_url(page + 1) if start + size < len(rows) else None,
+            'previous': page_url(page - 1) if page > 1 else None,
+            'results': [table.render(row, user_field_names) for row in rows[start:start + size]],
+        })
+
+    def _row_or_404(self, table: FakeTable, request: web.Request) -> Dict[str, Any]:
+        row = table.rows.get(int(request.match_info['row_id']))
+        if row is None:
+            raise web.HTTPNotFound(text='{"error": "ERROR_ROW_DOES_NOT_EXIST"}', content_type='application/json')
+        return row
+
+    async def get_row(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        return web.json_response(table.render(self._row_or_404(table, request), self._user_field_names(request)))
+
+    async def create_row(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        try:
+            row = table.create(await request.json())
+        except KeyError as e:
+            return _error(400, 'ERROR_REQUEST_BODY_VALIDATION', f'Unknown field {e}')
+        return web.json_response(table.render(row, self._user_field_names(request)))
+
+    async def update_row(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        row = self._row_or_404(table, request)
+        try:
+            row = table.update(row['id'], await request.json())
+        except KeyError as e:
+            return _error(400, 'ERROR_REQUEST_BODY_VALIDATION', f'Unknown field {e}')
+        return web.json_response(table.render(row, self._user_field_names(request)))
+
+    async def delete_row(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        row = self._row_or_404(table, request)
+        del table.rows[row['id']]
+        return web.Response(status=204)
+
+    async def _batch_items(self, request: web.Request) -> List[Any]:
+        items = (await request.json()).get('items')
+        if not isinstance(items, list) or not items or len(items) > BATCH_SIZE:
+            raise web.HTTPBadRequest(
+                text='{"error": "ERROR_REQUEST_BODY_VALIDATION"}', content_type='application/json'
+            )
+        return items
+
+    async def batch_create(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        items = await self._batch_items(request)
+        try:
+            # Validate everything first: a batch is all or nothing
+            for item in items:
+                table._values(item)
+        except KeyError as e:
+            return _error(400, 'ERROR_REQUEST_BODY_VALIDATION', f'Unknown field {e}')
+        user_field_names = self._user_field_names(request)
+        return web.json_response({'items': [table.render(table.create(item), user_field_names) for item in items]})
+
+    async def batch_update(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        items = await self._batch_items(request)
+        missing = [item.get('id') for item in items if item.get('id') not in table.rows]
+        if missing:
+            return _error(400, 'ERROR_ROW_DOES_NOT_EXIST', f'Rows {missing} do not exist')
+        try:
+            for item in items:
+                table._values(item)
+        except KeyError as e:
+            return _error(400, 'ERROR_REQUEST_BODY_VALIDATION', f'Unknown field {e}')
+        user_field_names = self._user_field_names(request)
+        return web.json_response({'items': [table.render(table.update(item['id'], item), user_field_names) for item in items]})
+
+    async def batch_delete(self, request: web.Request) -> web.Response:
+        table = self._table_or_404(request)
+        items = await self._batch_items(request)
+        missing = [row_id for row_id in items if row_id not in table.rows]
+        if missing:
+            return _error(400, 'ERROR_ROW_DOES_NOT_EXIST', f'Rows {missing} do not exist')
+        for row_id in items:
+            del table.rows[row_id]
+        return web.Response(status=204)
+
+    async def dump(self, request: web.Request) -> web.Response:
+        """``GET /_fake/tables``: row counts per table"""
+        return web.json_response({table.name: {'id': table.id, 'rows': len(table.rows)} for table in self.tables.values()})
+
+    def app(self) -> web.Application:
+        app = make_app(self.state)
+        app.middlewares.append(self.auth_middleware)
+        rows = '/api/database/rows/table/{table_id:\\d+}'
+        app.router.add_get('/api/database/fields/table/{table_id:\\d+}/', self.list_fields)
+        app.router.add_get(f'{rows}/', self.list_rows)
+        app.router.add_post(f'{rows}/', self.create_row)
+        app.router.add_post(f'{rows}/batch/', self.batch_create)
+        app.router.add_patch(f'{rows}/batch/', self.batch_update)
+        app.router.add_post(f'{rows}/batch-delete/', self.batch_delete)
+        app.router.add_get(f'{rows}/{{row_id:\\d+}}/', self.get_row)
+        app.router.add_patch(f'{rows}/{{row_id:\\d+}}/', self.update_row)
+        app.router.add_delete(f'{rows}/{{row_id:\\d+}}/', self.delete_row)
+        app.router.add_get('/_fake/tables', self.dump)
+        return app
+
+    def env(self, base_url: str) -> Dict[str, str]:
+        """Settings that point the Baserow services at this fake"""
+        env_names = {
+            'Customer details': 'BASEROW_TABLE_CUSTOMER_DETAILS',
+            'Fix it': 'BASEROW_TABLE_FIX_IT',
+            'Recevied email': 'BASEROW_TABLE_RECEIVED_EMAIL',
+            'Quotes': 'BASEROW_TABLE_QUOTES',
+            'Service Requests': 'BASEROW_TABLE_SERVICE_REQUESTS',
+        }
+        env = {'BASEROW_URL': base_url, 'BASEROW_API_TOKEN': 'fake-baserow-token', 'BASEROW_DATABASE_ID': '1'}
+        for table in self.tables.values():
+            env[env_names[table.name]] = str(table.id)
+        return env
@@ -0,0 +1,152 @@
+"""Fake Cloudinary upload API.
+
+Implements ``POST /v1_1/<cloud>/<resource type>/upload`` as the cloudinary
+SDK sends it: a multipart form with ``file``, ``public_id``/``folder``, and
+either ``api_key``+``timestamp``+``signature`` or an ``upload_preset``.
+Point the SDK here with ``CLOUDINARY_UPLOAD_PREFIX``.
+
+Responses carry the real response signature (``sha1`` of ``public_id``
+and ``version`` with :data:`API_SECRET`), so the app can verify uploads
+the browser made directly.
+
+Uploaded bytes are kept in memory (oldest dropped beyond
+``max_stored_bytes``) and served back from the returned ``secure_url``,
+under ``/<cloud>/<resource type>/upload/v<version>/<public id>.<format>``.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from .faults import FakeState, Faults, make_app
+
+API_SECRET = 'fake-secret'
+
+_CONTENT_TYPES = {
+    'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif',
+    'webp': 'image/webp', 'pdf': 'application/pdf', 'mp4': 'video/mp4',
+}
+
+
+def _sniff_format(content: bytes, filename: str) -> str:
+    if content.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if content.startswith(b'\x89PNG'):
+        return 'png'
+    if content[:4] == b'RIFF' and content[8:12] == b'WEBP':
+        return 'webp'
+    if content.startswith(b'GIF8'):
+        return 'gif'
+    if content.startswith(b'%PDF'):
+        return 'pdf'
+    extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return extension or 'bin'
+
+
+class FakeCloudinary:
+    """Accepts uploads and serves them back, see module docstring"""
+
+    def __init__(self, faults: Optional[Faults] = None, max_stored_bytes: int = 256 * 1024 * 1024, seed: Optional[int] = None):
+        self.state = FakeState('cloudinary', faults, seed)
+        self.max_stored_bytes = max_stored_bytes
+        # Served path -> (content type, bytes)
+        self.assets: OrderedDict = OrderedDict()
+        self.stored_bytes = 0
+        self.uploads = 0
+        self.uploaded_bytes = 0
+        self._last_version = 0
+
+    def _keep(self, path: str, content_type: str, content: bytes):
+        if path in self.assets:
+            self.stored_bytes -= len(self.assets.pop(path)[1])
+        self.assets[path] = (content_type, content)
+        self.stored_bytes += len(content)
+        while self.stored_bytes > self.max_stored_bytes and self.assets:
+            _, (_, dropped) = self.assets.popitem(last=False)
+            self.stored_bytes -= len(dropped)
+
+    async def upload(self, request: web.Request) -> web.Response:
+        cloud, resource_type = request.match_info['cloud'], request.match_info['resource_type']
+        form = await request.post()
+        if not form.get('upload_preset') and not all(form.get(k) for k in ('api_key', 'timestamp', 'signature')):
+            return web.json_response({'error': {'message': 'Must supply api_key'}}, status=401)
+
+        file_field = form.get('file')
+        if file_field is None:
+            return web.json_response({'error': {'message': 'Missing required parameter - file'}}, status=400)
+        if isinstance(file_field, str):
+            # A remote URL or data URI; we don't fetch, just store the string
+            content, filename = file_field.encode(), ''
+        else:
+            content, filename = file_field.file.read(), file_field.filename or ''
+        if not content:
+            return web.json_response({'error': {'message': 'Empty file'}}, status=400)
+
+        fmt = _sniff_format(content, filename)
+        public_id = form.get('public_id') or hashlib.sha1(content).hexdigest()[:20]
+        folder = form.get('folder')
+        if folder and not public_id.startswith(f'{folder}/'):
+            public_id = f'{folder}/{public_id}'
+        if resource_type == 'auto':
+            resource_type = 'raw' if fmt in ('pdf', 'bin') else 'video' if fmt == 'mp4' else 'image'
+
+        # Cloudinary versions are upload timestamps; keep them unique here
+        version = self._last_version = max(int(time.time()), self._last_version + 1)
+        path = f'{cloud}/{resource_type}/upload/v{version}/{public_id}.{fmt}'
+        self._keep(path, _CONTENT_TYPES.get(fmt, 'application/octet-stream'), content)
+        self.uploads += 1
+        self.uploaded_bytes += len(content)
+
+        url = f'{request.scheme}://{request.host}/{path}'
+        return web.json_response({
+            'asset_id': hashlib.md5(path.encode()).hexdigest(),
+            'public_id': public_id,
+            'version': version,
+            'signature': hashlib.sha1(f'public_id={public_id}&version={version}{API_SECRET}'.encode()).hexdigest(),
+            'format': fmt,
+            'resource_type': resource_type,
+            'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'bytes': len(content),
+            'type': 'upload',
+            'etag': hashlib.md5(content).hexdigest(),
+            'url': url,
+            'secure_url': url,
+            'original_filename': os.path.splitext(os.path.basename(filename))[0],
+        })
+
+    async def serve(self, request: web.Request) -> web.Response:
+        asset = self.assets.get(request.path.lstrip('/'))
+        if asset is None:
+            raise web.HTTPNotFound()
+        content_type, content = asset
+        return web.Response(body=content, content_type=content_type)
+
+    async def summary(self, request: web.Request) -> web.Response:
+        """``GET /_fake/uploads``: upload counts and bytes"""
+        return web.json_response({
+            'uploads': self.uploads,
+            'uploaded_bytes': self.uploaded_bytes,
+            'stored_assets': len(self.assets),
+            'stored_bytes': self.stored_bytes,
+        })
+
+    def app(self) -> web.Application:
+        app = make_app(self.state)
+        app.router.add_post('/v1_1/{cloud}/{resource_type}/upload', self.upload)
+        app.router.add_get('/_fake/uploads', self.summary)
+        app.router.add_get('/{cloud}/{resource_type}/upload/{tail:.+}', self.serve)
+        return app
+
+    def env(self, base_url: str) -> Dict[str, str]:
+        """Settings that point the cloudinary SDK at this fake"""
+        return {
+            'CLOUDINARY_UPLOAD_PREFIX': base_url,
+            'CLOUDINARY_CLOUD_NAME': 'fake-cloud',
+            'CLOUDINARY_API_KEY': 'fake-key',
+            'CLOUDINARY_API_SECRET': API_SECRET,
+            'CLOUDINARY_DELIVERY_URL': base_url,
+        }
@@ -0,0 +1,142 @@
+"""Latency, error and throttling injection shared by the fake services.
+
+Every fake is an aiohttp application with :func:`fault_middleware` in
+front of its routes. For each request the middleware sleeps for the
+configured latency (plus jitter). Then, with the configured
+probabilities, it answers 429 (with ``Retry-After``) or a 5xx instead of
+calling the handler. Paths under ``/_fake/`` (the control endpoints) are
+never delayed or failed.
+
+Faults can be changed while a fake is running::
+
+    curl -X POST localhost:8101/_fake/faults -d '{"throttle_rate": 0.2}'
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Callable, Dict, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class Faults:
+    """What to inject into each request"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+
+    def update(self, values: Dict[str, Any]) -> 'Faults':
+        known = {f.name for f in fields(self)}
+        for key, value in values.items():
+            if key not in known:
+                raise ValueError(f"Unknown fault setting {key!r}")
+            setattr(self, key, int(value) if key == 'error_status' else float(value))
+        return self
+
+    def delay(self, rng: random.Random) -> float:
+        if not self.latency_ms and not self.jitter_ms:
+            return 0.0
+        return max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+
+class FakeState:
+    """Faults plus request counters for one fake service"""
+
+    def __init__(self, name: str, faults: Optional[Faults] = None, seed: Optional[int] = None):
+        self.name = name
+        self.faults = faults or Faults()
+        self.calls: Counter = Counter()
+        self.started_at = time.time()
+        self.random = random.Random(seed)
+
+    def pick_fault(self) -> Optional[int]:
+        """Status to fail this request with (429 or ``error_status``), or None to serve it"""
+        roll = self.random.random()
+        if roll < self.faults.throttle_rate:
+            return 429
+        if roll < self.faults.throttle_rate + self.faults.error_rate:
+            return self.faults.error_status
+        return None
+
+    def fault_response(self, status: int) -> web.Response:
+        if status == 429:
+            return web.json_response(
+                {'error': 'Too many requests'},
+                status=429,
+                headers={'Retry-After': f'{self.faults.retry_after:g}'},
+            )
+        return web.json_response({'error': 'Injected failure'}, status=status)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'service': self.name,
+            'faults': asdict(self.faults),
+            'calls': {f'{route} {status}': count for (route, status), count in sorted(self.calls.items())},
+            'total': sum(self.calls.values()),
+        }
+
+
+def _route_name(request: web.Request) -> str:
+    resource = request.match_info.route.resource
+    return f"{request.method} {resource.canonical if resource else request.path}"
+
+
+def fault_middleware(state: FakeState) -> Callable:
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        if request.path.startswith('/_fake/'):
+            return await handler(request)
+
+        faults = state.faults
+        route = _route_name(request)
+        delay = faults.delay(state.random)
+        if delay:
+            await asyncio.sleep(delay)
+
+        status = state.pick_fault()
+        if status is not None:
+            state.calls[(route, status)] += 1
+            return state.fault_response(status)
+
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            state.calls[(route, e.status)] += 1
+            raise
+        state.calls[(route, response.status)] += 1
+        return response
+    return middleware
+
+
+def add_control_routes(app: web.Application, state: FakeState):
+    """``GET /_fake/stats``, ``POST /_fake/faults`` and ``POST /_fake/reset-stats``"""
+
+    async def get_stats(request):
+        return web.json_response(state.stats())
+
+    async def set_faults(request):
+        try:
+            state.faults.update(await request.json())
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        return web.json_response(asdict(state.faults))
+
+    async def reset_stats(request):
+        state.calls.clear()
+        return web.json_response({'ok': True})
+
+    app.router.add_get('/_fake/stats', get_stats)
+    app.router.add_post('/_fake/faults', set_faults)
+    app.router.add_post('/_fake/reset-stats', reset_stats)
+
+
+def make_app(state: FakeState) -> web.Application:
+    app = web.Application(middlewares=[fault_middleware(state)], client_max_size=64 * 1024 * 1024)
+    add_control_routes(app, state)
+    return app
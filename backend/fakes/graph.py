@@ -0,0 +1,256 @@
+"""Fake Microsoft Graph mail API.
+
+Implements the calls the email service and the reply-ingest script make:
+
+* ``POST /v1.0/users/<user>/sendMail`` (202, nothing returned)
+* ``GET  /v1.0/users/<user>/messages`` and
+  ``/v1.0/users/<user>/mailFolders/<folder>/messages`` with ``$top``,
+  ``$skip``, ``$orderby=receivedDateTime [asc|desc]``, ``$select`` and
+  ``$filter=receivedDateTime ge <iso>``, paged with ``@odata.nextLink``
+* ``PATCH /v1.0/users/<user>/messages/<id>`` (e.g. ``isRead``)
+* ``POST /v1.0/$batch`` (at most 20 sub-requests, each of which can be
+  throttled on its own, as Graph does)
+
+Tokens aren't checked beyond being a Bearer token: point the services here
+with ``GRAPH_BASE_URL`` and skip MSAL with ``GRAPH_STATIC_TOKEN``.
+
+To drive the whole pipeline, the fake can play the garages: with
+``reply_rate`` > 0, each recipient of a sent mail answers with that
+probability after ``reply_delay_ms``. The answer goes into the sender's
+inbox, quotes a price and includes the original request, VIN and all.
+"""
+import asyncio
+import itertools
+import json
+import re
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from aiohttp import web
+
+from .faults import FakeState, Faults, make_app
+
+MAX_BATCH_REQUESTS = 20
+
+_FILTER_RE = re.compile(r"receivedDateTime\s+ge\s+'?([0-9T:\-.Z+]+)'?", re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_iso(value: str) -> float:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class FakeGraph:
+    """In-memory mailboxes behind the Graph endpoints we use"""
+
+    def __init__(
+        self,
+        faults: Optional[Faults] = None,
+        reply_rate: float = 0.0,
+        reply_delay_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.state = FakeState('graph', faults, seed)
+        self.reply_rate = reply_rate
+        self.reply_delay_ms = reply_delay_ms
+        self.inboxes: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.sent: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._pending_replies: set = set()
+
+    # --- mailbox operations ----------------------------------------------
+
+    def deliver(self, user: str, sender: str, subject: str, body: str, received_at: Optional[float] = None) -> Dict[str, Any]:
+        """Put a message in ``user``'s inbox"""
+        number = next(self._ids)
+        message = {
+            'id': f'AAMk{number:08d}',
+            'internetMessageId': f'<fake-{number}-{uuid.uuid4().hex[:8]}@mail.fake.test>',
+            'receivedDateTime': _iso(received_at or time.time()),
+            'subject': subject,
+            'from': {'emailAddress': {'address': sender, 'name': sender.split('@')[0]}},
+            'body': {'contentType': 'text', 'content': body},
+            'hasAttachments': False,
+            'isRead': False,
+        }
+        self.inboxes[user.lower()].append(message)
+        return message
+
+    def _reply_text(self, message: Dict[str, Any]) -> str:
+        original = _TAG_RE.sub(' ', message.get('body', {}).get('content', ''))
+        original = ' '.join(original.split())[:2000]
+        price = 150 + self.state.random.randint(0, 1850)
+        return (
+            f"Bonjour,\n\nSuite à votre demande, notre devis est de {price} EUR TTC, "
+            f"pièces et main d'œuvre comprises.\n\nCordialement\n\n"
+            f"On {_iso(time.time())} Garagefy wrote:\n> {original}"
+        )
+
+    async def _reply_later(self, user: str, garage: str, message: Dict[str, Any]):
+        try:
+            if self.reply_delay_ms:
+                await asyncio.sleep(self.reply_delay_ms / 1000)
+            self.deliver(user, garage, f"RE: {message.get('subject', '')}", self._reply_text(message))
+        finally:
+            self._pending_replies.discard(asyncio.current_task())
+
+    def _send(self, user: str, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        message = payload.get('message') if isinstance(payload, dict) else None
+        if not message or not message.get('toRecipients'):
+            return 400, {'error': {'code': 'ErrorInvalidRecipients', 'message': 'At least one recipient is required'}}
+        recipients = [r['emailAddress']['address'] for r in message['toRecipients']]
+        self.sent.append({
+            'from': user,
+            'to': recipients,
+            'subject': message.get('subject', ''),
+            'sent_at': time.time(),
+        })
+        for garage in recipients:
+            if self.reply_rate and self.state.random.random() < self.reply_rate:
+                task = asyncio.get_running_loop().create_task(self._reply_later(user, garage, message))
+                self._pending_replies.add(task)
+        return 202, None
+
+    def _list(self, user: str, query: Dict[str, str], base_url: str, path: str) -> Tuple[int, Any]:
+        messages = list(self.inboxes.get(user.lower(), []))
+        match = _FILTER_RE.search(query.get('$filter', ''))
+        if match:
+            since = _parse_iso(match.group(1))
+            messages = [m for m in messages if _parse_iso(m['receivedDateTime']) >= since]
+        order = query.get('$orderby', 'receivedDateTime desc')
+        messages.sort(key=lambda m: (m['receivedDateTime'], m['id']), reverse=not order.strip().endswith('asc'))
+
+        top = min(int(query.get('$top', 10)), 1000)
+        skip = int(query.get('$skip', 0))
+        page = messages[skip:skip + top]
+        selected = [s.strip() for s in query.get('$select', '').split(',') if s.strip()]
+        if selected:
+            page = [{key: m[key] for key in ['id', *selected] if key in m} for m in page]
+
+        result: Dict[str, Any] = {'value': page}
+        if skip + top < len(messages):
+            result['@odata.nextLink'] = f"{base_url}{path}?{urlencode({**query, '$skip': str(skip + top)})}"
+        return 200, result
+
+    def _patch(self, user: str, message_id: str, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        for message in self.inboxes.get(user.lower(), []):
+            if message['id'] == message_id:
+                if 'isRead' in payload:
+                    message['isRead'] = bool(payload['isRead'])
+                return 200, message
+        return 404, {'error': {'code': 'ErrorItemNotFound', 'message': 'The specified object was not found in the store.'}}
+
+    def dispatch(self, method: str, path: str, query: Dict[str, str], body: Any, base_url: str) -> Tuple[int, Any]:
+        """Route one Graph call; shared by the HTTP routes and ``$batch``"""
+        path = '/' + path.lstrip('/')
+        if not path.startswith('/v1.0/'):
+            path = '/v1.0' + path
+        parts = path.split('/')[2:]
+        if len(parts) >= 3 and parts[0] == 'users':
+            user = parts[1]
+            rest = parts[2:]
+            if method == 'POST' and rest == ['sendMail']:
+                return self._send(user, body or {})
+            if method == 'GET' and (rest == ['messages'] or (len(rest) == 3 and rest[0] == 'mailFolders' and rest[2] == 'messages')):
+                return self._list(user, query, base_url, path)
+            if method == 'PATCH' and len(rest) == 2 and rest[0] == 'messages':
+                return self._patch(user, rest[1], body or {})
+        return 404, {'error': {'code': 'BadRequest', 'message': f'Unsupported request {method} {path}'}}
+
+    # --- HTTP -------------------------------------------------------------
+
+    @web.middleware
+    async def auth_middleware(self, request: web.Request, handler):
+        if request.path.startswith('/v1.0/') and not request.headers.get('Authorization', '').startswith('Bearer '):
+            return web.json_response(
+                {'error': {'code': 'InvalidAuthenticationToken', 'message': 'Access token is empty.'}}, status=401
+            )
+        return await handler(request)
+
+    @staticmethod
+    def _base_url(request: web.Request) -> str:
+        return f'{request.scheme}://{request.host}'
+
+    @staticmethod
+    def _respond(status: int, body: Any) -> web.Response:
+        if body is None:
+            return web.Response(status=status)
+        return web.json_response(body, status=status)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = None
+        if request.can_read_body:
+            try:
+                body = await request.json()
+            except json.JSONDecodeError:
+                return web.json_response({'error': {'code': 'BadRequest', 'message': 'Invalid JSON'}}, status=400)
+        status, result = self.dispatch(request.method, request.path, dict(request.query), body, self._base_url(request))
+        return self._respond(status, result)
+
+    async def batch(self, request: web.Request) -> web.Response:
+        requests_ = (await request.json()).get('requests') or []
+        if len(requests_) > MAX_BATCH_REQUESTS:
+            return web.json_response(
+                {'error': {'code': 'BadRequest', 'message': f'Batch has more than {MAX_BATCH_REQUESTS} requests'}}, status=400
+            )
+        responses = []
+        for sub in requests_:
+            fault = self.state.pick_fault()
+            route = f"{sub.get('method', 'GET')} $batch/{sub.get('url', '').split('?')[0].rsplit('/', 1)[-1]}"
+            if fault is not None:
+                self.state.calls[(route, fault)] += 1
+                headers = {'Retry-After': f'{self.state.faults.retry_after:g}'} if fault == 429 else {}
+                responses.append({'id': sub.get('id'), 'status': fault, 'headers': headers, 'body': {'error': {'code': 'Injected'}}})
+                continue
+            url = urlsplit(sub.get('url', ''))
+            status, result = self.dispatch(
+                sub.get('method', 'GET').upper(), url.path, dict(parse_qsl(url.query)), sub.get('body'), self._base_url(request)
+            )
+            self.state.calls[(route, status)] += 1
+            responses.append({'id': sub.get('id'), 'status': status, 'headers': {}, 'body': result})
+        return web.json_response({'responses': responses})
+
+    async def inject(self, request: web.Request) -> web.Response:
+        """``POST /_fake/inbox``: ``{"user", "from", "subject", "body"}`` or a list of them"""
+        payload = await request.json()
+        messages = [
+            self.deliver(item['user'], item['from'], item.get('subject', ''), item.get('body', ''))
+            for item in (payload if isinstance(payload, list) else [payload])
+        ]
+        return web.json_response({'delivered': len(messages), 'ids': [m['id'] for m in messages]})
+
+    async def sent_mail(self, request: web.Request) -> web.Response:
+        """``GET /_fake/sent``: every mail sent so far, oldest first"""
+        return web.json_response({'count': len(self.sent), 'value': self.sent})
+
+    async def mailboxes(self, request: web.Request) -> web.Response:
+        """``GET /_fake/inbox``: message count per mailbox"""
+        return web.json_response({user: len(messages) for user, messages in self.inboxes.items()})
+
+    def app(self) -> web.Application:
+        app = make_app(self.state)
+        app.middlewares.append(self.auth_middleware)
+        app.router.add_post('/v1.0/$batch', self.batch)
+        app.router.add_route('*', '/v1.0/users/{tail:.+}', self.handle)
+        app.router.add_post('/_fake/inbox', self.inject)
+        app.router.add_get('/_fake/inbox', self.mailboxes)
+        app.router.add_get('/_fake/sent', self.sent_mail)
+        return app
+
+    def env(self, base_url: str) -> Dict[str, str]:
+        """Settings that point the email service and ingest script at this fake"""
+        return {
+            'GRAPH_BASE_URL': f'{base_url}/v1.0',
+            'GRAPH_STATIC_TOKEN': 'fake-graph-token',
+            'MS_CLIENT_ID': 'fake-client',
+            'MS_CLIENT_SECRET': 'fake-secret',
+            'MS_TENANT_ID': 'fake-tenant',
+        }
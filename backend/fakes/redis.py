@@ -0,0 +1,224 @@
+"""Fake Redis server (RESP2 over TCP) for the shared idempotency store.
+
+Implements what :class:`app.core.idempotency.RedisIdempotencyStore` and the
+``redis`` client use: ``PING``, ``SET`` (with ``NX``/``XX``/``EX``/``PX``),
+``GET``, ``DEL``, ``EXISTS``, ``PTTL``, ``DBSIZE``, ``FLUSHDB``/``FLUSHALL``,
+``WATCH``/``UNWATCH``/``MULTI``/``EXEC``/``DISCARD``, and accepts
+``CLIENT``/``SELECT`` so the client's connection setup succeeds. Keys
+expire lazily, when they are next read.
+
+It is not an HTTP app, so there are no ``/_fake/`` routes; latency and
+``error_rate`` faults still apply to every command (an injected error is an
+``-ERR`` reply), and per-command counts show up in ``FakeServices.stats()``.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .faults import FakeState, Faults
+
+
+class _Error(Exception):
+    pass
+
+
+# EXEC's reply when a watched key changed
+_NullArray = object()
+
+
+def _encode(value: Any) -> bytes:
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, _Error):
+        return f'-{value}\r\n'.encode()
+    if isinstance(value, bool):
+        return b'+OK\r\n' if value else b'$-1\r\n'
+    if isinstance(value, int):
+        return f':{value}\r\n'.encode()
+    if isinstance(value, str):
+        return f'+{value}\r\n'.encode()
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(_encode(item) for item in value)
+    raise TypeError(f"Can't encode {type(value).__name__}")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        # Inline command, as typed into telnet
+        return line.strip().split()
+    parts = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        length = int(header[1:])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts
+
+
+class _Connection:
+    def __init__(self):
+        self.watched: Dict[bytes, int] = {}
+        self.queued: Optional[List[List[bytes]]] = None
+
+
+class FakeRedis:
+    """Keys in memory, served over the Redis protocol; see module docstring"""
+
+    def __init__(self, faults: Optional[Faults] = None, seed: Optional[int] = None):
+        self.state = FakeState('redis', faults, seed)
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        # Bumped on every write, for WATCH
+        self.versions: Dict[bytes, int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    def _touch(self, key: bytes):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            self._touch(key)
+            return None
+        return entry
+
+    def _set(self, args: List[bytes]) -> Any:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        exists = self._live(key) is not None
+        for i, option in enumerate(options):
+            if option in (b'EX', b'PX'):
+                amount = int(args[2 + i + 1])
+                expires_at = time.monotonic() + (amount if option == b'EX' else amount / 1000)
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        self._touch(key)
+        return True
+
+    def _delete(self, keys: List[bytes]) -> int:
+        deleted = 0
+        for key in keys:
+            if self._live(key) is not None:
+                del self.data[key]
+                self._touch(key)
+                deleted += 1
+        return deleted
+
+    def _pttl(self, key: bytes) -> int:
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return int((entry[1] - time.monotonic()) * 1000)
+
+    def _run(self, name: bytes, args: List[bytes]) -> Any:
+        if name == b'PING':
+            return args[0] if args else 'PONG'
+        if name in (b'CLIENT', b'SELECT'):
+            return True
+        if name == b'SET':
+            return self._set(args)
+        if name == b'GET':
+            entry = self._live(args[0])
+            return entry[0] if entry is not None else None
+        if name == b'DEL':
+            return self._delete(args)
+        if name == b'EXISTS':
+            return sum(1 for key in args if self._live(key) is not None)
+        if name == b'PTTL':
+            return self._pttl(args[0])
+        if name == b'DBSIZE':
+            return sum(1 for key in list(self.data) if self._live(key) is not None)
+        if name in (b'FLUSHDB', b'FLUSHALL'):
+            for key in list(self.data):
+                self._touch(key)
+            self.data.clear()
+            return True
+        return _Error(f"ERR unknown command '{name.decode(errors='replace')}'")
+
+    def _execute(self, connection: _Connection, command: List[bytes]) -> Any:
+        name, args = command[0].upper(), command[1:]
+        if name == b'MULTI':
+            connection.queued = []
+            return True
+        if name == b'DISCARD':
+            connection.queued, connection.watched = None, {}
+            return True
+        if name == b'EXEC':
+            queued, connection.queued = connection.queued, None
+            watched, connection.watched = connection.watched, {}
+            if queued is None:
+                return _Error('ERR EXEC without MULTI')
+            for key in watched:
+                self._live(key)
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return _NullArray
+            return [self._run(queued_command[0].upper(), queued_command[1:]) for queued_command in queued]
+        if connection.queued is not None:
+            connection.queued.append(command)
+            return 'QUEUED'
+        if name == b'WATCH':
+            for key in args:
+                self._live(key)
+                connection.watched[key] = self.versions.get(key, 0)
+            return True
+        if name == b'UNWATCH':
+            connection.watched = {}
+            return True
+        return self._run(name, args)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = _Connection()
+        self._clients[asyncio.current_task()] = writer
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None:
+                    break
+                if not command:
+                    continue
+                route = command[0].upper().decode(errors='replace')
+                delay = self.state.faults.delay(self.state.random)
+                if delay:
+                    await asyncio.sleep(delay)
+                if self.state.pick_fault() is not None:
+                    self.state.calls[(route, 'error')] += 1
+                    writer.write(b'-ERR injected failure\r\n')
+                else:
+                    reply = self._execute(connection, command)
+                    self.state.calls[(route, 'error' if isinstance(reply, _Error) else 'ok')] += 1
+                    writer.write(b'*-1\r\n' if reply is _NullArray else _encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> str:
+        """Start listening; returns the ``redis://`` URL"""
+        self._server = await asyncio.start_server(self._serve_client, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f'redis://{host}:{port}/0'
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # Connected clients are dropped too, so their handlers finish on this loop
+        for writer in list(self._clients.values()):
+            writer.close()
+        if self._clients:
+            await asyncio.wait(list(self._clients), timeout=5)
+
+    def env(self, url: str) -> Dict[str, str]:
+        """Settings that point the idempotency store at this fake"""
+        return {'IDEMPOTENCY_REDIS_URL': url}
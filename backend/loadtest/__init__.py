@@ -0,0 +1,15 @@
+"""End-to-end load test for the service-request pipeline.
+
+Runs the backend against the local fakes (:mod:`fakes`) and reports, per
+target rate: throughput, submit latency percentiles, time until every garage
+has been mailed (fan-out), time until the customer's digest goes out,
+outbound calls per request and peak RSS. From ``backend/``::
+
+    python -m loadtest --rps 1,2,5,10 --duration 60 --garages 40
+
+Stages stop at the first rate where the error rate (or, with ``--max-p99``,
+the submit p99) goes over the limit: that's where the system falls over.
+"""
+from .harness import LoadConfig, LoadTest
+
+__all__ = ['LoadConfig', 'LoadTest']
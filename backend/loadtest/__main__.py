@@ -0,0 +1,117 @@
+"""``python -m loadtest``: ramp the service-request pipeline, see package docstring"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from fakes import Faults
+
+from .harness import LoadConfig, LoadTest
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description=__doc__)
+    parser.add_argument('--rps', default='1', help='comma-separated target rates, run in order (e.g. 1,2,5,10)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of submissions per rate')
+    parser.add_argument('--drain', type=float, default=120.0, help='seconds to wait for fan-outs and digests after each rate')
+    parser.add_argument('--garages', type=int, default=20)
+    parser.add_argument('--images', default='1-5', help='photos per request, e.g. 1-5')
+    parser.add_argument('--image-kb', default='80-4096', help='photo size range in KiB (log-uniform)')
+    parser.add_argument('--reply-rate', type=float, default=1.0, help='share of garages that answer')
+    parser.add_argument('--reply-delay-ms', type=float, default=5000, help='garages answer after up to this long')
+    parser.add_argument('--tick-interval', type=float, default=2.0, help='seconds between ingest/digest runs')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='open submit connections')
+    parser.add_argument('--timeout', type=float, default=60.0, help='submit timeout in seconds')
+    parser.add_argument('--max-error-rate', type=float, default=0.05)
+    parser.add_argument('--max-p99', type=float, default=None, help='submit p99 (seconds) that counts as falling over')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added to every fake call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of fake calls failing with 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of fake calls answered with 429')
+    parser.add_argument('--set', action='append', default=[], metavar='SERVICE.FAULT=VALUE',
+                        help='per-fake override, e.g. graph.throttle_rate=0.1')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', metavar='PATH', help='also write the results here')
+    parser.add_argument('--keep-workdir', action='store_true', help="keep the app's log and local state after the run")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the tick jobs' logging")
+    return parser.parse_args(argv)
+
+
+def _range(value: str, cast=int):
+    low, _, high = value.partition('-')
+    return cast(low), cast(high or low)
+
+
+def _faults(args):
+    base = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    faults = {service: Faults(**base) for service in ('baserow', 'graph', 'cloudinary')}
+    for override in args.set:
+        try:
+            target, value = override.split('=', 1)
+            service, key = target.split('.', 1)
+            faults[service].update({key: value})
+        except (KeyError, ValueError) as e:
+            sys.exit(f'Bad --set {override!r} ({e})')
+    return faults
+
+
+def _ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.0f}ms' if seconds < 10 else f'{seconds:.1f}s'
+
+
+def _print_stage(stage):
+    latency, fan_out, digest = stage['submit_latency'], stage['time_to_fan_out'], stage['time_to_digest']
+    print(f"\n=== {stage['target_rps']:g} rps: {stage['accepted']}/{stage['submitted']} accepted, "
+          f"{stage['throughput_rps']:.2f} rps, errors {stage['error_rate']:.1%} {stage['statuses']}")
+    for label, summary in (('submit', latency), ('fan-out', fan_out), ('digest', digest)):
+        print(f"  {label:<8} n={summary['count']:<5} p50={_ms(summary['p50'])} p95={_ms(summary['p95'])} "
+              f"p99={_ms(summary['p99'])} max={_ms(summary['max'])}")
+    ticks = stage['ticks']
+    print(f"  ticks    n={ticks['count']:<5} p50={_ms(ticks['p50'])} max={_ms(ticks['max'])} errors={ticks['errors']}")
+    for service, calls in stage['outbound_calls_per_request'].items():
+        print(f"  {service:<10} {calls['total']:>8.2f} calls/request")
+        for route, count in sorted(calls['routes'].items(), key=lambda item: -item[1]):
+            print(f"    {count:>8.2f}  {route}")
+    rss = stage['peak_rss_kb']
+    print(f"  peak RSS app={(rss['app'] or 0) / 1024:.0f}MiB harness={(rss['harness'] or 0) / 1024:.0f}MiB")
+    if stage['fell_over']:
+        print(f"  FELL OVER: {stage['fell_over']}")
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    images_min, images_max = _range(args.images)
+    image_kb_min, image_kb_max = _range(args.image_kb, float)
+    config = LoadConfig(
+        rates=[float(rate) for rate in args.rps.split(',') if rate.strip()],
+        duration=args.duration,
+        drain=args.drain,
+        garages=args.garages,
+        images_min=images_min,
+        images_max=images_max,
+        image_kb_min=image_kb_min,
+        image_kb_max=image_kb_max,
+        reply_rate=args.reply_rate,
+        reply_delay_ms=args.reply_delay_ms,
+        tick_interval=args.tick_interval,
+        max_in_flight=args.max_in_flight,
+        timeout=args.timeout,
+        max_error_rate=args.max_error_rate,
+        max_p99=args.max_p99,
+        faults=_faults(args),
+        seed=args.seed,
+        keep_workdir=args.keep_workdir,
+    )
+    # The harness changes directory to its scratch space
+    json_path = os.path.abspath(args.json) if args.json else None
+    results = asyncio.run(LoadTest(config).run(on_stage=_print_stage))
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""Drive the service-request pipeline end to end and measure it.
+
+One run is a series of stages, one per target rate. Each stage:
+
+1. submits ``POST /api/service-requests`` open-loop at the target rate
+   (a request is sent at its scheduled time whether or not earlier ones
+   have answered, and its latency counts from that time, so a backed-up
+   server can't hide its queueing);
+2. watches the fake Graph outbox: the request's fan-out is complete once
+   every garage has been sent its quote request, and each garage answers
+   (``reply_rate``) after a random delay up to ``reply_delay_ms``;
+3. runs the reply-ingest script and the customer digest job every
+   ``tick_interval`` seconds, as the scheduler would, until the customer's
+   digest mail shows up in the outbox or the stage's drain time runs out.
+
+The app runs under uvicorn in its own process with the scheduler off, so
+the two periodic jobs run here at a pace the test controls. Outbound calls
+are counted by the fakes, which means they include what the ticks did.
+"""
+import asyncio
+import contextlib
+import io
+import os
+import random
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from fakes import FakeServices, Faults
+
+from .payloads import ImagePool, garage_reply, garage_request_text, service_request_form
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SUBJECT_VIN_RE = re.compile(r'VIN:\s*([A-Z0-9]{17})')
+
+
+@dataclass
+class LoadConfig:
+    rates: List[float] = field(default_factory=lambda: [1.0])
+    duration: float = 30.0
+    drain: float = 120.0
+    garages: int = 20
+    images_min: int = 1
+    images_max: int = 5
+    image_kb_min: float = 80
+    image_kb_max: float = 4096
+    reply_rate: float = 1.0
+    reply_delay_ms: float = 5000
+    tick_interval: float = 2.0
+    max_in_flight: int = 256
+    timeout: float = 60.0
+    max_error_rate: float = 0.05
+    max_p99: Optional[float] = None
+    faults: Dict[str, Faults] = field(default_factory=dict)
+    mailbox: str = 'info@garagefy.app'
+    seed: Optional[int] = None
+    keep_workdir: bool = False
+
+
+@dataclass
+class Tracked:
+    """One submitted service request"""
+    number: int
+    form: Dict[str, str]
+    scheduled_at: float
+    status: Optional[int] = None
+    latency: Optional[float] = None
+    error: Optional[str] = None
+    garages_sent: set = field(default_factory=set)
+    fanned_out_at: Optional[float] = None
+    digest_at: Optional[float] = None
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarise(values: List[float]) -> Dict[str, Any]:
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+def peak_rss_kb(pid: Optional[int] = None) -> Optional[int]:
+    """High-water RSS of ``pid`` (this process when None), in KiB"""
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class AppProcess:
+    """The backend under uvicorn, pointed at the fakes"""
+
+    def __init__(self, env: Dict[str, str], workdir: str):
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.env = {**os.environ, **env, 'PYTHONPATH': BACKEND_DIR, 'SCHEDULER_ENABLED': 'false'}
+        self.workdir = workdir
+        self.log_path = os.path.join(workdir, 'app.log')
+        self.process: Optional[subprocess.Popen] = None
+
+    async def start(self, timeout: float = 60.0):
+        log = open(self.log_path, 'ab')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(self.port),
+             '--log-level', 'warning', '--no-access-log'],
+            cwd=self.workdir, env=self.env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f'App exited with {self.process.returncode}, see {self.log_path}')
+                with contextlib.suppress(aiohttp.ClientError):
+                    async with session.get(f'{self.url}/health') as response:
+                        if response.status == 200:
+                            return
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f'App did not become healthy in {timeout:.0f}s, see {self.log_path}')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class LoadTest:
+
+    def __init__(self, config: LoadConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.images = ImagePool(config.image_kb_min, config.image_kb_max, seed=config.seed)
+        self.fakes: Optional[FakeServices] = None
+        self.app: Optional[AppProcess] = None
+        self.by_vin: Dict[str, Tracked] = {}
+        self.by_email: Dict[str, Tracked] = {}
+        self.next_number = 1
+        self._sent_seen = 0
+        self.tick_durations: List[float] = []
+        self.tick_errors = 0
+
+    # --- pieces ------------------------------------------------------------
+
+    def _import_jobs(self):
+        """Load the ingest script and digest service with the fakes' settings"""
+        if BACKEND_DIR not in sys.path:
+            sys.path.insert(0, BACKEND_DIR)
+        from app.services.customer_response_service import customer_response_service
+        from scripts.ingest_garage_replies import ingest_garage_replies
+        return ingest_garage_replies, customer_response_service
+
+    async def _submit(self, session: aiohttp.ClientSession, url: str, tracked: Tracked):
+        form = aiohttp.FormData()
+        for key, value in tracked.form.items():
+            form.add_field(key, value)
+        for filename, content in self.images.pick(self.config.images_min, self.config.images_max):
+            form.add_field('images', content, filename=filename, content_type='image/jpeg')
+        try:
+            async with session.post(f'{url}/api/service-requests', data=form) as response:
+                await response.read()
+                tracked.status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            tracked.error = type(e).__name__
+        tracked.latency = time.time() - tracked.scheduled_at
+
+    def _reply(self, garage: str, tracked: Tracked):
+        original = garage_request_text(tracked.form['vin'], tracked.form['carBrand'], tracked.form['notes'])
+        _, body = garage_reply(tracked.form['vin'], original, self.random, garage=garage.split('@')[0])
+        subject = f"RE: Repair Quote Request - VIN: {tracked.form['vin']}"
+        self.fakes.loop.call_soon_threadsafe(self.fakes.graph.deliver, self.config.mailbox, garage, subject, body)
+
+    def _watch_outbox(self):
+        """Pick up new mail from the fake Graph outbox"""
+        sent = self.fakes.graph.sent
+        new, self._sent_seen = sent[self._sent_seen:], len(sent)
+        loop = asyncio.get_running_loop()
+        for mail in new:
+            match = _SUBJECT_VIN_RE.search(mail['subject'])
+            tracked = self.by_vin.get(match.group(1)) if match else None
+            if tracked is not None:
+                for garage in mail['to']:
+                    if garage in tracked.garages_sent:
+                        continue
+                    tracked.garages_sent.add(garage)
+                    if self.random.random() < self.config.reply_rate:
+                        loop.call_later(self.random.uniform(0, self.config.reply_delay_ms / 1000), self._reply, garage, tracked)
+                if tracked.fanned_out_at is None and len(tracked.garages_sent) >= self.config.garages:
+                    tracked.fanned_out_at = mail['sent_at']
+                continue
+            for recipient in mail['to']:
+                tracked = self.by_email.get(recipient)
+                if tracked is not None and tracked.digest_at is None:
+                    tracked.digest_at = mail['sent_at']
+
+    async def _watch(self, stop: asyncio.Event):
+        while not stop.is_set():
+            self._watch_outbox()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), 0.1)
+        self._watch_outbox()
+
+    async def _ticks(self, stop: asyncio.Event):
+        ingest, digests = self._import_jobs()
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                # The ingest script reports with print()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    await ingest()
+                await digests.check_and_send_customer_responses()
+            except Exception:
+                self.tick_errors += 1
+            self.tick_durations.append(time.monotonic() - started)
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), self.config.tick_interval)
+
+    # --- stages ------------------------------------------------------------
+
+    async def run_stage(self, rate: float, url: str) -> Dict[str, Any]:
+        config = self.config
+        self.fakes.reset_stats()
+        self.tick_durations, self.tick_errors = [], 0
+        total = max(1, int(rate * config.duration))
+        stage: List[Tracked] = []
+
+        stop = asyncio.Event()
+        watcher = asyncio.create_task(self._watch(stop))
+        ticker = asyncio.create_task(self._ticks(stop))
+
+        connector = aiohttp.TCPConnector(limit=config.max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=config.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            started = time.time()
+            submits = []
+            for i in range(total):
+                scheduled = started + i / rate
+                await asyncio.sleep(max(0.0, scheduled - time.time()))
+                tracked = Tracked(self.next_number, service_request_form(self.next_number, self.random), scheduled)
+                self.next_number += 1
+                self.by_vin[tracked.form['vin']] = tracked
+                self.by_email[tracked.form['email']] = tracked
+                stage.append(tracked)
+                submits.append(asyncio.create_task(self._submit(session, url, tracked)))
+            await asyncio.gather(*submits)
+            submitted_until = time.time()
+
+        accepted = [t for t in stage if t.status is not None and 200 <= t.status < 300]
+        deadline = time.monotonic() + config.drain
+        expect_digest = config.reply_rate >= 1.0
+        while time.monotonic() < deadline:
+            if all(t.fanned_out_at and (t.digest_at or not expect_digest) for t in accepted):
+                break
+            await asyncio.sleep(0.25)
+        stop.set()
+        await asyncio.gather(watcher, ticker)
+
+        statuses: Dict[str, int] = {}
+        for t in stage:
+            key = str(t.status) if t.status is not None else t.error or 'unknown'
+            statuses[key] = statuses.get(key, 0) + 1
+        calls = self.fakes.stats()
+        per_request = max(1, len(accepted))
+        return {
+            'target_rps': rate,
+            'submitted': len(stage),
+            'accepted': len(accepted),
+            'statuses': statuses,
+            'error_rate': 1 - len(accepted) / len(stage),
+            'throughput_rps': len(accepted) / max(1e-9, submitted_until - started),
+            'submit_latency': summarise([t.latency for t in stage if t.latency is not None]),
+            'time_to_fan_out': summarise([t.fanned_out_at - t.scheduled_at for t in accepted if t.fanned_out_at]),
+            'time_to_digest': summarise([t.digest_at - t.scheduled_at for t in accepted if t.digest_at]),
+            'outbound_calls_per_request': {
+                service: {
+                    'total': round(stats['total'] / per_request, 2),
+                    'routes': {route: round(count / per_request, 2) for route, count in stats['calls'].items()},
+                }
+                for service, stats in calls.items()
+            },
+            'ticks': {**summarise(self.tick_durations), 'errors': self.tick_errors},
+            'peak_rss_kb': {'app': peak_rss_kb(self.app.process.pid), 'harness': peak_rss_kb()},
+        }
+
+    def _fell_over(self, stage: Dict[str, Any]) -> Optional[str]:
+        if stage['error_rate'] > self.config.max_error_rate:
+            return f"error rate {stage['error_rate']:.1%} above {self.config.max_error_rate:.1%}"
+        p99 = stage['submit_latency']['p99']
+        if self.config.max_p99 is not None and p99 is not None and p99 > self.config.max_p99:
+            return f"submit p99 {p99:.2f}s above {self.config.max_p99:.2f}s"
+        return None
+
+    async def run(self, on_stage=None) -> List[Dict[str, Any]]:
+        config = self.config
+        workdir = tempfile.mkdtemp(prefix='garagefy-load-')
+        self.fakes = FakeServices(faults=config.faults, garages=config.garages, seed=config.seed).start()
+        # Log files go beside the app's state, not into backend/logs
+        env = {**self.fakes.env(), 'EMAIL_ADDRESS': config.mailbox, 'LOG_DIR': os.path.join(workdir, 'app', 'logs')}
+        os.environ.update(env)
+        # The app and the tick jobs each keep local state (SQLite index,
+        # processed_emails.txt) in their working directory
+        os.makedirs(os.path.join(workdir, 'app'))
+        os.makedirs(os.path.join(workdir, 'ticks'))
+        previous_cwd = os.getcwd()
+        os.chdir(os.path.join(workdir, 'ticks'))
+        results = []
+        try:
+            self.app = AppProcess(env, os.path.join(workdir, 'app'))
+            await self.app.start()
+            for rate in config.rates:
+                stage = await self.run_stage(rate, self.app.url)
+                stage['fell_over'] = self._fell_over(stage)
+                results.append(stage)
+                if on_stage:
+                    on_stage(stage)
+                if stage['fell_over']:
+                    break
+        finally:
+            if self.app:
+                self.app.stop()
+            self.fakes.stop()
+            with contextlib.suppress(Exception):
+                from app.services.baserow_async_service import async_baserow_service
+                await async_baserow_service.close()
+            os.chdir(previous_cwd)
+            if config.keep_workdir:
+                print(f'App log and local state kept in {workdir}', file=sys.stderr)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+        return results
@@ -0,0 +1,199 @@
+"""Synthetic service requests and garage replies.
+
+Images are real JPEGs of the requested size: with Pillow installed they are
+noisy photos at phone-camera dimensions, otherwise a small valid JPEG padded
+with comment segments (enough for anything that only moves bytes around).
+
+Replies are modelled on what garages actually send back: French, English or
+German, prices written every which way, sometimes a signature, and the
+original request quoted below in the mail client's own format.
+"""
+import base64
+import io
+import math
+import random
+import string
+from typing import Dict, List, Optional, Tuple
+
+VIN_ALPHABET = ''.join(c for c in string.ascii_uppercase + string.digits if c not in 'IOQ')
+
+LANGUAGES = ('fr', 'en', 'de')
+
+CAR_BRANDS = ['Volkswagen', 'Renault', 'Peugeot', 'BMW', 'Mercedes-Benz', 'Audi', 'Toyota', 'Citroën', 'Skoda', 'Tesla']
+
+DAMAGE_NOTES = [
+    "Rayure profonde sur la portière avant gauche, environ 40 cm.",
+    "Pare-chocs arrière enfoncé après un choc à faible vitesse, feu arrière fissuré.",
+    "Scratch along the passenger side, both doors, paint down to primer in places.",
+    "Front bumper cracked, fog light housing broken, bonnet slightly bent.",
+    "Delle in der Motorhaube durch Hagel, mehrere kleine Beulen auf dem Dach.",
+    "Kotflügel vorne rechts eingedrückt, Spiegelgehäuse abgebrochen.",
+    "Rétroviseur arraché et aile avant droite rayée sur toute la longueur.",
+]
+
+# 16x16 baseline JPEG; padded up to the requested size when Pillow is missing
+_TINY_JPEG = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1xeXBkeFxl'
+    'Z2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAAQABADASIAAhEB'
+    'AxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS'
+    '0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKz'
+    'tLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgEC'
+    'BAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpj'
+    'ZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6'
+    '/9oADAMBAAIRAxEAPwDIooorkPoT/9k='
+)
+_JFIF_END = 20  # SOI + APP0 segment
+_MAX_SEGMENT = 65533
+
+
+def _padded_jpeg(size: int, rng: random.Random) -> bytes:
+    padding = max(0, size - len(_TINY_JPEG))
+    segments = []
+    while padding > 4:
+        chunk = min(_MAX_SEGMENT, padding - 4)
+        segments.append(b'\xff\xfe' + (chunk + 2).to_bytes(2, 'big') + rng.randbytes(chunk))
+        padding -= chunk + 4
+    return _TINY_JPEG[:_JFIF_END] + b''.join(segments) + _TINY_JPEG[_JFIF_END:]
+
+
+def _photo_jpeg(size: int, rng: random.Random) -> Optional[bytes]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    # Noise compresses to roughly 1.1 bytes/pixel at quality 85
+    pixels = max(64 * 64, int(size / 1.1))
+    width = int(math.sqrt(pixels * 4 / 3))
+    height = max(48, int(width * 3 / 4))
+    image = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def jpeg(size: int, rng: Optional[random.Random] = None) -> bytes:
+    """A valid JPEG of roughly ``size`` bytes"""
+    rng = rng or random.Random()
+    return _photo_jpeg(size, rng) or _padded_jpeg(size, rng)
+
+
+class ImagePool:
+    """Pre-built JPEGs with sizes spread log-uniformly over ``[min_kb, max_kb]``.
+
+    Building a JPEG per request would make the harness the bottleneck, so
+    requests draw from a fixed pool instead.
+    """
+
+    def __init__(self, min_kb: float = 80, max_kb: float = 4096, count: int = 24, seed: Optional[int] = None):
+        rng = random.Random(seed)
+        low, high = math.log(min_kb * 1024), math.log(max(max_kb, min_kb) * 1024)
+        self.images = [jpeg(int(math.exp(rng.uniform(low, high))), rng) for _ in range(count)]
+        self.random = rng
+
+    def pick(self, low: int = 1, high: int = 5) -> List[Tuple[str, bytes]]:
+        """``(filename, content)`` for between ``low`` and ``high`` photos"""
+        count = self.random.randint(low, high)
+        return [(f'IMG_{self.random.randint(1000, 9999)}.jpg', self.random.choice(self.images)) for _ in range(count)]
+
+
+def vin(rng: random.Random) -> str:
+    return ''.join(rng.choice(VIN_ALPHABET) for _ in range(17))
+
+
+def service_request_form(number: int, rng: random.Random, email_domain: str = 'customers.fake.test') -> Dict[str, str]:
+    """Form fields for ``POST /api/service-requests`` (images not included)"""
+    return {
+        'name': f'Client Test {number}',
+        'email': f'client{number}@{email_domain}',
+        'phone': f'+352 621 {rng.randint(100000, 999999)}',
+        'carBrand': rng.choice(CAR_BRANDS),
+        'vin': vin(rng),
+        'licensePlate': f'{rng.choice(string.ascii_uppercase)}{rng.choice(string.ascii_uppercase)} {rng.randint(1000, 9999)}',
+        'notes': rng.choice(DAMAGE_NOTES),
+        'requestId': f'lt-{number}-{rng.getrandbits(32):08x}',
+    }
+
+
+# --- garage replies ------------------------------------------------------
+
+def _price(rng: random.Random, language: str) -> str:
+    amount = rng.randint(90, 4800) + rng.choice([0, 0, 0.5, 0.99])
+    whole = f'{int(amount):,}'
+    cents = f'{round((amount % 1) * 100):02d}'
+    styles = {
+        'fr': [f'{int(amount)} euros', f'{int(amount)}€', f'{whole.replace(",", " ")},{cents} €', f'EUR {int(amount)}',
+               f'entre {int(amount)} et {int(amount) + rng.randint(50, 400)} euros'],
+        'en': [f'€{int(amount)}', f'EUR {whole}.{cents}', f'{int(amount)} euros', f'{int(amount)}-{int(amount) + rng.randint(50, 400)} EUR'],
+        'de': [f'{int(amount)} EUR', f'{whole.replace(",", ".")},{cents} €', f'{int(amount)},- Euro', f'ca. {int(amount)} Euro'],
+    }
+    return rng.choice(styles[language])
+
+
+_OPENINGS = {
+    'fr': ["Bonjour,", "Madame, Monsieur,", "Bonjour Garagefy,", "Bonjour, merci pour votre demande."],
+    'en': ["Hello,", "Dear Garagefy team,", "Hi,", "Good afternoon,"],
+    'de': ["Guten Tag,", "Sehr geehrte Damen und Herren,", "Hallo,", "Moin,"],
+}
+
+_QUOTES = {
+    'fr': [
+        "Après examen des photos, nous pouvons réaliser la réparation pour {price} TTC, pièces et main d'œuvre comprises.",
+        "Notre devis pour le véhicule {vin} s'élève à {price}. Délai d'intervention : {days} jours ouvrés.",
+        "Nous estimons les travaux de carrosserie à {price} hors peinture. Un passage à l'atelier permettrait de confirmer.",
+        "Pour cette réparation, comptez {price}. Nous pouvons prendre le véhicule dès lundi.",
+    ],
+    'en': [
+        "Based on the photos we can do the repair for {price} including parts and labour.",
+        "Our quote for {vin} is {price}, and the work would take about {days} working days.",
+        "We estimate {price} for the bodywork. Paint matching may add a little once we see the car.",
+        "Happy to help - the repair comes to {price}. We have availability next week.",
+    ],
+    'de': [
+        "Nach Sichtung der Fotos können wir die Reparatur für {price} inkl. MwSt. anbieten.",
+        "Unser Kostenvoranschlag für das Fahrzeug {vin} beträgt {price}. Dauer: etwa {days} Werktage.",
+        "Die Karosseriearbeiten schätzen wir auf {price}, Lackierung inklusive.",
+        "Für die Instandsetzung veranschlagen wir {price}. Ein Termin wäre ab nächster Woche möglich.",
+    ],
+}
+
+_SIGNATURES = {
+    'fr': ["Cordialement,\nL'équipe {garage}", "Bien à vous,\n{garage}\nTél. +352 26 {phone}", "Salutations distinguées"],
+    'en': ["Kind regards,\n{garage}", "Best,\nThe {garage} team\nTel +352 26 {phone}", "Thanks"],
+    'de': ["Mit freundlichen Grüßen\n{garage}", "Viele Grüße\nIhr {garage} Team\nTel. +352 26 {phone}", "MfG"],
+}
+
+_QUOTE_HEADERS = {
+    'fr': ["Le {date}, Garagefy <info@garagefy.app> a écrit :", "-----Message d'origine-----\nDe : Garagefy <info@garagefy.app>"],
+    'en': ["On {date}, Garagefy <info@garagefy.app> wrote:", "-----Original Message-----\nFrom: Garagefy <info@garagefy.app>",
+           "On {date} Garagefy\n<info@garagefy.app> wrote:"],
+    'de': ["Am {date} schrieb Garagefy <info@garagefy.app>:", "-----Ursprüngliche Nachricht-----\nVon: Garagefy <info@garagefy.app>"],
+}
+
+
+def garage_reply(vin_: str, original: str, rng: random.Random, language: Optional[str] = None,
+                 garage: str = 'Garage Test') -> Tuple[str, str]:
+    """``(language, body)`` of a garage's answer to the request ``original``"""
+    language = language or rng.choice(LANGUAGES)
+    price = _price(rng, language)
+    lines = [
+        rng.choice(_OPENINGS[language]),
+        '',
+        rng.choice(_QUOTES[language]).format(price=price, vin=vin_, days=rng.randint(2, 10)),
+        '',
+        rng.choice(_SIGNATURES[language]).format(garage=garage, phone=rng.randint(100000, 999999)),
+        '',
+    ]
+    header = rng.choice(_QUOTE_HEADERS[language]).format(date=f'{rng.randint(1, 28)}/{rng.randint(1, 12)}/2026 {rng.randint(8, 18)}:{rng.randint(0, 59):02d}')
+    if header.startswith('-----'):
+        quoted = [header, '', original]
+    else:
+        quoted = [header, ''] + [f'> {line}' for line in original.splitlines()]
+    return language, '\n'.join(lines + quoted)
+
+
+def garage_request_text(vin_: str, brand: str, notes: str) -> str:
+    """Plain-text version of the quote request the garages receive"""
+    return (
+        f"Repair Quote Request\n\nRequest details:\nVehicle: {brand}\nVIN: {vin_}\n"
+        f"Damage description: {notes}\n\nPlease reply to this email with your quote.\n\nGaragefy"
+    )
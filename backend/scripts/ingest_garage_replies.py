@@ -1,4 +1,6 @@
 import os
+import re
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
@@ -19,11 +21,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Now import the services
-from app.services.airtable_service import AirtableService
-from app.services.email_service import get_access_token
-
-# Initialize Airtable service
-airtable_service = AirtableService()
+from app.services.baserow_service import baserow_service as airtable_service
 
 load_dotenv()
 
@@ -36,10 +34,14 @@ EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
 
 SCOPES = ['https://graph.microsoft.com/.default']
 AUTHORITY = f'https://login.microsoftonline.com/{MS_TENANT_ID}'
-GRAPH_ENDPOINT = 'https://graph.microsoft.com/v1.0'
+GRAPH_ENDPOINT = os.getenv('GRAPH_BASE_URL', 'https://graph.microsoft.com/v1.0').rstrip('/')
+# Fixed bearer token for the local fakes (python -m fakes); skips MSAL
+GRAPH_STATIC_TOKEN = os.getenv('GRAPH_STATIC_TOKEN')
 
 # Utility to get access token
 async def get_access_token():
+    if GRAPH_STATIC_TOKEN:
+        return GRAPH_STATIC_TOKEN
     app = msal.ConfidentialClientApplication(
         client_id=MS_CLIENT_ID,
         authority=AUTHORITY,
@@ -158,7 +160,7 @@ async def get_recent_emails():
             f"{GRAPH_ENDPOINT}/users/{EMAIL_ADDRESS}/mailFolders/inbox/messages"
             f"?$top=50"  # Increase limit to 50 emails
             f"&$orderby=receivedDateTime desc"
-            f"&$select=id,receivedDateTime,subject,from,body,hasAttachments"
+            f"&$select=id,internetMessageId,receivedDateTime,subject,from,body,hasAttachments"
             f"&$filter=receivedDateTime ge {get_iso8601(since)}"
         )
         
@@ -199,6 +201,7 @@ async def get_recent_emails():
                             'subject': subject,
                             'body': body,
                             'received_at': received_at,
+                            'message_id': item.get('internetMessageId', ''),
                             'has_attachments': item.get('hasAttachments', False)
                         }
                         
@@ -217,6 +220,41 @@ async def get_recent_emails():
 def get_iso8601(dt):
     return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
 
+def store_replies(pending) -> int:
+    """Store ``(email id, VIN, from, payload)`` replies in one batch; returns how many were stored"""
+    # Drop replies already stored by an earlier run, using the local
+    # received-email index (falls back to one Baserow lookup per reply)
+    try:
+        airtable_service.received_index.warm()
+    except Exception as e:
+        print(f"Could not warm the received-email index, checking Baserow instead: {str(e)}")
+    rows = []
+    for email_id, vin, from_email, email_data in pending:
+        if airtable_service._find_stored_reply(email_data, vin):
+            print(f"Reply from {from_email} for VIN {vin} already stored, skipping...")
+            save_processed_email(email_id)
+            continue
+        rows.append((email_id, vin, email_data, airtable_service._build_received_email_payload(email_data, vin)))
+    
+    stored = 0
+    if rows:
+        print(f"Storing {len(rows)} email(s) in Baserow...")
+        result = airtable_service.bulk_create_records('Recevied email', [payload for *_, payload in rows])
+        message_ids = []
+        for (email_id, vin, email_data, _), row in zip(rows, result['results']):
+            if row['success']:
+                print(f"Successfully stored email {email_id} (Record ID: {row['id']})")
+                stored += 1
+                if email_data.get('message_id'):
+                    message_ids.append((vin, email_data['from_email'], email_data['message_id'], row['id']))
+                # Only mark as processed once stored, so failures are retried next run
+                save_processed_email(email_id)
+            else:
+                print(f"Failed to store email {email_id}: {row['error']}")
+        # The rows themselves were indexed by the write; add their Message-IDs in one go
+        airtable_service.received_index.add_many(message_ids)
+    return stored
+
 async def ingest_garage_replies():
     """Process new emails, extract VINs, and store in Airtable."""
     try:
@@ -226,6 +264,9 @@ async def ingest_garage_replies():
             return True
             
         processed_count = 0
+        # Rows are written in one batch at the end: (email id, VIN, from, payload)
+        pending = []
+        seen = set()
         for email in new_emails:
             try:
                 email_id = email.get('id')
@@ -249,27 +290,23 @@ async def ingest_garage_replies():
                     save_processed_email(email_id)  # Mark as processed to avoid reprocessing
                     continue
                 
-                # Prepare the email data for Airtable
+                # Same garage replying twice for one VIN in this run
+                key = (vin, from_email.lower())
+                if key in seen:
+                    print(f"Duplicate reply from {from_email} for VIN {vin} in this run, skipping...")
+                    save_processed_email(email_id)
+                    continue
+                seen.add(key)
+                
+                # Prepare the email data for Baserow
                 email_data = {
-                    'VIN': vin,
-                    'Email': from_email,
-                    'Subject': subject,
-                    'Body': body[:5000],  # Limit body length to avoid Airtable field limits
-                    'Received At': received_at or datetime.utcnow().isoformat()
+                    'from_email': from_email,
+                    'subject': subject,
+                    'body': body[:5000],  # Limit body length to avoid field limits
+                    'received_at': received_at or datetime.utcnow().isoformat(),
+                    'message_id': email.get('message_id', '')
                 }
-                
-                print(f"Storing in Airtable: {email_data}")
-                
-                # Store in Airtable
-                result = airtable_service.store_received_email(email_data, vin)
-                if result and result.get('id'):
-                    print(f"Successfully stored email in Airtable (Record ID: {result.get('id')})")
-                    processed_count += 1
-                else:
-                    print(f"Warning: Email stored but no record ID returned: {result}")
-                
-                # Mark as processed
-                save_processed_email(email_id)
+                pending.append((email_id, vin, from_email, email_data))
                 
             except Exception as e:
                 print(f"Error processing email {email_id}: {str(e)}")
@@ -277,6 +314,11 @@ async def ingest_garage_replies():
                 traceback.print_exc()
                 continue
         
+        # Baserow calls block, so they run on a worker thread where they
+        # wait their turn under the Baserow rate limit like any other
+        if pending:
+            processed_count = await asyncio.to_thread(store_replies, pending)
+        
         print(f"\nProcessing complete. Successfully processed {processed_count} of {len(new_emails)} emails.")
         return True
         
@@ -287,5 +329,4 @@ async def ingest_garage_replies():
         return False
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(ingest_garage_replies())
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app.core import idempotency
+from app.core.database import Base, SessionLocal
+from app.core.idempotency import SqliteIdempotencyStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A sqlite store on its own database, so garagefy.db is never touched"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    previous = SessionLocal.kw['bind']
+    SessionLocal.configure(bind=engine)
+    try:
+        yield SqliteIdempotencyStore()
+    finally:
+        SessionLocal.configure(bind=previous)
+        engine.dispose()
+
+
+def test_first_claim_wins(store):
+    assert store.claim('form:abc', 'req-1', ttl=60) is None
+    assert store.claim('form:abc', 'req-2', ttl=60) == 'req-1'
+    assert store.claim('form:other', 'req-2', ttl=60) is None
+
+
+def test_expired_claim_is_taken_over(store, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(idempotency.time, 'time', lambda: now[0])
+    assert store.claim('form:abc', 'req-1', ttl=10) is None
+    now[0] += 9
+    assert store.claim('form:abc', 'req-2', ttl=10) == 'req-1'
+    now[0] += 2
+    assert store.claim('form:abc', 'req-2', ttl=10) is None
+    assert store.claim('form:abc', 'req-3', ttl=10) == 'req-2'
+
+
+def test_release_only_by_holder(store):
+    assert store.claim('form:abc', 'req-1', ttl=60) is None
+    assert store.release('form:abc', 'req-2') is False
+    assert store.release('form:abc', 'req-1') is True
+    assert store.claim('form:abc', 'req-2', ttl=60) is None
+
+
+def test_status_counts_live_claims(store, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(idempotency.time, 'time', lambda: now[0])
+    store.claim('a', 'req-1', ttl=10)
+    store.claim('b', 'req-2', ttl=100)
+    now[0] += 50
+    assert store.status() == {'entries': 1}
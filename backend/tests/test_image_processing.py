@@ -0,0 +1,96 @@
+import hashlib
+
+import pytest
+
+from app.services.image_processing import (
+    ImageCorrupt,
+    ImageRejected,
+    ImageSettings,
+    normalise_image,
+    strip_jpeg_metadata,
+)
+
+Image = pytest.importorskip('PIL.Image')
+
+CAMERA_MAKE = 0x010F
+ORIENTATION = 0x0112
+
+
+def _photo(path, size=(800, 600), **save):
+    exif = Image.Exif()
+    exif[CAMERA_MAKE] = 'PhoneCo'
+    exif[ORIENTATION] = 6
+    Image.effect_noise(size, 50).convert('RGB').save(path, 'JPEG', exif=exif.tobytes(), comment=b'secret', **save)
+    return str(path)
+
+
+def test_normalise_downscales_and_drops_metadata(tmp_path):
+    source, dest = _photo(tmp_path / 'car.jpg', size=(3000, 2000)), str(tmp_path / 'out')
+    result = normalise_image(source, dest, 'car.jpeg', ImageSettings(max_edge=1024))
+
+    content = open(dest, 'rb').read()
+    assert result['filename'] == 'car.jpg'
+    assert result['content_type'] == 'image/jpeg'
+    assert result['size'] == len(content)
+    assert result['sha256'] == hashlib.sha256(content).hexdigest()
+    # Orientation 6 is applied, so the photo comes out upright (portrait)
+    assert (result['width'], result['height']) == (683, 1024)
+    assert b'Exif' not in content and b'secret' not in content
+    with Image.open(dest) as image:
+        assert CAMERA_MAKE not in image.getexif()
+
+
+def test_normalise_keeps_unreadable_files(tmp_path):
+    source = tmp_path / 'notes.txt'
+    source.write_bytes(b'not an image')
+    assert normalise_image(str(source), str(tmp_path / 'out'), 'notes.txt', ImageSettings()) is None
+
+
+def test_normalise_rejects_too_many_pixels(tmp_path):
+    source = _photo(tmp_path / 'big.jpg', size=(1000, 1000))
+    with pytest.raises(ImageRejected):
+        normalise_image(source, str(tmp_path / 'out'), 'big.jpg', ImageSettings(max_pixels=500_000))
+
+
+def test_normalise_rejects_decompression_bomb(tmp_path):
+    # A huge flat image compresses to a few KB
+    source = str(tmp_path / 'bomb.png')
+    Image.new('L', (6000, 6000)).save(source)
+    with pytest.raises(ImageRejected):
+        normalise_image(source, str(tmp_path / 'out'), 'bomb.png', ImageSettings(max_edge=512))
+
+
+def test_normalise_truncated_image_is_corrupt(tmp_path):
+    source = tmp_path / 'broken.png'
+    Image.effect_noise((400, 300), 50).save(source)
+    data = source.read_bytes()
+    source.write_bytes(data[:len(data) // 3])
+    with pytest.raises(ImageCorrupt):
+        normalise_image(str(source), str(tmp_path / 'out'), 'broken.png', ImageSettings())
+
+
+def test_strip_jpeg_metadata(tmp_path):
+    source, dest = _photo(tmp_path / 'car.jpg'), str(tmp_path / 'out.jpg')
+    size, digest = strip_jpeg_metadata(source, dest)
+
+    content = open(dest, 'rb').read()
+    assert (size, digest) == (len(content), hashlib.sha256(content).hexdigest())
+    assert b'Exif' not in content and b'secret' not in content
+    # The compressed pixels are copied untouched
+    scan = open(source, 'rb').read().index(b'\xff\xda')
+    assert content.endswith(open(source, 'rb').read()[scan:])
+    with Image.open(dest) as image:
+        image.load()
+        assert image.size == (800, 600)
+        assert not image.getexif()
+
+
+def test_strip_jpeg_metadata_refuses_other_files(tmp_path):
+    source = _photo(tmp_path / 'car.jpg')
+    truncated = tmp_path / 'truncated.jpg'
+    truncated.write_bytes(open(source, 'rb').read()[:100])
+    png = tmp_path / 'car.png'
+    Image.new('RGB', (10, 10)).save(png)
+
+    assert strip_jpeg_metadata(str(truncated), str(tmp_path / 'out1.jpg')) is None
+    assert strip_jpeg_metadata(str(png), str(tmp_path / 'out2.jpg')) is None
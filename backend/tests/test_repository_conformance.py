@@ -0,0 +1,13 @@
+"""The shared repository contract (``app.repositories.conformance``) under pytest"""
+import asyncio
+
+import pytest
+
+from app.repositories.conformance import CHECKS, _factory
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sql'])
+@pytest.mark.parametrize('name, check', CHECKS, ids=[name for name, _ in CHECKS])
+def test_conformance(backend, name, check):
+    # A fresh in-memory SQLite database for every sql check
+    asyncio.run(check(_factory(backend, 'sqlite://')()))
@@ -6,7 +6,8 @@ const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8099';
 // Endpoints
 const ENDPOINTS = {
     HEALTH: '/health',
-    SERVICE_REQUESTS: '/api/service-requests'
+    SERVICE_REQUESTS: '/api/service-requests',
+    UPLOAD_SIGNATURE: '/api/service-requests/upload-signature'
 };
 
 const config = {
@@ -33,6 +33,36 @@ import axios from 'axios';
 import config from '../config';
 import { useLanguage } from '../i18n/LanguageContext';
 
+// Upload photos straight to Cloudinary with parameters signed by our API.
+// Returns what the API needs to verify the uploads, or null if anything
+// goes wrong, in which case the photos are sent with the form instead.
+const uploadImagesDirectly = async (images) => {
+  try {
+    const { data } = await axios.post(
+      `${config.API_BASE_URL}${config.ENDPOINTS.UPLOAD_SIGNATURE}`,
+      { count: images.length },
+      { timeout: 10000 }
+    );
+    if (images.some(image => image.size > data.max_bytes)) {
+      return null;
+    }
+
+    return await Promise.all(images.map(async (image, index) => {
+      const upload = new FormData();
+      upload.append('file', image);
+      upload.append('api_key', data.api_key);
+      Object.entries(data.uploads[index]).forEach(([key, value]) => upload.append(key, value));
+
+      const response = await axios.post(data.upload_url, upload, { timeout: 60000 });
+      const { public_id, version, signature, format } = response.data;
+      return { public_id, version, signature, format };
+    }));
+  } catch (error) {
+    console.warn('Direct upload unavailable, sending images with the form:', error.message);
+    return null;
+  }
+};
+
 const FixIt = () => {
   const { t } = useLanguage();
   const [formData, setFormData] = useState({
@@ -262,10 +292,20 @@ const FixIt = () => {
       formDataToSend.append('notes', formData.notes || '');
       formDataToSend.append('requestId', requestIdRef.current);
 
-      // Add images if any
-      formData.images.forEach((image, index) => {
-        formDataToSend.append(`images`, image);
-      });
+      // Photos go straight to Cloudinary when the API hands out upload
+      // signatures; otherwise they are sent with the form as before
+      const uploadedImages = formData.images.length > 0
+        ? await uploadImagesDirectly(formData.images)
+        : null;
+
+      if (uploadedImages) {
+        formDataToSend.append('uploadedImages', JSON.stringify(uploadedImages));
+      } else {
+        // Add images if any
+        formData.images.forEach((image, index) => {
+          formDataToSend.append(`images`, image);
+        });
+      }
 
       console.log('Sending form data:', {
         name: formData.name,
@@ -274,7 +314,8 @@ const FixIt = () => {
         vin: formData.vin,
         plateNumber: formData.plateNumber,
         notes: formData.notes,
-        imagesCount: formData.images.length
+        imagesCount: formData.images.length,
+        uploadedDirectly: Boolean(uploadedImages)
       });
       
       console.log('About to POST to:', `${config.API_BASE_URL}${config.ENDPOINTS.SERVICE_REQUESTS}`);